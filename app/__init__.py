@@ -8,6 +8,7 @@ from flask_sqlalchemy import SQLAlchemy
 from core.configuration.configuration import get_app_version
 from core.managers.config_manager import ConfigManager
 from core.managers.error_handler_manager import ErrorHandlerManager
+from core.managers.instrumentation_manager import InstrumentationManager
 from core.managers.logging_manager import LoggingManager
 from core.managers.module_manager import ModuleManager
 
@@ -55,6 +56,10 @@ def create_app(config_name="development"):
     error_handler_manager = ErrorHandlerManager(app)
     error_handler_manager.register_error_handlers()
 
+    # Per-endpoint latency and query metrics, served at /metrics
+    instrumentation_manager = InstrumentationManager(app)
+    instrumentation_manager.register_instrumentation()
+
     # Injecting environment variables into jinja context
     @app.context_processor
     def inject_vars_into_jinja():
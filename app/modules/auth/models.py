@@ -53,7 +53,7 @@ class UserSession(db.Model):
     __tablename__ = "user_session"
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False, index=True)
     session_id = db.Column(db.String(256), nullable=False, unique=True)
     user_agent = db.Column(db.String(512), nullable=True)
     ip_address = db.Column(db.String(45), nullable=True)
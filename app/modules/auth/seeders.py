@@ -1,7 +1,15 @@
+import uuid
+
+from faker import Faker
+from werkzeug.security import generate_password_hash
+
 from app.modules.auth.models import User
 from app.modules.profile.models import UserProfile
 from core.seeders.BaseSeeder import BaseSeeder
 
+# Synthetic users per synthetic dataset at scale: most users own a few datasets and a handful own many
+USERS_PER_DATASET = 0.2
+
 
 class AuthSeeder(BaseSeeder):
 
@@ -35,3 +43,37 @@ class AuthSeeder(BaseSeeder):
 
         # Seeding user profiles
         self.seed(user_profiles)
+
+        if self.scale:
+            self.seed_synthetic_users(max(1, int(self.scale * USERS_PER_DATASET)))
+
+    def seed_synthetic_users(self, count):
+        """Users with realistic names and profiles, all with password 1234 (hashed once: hashing is slow on purpose)."""
+        faker = Faker()
+        faker.seed_instance(count)
+        password = generate_password_hash("1234")
+        # Emails stay unique when seeding again without a reset
+        run = uuid.uuid4().hex[:6]
+
+        people = [(faker.first_name(), faker.last_name()) for _ in range(count)]
+        user_ids = self.bulk_seed(
+            User,
+            (
+                {"email": f"{name}.{surname}.{run}{i}@example.com".lower(), "password": password}
+                for i, (name, surname) in enumerate(people)
+            ),
+            return_ids=True,
+        )
+        self.bulk_seed(
+            UserProfile,
+            (
+                {
+                    "user_id": user_id,
+                    "name": name,
+                    "surname": surname,
+                    "affiliation": faker.company()[:100],
+                    "orcid": faker.numerify("0000-000#-####-####") if faker.boolean(40) else "",
+                }
+                for user_id, (name, surname) in zip(user_ids, people)
+            ),
+        )
@@ -10,6 +10,8 @@ dataset_fields = {
     "created": "created_at",
     "name": "name",
     "doi": "get_uvlhub_doi",
+    "files_count": "files_count",
+    "total_size_in_bytes": "total_size_in_bytes",
     "files": "files",
 }
 
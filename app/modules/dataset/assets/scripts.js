@@ -206,7 +206,11 @@ var currentId = 0;
                                     console.log('Dataset sent successfully');
                                     response.json().then(data => {
                                         console.log(data.message);
-                                        window.location.href = "/dataset/list";
+                                        if (data.status_url) {
+                                            wait_for_publication(data.status_url);
+                                        } else {
+                                            window.location.href = "/dataset/list";
+                                        }
                                     });
                                 } else {
                                     response.json().then(data => {
@@ -233,6 +237,29 @@ var currentId = 0;
         };
 
 
+        // The dataset is already saved; Zenodo publication runs in the background, so the page only follows it
+        // for a while and then leaves it running
+        const PUBLICATION_POLL_INTERVAL = 2000;
+        const PUBLICATION_MAX_POLLS = 15;
+
+        function wait_for_publication(status_url, polls = 0) {
+            const loading = document.getElementById("loading");
+            fetch(status_url)
+                .then(response => response.ok ? response.json() : null)
+                .then(job => {
+                    const finished = !job || job.status === "succeeded" || job.status === "failed";
+                    if (finished || polls >= PUBLICATION_MAX_POLLS) {
+                        window.location.href = "/dataset/list";
+                        return;
+                    }
+                    loading.lastChild.textContent = " Dataset saved, publishing in Zenodo (" + job.step.replace("_", " ") + ")...";
+                    setTimeout(() => wait_for_publication(status_url, polls + 1), PUBLICATION_POLL_INTERVAL);
+                })
+                .catch(() => {
+                    window.location.href = "/dataset/list";
+                });
+        }
+
         function isValidOrcid(orcid) {
             let orcidRegex = /^\d{4}-\d{4}-\d{4}-\d{4}$/;
             return orcidRegex.test(orcid);
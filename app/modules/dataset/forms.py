@@ -79,7 +79,8 @@ class DataSetForm(FlaskForm):
             "description": self.desc.data,
             "publication_type": publication_type_converted,
             "publication_doi": self.publication_doi.data,
-            "dataset_doi": self.dataset_doi.data,
+            # Empty means no DOI: dataset DOIs are unique, and an empty string would be taken only once
+            "dataset_doi": self.dataset_doi.data or None,
             "tags": self.tags.data,
         }
 
@@ -124,6 +125,7 @@ class RawDataSetForm(FlaskForm):
             "description": self.desc.data,
             "publication_type": publication_type_converted,
             "publication_doi": self.publication_doi.data,
-            "dataset_doi": self.dataset_doi.data,
+            # Empty means no DOI: dataset DOIs are unique, and an empty string would be taken only once
+            "dataset_doi": self.dataset_doi.data or None,
             "tags": self.tags.data,
         }
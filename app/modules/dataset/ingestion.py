@@ -0,0 +1,695 @@
+"""
+Bulk import of UVL datasets described by a manifest, for catalogues of thousands of feature models.
+
+The manifest lists the datasets and, for each, its feature models and the UVL files they come from, relative to a
+directory or to the root of a ZIP archive. A pool of processes hashes and validates the files in manifest order while
+the datasets already inspected are written: every batch goes in one transaction of a few multi-row INSERTs, instead of
+a flush per row as in the upload form. Files that are missing or not valid UVL are left out and reported.
+
+Bulk INSERTs bypass the mapper events, so the file totals of the datasets, the blob references, the homepage counter
+and the search index are written here as well. Models are not analysed: `rosemary featuremodel:analyze` computes
+their metrics afterwards.
+
+Imports sent to the web app are only queued (DataSetImportJobService): `flask dataset import-worker` runs them, so
+that a large import neither holds a web worker nor is killed halfway by its timeout.
+"""
+
+import csv
+import io
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import socket
+import tempfile
+import time
+import uuid
+import zipfile
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List, NamedTuple, Optional
+
+from flask import current_app
+from sqlalchemy import bindparam, delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.modules.dataset.models import (
+    Author,
+    DataSetImportJob,
+    DSMetaData,
+    ImportJobStatus,
+    PublicationType,
+    UVLDataSet,
+)
+from app.modules.dataset.repositories import DataSetImportJobRepository, DataSetRepository
+from app.modules.explore.models import SearchTerm
+from app.modules.explore.repositories import collect_terms
+from app.modules.explore.services import metadata_texts
+from app.modules.featuremodel.models import FeatureModel, FMMetaData
+from app.modules.flamapy.validation import remember_verdicts
+from app.modules.hubfile.models import Blob, Hubfile
+from app.modules.hubfile.services import BlobService
+from app.modules.public.models import FEATURE_MODELS, increment_counter
+from core.flamapy.validation import UVLVerdict, inspect_uvl_file
+from core.services.BaseService import BaseService
+from core.storage.resolver import uploads_root
+
+logger = logging.getLogger(__name__)
+
+# As the flamapy pools, workers start in a clean interpreter rather than a fork of a threaded web worker
+_context = multiprocessing.get_context("spawn")
+
+# Files sent to a worker at once: UVL files are small, and one at a time the round trips would dominate
+INSPECT_CHUNK_SIZE = 32
+
+# Attempts at writing a batch whose new blobs collide with those of concurrent uploads
+BATCH_ATTEMPTS = 3
+
+# Length of the String(120) columns of the metadata
+MAX_TEXT_LENGTH = 120
+
+CSV_COLUMNS = (
+    "dataset",
+    "description",
+    "publication_type",
+    "publication_doi",
+    "tags",
+    "authors",
+    "file",
+    "model_title",
+    "model_description",
+    "model_tags",
+    "uvl_version",
+)
+
+
+class ManifestError(ValueError):
+    pass
+
+
+class AuthorEntry(NamedTuple):
+    name: str
+    affiliation: Optional[str] = None
+    orcid: Optional[str] = None
+
+
+class ModelEntry(NamedTuple):
+    # Path of the UVL file, relative to the root of the files
+    file: str
+    uvl_filename: str
+    title: str
+    description: str
+    publication_type: PublicationType
+    publication_doi: Optional[str]
+    tags: Optional[str]
+    uvl_version: Optional[str]
+    authors: List[AuthorEntry]
+
+
+class DatasetEntry(NamedTuple):
+    title: str
+    description: str
+    publication_type: PublicationType
+    publication_doi: Optional[str]
+    tags: Optional[str]
+    authors: List[AuthorEntry]
+    models: List[ModelEntry]
+
+
+def read_manifest(content: bytes, filename) -> List[DatasetEntry]:
+    """
+    Reads a JSON or CSV manifest, told apart by the extension of its name.
+
+    A JSON manifest is a list of datasets, each with title, description, publication_type (a value such as "article",
+    "none" by default), publication_doi, tags (a string or a list), authors (objects with name, affiliation and
+    orcid) and models. Models have file and, optionally, the same fields as datasets plus uvl_version; their title
+    defaults to the name of the file and their publication type to that of the dataset.
+
+    A CSV manifest has one row per model, with the columns of CSV_COLUMNS: the rows of a dataset share its title (the
+    dataset column), and the dataset fields are read from the first of them. Authors are names separated by ";".
+
+    :raises ManifestError: If the manifest cannot be read or describes an invalid dataset.
+    """
+    extension = os.path.splitext(filename or "")[1].lower()
+    try:
+        text = content.decode("utf-8-sig")
+        if extension == ".json":
+            datasets = json.loads(text)
+        elif extension == ".csv":
+            datasets = _datasets_from_rows(csv.DictReader(io.StringIO(text)))
+        else:
+            raise ManifestError("The manifest must be a .json or a .csv file")
+    except (UnicodeDecodeError, json.JSONDecodeError, csv.Error) as exc:
+        raise ManifestError(f"The manifest cannot be read: {exc}") from exc
+
+    if not isinstance(datasets, list) or not datasets:
+        raise ManifestError("The manifest must list at least one dataset")
+    return [_dataset_entry(data, f"dataset {position}") for position, data in enumerate(datasets, start=1)]
+
+
+def _datasets_from_rows(rows):
+    columns = set(rows.fieldnames or ())
+    missing = {"dataset", "file"} - columns
+    if missing:
+        raise ManifestError(f"The manifest lacks the columns {', '.join(sorted(missing))}")
+    unknown = columns - set(CSV_COLUMNS)
+    if unknown:
+        raise ManifestError(f"Unknown columns in the manifest: {', '.join(sorted(unknown))}")
+
+    datasets = {}
+    for row in rows:
+        dataset = datasets.get(row["dataset"])
+        if dataset is None:
+            dataset = datasets[row["dataset"]] = {
+                "title": row["dataset"],
+                "description": row.get("description"),
+                "publication_type": row.get("publication_type") or "none",
+                "publication_doi": row.get("publication_doi"),
+                "tags": row.get("tags"),
+                "authors": [{"name": name.strip()} for name in (row.get("authors") or "").split(";") if name.strip()],
+                "models": [],
+            }
+        dataset["models"].append(
+            {
+                "file": row["file"],
+                "title": row.get("model_title"),
+                "description": row.get("model_description"),
+                "tags": row.get("model_tags"),
+                "uvl_version": row.get("uvl_version"),
+            }
+        )
+    return list(datasets.values())
+
+
+def _dataset_entry(data, where) -> DatasetEntry:
+    if not isinstance(data, dict):
+        raise ManifestError(f"{where}: must be an object")
+    title = _text(data, "title", where, required=True)
+    models = data.get("models")
+    if not isinstance(models, list) or not models:
+        raise ManifestError(f"{where}: must list at least one model")
+
+    publication_type = _publication_type(data.get("publication_type"), PublicationType.NONE, where)
+    entries = [
+        _model_entry(model, f"{where}, model {position}", publication_type)
+        for position, model in enumerate(models, start=1)
+    ]
+    duplicated = [name for name, count in Counter(entry.uvl_filename for entry in entries).items() if count > 1]
+    if duplicated:
+        raise ManifestError(f"{where}: more than one file is named {duplicated[0]}")
+
+    return DatasetEntry(
+        title=title,
+        description=_text(data, "description", where, required=True, max_length=None),
+        publication_type=publication_type,
+        publication_doi=_text(data, "publication_doi", where),
+        tags=_tags(data, where),
+        authors=_authors(data, where),
+        models=entries,
+    )
+
+
+def _model_entry(data, where, publication_type) -> ModelEntry:
+    if not isinstance(data, dict):
+        raise ManifestError(f"{where}: must be an object")
+    file = _text(data, "file", where, required=True, max_length=None)
+    path = os.path.normpath(file.replace("\\", "/"))
+    if os.path.isabs(path) or path.split(os.sep)[0] == os.pardir:
+        raise ManifestError(f"{where}: {file} is not a path inside the files")
+    uvl_filename = os.path.basename(path)
+    if os.path.splitext(uvl_filename)[1].lower() != ".uvl":
+        raise ManifestError(f"{where}: {file} is not a .uvl file")
+    if len(uvl_filename) > MAX_TEXT_LENGTH:
+        raise ManifestError(f"{where}: the name of {file} is longer than {MAX_TEXT_LENGTH} characters")
+
+    return ModelEntry(
+        file=path,
+        uvl_filename=uvl_filename,
+        title=_text(data, "title", where) or os.path.splitext(uvl_filename)[0],
+        description=_text(data, "description", where, max_length=None) or "",
+        publication_type=_publication_type(data.get("publication_type"), publication_type, where),
+        publication_doi=_text(data, "publication_doi", where),
+        tags=_tags(data, where),
+        uvl_version=_text(data, "uvl_version", where),
+        authors=_authors(data, where),
+    )
+
+
+def _text(data, key, where, required=False, max_length=MAX_TEXT_LENGTH) -> Optional[str]:
+    value = data.get(key)
+    if value is not None and not isinstance(value, str):
+        raise ManifestError(f"{where}: {key} must be a string")
+    value = (value or "").strip() or None
+    if value is None and required:
+        raise ManifestError(f"{where}: {key} is required")
+    if value is not None and max_length is not None and len(value) > max_length:
+        raise ManifestError(f"{where}: {key} is longer than {max_length} characters")
+    return value
+
+
+def _tags(data, where) -> Optional[str]:
+    if isinstance(data.get("tags"), list):
+        data = {"tags": ",".join(str(tag).strip() for tag in data["tags"])}
+    return _text(data, "tags", where)
+
+
+def _publication_type(value, default, where) -> PublicationType:
+    if not value:
+        return default
+    try:
+        return PublicationType(value)
+    except ValueError:
+        raise ManifestError(f"{where}: unknown publication type {value}") from None
+
+
+def _authors(data, where) -> List[AuthorEntry]:
+    authors = data.get("authors") or []
+    if not isinstance(authors, list) or not all(isinstance(author, dict) for author in authors):
+        raise ManifestError(f"{where}: authors must be a list of objects")
+    return [
+        AuthorEntry(
+            name=_text(author, "name", f"{where}, author {position}", required=True),
+            affiliation=_text(author, "affiliation", where),
+            orcid=_text(author, "orcid", where),
+        )
+        for position, author in enumerate(authors, start=1)
+    ]
+
+
+class ImportReport:
+    def __init__(self):
+        self.dataset_ids = []
+        self.models = 0
+        self.bytes = 0
+        # (file or dataset title, reason) of what was left out
+        self.rejected = []
+        self.seconds = 0.0
+
+    @property
+    def models_per_second(self) -> float:
+        return self.models / self.seconds if self.seconds else 0.0
+
+    @property
+    def megabytes_per_second(self) -> float:
+        return self.bytes / 1024**2 / self.seconds if self.seconds else 0.0
+
+    def to_dict(self):
+        return {
+            "datasets": len(self.dataset_ids),
+            "dataset_ids": self.dataset_ids,
+            "models": self.models,
+            "bytes": self.bytes,
+            "seconds": round(self.seconds, 3),
+            "models_per_second": round(self.models_per_second, 1),
+            "megabytes_per_second": round(self.megabytes_per_second, 2),
+            "rejected": [{"item": item, "reason": reason} for item, reason in self.rejected],
+        }
+
+
+def archive_members(archive: zipfile.ZipFile, datasets) -> List[zipfile.ZipInfo]:
+    """
+    The members of the ZIP archive of an import that the manifest refers to, checked against the limits of the
+    configuration before anything is extracted. Extraction stops at the size every member declares (and fails if its
+    CRC does not match), so the declared sizes cannot lie.
+
+    :raises ManifestError: If the archive has more than DATASET_IMPORT_MAX_FILES entries, or the files of the
+        manifest take more than DATASET_IMPORT_MAX_BYTES once extracted.
+    """
+    max_files = current_app.config["DATASET_IMPORT_MAX_FILES"]
+    max_bytes = current_app.config["DATASET_IMPORT_MAX_BYTES"]
+    members = archive.infolist()
+    if len(members) > max_files:
+        raise ManifestError(f"The ZIP archive has {len(members)} entries, more than the {max_files} allowed")
+
+    wanted = {model.file for dataset in datasets for model in dataset.models}
+    referenced = [info for info in members if not info.is_dir() and os.path.normpath(info.filename) in wanted]
+    size = sum(info.file_size for info in referenced)
+    if size > max_bytes:
+        raise ManifestError(f"The files of the manifest take {size} bytes, more than the {max_bytes} allowed")
+    return referenced
+
+
+@contextmanager
+def files_root(path, datasets):
+    """
+    The directory of the files of an import: path itself, or a temporary copy of the files of the ZIP archive at path
+    that the manifest refers to (see archive_members), next to the uploads so that blobs can be hard links to them.
+    """
+    if os.path.isdir(path):
+        yield path
+        return
+    if not zipfile.is_zipfile(path):
+        raise ManifestError("The files must be a directory or a ZIP archive")
+
+    os.makedirs(uploads_root(), exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix="import-", dir=uploads_root()) as directory:
+        with zipfile.ZipFile(path) as archive:
+            # Manifest paths are relative and without parent components, so members land below directory
+            for info in archive_members(archive, datasets):
+                archive.extract(info, directory)
+        yield directory
+
+
+@contextmanager
+def _inspector(workers):
+    """A function mapping UVL paths to their InspectedFile, in order, in workers processes (in this one if 1)."""
+    if workers <= 1:
+        yield lambda paths: map(inspect_uvl_file, paths)
+        return
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=_context)
+    try:
+        yield lambda paths: executor.map(inspect_uvl_file, paths, chunksize=INSPECT_CHUNK_SIZE)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+class DataSetImportService(BaseService):
+    def __init__(self):
+        super().__init__(DataSetRepository(UVLDataSet))
+        self.blob_service = BlobService()
+
+    def import_datasets(
+        self, datasets, root, owner, workers=None, batch_size=None, progress: Optional[Callable] = None
+    ) -> ImportReport:
+        """
+        Creates the given UVL datasets, owned by owner, from the files below root. Each batch of about batch_size
+        models is committed on its own, so an import that fails halfway keeps the batches written before.
+
+        :param datasets: DatasetEntry list, as read by read_manifest.
+        :param workers: Processes hashing and validating files (DATASET_IMPORT_WORKERS by default).
+        :param batch_size: Models per transaction (DATASET_IMPORT_BATCH_SIZE by default).
+        :param progress: Called with the ImportReport so far after every batch.
+        """
+        workers = workers or current_app.config["DATASET_IMPORT_WORKERS"]
+        batch_size = batch_size or current_app.config["DATASET_IMPORT_BATCH_SIZE"]
+        # Datasets without authors in the manifest are authored by the owner, as those of the upload form
+        profile = owner.profile
+        default_authors = (
+            [AuthorEntry(f"{profile.surname}, {profile.name}", profile.affiliation, profile.orcid)] if profile else []
+        )
+
+        report = ImportReport()
+        started = time.monotonic()
+        paths = [os.path.join(root, model.file) for dataset in datasets for model in dataset.models]
+        with _inspector(workers) as inspect:
+            inspected = iter(inspect(paths))
+            batch, batch_models = [], 0
+            for dataset in datasets:
+                if not dataset.authors:
+                    dataset = dataset._replace(authors=default_authors)
+                files = [(model, os.path.join(root, model.file), next(inspected)) for model in dataset.models]
+                batch.append((dataset, files))
+                batch_models += len(files)
+                if batch_models >= batch_size:
+                    self._write_batch(batch, owner, report)
+                    batch, batch_models = [], 0
+                    report.seconds = time.monotonic() - started
+                    logger.info(f"Imported {report.models} feature models ({report.models_per_second:.1f}/s)")
+                    if progress:
+                        progress(report)
+            if batch:
+                self._write_batch(batch, owner, report)
+
+        report.seconds = time.monotonic() - started
+        logger.info(
+            f"Imported {len(report.dataset_ids)} datasets, {report.models} feature models in {report.seconds:.1f} s"
+        )
+        return report
+
+    def _write_batch(self, batch, owner, report: ImportReport):
+        accepted = []
+        for dataset, files in batch:
+            models = []
+            for model, path, result in files:
+                if result.error is not None:
+                    report.rejected.append((model.file, result.error))
+                elif not result.verdict.valid:
+                    report.rejected.append((model.file, result.verdict.errors()[0]))
+                else:
+                    models.append((model, path, result.digest))
+            if models:
+                accepted.append((dataset, models))
+            else:
+                report.rejected.append((dataset.title, "None of its files is a valid UVL model"))
+        if not accepted:
+            return
+
+        for attempt in range(1, BATCH_ATTEMPTS + 1):
+            try:
+                dataset_ids = self._insert(accepted, owner)
+                self.repository.session.commit()
+                break
+            except IntegrityError:
+                self.repository.session.rollback()
+                # A concurrent upload stored one of the new blobs first: they are read back on the next attempt
+                if attempt == BATCH_ATTEMPTS:
+                    raise
+            except Exception:
+                self.repository.session.rollback()
+                raise
+
+        digests = [digest for _, models in accepted for _, _, digest in models]
+        remember_verdicts({digest.md5: UVLVerdict() for digest in digests})
+        report.dataset_ids.extend(dataset_ids)
+        report.models += len(digests)
+        report.bytes += sum(digest.size for digest in digests)
+
+    def _insert(self, accepted, owner) -> List[int]:
+        session = self.repository.session
+        models = [model for _, dataset_models in accepted for model in dataset_models]
+
+        blob_ids = self._acquire_blobs(models)
+
+        ds_meta_data_ids = self._insert_returning_ids(
+            DSMetaData,
+            [
+                {
+                    "title": dataset.title,
+                    "description": dataset.description,
+                    "publication_type": dataset.publication_type,
+                    "publication_doi": dataset.publication_doi,
+                    "tags": dataset.tags,
+                }
+                for dataset, _ in accepted
+            ],
+        )
+        # The file totals kept by the Hubfile listeners, which bulk inserts do not run
+        dataset_ids = self._insert_returning_ids(
+            UVLDataSet,
+            [
+                {
+                    "user_id": owner.id,
+                    "ds_meta_data_id": ds_meta_data_id,
+                    "files_count": len(dataset_models),
+                    "total_size_in_bytes": sum(digest.size for _, _, digest in dataset_models),
+                }
+                for (_, dataset_models), ds_meta_data_id in zip(accepted, ds_meta_data_ids)
+            ],
+        )
+        fm_meta_data_ids = self._insert_returning_ids(
+            FMMetaData,
+            [
+                {
+                    "uvl_filename": model.uvl_filename,
+                    "title": model.title,
+                    "description": model.description,
+                    "publication_type": model.publication_type,
+                    "publication_doi": model.publication_doi,
+                    "tags": model.tags,
+                    "uvl_version": model.uvl_version,
+                }
+                for model, _, _ in models
+            ],
+        )
+        data_set_ids = [
+            dataset_id for (_, dataset_models), dataset_id in zip(accepted, dataset_ids) for _ in dataset_models
+        ]
+        feature_model_ids = self._insert_returning_ids(
+            FeatureModel,
+            [
+                {"data_set_id": data_set_id, "fm_meta_data_id": fm_meta_data_id}
+                for data_set_id, fm_meta_data_id in zip(data_set_ids, fm_meta_data_ids)
+            ],
+        )
+
+        session.execute(
+            insert(Hubfile),
+            [
+                {
+                    "name": model.uvl_filename,
+                    "checksum": digest.md5,
+                    "size": digest.size,
+                    "feature_model_id": feature_model_id,
+                    "blob_id": blob_ids[digest.md5],
+                }
+                for (model, _, digest), feature_model_id in zip(models, feature_model_ids)
+            ],
+        )
+
+        authors = [
+            {"ds_meta_data_id": ds_meta_data_id, **author._asdict()}
+            for (dataset, _), ds_meta_data_id in zip(accepted, ds_meta_data_ids)
+            for author in dataset.authors
+        ] + [
+            {"fm_meta_data_id": fm_meta_data_id, **author._asdict()}
+            for (model, _, _), fm_meta_data_id in zip(models, fm_meta_data_ids)
+            for author in model.authors
+        ]
+        if authors:
+            session.execute(insert(Author), authors)
+
+        terms = [
+            {"term": term, "dataset_id": dataset_id, "weight": weight}
+            for (dataset, dataset_models), dataset_id in zip(accepted, dataset_ids)
+            for term, weight in collect_terms(
+                metadata_texts(dataset, dataset.authors, [model for model, _, _ in dataset_models])
+            ).items()
+        ]
+        # As in SearchTermRepository.replace_terms: backends that reuse the ids of deleted datasets (SQLite) may keep
+        # their postings
+        session.execute(delete(SearchTerm).where(SearchTerm.dataset_id.in_(dataset_ids)))
+        if terms:
+            session.execute(insert(SearchTerm), terms)
+
+        increment_counter(session.connection(), FEATURE_MODELS, len(models))
+        return dataset_ids
+
+    def _acquire_blobs(self, models) -> dict:
+        """
+        Adds the references of the given (model, path, digest) to their blobs, creating and storing the new ones.
+
+        :return: The id of the blob of every checksum.
+        """
+        session = self.repository.session
+        references = Counter(digest.md5 for _, _, digest in models)
+        blob_ids = dict(
+            session.execute(select(Blob.checksum, Blob.id).where(Blob.checksum.in_(list(references)))).all()
+        )
+        if blob_ids:
+            session.execute(
+                update(Blob.__table__)
+                .where(Blob.id == bindparam("blob_id"))
+                .values(ref_count=Blob.ref_count + bindparam("added")),
+                [{"blob_id": blob_id, "added": references[checksum]} for checksum, blob_id in blob_ids.items()],
+            )
+
+        new_blobs = {}
+        for _, path, digest in models:
+            if digest.md5 not in blob_ids and digest.md5 not in new_blobs:
+                # Stored before the commit, as in the upload form: a failed batch leaves orphans for storage:gc
+                self.blob_service.store(path, digest.md5)
+                new_blobs[digest.md5] = {
+                    "checksum": digest.md5,
+                    "crc32": digest.crc32,
+                    "size": digest.size,
+                    "ref_count": references[digest.md5],
+                }
+        if new_blobs:
+            blob_ids.update(
+                session.execute(insert(Blob).returning(Blob.checksum, Blob.id), list(new_blobs.values())).all()
+            )
+        return blob_ids
+
+    def _insert_returning_ids(self, model, rows) -> List[int]:
+        """Inserts rows in as few statements as the backend allows, returning their ids in the same order."""
+        return (
+            self.repository.session.execute(insert(model).returning(model.id, sort_by_parameter_order=True), rows)
+            .scalars()
+            .all()
+        )
+
+
+class DataSetImportJobService(BaseService):
+    """
+    Queue of bulk imports sent to the web app. Enqueuing checks the manifest and the archive and keeps them below the
+    uploads; a worker process (`flask dataset import-worker`) runs the imports one at a time, recording the report
+    after every batch so that the owner can follow them.
+    """
+
+    # A RUNNING job whose worker has not written a batch for this long is considered abandoned
+    LEASE_SECONDS = 15 * 60
+
+    def __init__(self):
+        super().__init__(DataSetImportJobRepository())
+        self.import_service = DataSetImportService()
+
+    def enqueue(self, manifest, archive, owner) -> DataSetImportJob:
+        """
+        Queues the import of an uploaded manifest and ZIP archive (werkzeug FileStorage objects).
+
+        :raises ManifestError: If the manifest is invalid, or the archive is not a ZIP archive within the limits.
+        """
+        datasets = read_manifest(manifest.read(), manifest.filename)
+        manifest_name = f"manifest{os.path.splitext(manifest.filename)[1].lower()}"
+        folder = os.path.join(uploads_root(), "imports", uuid.uuid4().hex)
+        os.makedirs(folder)
+        try:
+            manifest.stream.seek(0)
+            manifest.save(os.path.join(folder, manifest_name))
+            archive_path = os.path.join(folder, "files.zip")
+            archive.save(archive_path)
+            if not zipfile.is_zipfile(archive_path):
+                raise ManifestError("The files must be a ZIP archive")
+            with zipfile.ZipFile(archive_path) as zip_file:
+                archive_members(zip_file, datasets)
+            return self.repository.create(user_id=owner.id, folder=folder, manifest_name=manifest_name)
+        except Exception:
+            shutil.rmtree(folder, ignore_errors=True)
+            raise
+
+    def status(self, job_id: int, owner) -> Optional[dict]:
+        job = self.repository.get_by_id(job_id)
+        return job.to_dict() if job and job.user_id == owner.id else None
+
+    def run_next(self, worker_id: str) -> Optional[DataSetImportJob]:
+        """Claims and runs the oldest queued job. Returns it, or None when the queue is empty."""
+        now = datetime.now(timezone.utc)
+        self.repository.fail_abandoned(now - timedelta(seconds=self.LEASE_SECONDS))
+        job = self.repository.claim_next(worker_id, now)
+        if job is None:
+            return None
+
+        logger.info(f"Running {job}")
+        session = self.repository.session
+
+        def record(report):
+            job.report = json.dumps(report.to_dict())
+            job.locked_at = datetime.now(timezone.utc)
+            session.commit()
+
+        try:
+            with open(os.path.join(job.folder, job.manifest_name), "rb") as file:
+                datasets = read_manifest(file.read(), job.manifest_name)
+            with files_root(os.path.join(job.folder, "files.zip"), datasets) as root:
+                report = self.import_service.import_datasets(datasets, root, job.user, progress=record)
+            job.status = ImportJobStatus.SUCCEEDED
+            record(report)
+        except Exception as exc:
+            logger.exception(f"{job} failed: {exc}")
+            session.rollback()
+            job.status = ImportJobStatus.FAILED
+            job.last_error = str(exc)
+            session.commit()
+        finally:
+            shutil.rmtree(job.folder, ignore_errors=True)
+        return job
+
+    def work(self, worker_id: Optional[str] = None, poll_interval: float = 5.0, once: bool = False) -> int:
+        """
+        Runs jobs until interrupted, sleeping poll_interval seconds whenever the queue is empty.
+
+        :param once: Stop as soon as the queue is empty instead of waiting for new jobs.
+        :return: Number of jobs run.
+        """
+        worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        processed = 0
+        while True:
+            if self.run_next(worker_id) is not None:
+                processed += 1
+                continue
+            if once:
+                return processed
+            time.sleep(poll_interval)
@@ -1,10 +1,13 @@
-from datetime import datetime
+import json
+from datetime import datetime, timezone
 from enum import Enum
 
 from flask import request
 from sqlalchemy import Enum as SQLAlchemyEnum
+from sqlalchemy import event, inspect, update
 
 from app import db
+from app.modules.profile.models import UserProfile
 
 
 class PublicationType(Enum):
@@ -42,22 +45,34 @@ class Author(db.Model):
 
 
 class DSMetrics(db.Model):
+    """Totals of the FMMetrics of the models of a dataset."""
+
     id = db.Column(db.Integer, primary_key=True)
-    number_of_models = db.Column(db.String(120))
-    number_of_features = db.Column(db.String(120))
+    number_of_models = db.Column(db.Integer)
+    # Sum over the models that could be analysed
+    number_of_features = db.Column(db.Integer)
+
+    @classmethod
+    def from_fm_metrics(cls, fm_metrics):
+        features = [metrics.number_of_features for metrics in fm_metrics if metrics.number_of_features is not None]
+        return cls(number_of_models=len(fm_metrics), number_of_features=sum(features) if features else None)
 
     def __repr__(self):
         return f"DSMetrics<models={self.number_of_models}, features={self.number_of_features}>"
 
 
 class DSMetaData(db.Model):
+    # DOI resolution and the synchronized/unsynchronized lists look datasets up by DOI
+    __table_args__ = (db.UniqueConstraint("dataset_doi", name="uq_ds_meta_data_dataset_doi"),)
+
     id = db.Column(db.Integer, primary_key=True)
     deposition_id = db.Column(db.Integer)
     title = db.Column(db.String(120), nullable=False)
     description = db.Column(db.Text, nullable=False)
     publication_type = db.Column(SQLAlchemyEnum(PublicationType), nullable=False)
     publication_doi = db.Column(db.String(120))
-    dataset_doi = db.Column(db.String(120))
+    # Active history keeps the previous DOI at hand for the homepage counters, even if it was not loaded
+    dataset_doi = db.column_property(db.Column(db.String(120)), active_history=True)
     tags = db.Column(db.String(120))
     ds_metrics_id = db.Column(db.Integer, db.ForeignKey("ds_metrics.id"))
     ds_metrics = db.relationship("DSMetrics", uselist=False, backref="ds_meta_data", cascade="all, delete")
@@ -75,11 +90,19 @@ class DataSet(db.Model):
     ds_meta_data_id = db.Column(db.Integer, db.ForeignKey("ds_meta_data.id"), nullable=False)
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     download_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    # Aggregates of the dataset files, kept up to date as files are added and removed (see the Hubfile listeners)
+    files_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    total_size_in_bytes = db.Column(db.BigInteger, nullable=False, default=0, server_default="0")
+    # Bumped by every change shown on the dataset page (see the listeners below), so that cached renders keyed on it
+    # are never served stale
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
 
     # --- POLIMORFISMO ---
     dataset_type = db.Column(db.String(50))  # Esta columna decide si es UVL, Imagen, etc.
 
     __mapper_args__ = {"polymorphic_identity": "generic_dataset", "polymorphic_on": dataset_type}
+    # The lists of datasets of a user, newest first
+    __table_args__ = (db.Index("ix_data_set_user_id_created_at", "user_id", "created_at"),)
 
     ds_meta_data = db.relationship("DSMetaData", backref=db.backref("data_set", uselist=False))
 
@@ -106,10 +129,10 @@ class DataSet(db.Model):
         return []
 
     def get_files_count(self):
-        return 0
+        return self.files_count
 
     def get_file_total_size(self):
-        return 0
+        return self.total_size_in_bytes
 
     def get_file_total_size_for_human(self):
         from app.modules.dataset.services import SizeService
@@ -137,6 +160,9 @@ class DataSet(db.Model):
             "zenodo": self.get_zenodo_url(),
             "download_count": self.download_count,
             "dataset_type": self.dataset_type,
+            "files_count": self.get_files_count(),
+            "total_size_in_bytes": self.get_file_total_size(),
+            "total_size_in_human_format": self.get_file_total_size_for_human(),
         }
 
     def __repr__(self):
@@ -162,25 +188,12 @@ class UVLDataSet(DataSet):
     def files(self):
         return [file for fm in self.feature_models for file in fm.files]
 
-    def get_files_count(self):
-        return sum(len(fm.files) for fm in self.feature_models)
-
-    def get_file_total_size(self):
-        return sum(file.size for fm in self.feature_models for file in fm.files)
-
     def get_dashboard_template(self):
         return "dataset/types/uvl_details.html"
 
     def to_dict(self):
         data = super().to_dict()
-        data.update(
-            {
-                "files": [file.to_dict() for fm in self.feature_models for file in fm.files],
-                "files_count": self.get_files_count(),
-                "total_size_in_bytes": self.get_file_total_size(),
-                "total_size_in_human_format": self.get_file_total_size_for_human(),
-            }
-        )
+        data["files"] = [file.to_dict() for fm in self.feature_models for file in fm.files]
         return data
 
 
@@ -194,6 +207,9 @@ class RawDataSet(DataSet):
 
 
 class DSDownloadRecord(db.Model):
+    # One record per browser and dataset: duplicates are dropped by the database when the events are written
+    __table_args__ = (db.UniqueConstraint("download_cookie", "dataset_id", name="uq_ds_download_record_cookie"),)
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=True)
     dataset_id = db.Column(db.Integer, db.ForeignKey("data_set.id"))
@@ -202,6 +218,8 @@ class DSDownloadRecord(db.Model):
 
 
 class DSViewRecord(db.Model):
+    __table_args__ = (db.UniqueConstraint("view_cookie", "dataset_id", name="uq_ds_view_record_cookie"),)
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=True)
     dataset_id = db.Column(db.Integer, db.ForeignKey("data_set.id"))
@@ -210,6 +228,93 @@ class DSViewRecord(db.Model):
 
 
 class DOIMapping(db.Model):
+    __table_args__ = (db.UniqueConstraint("dataset_doi_old", name="uq_doi_mapping_dataset_doi_old"),)
+
     id = db.Column(db.Integer, primary_key=True)
     dataset_doi_old = db.Column(db.String(120))
     dataset_doi_new = db.Column(db.String(120))
+
+
+class ImportJobStatus(Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class DataSetImportJob(db.Model):
+    """
+    Bulk import sent to POST /dataset/import, run in the background by `flask dataset import-worker`. The manifest and
+    the ZIP archive wait in folder, below the uploads, until the job is run.
+    """
+
+    __tablename__ = "dataset_import_job"
+    __table_args__ = (db.Index("ix_dataset_import_job_status_created_at", "status", "created_at"),)
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"), nullable=False, index=True)
+    status = db.Column(SQLAlchemyEnum(ImportJobStatus), nullable=False, default=ImportJobStatus.QUEUED)
+    folder = db.Column(db.String(255), nullable=False)
+    manifest_name = db.Column(db.String(255), nullable=False)
+    # ImportReport.to_dict() of a finished import, as JSON
+    report = db.Column(db.Text)
+    locked_by = db.Column(db.String(64))
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    updated_at = db.Column(
+        db.DateTime,
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc),
+    )
+
+    user = db.relationship("User")
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "status": self.status.value,
+            "report": json.loads(self.report) if self.report else None,
+            "last_error": self.last_error,
+        }
+
+    def __repr__(self):
+        return f"DataSetImportJob<{self.id} {self.status.value}>"
+
+
+# Changes to what the dataset page shows bump the version of the dataset, in the same transaction as the change.
+# Download counts are left out: they change far more often and are read along with the version instead
+
+
+def bump_dataset_version(connection, *criteria):
+    connection.execute(update(DataSet.__table__).where(*criteria).values(version=DataSet.version + 1))
+
+
+@event.listens_for(DataSet, "before_update", propagate=True)
+def dataset_updated(mapper, connection, dataset):
+    state = inspect(dataset)
+    if any(
+        state.attrs[column.key].history.has_changes()
+        for column in mapper.column_attrs
+        if column.key not in ("download_count", "version")
+    ):
+        dataset.version = DataSet.version + 1
+
+
+@event.listens_for(DSMetaData, "after_update")
+def ds_meta_data_updated(mapper, connection, ds_meta_data):
+    bump_dataset_version(connection, DataSet.ds_meta_data_id == ds_meta_data.id)
+
+
+def _author_changed(mapper, connection, author):
+    if author.ds_meta_data_id is not None:
+        bump_dataset_version(connection, DataSet.ds_meta_data_id == author.ds_meta_data_id)
+
+
+for _event in ("after_insert", "after_update", "after_delete"):
+    event.listen(Author, _event, _author_changed)
+
+
+@event.listens_for(UserProfile, "after_update")
+def owner_profile_updated(mapper, connection, profile):
+    bump_dataset_version(connection, DataSet.user_id == profile.user_id)
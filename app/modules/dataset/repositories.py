@@ -1,15 +1,55 @@
 import logging
-from datetime import datetime, timezone
 from typing import Optional
 
-from flask_login import current_user
-from sqlalchemy import desc, func
+from sqlalchemy import desc, func, or_, select, update
+from sqlalchemy.orm import joinedload, selectin_polymorphic, selectinload
 
-from app.modules.dataset.models import Author, DataSet, DOIMapping, DSDownloadRecord, DSMetaData, DSViewRecord
+from app.modules.auth.models import User
+from app.modules.dataset.models import (
+    Author,
+    DataSet,
+    DataSetImportJob,
+    DOIMapping,
+    DSDownloadRecord,
+    DSMetaData,
+    DSViewRecord,
+    ImportJobStatus,
+    UVLDataSet,
+)
+from app.modules.featuremodel.models import FeatureModel, FMMetaData
+from app.modules.hubfile.models import Hubfile
 from core.repositories.BaseRepository import BaseRepository
 
 logger = logging.getLogger(__name__)
 
+# Named sets of loader options, one per way of rendering datasets. Each loads everything its pages touch in a fixed
+# number of queries, however many datasets, feature models and files there are:
+#   card     lists of datasets: metadata and authors
+#   detail   the dataset page: card plus metrics, owner profile, feature models with their metrics and their files
+#   archive  copying or exporting every file: feature models with their metadata, metrics, authors and files
+LOADING_PROFILES = {
+    "card": (joinedload(DataSet.ds_meta_data).selectinload(DSMetaData.authors),),
+    "detail": (
+        joinedload(DataSet.ds_meta_data).options(selectinload(DSMetaData.authors), joinedload(DSMetaData.ds_metrics)),
+        joinedload(DataSet.user).joinedload(User.profile),
+        selectin_polymorphic(DataSet, [UVLDataSet]),
+        selectinload(UVLDataSet.feature_models).options(
+            joinedload(FeatureModel.fm_meta_data).joinedload(FMMetaData.fm_metrics),
+            selectinload(FeatureModel.files),
+        ),
+    ),
+    "archive": (
+        joinedload(DataSet.ds_meta_data).selectinload(DSMetaData.authors),
+        selectin_polymorphic(DataSet, [UVLDataSet]),
+        selectinload(UVLDataSet.feature_models).options(
+            joinedload(FeatureModel.fm_meta_data).options(
+                selectinload(FMMetaData.authors), joinedload(FMMetaData.fm_metrics)
+            ),
+            selectinload(FeatureModel.files),
+        ),
+    ),
+}
+
 
 class AuthorRepository(BaseRepository):
     def __init__(self):
@@ -41,58 +81,142 @@ class DSViewRecordRepository(BaseRepository):
         max_id = self.model.query.with_entities(func.max(self.model.id)).scalar()
         return max_id if max_id is not None else 0
 
-    def the_record_exists(self, dataset: DataSet, user_cookie: str):
-        return self.model.query.filter_by(
-            user_id=current_user.id if current_user.is_authenticated else None,
-            dataset_id=dataset.id,
-            view_cookie=user_cookie,
-        ).first()
 
-    def create_new_record(self, dataset: DataSet, user_cookie: str) -> DSViewRecord:
-        return self.create(
-            user_id=current_user.id if current_user.is_authenticated else None,
-            dataset_id=dataset.id,
-            view_date=datetime.now(timezone.utc),
-            view_cookie=user_cookie,
+class DataSetRepository(BaseRepository):
+    def __init__(self, model=DataSet):
+        super().__init__(model)
+
+    def file_checksums(self, dataset_id: int):
+        return (
+            self.session.query(Hubfile.name, Hubfile.checksum)
+            .join(FeatureModel, Hubfile.feature_model_id == FeatureModel.id)
+            .filter(FeatureModel.data_set_id == dataset_id)
+            .order_by(Hubfile.name, Hubfile.checksum)
+            .all()
         )
 
+    def query(self, profile: Optional[str] = None):
+        """Query of datasets that loads what the given loading profile needs up front, or lazily without one."""
+        query = self.model.query
+        if profile is not None:
+            query = query.options(*LOADING_PROFILES[profile])
+        return query
 
-class DataSetRepository(BaseRepository):
-    def __init__(self):
-        super().__init__(DataSet)
+    def get_by_id(self, id: int, profile: Optional[str] = None) -> Optional[DataSet]:
+        if profile is None:
+            return super().get_by_id(id)
+        return self.query(profile).filter(DataSet.id == id).first()
+
+    def get_or_404(self, id: int, profile: Optional[str] = None) -> DataSet:
+        if profile is None:
+            return super().get_or_404(id)
+        return self.query(profile).filter(DataSet.id == id).first_or_404()
+
+    def get_by_ds_meta_data(self, ds_meta_data_id: int, profile: Optional[str] = None) -> Optional[DataSet]:
+        return self.query(profile).filter(DataSet.ds_meta_data_id == ds_meta_data_id).first()
+
+    def page_stamp(self, dataset_id: int):
+        """
+        What the dataset page needs before rendering anything: (id, user_id, version, download_count, dataset_doi),
+        or None if there is no such dataset.
+        """
+        return self.session.execute(
+            select(DataSet.id, DataSet.user_id, DataSet.version, DataSet.download_count, DSMetaData.dataset_doi)
+            .join(DSMetaData, DataSet.ds_meta_data_id == DSMetaData.id)
+            .where(DataSet.id == dataset_id)
+        ).first()
+
+    def id_by_doi(self, doi: str) -> Optional[int]:
+        return self.session.execute(
+            select(DataSet.id)
+            .join(DSMetaData, DataSet.ds_meta_data_id == DSMetaData.id)
+            .where(DSMetaData.dataset_doi == doi)
+        ).scalar()
 
-    def get_synchronized(self, current_user_id: int) -> DataSet:
+    def get_synchronized(self, current_user_id: int, profile: str = "card") -> DataSet:
         return (
-            self.model.query.join(DSMetaData)
+            self.query(profile)
+            .join(DSMetaData)
             .filter(DataSet.user_id == current_user_id, DSMetaData.dataset_doi.isnot(None))
             .order_by(self.model.created_at.desc())
             .all()
         )
 
-    def get_unsynchronized(self, current_user_id: int) -> DataSet:
+    def get_unsynchronized(self, current_user_id: int, profile: str = "card") -> DataSet:
         return (
-            self.model.query.join(DSMetaData)
+            self.query(profile)
+            .join(DSMetaData)
             .filter(DataSet.user_id == current_user_id, DSMetaData.dataset_doi.is_(None))
             .order_by(self.model.created_at.desc())
             .all()
         )
 
-    def get_unsynchronized_dataset(self, current_user_id: int, dataset_id: int) -> DataSet:
+    def get_unsynchronized_dataset(self, current_user_id: int, dataset_id: int, profile: str = "detail") -> DataSet:
         return (
-            self.model.query.join(DSMetaData)
+            self.query(profile)
+            .join(DSMetaData)
             .filter(DataSet.user_id == current_user_id, DataSet.id == dataset_id, DSMetaData.dataset_doi.is_(None))
             .first()
         )
 
+    def paginate_by_user(self, user_id: int, page: int, per_page: int, profile: str = "card"):
+        return (
+            self.query(profile)
+            .filter(DataSet.user_id == user_id)
+            .order_by(DataSet.created_at.desc())
+            .paginate(page=page, per_page=per_page, error_out=False)
+        )
+
+    def file_totals_drift(self):
+        """
+        Datasets whose stored files_count or total_size_in_bytes differ from their files, as (id, stored count,
+        stored size, actual count, actual size) rows. Computed by the database in one query.
+        """
+        actual = (
+            select(
+                FeatureModel.data_set_id.label("dataset_id"),
+                func.count(Hubfile.id).label("files_count"),
+                func.sum(Hubfile.size).label("total_size"),
+            )
+            .join(Hubfile, Hubfile.feature_model_id == FeatureModel.id)
+            .group_by(FeatureModel.data_set_id)
+            .subquery()
+        )
+        actual_count = func.coalesce(actual.c.files_count, 0)
+        actual_size = func.coalesce(actual.c.total_size, 0)
+        return self.session.execute(
+            select(DataSet.id, DataSet.files_count, DataSet.total_size_in_bytes, actual_count, actual_size)
+            .outerjoin(actual, actual.c.dataset_id == DataSet.id)
+            .where(or_(DataSet.files_count != actual_count, DataSet.total_size_in_bytes != actual_size))
+            .order_by(DataSet.id)
+        ).all()
+
+    def set_file_totals(self, totals):
+        """:param totals: (dataset id, files count, total size) triples."""
+        if totals:
+            self.session.execute(
+                update(DataSet),
+                [
+                    {"id": dataset_id, "files_count": files_count, "total_size_in_bytes": total_size}
+                    for dataset_id, files_count, total_size in totals
+                ],
+            )
+            self.session.execute(
+                update(DataSet)
+                .where(DataSet.id.in_([dataset_id for dataset_id, _, _ in totals]))
+                .values(version=DataSet.version + 1)
+            )
+
     def count_synchronized_datasets(self):
         return self.model.query.join(DSMetaData).filter(DSMetaData.dataset_doi.isnot(None)).count()
 
     def count_unsynchronized_datasets(self):
         return self.model.query.join(DSMetaData).filter(DSMetaData.dataset_doi.is_(None)).count()
 
-    def latest_synchronized(self):
+    def latest_synchronized(self, profile: str = "card"):
         return (
-            self.model.query.join(DSMetaData)
+            self.query(profile)
+            .join(DSMetaData)
             .filter(DSMetaData.dataset_doi.isnot(None))
             .order_by(desc(self.model.id))
             .limit(5)
@@ -106,3 +230,51 @@ class DOIMappingRepository(BaseRepository):
 
     def get_new_doi(self, old_doi: str) -> str:
         return self.model.query.filter_by(dataset_doi_old=old_doi).first()
+
+
+class DataSetImportJobRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(DataSetImportJob)
+
+    def fail_abandoned(self, stale_before) -> int:
+        """
+        Marks as failed the RUNNING jobs locked before stale_before, whose worker died. They are not run again: the
+        batches they committed would be imported twice.
+        """
+        failed = self.session.execute(
+            update(self.model)
+            .where(self.model.status == ImportJobStatus.RUNNING, self.model.locked_at < stale_before)
+            .values(
+                status=ImportJobStatus.FAILED,
+                last_error="The import was abandoned by its worker; the batches written before remain",
+            )
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        self.session.commit()
+        return failed
+
+    def claim_next(self, worker_id: str, now):
+        """
+        Locks the oldest queued job for worker_id, with a conditional UPDATE as ZenodoJobRepository.claim_next.
+
+        :return: The claimed job, or None if there is nothing to run.
+        """
+        while True:
+            job_id = self.session.scalar(
+                select(self.model.id)
+                .where(self.model.status == ImportJobStatus.QUEUED)
+                .order_by(self.model.created_at, self.model.id)
+                .limit(1)
+            )
+            if job_id is None:
+                return None
+
+            claimed = self.session.execute(
+                update(self.model)
+                .where(self.model.id == job_id, self.model.status == ImportJobStatus.QUEUED)
+                .values(status=ImportJobStatus.RUNNING, locked_by=worker_id, locked_at=now)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            self.session.commit()
+            if claimed:
+                return self.get_by_id(job_id)
@@ -1,30 +1,43 @@
-import json
 import logging
 import os
 import shutil
-import tempfile
 import uuid
 from datetime import datetime, timezone
-from zipfile import ZipFile
 
-from flask import abort, jsonify, make_response, redirect, render_template, request, send_from_directory, url_for
+import click
+from flask import (
+    Response,
+    abort,
+    current_app,
+    jsonify,
+    make_response,
+    redirect,
+    render_template,
+    request,
+    send_file,
+    url_for,
+)
 from flask_login import current_user, login_required
 
-from app import db
 from app.modules.dataset import dataset_bp
 from app.modules.dataset.forms import DataSetForm, RawDataSetForm
+from app.modules.dataset.ingestion import DataSetImportJobService, ManifestError
 from app.modules.dataset.models import DataSet, DSDownloadRecord
 from app.modules.dataset.services import (
     AuthorService,
+    DataSetArchiveService,
+    DataSetPageService,
     DataSetService,
-    DOIMappingService,
-    DSDownloadRecordService,
     DSMetaDataService,
     DSViewRecordService,
     RawDataSetService,
     UVLDataSetService,
 )
-from app.modules.zenodo.services import ZenodoService
+from app.modules.flamapy.validation import uvl_verdict
+from app.modules.public.tracking import record_tracker
+from app.modules.zenodo.services import ZenodoJobService
+from core.storage.hashing import remove_sidecar
+from core.storage.uploads import ChunkedUpload, OffsetMismatch, save_new_file
 
 logger = logging.getLogger(__name__)
 
@@ -32,9 +45,11 @@ logger = logging.getLogger(__name__)
 dataset_service = DataSetService()
 author_service = AuthorService()
 dsmetadata_service = DSMetaDataService()
-zenodo_service = ZenodoService()
-doi_mapping_service = DOIMappingService()
+zenodo_job_service = ZenodoJobService()
+page_service = DataSetPageService()
 ds_view_record_service = DSViewRecordService()
+archive_service = DataSetArchiveService()
+import_job_service = DataSetImportJobService()
 
 
 @dataset_bp.route("/dataset/upload", defaults={"dataset_type": "uvl"}, methods=["GET", "POST"])
@@ -82,42 +97,10 @@ def create_dataset(dataset_type):
             logger.exception(f"Exception while create dataset data in local {exc}")
             return jsonify({"Exception while create dataset data in local: ": str(exc)}), 400
 
-        # 3. SINCRONIZACIÓN ZENODO (Lógica Común)
-        # Nota: Esto asume que Zenodo acepta cualquier tipo de fichero que subamos.
-        # Si el dataset es 'raw' y no tiene ficheros aún, esto subirá solo metadatos.
-        data = {}
-        try:
-            zenodo_response_json = zenodo_service.create_new_deposition(dataset)
-            response_data = json.dumps(zenodo_response_json)
-            data = json.loads(response_data)
-        except Exception as exc:
-            data = {}
-            zenodo_response_json = {}
-            logger.exception(f"Exception while create dataset data in Zenodo {exc}")
-
-        if data.get("conceptrecid"):
-            deposition_id = data.get("id")
-
-            # update dataset with deposition id in Zenodo
-            dataset_service.update_dsmetadata(dataset.ds_meta_data_id, deposition_id=deposition_id)
-
-            try:
-                # Subida de ficheros a Zenodo
-                # Si es UVL, subimos los feature models.
-                # Si es Raw, en el futuro habrá que implementar su lógica de subida de ficheros.
-                if hasattr(dataset, "feature_models"):
-                    for feature_model in dataset.feature_models:
-                        zenodo_service.upload_file(dataset, deposition_id, feature_model)
-
-                # publish deposition
-                zenodo_service.publish_deposition(deposition_id)
-
-                # update DOI
-                deposition_doi = zenodo_service.get_doi(deposition_id)
-                dataset_service.update_dsmetadata(dataset.ds_meta_data_id, dataset_doi=deposition_doi)
-            except Exception as e:
-                msg = f"it has not been possible upload feature models in Zenodo and update the DOI: {e}"
-                return jsonify({"message": msg}), 200
+        # 3. PUBLICACIÓN EN ZENODO EN SEGUNDO PLANO
+        # La petición termina en cuanto el dataset está guardado; el worker (`flask zenodo worker`) crea la
+        # deposición, sube los ficheros, la publica y guarda el DOI. La página de subida consulta status_url.
+        job = zenodo_job_service.enqueue_publication(dataset)
 
         # Delete temp folder (Limpieza)
         file_path = current_user.temp_folder()
@@ -125,7 +108,17 @@ def create_dataset(dataset_type):
             shutil.rmtree(file_path)
 
         msg = "Everything works!"
-        return jsonify({"message": msg}), 200
+        return (
+            jsonify(
+                {
+                    "message": msg,
+                    "dataset_id": dataset.id,
+                    "publication": job.to_dict(),
+                    "status_url": url_for("zenodo.publication_status", dataset_id=dataset.id),
+                }
+            ),
+            200,
+        )
 
     return render_template(template, form=form)
 
@@ -147,35 +140,47 @@ def upload():
     """
     Esta ruta maneja la subida asíncrona (Dropzone) a la carpeta temporal.
     Actualmente está configurada para UVL.
+
+    Los ficheros llegan enteros o por trozos, con los parámetros de Dropzone: dzuuid (la sesión de subida),
+    dzchunkbyteoffset (dónde empieza el trozo) y dztotalfilesize. Un cliente que perdió la conexión consulta en
+    /dataset/file/upload/<dzuuid> por dónde sigue la subida.
     """
-    file = request.files["file"]
+    file = request.files.get("file")
     temp_folder = current_user.temp_folder()
 
     if not file or not file.filename.endswith(".uvl"):
         return jsonify({"message": "No valid file"}), 400
 
     # create temp folder
-    if not os.path.exists(temp_folder):
-        os.makedirs(temp_folder)
-
-    file_path = os.path.join(temp_folder, file.filename)
-
-    if os.path.exists(file_path):
-        # Generate unique filename (by recursion)
-        base_name, extension = os.path.splitext(file.filename)
-        i = 1
-        while os.path.exists(os.path.join(temp_folder, f"{base_name} ({i}){extension}")):
-            i += 1
-        new_filename = f"{base_name} ({i}){extension}"
-        file_path = os.path.join(temp_folder, new_filename)
-    else:
-        new_filename = file.filename
+    os.makedirs(temp_folder, exist_ok=True)
 
     try:
-        file.save(file_path)
+        if "dzuuid" in request.form:
+            # Cada trozo se añade al fichero parcial de la sesión, calculando el checksum por el camino
+            chunked_upload = ChunkedUpload(temp_folder, request.form["dzuuid"])
+            offset = chunked_upload.append(file.stream, int(request.form.get("dzchunkbyteoffset", 0)))
+            if offset < int(request.form["dztotalfilesize"]):
+                return jsonify({"message": "Chunk uploaded", "offset": offset}), 200
+            new_filename, digest = chunked_upload.complete(file.filename)
+        else:
+            # Se calcula el checksum mientras se escribe, y queda junto al fichero temporal
+            new_filename, digest = save_new_file(file.stream, temp_folder, file.filename)
+
+        # Cada fichero se valida una sola vez, al llegar; el veredicto queda guardado por checksum
+        file_path = os.path.join(temp_folder, new_filename)
+        verdict = uvl_verdict(file_path, digest.md5)
+    except OffsetMismatch as e:
+        return jsonify({"message": str(e), "offset": e.offset}), 409
+    except (KeyError, ValueError) as e:
+        return jsonify({"message": f"Invalid upload: {e}"}), 400
     except Exception as e:
         return jsonify({"message": str(e)}), 500
 
+    if not verdict.valid:
+        os.remove(file_path)
+        remove_sidecar(file_path)
+        return jsonify({"message": f"{file.filename} is not a valid UVL model", "errors": verdict.errors()}), 400
+
     return (
         jsonify(
             {
@@ -187,6 +192,62 @@ def upload():
     )
 
 
+@dataset_bp.route("/dataset/file/upload/<session_id>", methods=["GET"])
+@login_required
+def upload_offset(session_id):
+    try:
+        chunked_upload = ChunkedUpload(current_user.temp_folder(), session_id)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    return jsonify({"offset": chunked_upload.offset()})
+
+
+@dataset_bp.route("/dataset/import", methods=["POST"])
+@login_required
+def import_datasets():
+    """
+    Importación masiva: un manifiesto JSON o CSV (campo manifest) y un ZIP con sus ficheros UVL (campo files). Los
+    datasets quedan a nombre del usuario. La importación se encola y la hace el worker (`flask dataset import-worker`);
+    en la URL de la respuesta se consulta su estado y, al terminar, lo importado, lo descartado y el rendimiento.
+    """
+    manifest = request.files.get("manifest")
+    archive = request.files.get("files")
+    if not manifest or not archive:
+        return jsonify({"message": "A manifest and a ZIP archive of UVL files are required"}), 400
+
+    try:
+        job = import_job_service.enqueue(manifest, archive, current_user)
+    except ManifestError as e:
+        return jsonify({"message": str(e)}), 400
+    except Exception as e:
+        logger.exception(f"Exception enqueuing import: {e}")
+        return jsonify({"message": str(e)}), 500
+
+    status_url = url_for("dataset.import_status", job_id=job.id)
+    response = jsonify({**job.to_dict(), "status_url": status_url})
+    response.status_code = 202
+    response.headers["Location"] = status_url
+    return response
+
+
+@dataset_bp.route("/dataset/import/<int:job_id>", methods=["GET"])
+@login_required
+def import_status(job_id):
+    status = import_job_service.status(job_id, current_user)
+    if status is None:
+        abort(404)
+    return jsonify(status)
+
+
+@dataset_bp.cli.command("import-worker", help="Runs the queued bulk imports of datasets.")
+@click.option("--poll-interval", default=5.0, show_default=True, help="Seconds to wait when the queue is empty.")
+@click.option("--once", is_flag=True, help="Exit when the queue is empty instead of waiting for new jobs.")
+def import_worker(poll_interval, once):
+    click.echo(click.style("Dataset import worker started", fg="yellow"))
+    processed = import_job_service.work(poll_interval=poll_interval, once=once)
+    click.echo(click.style(f"Dataset import worker finished after {processed} jobs", fg="green"))
+
+
 @dataset_bp.route("/dataset/file/delete", methods=["POST"])
 def delete():
     data = request.get_json()
@@ -196,6 +257,7 @@ def delete():
 
     if os.path.exists(filepath):
         os.remove(filepath)
+        remove_sidecar(filepath)
         return jsonify({"message": "File deleted successfully"})
 
     return jsonify({"error": "Error: File not found"})
@@ -206,60 +268,50 @@ def download_dataset(dataset_id):
     # Usamos get_or_404 genérico. SQLalchemy nos devolverá la instancia hija correcta (UVLDataSet o RawDataSet)
     dataset = dataset_service.get_or_404(dataset_id)
 
-    # Lógica de contador (Común)
-    dataset.download_count = DataSet.download_count + 1
-    db.session.commit()
-
-    file_path = f"uploads/user_{dataset.user_id}/dataset_{dataset.id}/"
-
-    temp_dir = tempfile.mkdtemp()
-    zip_path = os.path.join(temp_dir, f"dataset_{dataset_id}.zip")
-
-    # Generación de ZIP
-    # Nota: Si es un RawDataSet y no tiene ficheros aún, esto generará un zip vacío o fallará si la carpeta no existe.
-    # Se recomienda asegurar que la carpeta exista.
-    if not os.path.exists(file_path):
-        os.makedirs(file_path, exist_ok=True)
-
-    with ZipFile(zip_path, "w") as zipf:
-        for subdir, dirs, files in os.walk(file_path):
-            for file in files:
-                full_path = os.path.join(subdir, file)
-                relative_path = os.path.relpath(full_path, file_path)
-                zipf.write(
-                    full_path,
-                    arcname=os.path.join(os.path.basename(zip_path[:-4]), relative_path),
-                )
+    archive_name = f"dataset_{dataset_id}.zip"
+    headers = {"Content-Disposition": f"attachment; filename={archive_name}"}
+
+    # Los datasets publicados (con DOI) no cambian: su ZIP se sirve desde la caché en disco.
+    # El resto se genera al vuelo mientras se envía, sin ficheros temporales.
+    cache_key = archive_service.cache_key(dataset)
+    cached_archive = archive_service.cache.get(cache_key) if cache_key else None
+    accel_redirect = current_app.config.get("ARCHIVE_CACHE_ACCEL_REDIRECT")
+
+    if cached_archive and accel_redirect:
+        # nginx envía el fichero con sendfile
+        headers["X-Accel-Redirect"] = f"{accel_redirect.rstrip('/')}/{cache_key}"
+        resp = Response(mimetype="application/zip", headers=headers)
+    elif cached_archive:
+        resp = send_file(
+            cached_archive, mimetype="application/zip", as_attachment=True, download_name=archive_name, etag=cache_key
+        )
+    else:
+        zip_stream = archive_service.zip_stream(dataset)
+        # Un fichero que falta se detecta antes de empezar a enviar (y de cachear) un ZIP incompleto
+        missing = zip_stream.missing_files()
+        if missing:
+            logger.error(f"Download of dataset {dataset_id} refused, files missing from storage: {missing}")
+            return jsonify({"message": f"{len(missing)} files of the dataset are missing from storage"}), 500
+        if cache_key:
+            zip_stream = archive_service.cache.put_stream(cache_key, zip_stream)
+        resp = Response(zip_stream, mimetype="application/zip", headers=headers)
+
+    if cache_key:
+        resp.set_etag(cache_key)
+        resp.make_conditional(request)
 
     user_cookie = request.cookies.get("download_cookie")
     if not user_cookie:
         user_cookie = str(uuid.uuid4())
-        resp = make_response(
-            send_from_directory(
-                temp_dir,
-                f"dataset_{dataset_id}.zip",
-                as_attachment=True,
-                mimetype="application/zip",
-            )
-        )
         resp.set_cookie("download_cookie", user_cookie)
-    else:
-        resp = send_from_directory(
-            temp_dir,
-            f"dataset_{dataset_id}.zip",
-            as_attachment=True,
-            mimetype="application/zip",
-        )
-
-    # Registro de descarga (Común)
-    existing_record = DSDownloadRecord.query.filter_by(
-        user_id=current_user.id if current_user.is_authenticated else None,
-        dataset_id=dataset_id,
-        download_cookie=user_cookie,
-    ).first()
 
-    if not existing_record:
-        DSDownloadRecordService().create(
+    # Solo cuenta como descarga si se envía el ZIP: un 304 Not Modified no lo hace.
+    # El contador y el registro se guardan en bloque más tarde, sin escribir en la petición; la base de datos
+    # descarta los registros repetidos, pero el contador suma todas las descargas
+    if resp.status_code in (200, 206):
+        record_tracker.increment(DataSet.download_count, dataset_id)
+        record_tracker.track(
+            DSDownloadRecord,
             user_id=current_user.id if current_user.is_authenticated else None,
             dataset_id=dataset_id,
             download_date=datetime.now(timezone.utc),
@@ -271,24 +323,32 @@ def download_dataset(dataset_id):
 
 @dataset_bp.route("/doi/<path:doi>/", methods=["GET"])
 def subdomain_index(doi):
-    new_doi = doi_mapping_service.get_new_doi(doi)
+    new_doi, stamp = page_service.resolve_doi(doi)
     if new_doi:
         return redirect(url_for("dataset.subdomain_index", doi=new_doi), code=302)
 
-    ds_meta_data = dsmetadata_service.filter_by_doi(doi)
-
-    if not ds_meta_data:
+    if not stamp:
         abort(404)
 
-    dataset = ds_meta_data.data_set
-
-    user_cookie = ds_view_record_service.create_cookie(dataset=dataset)
-    resp = make_response(render_template("dataset/view_dataset.html", dataset=dataset))
+    # La visita se registra siempre, aunque la página salga de la caché
+    user_cookie = ds_view_record_service.create_cookie(dataset_id=stamp.id)
+    resp = make_response(render_template("dataset/view_dataset.html", content=_dataset_page_content(stamp)))
     resp.set_cookie("view_cookie", user_cookie)
 
     return resp
 
 
+def _dataset_page_content(stamp):
+    return page_service.content(
+        stamp,
+        lambda download_count: render_template(
+            "dataset/view_dataset_content.html",
+            dataset=dataset_service.get_or_404(stamp.id, profile="detail"),
+            download_count=download_count,
+        ),
+    )
+
+
 @dataset_bp.route("/dataset/unsynchronized/<int:dataset_id>/", methods=["GET"])
 @login_required
 def get_unsynchronized_dataset(dataset_id):
@@ -300,7 +360,9 @@ def get_unsynchronized_dataset(dataset_id):
 
 @dataset_bp.route("/dataset/view/<int:dataset_id>", methods=["GET"])
 def view_dataset(dataset_id):
-    dataset = dataset_service.get_or_404(dataset_id)
-    if current_user.is_authenticated and dataset.user_id != current_user.id:
+    stamp = page_service.stamp(dataset_id)
+    if not stamp:
+        abort(404)
+    if current_user.is_authenticated and stamp.user_id != current_user.id:
         abort(403)
-    return render_template("dataset/view_dataset.html", dataset=dataset)
+    return render_template("dataset/view_dataset.html", content=_dataset_page_content(stamp))
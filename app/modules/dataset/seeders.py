@@ -1,14 +1,37 @@
 import os
+import random
 import shutil
+import uuid
 from datetime import datetime, timezone
+from types import SimpleNamespace
 
 from dotenv import load_dotenv
+from faker import Faker
+from sqlalchemy import delete, select
 
 from app.modules.auth.models import User
-from app.modules.dataset.models import Author, DataSet, DSMetaData, DSMetrics, PublicationType
-from app.modules.featuremodel.models import FeatureModel, FMMetaData
-from app.modules.hubfile.models import Hubfile
+from app.modules.dataset.models import Author, DataSet, DSMetaData, DSMetrics, PublicationType, UVLDataSet
+from app.modules.explore.models import SearchTerm
+from app.modules.explore.repositories import collect_terms
+from app.modules.explore.services import SearchIndexService, metadata_texts
+from app.modules.featuremodel.models import FeatureModel, FMMetaData, FMMetrics
+from app.modules.featuremodel.services import FMMetricsService
+from app.modules.hubfile.models import Blob, Hubfile
+from app.modules.public.services import StatisticsService
 from core.seeders.BaseSeeder import BaseSeeder
+from core.storage.hashing import StreamingDigest
+from core.storage.resolver import blob_path
+
+# Synthetic datasets generated and written at a time, which bounds the memory used at any scale
+SYNTHETIC_CHUNK_SIZE = 2000
+
+# Share of the synthetic datasets that are synchronized with Zenodo (they have a DOI)
+SYNCHRONIZED_SHARE = 0.7
+
+MAX_MODELS_PER_DATASET = 50
+
+# Distinct synthetic authors: as in the real catalogue, the same people sign many datasets and models
+AUTHOR_POOL_SIZE = 5000
 
 
 class DataSetSeeder(BaseSeeder):
@@ -22,9 +45,14 @@ class DataSetSeeder(BaseSeeder):
         if not user1 or not user2:
             raise Exception("Users not found. Please seed users first.")
 
-        # Create DSMetrics instance
-        ds_metrics = DSMetrics(number_of_models="5", number_of_features="50")
-        seeded_ds_metrics = self.seed([ds_metrics])[0]
+        load_dotenv()
+        working_dir = os.getenv("WORKING_DIR", "")
+        src_folder = os.path.join(working_dir, "app", "modules", "dataset", "uvl_examples")
+
+        # Analyse the 12 UVL examples, as an upload does, and total them per dataset (3 models each)
+        fm_metrics = FMMetricsService().analyze([os.path.join(src_folder, f"file{i + 1}.uvl") for i in range(12)])
+        seeded_fm_metrics = self.seed(fm_metrics)
+        seeded_ds_metrics = self.seed([DSMetrics.from_fm_metrics(fm_metrics[i * 3 : i * 3 + 3]) for i in range(4)])
 
         # Create DSMetaData instances
         ds_meta_data_list = [
@@ -36,7 +64,7 @@ class DataSetSeeder(BaseSeeder):
                 publication_doi=f"10.1234/dataset{i + 1}",
                 dataset_doi=f"10.1234/dataset{i + 1}",
                 tags="tag1, tag2",
-                ds_metrics_id=seeded_ds_metrics.id,
+                ds_metrics_id=seeded_ds_metrics[i].id,
             )
             for i in range(4)
         ]
@@ -75,6 +103,7 @@ class DataSetSeeder(BaseSeeder):
                 publication_doi=f"10.1234/fm{i + 1}",
                 tags="tag1, tag2",
                 uvl_version="1.0",
+                fm_metrics_id=seeded_fm_metrics[i].id,
             )
             for i in range(12)
         ]
@@ -102,9 +131,7 @@ class DataSetSeeder(BaseSeeder):
         seeded_feature_models = self.seed(feature_models)
 
         # Create files, associate them with FeatureModels and copy files
-        load_dotenv()
-        working_dir = os.getenv("WORKING_DIR", "")
-        src_folder = os.path.join(working_dir, "app", "modules", "dataset", "uvl_examples")
+        uvl_files = []
         for i in range(12):
             file_name = f"file{i + 1}.uvl"
             feature_model = seeded_feature_models[i]
@@ -117,10 +144,222 @@ class DataSetSeeder(BaseSeeder):
 
             file_path = os.path.join(dest_folder, file_name)
 
-            uvl_file = Hubfile(
-                name=file_name,
-                checksum=f"checksum{i + 1}",
-                size=os.path.getsize(file_path),
-                feature_model_id=feature_model.id,
+            uvl_files.append(
+                Hubfile(
+                    name=file_name,
+                    checksum=f"checksum{i + 1}",
+                    size=os.path.getsize(file_path),
+                    feature_model_id=feature_model.id,
+                )
             )
-            self.seed([uvl_file])
+        self.seed(uvl_files)
+
+        # Make the seeded datasets searchable from explore
+        SearchIndexService().reindex_all()
+
+        if self.scale:
+            templates = [os.path.join(src_folder, f"file{i + 1}.uvl") for i in range(12)]
+            self.seed_synthetic_datasets(self.scale, templates, fm_metrics)
+
+    def seed_synthetic_datasets(self, count, templates, template_metrics):
+        """
+        Generates count UVL datasets for load testing, written with bulk inserts. Datasets are spread over every user
+        with a Zipf-like skew and have a log-normal number of feature models (3 or 4 on average, up to
+        MAX_MODELS_PER_DATASET). Every feature model is a distinct copy of one of the UVL templates, materialised in
+        the blob store, and gets the metrics of its template.
+        """
+        rng = random.Random(count)
+        faker = Faker()
+        faker.seed_instance(count)
+        # DOIs and file contents stay unique when seeding again without a reset
+        run = uuid.uuid4().hex[:8]
+        contents = []
+        for template in templates:
+            with open(template, "rb") as file:
+                contents.append(file.read())
+        metrics = [fm_metrics.to_dict() for fm_metrics in template_metrics]
+
+        authors = [self._synthetic_author(faker) for _ in range(min(AUTHOR_POOL_SIZE, count * 2))]
+        user_ids = self.db.session.execute(select(User.id)).scalars().all()
+        rng.shuffle(user_ids)
+        owner_weights = [1 / rank for rank in range(1, len(user_ids) + 1)]
+
+        for start in range(0, count, SYNTHETIC_CHUNK_SIZE):
+            datasets = [
+                self._synthetic_dataset(rng, faker, run, index, contents, metrics, authors, user_ids, owner_weights)
+                for index in range(start, min(count, start + SYNTHETIC_CHUNK_SIZE))
+            ]
+            self._bulk_seed_datasets(datasets)
+
+        # Bulk inserts do not run the listeners that keep the homepage counters
+        StatisticsService().recount()
+
+    def _synthetic_dataset(self, rng, faker, run, index, contents, metrics, authors, user_ids, owner_weights):
+        publication_type = rng.choice(list(PublicationType))
+        dataset = SimpleNamespace(
+            meta=dict(
+                title=faker.catch_phrase()[:120],
+                description=faker.paragraph(nb_sentences=rng.randint(2, 6)),
+                publication_type=publication_type,
+                publication_doi=(
+                    f"10.{rng.randint(1000, 9999)}/{faker.bothify('????.####')}" if rng.random() < 0.5 else None
+                ),
+                dataset_doi=f"10.1234/seed.{run}.{index}" if rng.random() < SYNCHRONIZED_SHARE else None,
+                deposition_id=rng.randint(1, 10**7),
+                tags=",".join(faker.words(rng.randint(1, 4), unique=True)),
+            ),
+            authors=rng.sample(authors, min(len(authors), rng.randint(1, 4))),
+            row=dict(
+                user_id=rng.choices(user_ids, owner_weights)[0],
+                created_at=faker.date_time_between("-3y", "now"),
+                # Most datasets are downloaded a few times and a few of them very often
+                download_count=min(int(rng.paretovariate(1.2)) - 1, 10**5),
+            ),
+            models=[],
+        )
+
+        for position in range(max(1, min(MAX_MODELS_PER_DATASET, round(rng.lognormvariate(1.0, 0.8))))):
+            template = rng.randrange(len(contents))
+            # A UVL comment makes every file a distinct blob, as real uploads are
+            content = f"// {run}.{index}.{position}\n".encode() + contents[template]
+            digest = StreamingDigest()
+            digest.update(content)
+            dataset.models.append(
+                SimpleNamespace(
+                    meta=dict(
+                        uvl_filename=f"{faker.word()}_{position + 1}.uvl",
+                        title=faker.catch_phrase()[:120],
+                        description=faker.sentence(),
+                        publication_type=publication_type,
+                        publication_doi=None,
+                        tags=",".join(faker.words(rng.randint(0, 3), unique=True)) or None,
+                        uvl_version="1.0",
+                    ),
+                    authors=rng.sample(authors, min(len(authors), rng.randint(0, 2))),
+                    metrics=metrics[template],
+                    content=content,
+                    digest=digest.digest(),
+                )
+            )
+        return dataset
+
+    def _dataset_totals(self, dataset):
+        totals = DSMetrics.from_fm_metrics([SimpleNamespace(**model.metrics) for model in dataset.models])
+        return {"number_of_models": totals.number_of_models, "number_of_features": totals.number_of_features}
+
+    def _synthetic_author(self, faker):
+        return dict(
+            name=f"{faker.last_name()}, {faker.first_name()}",
+            affiliation=faker.company()[:120],
+            orcid=faker.numerify("0000-000#-####-####") if faker.boolean(40) else None,
+        )
+
+    def _bulk_seed_datasets(self, datasets):
+        models = [model for dataset in datasets for model in dataset.models]
+
+        ds_metrics_ids = self.bulk_seed(
+            DSMetrics,
+            (self._dataset_totals(dataset) for dataset in datasets),
+            return_ids=True,
+        )
+        ds_meta_data_ids = self.bulk_seed(
+            DSMetaData,
+            (
+                {**dataset.meta, "ds_metrics_id": ds_metrics_id}
+                for dataset, ds_metrics_id in zip(datasets, ds_metrics_ids)
+            ),
+            return_ids=True,
+        )
+        self.bulk_seed(
+            Author,
+            (
+                {**author, "ds_meta_data_id": ds_meta_data_id}
+                for dataset, ds_meta_data_id in zip(datasets, ds_meta_data_ids)
+                for author in dataset.authors
+            ),
+        )
+        # The file totals are those the Hubfile listeners would have kept
+        dataset_ids = self.bulk_seed(
+            UVLDataSet,
+            (
+                {
+                    **dataset.row,
+                    "ds_meta_data_id": ds_meta_data_id,
+                    "files_count": len(dataset.models),
+                    "total_size_in_bytes": sum(model.digest.size for model in dataset.models),
+                }
+                for dataset, ds_meta_data_id in zip(datasets, ds_meta_data_ids)
+            ),
+            return_ids=True,
+        )
+
+        fm_metrics_ids = self.bulk_seed(FMMetrics, (model.metrics for model in models), return_ids=True)
+        fm_meta_data_ids = self.bulk_seed(
+            FMMetaData,
+            ({**model.meta, "fm_metrics_id": fm_metrics_id} for model, fm_metrics_id in zip(models, fm_metrics_ids)),
+            return_ids=True,
+        )
+        self.bulk_seed(
+            Author,
+            (
+                {**author, "fm_meta_data_id": fm_meta_data_id}
+                for model, fm_meta_data_id in zip(models, fm_meta_data_ids)
+                for author in model.authors
+            ),
+        )
+        feature_model_ids = self.bulk_seed(
+            FeatureModel,
+            (
+                {"data_set_id": dataset_id, "fm_meta_data_id": fm_meta_data_id}
+                for dataset_id, fm_meta_data_id in zip(
+                    (dataset_id for dataset, dataset_id in zip(datasets, dataset_ids) for _ in dataset.models),
+                    fm_meta_data_ids,
+                )
+            ),
+            return_ids=True,
+        )
+
+        for model in models:
+            path = blob_path(model.digest.md5)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as file:
+                file.write(model.content)
+        blob_ids = self.bulk_seed(
+            Blob,
+            (
+                {"checksum": model.digest.md5, "crc32": model.digest.crc32, "size": model.digest.size, "ref_count": 1}
+                for model in models
+            ),
+            return_ids=True,
+        )
+        self.bulk_seed(
+            Hubfile,
+            (
+                {
+                    "name": model.meta["uvl_filename"],
+                    "checksum": model.digest.md5,
+                    "size": model.digest.size,
+                    "feature_model_id": feature_model_id,
+                    "blob_id": blob_id,
+                }
+                for model, feature_model_id, blob_id in zip(models, feature_model_ids, blob_ids)
+            ),
+        )
+
+        # Postings as SearchIndexService would build them, without loading the datasets back. As replace_terms does,
+        # stale postings of deleted datasets whose ids are reused (SQLite reuses them) are dropped first
+        self.db.session.execute(delete(SearchTerm).where(SearchTerm.dataset_id.in_(dataset_ids)))
+        self.bulk_seed(
+            SearchTerm,
+            (
+                {"term": term, "dataset_id": dataset_id, "weight": weight}
+                for dataset, dataset_id in zip(datasets, dataset_ids)
+                for term, weight in collect_terms(
+                    metadata_texts(
+                        SimpleNamespace(**dataset.meta),
+                        [SimpleNamespace(**author) for author in dataset.authors],
+                        [SimpleNamespace(**model.meta) for model in dataset.models],
+                    )
+                ).items()
+            ),
+        )
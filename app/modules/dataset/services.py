@@ -1,14 +1,25 @@
 import hashlib
 import logging
 import os
-import shutil
 import uuid
+from datetime import datetime, timezone
 from typing import Optional
 
-from flask import request
+from cachelib import BaseCache
+from flask import current_app, request
+from flask_login import current_user
+from markupsafe import Markup
 
 from app.modules.auth.services import AuthenticationService
-from app.modules.dataset.models import DataSet, DSMetaData, DSViewRecord, PublicationType, RawDataSet, UVLDataSet
+from app.modules.dataset.models import (
+    DataSet,
+    DSMetaData,
+    DSMetrics,
+    DSViewRecord,
+    PublicationType,
+    RawDataSet,
+    UVLDataSet,
+)
 from app.modules.dataset.repositories import (
     AuthorRepository,
     DataSetRepository,
@@ -17,20 +28,30 @@ from app.modules.dataset.repositories import (
     DSMetaDataRepository,
     DSViewRecordRepository,
 )
+from app.modules.explore.services import INDEXED_DSMETADATA_FIELDS, SearchIndexService
+from app.modules.featuremodel.analysis import analysis_queue
+from app.modules.featuremodel.models import FMMetrics
 from app.modules.featuremodel.repositories import FeatureModelRepository, FMMetaDataRepository
+from app.modules.featuremodel.services import FMMetricsService
+from app.modules.flamapy.validation import uvl_verdict
+from app.modules.hubfile.models import Blob
 from app.modules.hubfile.repositories import HubfileRepository
-from core.repositories.BaseRepository import BaseRepository
+from app.modules.hubfile.services import BlobService, HubfileService
+from app.modules.public.tracking import record_tracker
+from core.archives.zip_stream import ZipStream
+from core.cache.disk_lru import DiskLRUCache
+from core.cache.page_cache import page_cache
 from core.services.BaseService import BaseService
+from core.storage.hashing import file_digest, remove_sidecar
+from core.storage.resolver import dataset_file_path
 
 logger = logging.getLogger(__name__)
 
 
 def calculate_checksum_and_size(file_path):
-    file_size = os.path.getsize(file_path)
-    with open(file_path, "rb") as file:
-        content = file.read()
-        hash_md5 = hashlib.md5(content).hexdigest()
-        return hash_md5, file_size
+    # Uploads leave their digest next to the temp file; otherwise the file is hashed in chunks
+    digest = file_digest(file_path)
+    return digest.md5, digest.size
 
 
 # === SERVICIO BASE ===
@@ -41,6 +62,35 @@ class DataSetService(BaseService):
         self.dsviewrecord_repostory = DSViewRecordRepository()
         self.author_repository = AuthorRepository()
         self.dsmetadata_repository = DSMetaDataRepository()
+        self.search_index_service = SearchIndexService()
+        self.blob_service = BlobService()
+        self.fm_metrics_service = FMMetricsService()
+
+    def get_or_404(self, id: int, profile: Optional[str] = None) -> DataSet:
+        """
+        :param profile: Loading profile of DataSetRepository ("card", "detail" or "archive") matching what the
+            caller is about to read, so that it is loaded up front instead of one lazy query at a time.
+        """
+        return self.repository.get_or_404(id, profile)
+
+    def get_by_ds_meta_data(self, ds_meta_data: DSMetaData, profile: Optional[str] = None) -> Optional[DataSet]:
+        return self.repository.get_by_ds_meta_data(ds_meta_data.id, profile)
+
+    def sync_file_totals(self, fix: bool = True):
+        """
+        Finds datasets whose files_count or total_size_in_bytes drifted from their files and, unless fix is False,
+        corrects them.
+
+        :return: The drifted datasets as (id, stored count, stored size, actual count, actual size) rows.
+        """
+        drifted = self.repository.file_totals_drift()
+        if fix and drifted:
+            self.repository.set_file_totals([(row[0], row[3], row[4]) for row in drifted])
+            self.repository.session.commit()
+        return drifted
+
+    def paginate_by_user(self, user_id: int, page: int, per_page: int):
+        return self.repository.paginate_by_user(user_id, page, per_page)
 
     def get_synchronized(self, current_user_id: int) -> DataSet:
         return self.repository.get_synchronized(current_user_id)
@@ -70,7 +120,10 @@ class DataSetService(BaseService):
         return self.dsviewrecord_repostory.total_dataset_views()
 
     def update_dsmetadata(self, id, **kwargs):
-        return self.dsmetadata_repository.update(id, **kwargs)
+        dsmetadata = self.dsmetadata_repository.update(id, **kwargs)
+        if dsmetadata and dsmetadata.data_set and INDEXED_DSMETADATA_FIELDS & kwargs.keys():
+            self.search_index_service.index_dataset(dsmetadata.data_set, commit=True)
+        return dsmetadata
 
     def get_uvlhub_doi(self, dataset: DataSet) -> str:
         domain = os.getenv("DOMAIN", "localhost")
@@ -124,28 +177,11 @@ class DataSetService(BaseService):
             # Crear el dataset
             dataset = self.create(commit=False, user_id=current_user.id, ds_meta_data_id=dsmetadata.id)
 
-            # Crear directorio para el nuevo dataset
-            working_dir = os.getenv("WORKING_DIR", "")
-            new_dataset_dir = os.path.join(
-                working_dir,
-                "uploads",
-                f"user_{current_user.id}",
-                f"dataset_{dataset.id}",
-            )
-            os.makedirs(new_dataset_dir, exist_ok=True)
-
             # Copiar feature models de los datasets seleccionados
             feature_models_copied = 0
+            fm_metrics = []
             for source_dataset_id in source_dataset_ids:
-                source_dataset = self.get_or_404(source_dataset_id)
-
-                # Obtener directorio del dataset fuente
-                source_dataset_dir = os.path.join(
-                    working_dir,
-                    "uploads",
-                    f"user_{source_dataset.user_id}",
-                    f"dataset_{source_dataset.id}",
-                )
+                source_dataset = self.get_or_404(source_dataset_id, profile="archive")
 
                 for feature_model in source_dataset.feature_models:
                     # Crear nueva metadata para el feature model
@@ -159,7 +195,11 @@ class DataSetService(BaseService):
                         "uvl_version": feature_model.fm_meta_data.uvl_version or "1.0",
                     }
 
-                    fmmetadata = self.fmmetadata_repository.create(commit=False, **fmmetadata_data)
+                    # Las métricas se copian de las ya calculadas, sin volver a analizar el modelo
+                    source_metrics = feature_model.fm_meta_data.fm_metrics
+                    metrics = FMMetrics(**source_metrics.to_dict()) if source_metrics else FMMetrics()
+                    fm_metrics.append(metrics)
+                    fmmetadata = self.fmmetadata_repository.create(commit=False, fm_metrics=metrics, **fmmetadata_data)
 
                     # Copiar autores del feature model original
                     for original_author in feature_model.fm_meta_data.authors:
@@ -176,42 +216,35 @@ class DataSetService(BaseService):
                         fm_meta_data_id=fmmetadata.id,
                     )
 
-                    # COPIAR LOS ARCHIVOS uvl
-                    files_copied = 0
+                    # Los ficheros no se copian: el nuevo Hubfile apunta al mismo blob que el original
                     for file in feature_model.files:
-                        # Ruta del archivo original
-                        source_file_path = os.path.join(source_dataset_dir, file.name)
-
-                        # Ruta del archivo destino
-                        dest_file_path = os.path.join(new_dataset_dir, file.name)
-
-                        # Verificar que el archivo fuente existe
-                        if os.path.exists(source_file_path):
-                            # Copiar el archivo
-                            shutil.copy2(source_file_path, dest_file_path)
-
-                            # Recalcular checksum y tamaño del archivo copiado
-                            new_checksum, new_size = calculate_checksum_and_size(dest_file_path)
-
-                            # Crear registro del archivo con los nuevos datos
-                            new_file = self.hubfilerepository.create(
-                                commit=False,
-                                name=file.name,
-                                checksum=new_checksum,
-                                size=new_size,
-                                feature_model_id=fm.id,
-                            )
-                            fm.files.append(new_file)
-                            files_copied += 1
-                        else:
-                            logger.error(f"Source file not found: {source_file_path}")
+                        blob = file.blob or self._blob_for_legacy_file(source_dataset, file)
+                        if blob is None:
+                            continue
+                        if file.blob is not None:
+                            self.blob_service.add_reference(blob)
+
+                        new_file = self.hubfilerepository.create(
+                            commit=False,
+                            name=file.name,
+                            checksum=blob.checksum,
+                            size=blob.size,
+                            feature_model_id=fm.id,
+                            blob_id=blob.id,
+                        )
+                        fm.files.append(new_file)
 
                     feature_models_copied += 1
 
             logger.info(f"Total feature models copied: {feature_models_copied}")
+            self.fm_metrics_service.set_dataset_metrics(dsmetadata, fm_metrics)
+
+            # Indexar para la búsqueda de explore en la misma transacción
+            self.search_index_service.index_dataset(dataset)
 
             # Hacer commit final
             self.repository.session.commit()
+            DataSetArchiveService().invalidate(dataset.id)
             return dataset
 
         except Exception as exc:
@@ -219,27 +252,41 @@ class DataSetService(BaseService):
             self.repository.session.rollback()
             raise exc
 
+    def _blob_for_legacy_file(self, dataset: DataSet, file) -> Optional[Blob]:
+        """Blob with the content of a file not migrated to the blob store yet, referenced once for the new copy."""
+        source_file_path = dataset_file_path(dataset.user_id, dataset.id, file.name)
+        if not os.path.exists(source_file_path):
+            logger.error(f"Source file not found: {source_file_path}")
+            return None
+        digest = file_digest(source_file_path)
+        blob = self.blob_service.acquire(digest)
+        self.blob_service.store(source_file_path, digest.md5)
+        return blob
+
 
 # === SERVICIO ESPECÍFICO UVL ===
 class UVLDataSetService(DataSetService):
     def __init__(self):
         super().__init__()
         # Inyectamos el repositorio para UVLDataSet
-        self.repository = BaseRepository(UVLDataSet)
+        self.repository = DataSetRepository(UVLDataSet)
         self.feature_model_repository = FeatureModelRepository()
         self.fmmetadata_repository = FMMetaDataRepository()
         self.hubfilerepository = HubfileRepository()
 
     def move_feature_models(self, dataset: UVLDataSet):
+        # El contenido ya está en el almacén de blobs desde create_from_form, solo quedan los temporales
         current_user = AuthenticationService().get_authenticated_user()
         source_dir = current_user.temp_folder()
-        working_dir = os.getenv("WORKING_DIR", "")
-        dest_dir = os.path.join(working_dir, "uploads", f"user_{current_user.id}", f"dataset_{dataset.id}")
-        os.makedirs(dest_dir, exist_ok=True)
 
         for feature_model in dataset.feature_models:
-            uvl_filename = feature_model.fm_meta_data.uvl_filename
-            shutil.move(os.path.join(source_dir, uvl_filename), dest_dir)
+            temp_path = os.path.join(source_dir, feature_model.fm_meta_data.uvl_filename)
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            remove_sidecar(temp_path)
+
+        # Los ficheros del dataset han cambiado, su ZIP cacheado ya no vale
+        DataSetArchiveService().invalidate(dataset.id)
 
     def count_feature_models(self):
         return self.feature_model_repository.count_feature_models()
@@ -260,7 +307,21 @@ class UVLDataSetService(DataSetService):
             # Aquí se crea la instancia de UVLDataSet automáticamente gracias al repositorio
             dataset = self.create(commit=False, user_id=current_user.id, ds_meta_data_id=dsmetadata.id)
 
-            for feature_model_form in form.feature_models:
+            uvl_paths = [
+                os.path.join(current_user.temp_folder(), feature_model_form.uvl_filename.data)
+                for feature_model_form in form.feature_models
+            ]
+            # Los ficheros se validaron al subirlos: aquí solo se lee el veredicto guardado para su checksum
+            digests = [file_digest(uvl_path) for uvl_path in uvl_paths]
+            for uvl_path, digest in zip(uvl_paths, digests):
+                verdict = uvl_verdict(uvl_path, digest.md5)
+                if not verdict.valid:
+                    raise ValueError(f"{os.path.basename(uvl_path)} is not a valid UVL model: {verdict.errors()[0]}")
+
+            # Los modelos se analizan después, fuera de la petición: de momento solo se sabe cuántos son
+            dsmetadata.ds_metrics = DSMetrics(number_of_models=len(uvl_paths))
+
+            for feature_model_form, digest in zip(form.feature_models, digests):
                 uvl_filename = feature_model_form.uvl_filename.data
                 fmmetadata = self.fmmetadata_repository.create(commit=False, **feature_model_form.get_fmmetadata())
                 for author_data in feature_model_form.get_authors():
@@ -271,28 +332,35 @@ class UVLDataSetService(DataSetService):
                     commit=False, data_set_id=dataset.id, fm_meta_data_id=fmmetadata.id
                 )
                 file_path = os.path.join(current_user.temp_folder(), uvl_filename)
-                checksum, size = calculate_checksum_and_size(file_path)
+                # El blob se guarda antes del commit: si algo falla solo queda un fichero huérfano para storage:gc
+                blob = self.blob_service.acquire(digest)
+                self.blob_service.store(file_path, digest.md5)
                 file = self.hubfilerepository.create(
                     commit=False,
                     name=uvl_filename,
-                    checksum=checksum,
-                    size=size,
+                    checksum=digest.md5,
+                    size=digest.size,
                     feature_model_id=fm.id,
+                    blob_id=blob.id,
                 )
                 fm.files.append(file)
 
+            self.search_index_service.index_dataset(dataset)
             self.repository.session.commit()
         except Exception as exc:
             logger.info(f"Exception creating dataset from form...: {exc}")
             self.repository.session.rollback()
             raise exc
+
+        # Cada modelo se analiza una sola vez, en segundo plano: las páginas y los filtros leen los números guardados
+        analysis_queue.schedule(dataset.id)
         return dataset
 
 
 class RawDataSetService(DataSetService):
     def __init__(self):
         super().__init__()
-        self.repository = BaseRepository(RawDataSet)
+        self.repository = DataSetRepository(RawDataSet)
 
     def create_from_form(self, form, current_user) -> RawDataSet:
         # Metadatos
@@ -310,12 +378,119 @@ class RawDataSetService(DataSetService):
 
         # Crear RawDataSet
         dataset = self.create(commit=True, user_id=current_user.id, ds_meta_data_id=dsmetadata.id)
+        self.search_index_service.index_dataset(dataset, commit=True)
         return dataset
 
     def move_feature_models(self, dataset):
         pass  # No hace nada en Raw
 
 
+class DataSetArchiveService(BaseService):
+    """
+    Builds the ZIP of a dataset and keeps the archives of published datasets, immutable once they have a DOI, in a
+    disk LRU cache. Keys combine the dataset id with a digest of its file checksums, so any change to the file set
+    yields a new key even before the stale entry is invalidated.
+    """
+
+    def __init__(self):
+        super().__init__(DataSetRepository())
+
+    @property
+    def cache(self) -> DiskLRUCache:
+        return DiskLRUCache(current_app.config["ARCHIVE_CACHE_DIR"], current_app.config["ARCHIVE_CACHE_MAX_BYTES"])
+
+    def zip_stream(self, dataset: DataSet) -> ZipStream:
+        archive_name = f"dataset_{dataset.id}"
+
+        # Un RawDataSet sin ficheros aún produce un zip vacío
+        zip_stream = ZipStream()
+        for _, name, path in HubfileService().stored_files([dataset.id]):
+            zip_stream.add_file(path, arcname=os.path.join(archive_name, name))
+        return zip_stream
+
+    def cache_key(self, dataset: DataSet) -> Optional[str]:
+        """Key of the cached archive, or None when the dataset is not published yet (or has no files)."""
+        if not dataset.ds_meta_data.dataset_doi:
+            return None
+        checksums = self.repository.file_checksums(dataset.id)
+        if not checksums:
+            return None
+        digest = hashlib.sha256()
+        for name, checksum in checksums:
+            digest.update(f"{name}\0{checksum}\n".encode())
+        return f"dataset_{dataset.id}-{digest.hexdigest()[:32]}.zip"
+
+    def invalidate(self, dataset_id: int):
+        self.cache.invalidate(f"dataset_{dataset_id}-")
+
+
+class DataSetPageService(BaseService):
+    """
+    Serves the read-only dataset pages from the page cache. Rendered pages are keyed on the dataset id and its version
+    (bumped by every change the page shows), read in one small query with the download count, so a stale page is
+    never served and nothing has to be invalidated. The download count changes with every download, so it is left
+    out of the key and filled into the cached page on every request. DOI lookups are cached by DOI.
+    """
+
+    # Rendered in place of the download count in cached pages (see content)
+    DOWNLOAD_COUNT_SLOT = Markup("<!--download-count-->")
+
+    def __init__(self):
+        super().__init__(DataSetRepository())
+        self.doi_mapping_repository = DOIMappingRepository()
+
+    @property
+    def cache(self) -> BaseCache:
+        return page_cache()
+
+    def stamp(self, dataset_id: int):
+        """See DataSetRepository.page_stamp."""
+        return self.repository.page_stamp(dataset_id)
+
+    def resolve_doi(self, doi: str):
+        """
+        Where a DOI leads: (new DOI, None) when it was replaced by another one, (None, page stamp of the dataset)
+        when it is the DOI of a dataset, and (None, None) otherwise.
+        """
+        key = f"doi:{doi}"
+        resolved = self.cache.get(key)
+        cached = resolved is not None
+        if not cached:
+            resolved = self._resolve_doi(doi)
+            if resolved == (None, None):
+                # Not cached, the DOI may be given to a dataset later
+                return None, None
+            self.cache.set(key, resolved)
+
+        new_doi, dataset_id = resolved
+        if new_doi:
+            return new_doi, None
+        stamp = self.stamp(dataset_id)
+        if stamp is None or stamp.dataset_doi != doi:
+            # The dataset was deleted or its DOI changed since the lookup was cached
+            self.cache.delete(key)
+            return self.resolve_doi(doi) if cached else (None, None)
+        return None, stamp
+
+    def _resolve_doi(self, doi: str):
+        mapping = self.doi_mapping_repository.get_new_doi(doi)
+        if mapping:
+            return mapping.dataset_doi_new, None
+        return None, self.repository.id_by_doi(doi)
+
+    def content(self, stamp, render) -> Markup:
+        """
+        The cacheable part of the page of the dataset with the given stamp, rendered by render(download_count) on a
+        miss, with DOWNLOAD_COUNT_SLOT as the download count.
+        """
+        key = f"dataset:{stamp.id}:{stamp.version}"
+        content = self.cache.get(key)
+        if content is None:
+            content = str(render(self.DOWNLOAD_COUNT_SLOT))
+            self.cache.set(key, content)
+        return Markup(content.replace(self.DOWNLOAD_COUNT_SLOT, str(stamp.download_count)))
+
+
 # --- Otros servicios sin cambios ---
 class AuthorService(BaseService):
     def __init__(self):
@@ -342,19 +517,18 @@ class DSViewRecordService(BaseService):
     def __init__(self):
         super().__init__(DSViewRecordRepository())
 
-    def the_record_exists(self, dataset: DataSet, user_cookie: str):
-        return self.repository.the_record_exists(dataset, user_cookie)
-
-    def create_new_record(self, dataset: DataSet, user_cookie: str) -> DSViewRecord:
-        return self.repository.create_new_record(dataset, user_cookie)
-
-    def create_cookie(self, dataset: DataSet) -> str:
+    def create_cookie(self, dataset_id: int) -> str:
         user_cookie = request.cookies.get("view_cookie")
         if not user_cookie:
             user_cookie = str(uuid.uuid4())
-        existing_record = self.the_record_exists(dataset=dataset, user_cookie=user_cookie)
-        if not existing_record:
-            self.create_new_record(dataset=dataset, user_cookie=user_cookie)
+        # Buffered and written in bulk later; repeated views of the same browser are dropped by the database
+        record_tracker.track(
+            DSViewRecord,
+            user_id=current_user.id if current_user.is_authenticated else None,
+            dataset_id=dataset_id,
+            view_date=datetime.now(timezone.utc),
+            view_cookie=user_cookie,
+        )
         return user_cookie
 
 
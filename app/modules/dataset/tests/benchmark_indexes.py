@@ -0,0 +1,192 @@
+"""
+Route latency benchmark for the indexes on hot lookup columns (migration 009).
+
+Seeds users, datasets with DOIs, DOI mappings, view and download records and user sessions into the TESTING
+database, with the tables as they were before the migration, and times the routes that look them up. Then it
+creates the indexes and unique constraints, as the migration does, and times the same routes again.
+
+WARNING: the testing database is dropped and recreated, exactly as the pytest fixtures do.
+
+Usage:
+    python -m app.modules.dataset.tests.benchmark_indexes --datasets 100000 --records 1000000 --runs 50
+"""
+
+import argparse
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import Index, insert
+from sqlalchemy.schema import CreateIndex
+
+from app import create_app, db
+from app.modules.auth.models import User, UserSession
+from app.modules.dataset.models import DataSet, DOIMapping, DSDownloadRecord, DSMetaData, DSViewRecord, PublicationType
+from app.modules.public.tracking import record_tracker
+
+BATCH_SIZE = 5000
+
+BENCHMARK_EMAIL = "benchmark@example.com"
+BENCHMARK_PASSWORD = "benchmark"
+
+# (table, name) of everything migration 009 creates
+NEW_INDEXES = (
+    (DSMetaData.__table__, "uq_ds_meta_data_dataset_doi"),
+    (DOIMapping.__table__, "uq_doi_mapping_dataset_doi_old"),
+    (DataSet.__table__, "ix_data_set_user_id_created_at"),
+    (UserSession.__table__, "ix_user_session_user_id"),
+)
+
+
+def detach_new_indexes():
+    """Removes the new indexes from the metadata, so that create_all builds the tables as they were before."""
+    detached = []
+    for table, name in NEW_INDEXES:
+        for index in list(table.indexes):
+            if index.name == name:
+                table.indexes.discard(index)
+                detached.append(CreateIndex(index))
+        for constraint in list(table.constraints):
+            if constraint.name == name:
+                table.constraints.discard(constraint)
+                # A unique index is what MySQL creates for a unique constraint, and every database can add one
+                index = Index(name, *constraint.columns, unique=True)
+                table.indexes.discard(index)
+                detached.append(CreateIndex(index))
+    return detached
+
+
+def insert_batches(model, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        db.session.execute(insert(model.__table__), rows[start : start + BATCH_SIZE])
+    db.session.commit()
+
+
+def seed(args, rng, benchmark_user_id):
+    now = datetime.now(timezone.utc)
+    user_ids = [benchmark_user_id] + list(range(benchmark_user_id + 1, benchmark_user_id + args.users))
+    insert_batches(
+        User, [{"id": user_id, "email": f"user{user_id}@example.com", "password": "-"} for user_id in user_ids[1:]]
+    )
+
+    ds_meta_data, datasets, mappings = [], [], []
+    for i in range(1, args.datasets + 1):
+        # One in ten datasets is not synchronized yet
+        doi = f"10.1234/benchmark.{i}" if i % 10 else None
+        ds_meta_data.append(
+            {
+                "id": i,
+                "title": f"Dataset {i}",
+                "description": "",
+                "publication_type": PublicationType.NONE.name,
+                "dataset_doi": doi,
+                "tags": "benchmark",
+            }
+        )
+        datasets.append(
+            {
+                "id": i,
+                "user_id": benchmark_user_id if i <= args.user_datasets else rng.choice(user_ids),
+                "ds_meta_data_id": i,
+                "created_at": now - timedelta(minutes=i),
+                "dataset_type": "generic_dataset",
+            }
+        )
+        if doi:
+            mappings.append({"dataset_doi_old": f"10.1234/old.{i}", "dataset_doi_new": doi})
+    insert_batches(DSMetaData, ds_meta_data)
+    insert_batches(DataSet, datasets)
+    insert_batches(DOIMapping, mappings)
+
+    for model, cookie, date in (
+        (DSViewRecord, "view_cookie", "view_date"),
+        (DSDownloadRecord, "download_cookie", "download_date"),
+    ):
+        insert_batches(
+            model,
+            [
+                {"dataset_id": rng.randint(1, args.datasets), cookie: str(uuid.uuid4()), date: now}
+                for _ in range(args.records)
+            ],
+        )
+
+    insert_batches(
+        UserSession,
+        [
+            {"user_id": rng.choice(user_ids), "session_id": str(uuid.uuid4()), "created_at": now, "last_activity": now}
+            for _ in range(args.records // 10)
+        ],
+    )
+    return [mapping["dataset_doi_new"] for mapping in mappings], [mapping["dataset_doi_old"] for mapping in mappings]
+
+
+def measure(client, urls, runs, expected_status):
+    timings = []
+    for run in range(runs):
+        started = time.perf_counter()
+        response = client.get(urls[run % len(urls)])
+        timings.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == expected_status, f"{urls[run % len(urls)]}: {response.status_code}"
+        db.session.remove()
+    timings.sort()
+    return statistics.median(timings), timings[max(int(len(timings) * 0.95) - 1, 0)]
+
+
+def measure_routes(client, routes, runs):
+    return {name: measure(client, urls, runs, status) for name, (urls, status) in routes.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000, help="Users owning the datasets and sessions.")
+    parser.add_argument("--datasets", type=int, default=100000, help="Datasets, each with its DOI mapping.")
+    parser.add_argument("--user-datasets", type=int, default=50, help="Datasets of the logged in user.")
+    parser.add_argument("--records", type=int, default=1000000, help="View and download records of each kind.")
+    parser.add_argument("--runs", type=int, default=50, help="Requests measured per route and schema.")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    app = create_app("testing")
+    with app.app_context():
+        new_indexes = detach_new_indexes()
+        db.drop_all()
+        db.create_all()
+        user = User(email=BENCHMARK_EMAIL, password=BENCHMARK_PASSWORD)
+        db.session.add(user)
+        db.session.commit()
+
+        dois, old_dois = seed(args, rng, user.id)
+        rng.shuffle(dois)
+        rng.shuffle(old_dois)
+        routes = {
+            "GET /doi/<doi>/": ([f"/doi/{doi}/" for doi in dois], 200),
+            "GET /doi/<old doi>/": ([f"/doi/{doi}/" for doi in old_dois], 302),
+            "GET /dataset/list": (["/dataset/list"], 200),
+            "GET /profile/summary": (["/profile/summary"], 200),
+            "GET /active_sessions": (["/active_sessions"], 200),
+        }
+
+        with app.test_client() as client:
+            client.post("/login", data={"email": BENCHMARK_EMAIL, "password": BENCHMARK_PASSWORD})
+            before = measure_routes(client, routes, args.runs)
+            for statement in new_indexes:
+                db.session.execute(statement)
+            db.session.commit()
+            after = measure_routes(client, routes, args.runs)
+
+        print(f"{'route':<22} | {'before p50':>10} | {'before p95':>10} | {'after p50':>10} | {'after p95':>10}")
+        for name in routes:
+            print(
+                f"{name:<22} | {before[name][0]:>8.1f}ms | {before[name][1]:>8.1f}ms "
+                f"| {after[name][0]:>8.1f}ms | {after[name][1]:>8.1f}ms"
+            )
+
+        record_tracker.flush()
+        db.session.remove()
+        db.drop_all()
+
+
+if __name__ == "__main__":
+    main()
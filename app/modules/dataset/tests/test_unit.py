@@ -1,4 +1,11 @@
+import hashlib
+import io
+import tracemalloc
+import zipfile
+import zlib
+
 import pytest
+from sqlalchemy import event
 
 from app import db
 
@@ -6,6 +13,21 @@ from app import db
 # pero basándome en tu estructura deberían ser estas:
 from app.modules.auth.models import User
 from app.modules.dataset.models import DataSet, DSMetaData, PublicationType
+from core.archives.zip_stream import ZipStream
+from core.cache.disk_lru import DiskLRUCache
+from core.storage.hashing import hash_file, read_sidecar
+
+
+@pytest.fixture(autouse=True)
+def flushed_record_tracker(test_client):
+    """
+    Vuelca al terminar cada test las descargas y visitas que dejó en el buffer, para que no se sumen a datasets de
+    tests posteriores que reciban el mismo id.
+    """
+    from app.modules.public.tracking import record_tracker
+
+    yield
+    record_tracker.flush()
 
 
 @pytest.fixture
@@ -88,6 +110,11 @@ def test_download_counter_backend_logic(test_client, clean_dataset_setup):
     except Exception as e:
         print(f"Error: {e}")
 
+    # El contador se escribe en bloque junto a los registros de descarga: se vuelca antes de comprobarlo
+    from app.modules.public.tracking import record_tracker
+
+    record_tracker.flush()
+
     # 3. MAGIA DE SQLALCHEMY (IMPORTANTE)
     # "Caducamos" la sesión actual. Esto obliga a SQLAlchemy a olvidar los datos
     # que tiene en memoria RAM y volver a leerlos del disco (Base de Datos Real)
@@ -102,3 +129,831 @@ def test_download_counter_backend_logic(test_client, clean_dataset_setup):
     assert (
         dataset_after.download_count == 1
     ), f"Fallo crítico: El contador es {dataset_after.download_count}, debería ser 1."
+
+
+# --- TESTS DEL ZIP EN STREAMING ---
+
+
+@pytest.fixture
+def uvl_datasets(test_client, tmp_path, monkeypatch):
+    """
+    Crea datasets UVL del usuario de test con sus ficheros en la estructura antigua uploads/user_X/dataset_Y/ (o en el
+    almacén de blobs si se pide) y los borra al terminar.
+    """
+    from app.modules.dataset.models import UVLDataSet
+    from app.modules.featuremodel.models import FeatureModel, FMMetaData
+    from app.modules.hubfile.models import Hubfile
+    from app.modules.hubfile.services import BlobService
+
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    monkeypatch.setitem(test_client.application.config, "ARCHIVE_CACHE_DIR", str(tmp_path / "archive_cache"))
+    user = User.query.filter_by(email="test@example.com").first()
+    created = []
+
+    def create(files, in_blob_store=False):
+        meta = DSMetaData(title="Stored files", description="", publication_type=PublicationType.NONE)
+        dataset = UVLDataSet(user_id=user.id, ds_meta_data=meta)
+        db.session.add(dataset)
+        db.session.commit()
+        folder = tmp_path / "uploads" / f"user_{user.id}" / f"dataset_{dataset.id}"
+        folder.mkdir(parents=True)
+
+        for name, content in files.items():
+            (folder / name).write_bytes(content)
+            fm_meta = FMMetaData(uvl_filename=name, title=name, description="", publication_type=PublicationType.NONE)
+            feature_model = FeatureModel(data_set_id=dataset.id, fm_meta_data=fm_meta)
+            hubfile = Hubfile(name=name, checksum=hashlib.md5(content).hexdigest(), size=len(content))
+            if in_blob_store:
+                digest = hash_file(str(folder / name))
+                hubfile.blob_id = BlobService().acquire(digest).id
+                BlobService().store(str(folder / name), digest.md5)
+                (folder / name).unlink()
+            feature_model.files.append(hubfile)
+            db.session.add(feature_model)
+        db.session.commit()
+        created.append(dataset.id)
+        return dataset
+
+    yield create
+
+    db.session.rollback()
+    for dataset_id in created:
+        dataset = db.session.get(UVLDataSet, dataset_id)
+        if dataset:
+            db.session.delete(dataset)
+    db.session.commit()
+
+
+def test_download_streams_zip_from_stored_files(test_client, uvl_datasets, tmp_path):
+    """
+    La descarga se genera al vuelo con los ficheros del dataset, estén en el almacén de blobs o aún en la estructura
+    antigua, sin pasar por un directorio temporal.
+    """
+    legacy = uvl_datasets({"model.uvl": b"features\n    Root\n"})
+    stored = uvl_datasets({"diagram.png": b"\x89PNG" + bytes(range(256))}, in_blob_store=True)
+    # El contenido del dataset se reúne en un solo dataset para descargarlo de una vez
+    png = stored.feature_models[0]
+    png.data_set_id = legacy.id
+    db.session.commit()
+    dataset_id = legacy.id
+
+    response = test_client.get(f"/dataset/download/{dataset_id}")
+
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.headers["Content-Disposition"] == f"attachment; filename=dataset_{dataset_id}.zip"
+
+    with zipfile.ZipFile(io.BytesIO(response.get_data())) as archive:
+        assert archive.testzip() is None
+        assert archive.read(f"dataset_{dataset_id}/model.uvl") == b"features\n    Root\n"
+        assert archive.read(f"dataset_{dataset_id}/diagram.png") == b"\x89PNG" + bytes(range(256))
+        # Los formatos ya comprimidos se guardan tal cual
+        assert archive.getinfo(f"dataset_{dataset_id}/diagram.png").compress_type == zipfile.ZIP_STORED
+        assert archive.getinfo(f"dataset_{dataset_id}/model.uvl").compress_type == zipfile.ZIP_DEFLATED
+
+
+def test_download_with_missing_blob_fails_before_streaming(test_client, uvl_datasets, tmp_path):
+    """Si falta un fichero se responde con un error en vez de enviar (y cachear) un ZIP cortado o incompleto."""
+    import os
+
+    from core.storage.resolver import blob_path
+
+    dataset = uvl_datasets({"a.uvl": b"features\n    A\n", "b.uvl": b"features\n    B\n"}, in_blob_store=True)
+    dataset.ds_meta_data.dataset_doi = "10.1234/missing.1"
+    db.session.commit()
+    os.remove(blob_path(dataset.feature_models[0].files[0].blob.checksum))
+
+    response = test_client.get(f"/dataset/download/{dataset.id}")
+
+    assert response.status_code == 500
+    assert response.get_json()["message"] == "1 files of the dataset are missing from storage"
+    assert not (tmp_path / "archive_cache").exists() or not list((tmp_path / "archive_cache").iterdir())
+
+
+def test_zip_stream_thousands_of_uvl_files_in_constant_memory(tmp_path):
+    """
+    Prueba de estrés: 3000 modelos UVL (~30 MB) se comprimen sin que la memoria crezca con el tamaño del dataset.
+    """
+    files_count = 3000
+    content = "features\n    Root\n        optional\n            Feature\n" * 200
+    for i in range(files_count):
+        (tmp_path / f"model_{i}.uvl").write_text(content)
+
+    zip_stream = ZipStream()
+    for i in range(files_count):
+        zip_stream.add_file(str(tmp_path / f"model_{i}.uvl"), arcname=f"dataset/model_{i}.uvl")
+
+    archive_path = tmp_path / "dataset.zip"
+    tracemalloc.start()
+    try:
+        with open(archive_path, "wb") as archive_file:
+            for chunk in zip_stream:
+                archive_file.write(chunk)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert peak < 4 * 1024 * 1024, f"Pico de memoria de {peak} bytes"
+
+    with zipfile.ZipFile(archive_path) as archive:
+        assert len(archive.infolist()) == files_count
+        assert archive.testzip() is None
+        assert archive.read("dataset/model_2999.uvl").decode() == content
+
+
+# --- TESTS DE LA CACHÉ DE ARCHIVOS ---
+
+
+@pytest.fixture
+def published_dataset(test_client, tmp_path, monkeypatch):
+    """
+    Dataset UVL con DOI y un fichero en disco, con la caché de archivos en un directorio temporal.
+    """
+    from app.modules.dataset.models import UVLDataSet
+    from app.modules.featuremodel.models import FeatureModel
+    from app.modules.hubfile.models import Hubfile
+
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    monkeypatch.setitem(test_client.application.config, "ARCHIVE_CACHE_DIR", str(tmp_path / "archive_cache"))
+    monkeypatch.setitem(test_client.application.config, "ARCHIVE_CACHE_ACCEL_REDIRECT", None)
+
+    user = User.query.filter_by(email="archive_cache@example.com").first()
+    if not user:
+        user = User(email="archive_cache@example.com", password="password123")
+        db.session.add(user)
+        db.session.commit()
+
+    meta = DSMetaData(
+        title="Published dataset",
+        description="Immutable once it has a DOI",
+        publication_type=PublicationType.NONE,
+        dataset_doi="10.1234/published.1",
+    )
+    db.session.add(meta)
+    db.session.commit()
+    dataset = UVLDataSet(user_id=user.id, ds_meta_data_id=meta.id)
+    db.session.add(dataset)
+    db.session.commit()
+    feature_model = FeatureModel(data_set_id=dataset.id)
+    db.session.add(feature_model)
+    db.session.commit()
+
+    folder = tmp_path / "uploads" / f"user_{user.id}" / f"dataset_{dataset.id}"
+    folder.mkdir(parents=True)
+    (folder / "model.uvl").write_text("features\n    Root\n")
+    db.session.add(Hubfile(name="model.uvl", checksum="abc", size=18, feature_model_id=feature_model.id))
+    db.session.commit()
+
+    yield dataset.id
+
+    db.session.rollback()
+    db.session.delete(db.session.get(UVLDataSet, dataset.id))
+    # Los DOI son únicos: los metadatos no se borran con el dataset
+    db.session.delete(db.session.get(DSMetaData, meta.id))
+    db.session.commit()
+
+
+def test_published_dataset_archive_is_cached(test_client, published_dataset, tmp_path):
+    first = test_client.get(f"/dataset/download/{published_dataset}")
+    assert first.status_code == 200
+    body = first.get_data()
+    etag = first.headers["ETag"]
+
+    cached = list((tmp_path / "archive_cache").iterdir())
+    assert [entry.name for entry in cached] == [etag.strip('"')]
+    assert cached[0].read_bytes() == body
+
+    # El segundo acceso envía el fichero cacheado, con su tamaño ya conocido
+    second = test_client.get(f"/dataset/download/{published_dataset}")
+    assert int(second.headers["Content-Length"]) == len(body)
+    assert second.headers["ETag"] == etag
+    assert second.get_data() == body
+
+    # Un 304 no envía el ZIP y no cuenta como descarga
+    from app.modules.public.tracking import record_tracker
+
+    not_modified = test_client.get(f"/dataset/download/{published_dataset}", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    # Las descargas no escriben en la petición: el contador se actualiza al volcar el buffer
+    db.session.expire_all()
+    assert db.session.get(DataSet, published_dataset).download_count == 0
+    record_tracker.flush()
+    db.session.expire_all()
+    assert db.session.get(DataSet, published_dataset).download_count == 2
+
+
+def test_cached_archive_is_delegated_to_nginx(test_client, published_dataset):
+    from app.modules.dataset.services import DataSetArchiveService
+
+    test_client.get(f"/dataset/download/{published_dataset}").get_data()
+    test_client.application.config["ARCHIVE_CACHE_ACCEL_REDIRECT"] = "/_archive_cache/"
+
+    response = test_client.get(f"/dataset/download/{published_dataset}")
+    assert response.headers["X-Accel-Redirect"].startswith(f"/_archive_cache/dataset_{published_dataset}-")
+    assert response.get_data() == b""
+
+    # Si cambian los ficheros del dataset, su archivo deja de estar en caché
+    DataSetArchiveService().invalidate(published_dataset)
+    response = test_client.get(f"/dataset/download/{published_dataset}")
+    assert "X-Accel-Redirect" not in response.headers
+
+
+def test_disk_lru_cache_evicts_least_recently_used(tmp_path):
+    import os
+
+    cache = DiskLRUCache(str(tmp_path), max_bytes=250)
+    for index, key in enumerate(["a", "b", "c"]):
+        list(cache.put_stream(key, [b"x" * 100]))
+        os.utime(cache.path_for(key), (index, index))
+        # "a" se usa después de escribir "b", así que el menos reciente es "b"
+        if key == "b":
+            cache.get("a")
+
+    assert cache.get("b") is None
+    assert cache.get("a") and cache.get("c")
+
+
+def test_disk_lru_cache_discards_interrupted_writes(tmp_path):
+    cache = DiskLRUCache(str(tmp_path), max_bytes=1024)
+
+    stream = cache.put_stream("archive", iter([b"first", b"second"]))
+    assert next(stream) == b"first"
+    stream.close()
+
+    assert cache.get("archive") is None
+    assert list(tmp_path.iterdir()) == []
+
+
+# --- TESTS DEL CÁLCULO DE CHECKSUMS EN STREAMING ---
+
+
+def test_hash_file_reads_in_chunks(tmp_path):
+    """
+    Hashear un fichero grande (64 MB) no reserva memoria proporcional a su tamaño.
+    """
+    path = tmp_path / "big.uvl"
+    with open(path, "wb") as big_file:
+        for _ in range(64):
+            big_file.write(b"features\n    Root\n" * (1024 * 1024 // 18) + b"\n" * (1024 * 1024 % 18))
+
+    tracemalloc.start()
+    try:
+        digest = hash_file(str(path))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert peak < 4 * 1024 * 1024, f"Pico de memoria de {peak} bytes"
+    with open(path, "rb") as big_file:
+        assert digest.md5 == hashlib.file_digest(big_file, "md5").hexdigest()
+    assert digest.size == 64 * 1024 * 1024
+    assert digest.crc32 == f"{zlib.crc32(path.read_bytes()):08x}"
+
+
+def test_upload_hashes_file_while_saving(test_client, tmp_path, monkeypatch):
+    from app.modules.conftest import login, logout
+    from app.modules.dataset.services import calculate_checksum_and_size
+
+    monkeypatch.chdir(tmp_path)
+    login(test_client, "test@example.com", "test1234")
+    content = b"features\n    Root\n        optional\n            Feature\n"
+
+    response = test_client.post(
+        "/dataset/file/upload",
+        data={"file": (io.BytesIO(content), "model.uvl")},
+        content_type="multipart/form-data",
+    )
+    assert response.status_code == 200
+
+    uploaded = str(next(tmp_path.glob("uploads/temp/*/model.uvl")))
+    assert read_sidecar(uploaded) == (hashlib.md5(content).hexdigest(), f"{zlib.crc32(content):08x}", len(content))
+    assert calculate_checksum_and_size(uploaded) == (hashlib.md5(content).hexdigest(), len(content))
+
+    # Si el fichero cambia después, el checksum cacheado deja de valer
+    with open(uploaded, "ab") as uploaded_file:
+        uploaded_file.write(b"        Other\n")
+    assert read_sidecar(uploaded) is None
+    assert calculate_checksum_and_size(uploaded)[1] == len(content) + 14
+
+    test_client.post("/dataset/file/delete", json={"file": "model.uvl"})
+    assert list(tmp_path.glob("uploads/temp/*/*")) == []
+    logout(test_client)
+
+
+def test_upload_validates_uvl_once_and_rejects_syntax_errors(test_client, tmp_path, monkeypatch):
+    from app.modules.conftest import login, logout
+    from app.modules.flamapy import validation
+
+    monkeypatch.chdir(tmp_path)
+    login(test_client, "test@example.com", "test1234")
+
+    response = test_client.post(
+        "/dataset/file/upload",
+        data={"file": (io.BytesIO(b"features\n\tRoot {\n"), "broken.uvl")},
+        content_type="multipart/form-data",
+    )
+    assert response.status_code == 400
+    assert "Line 3:0" in response.get_json()["errors"][0]
+    assert list(tmp_path.glob("uploads/temp/*/*")) == []
+
+    content = b"features\n    Root\n        optional\n            Feature\n"
+    response = test_client.post(
+        "/dataset/file/upload", data={"file": (io.BytesIO(content), "model.uvl")}, content_type="multipart/form-data"
+    )
+    assert response.status_code == 200
+
+    # El veredicto queda guardado en disco por checksum, compartido por todos los workers: el mismo contenido no se
+    # vuelve a analizar aunque se vacíe la caché de páginas
+    def fail(path):
+        raise AssertionError(f"{path} parsed again")
+
+    monkeypatch.setattr(validation, "validate_uvl", fail)
+    test_client.application.extensions.pop("page_cache", None)
+    uploaded = str(next(tmp_path.glob("uploads/temp/*/model.uvl")))
+    checksum = hashlib.md5(content).hexdigest()
+    assert (tmp_path / "uploads" / "verdicts" / checksum[:2] / f"{checksum}.json").exists()
+    assert validation.uvl_verdict(uploaded, checksum).valid
+    broken = hashlib.md5(b"features\n\tRoot {\n").hexdigest()
+    assert "Line 3:0" in validation.uvl_verdict(uploaded, broken).errors()[0]
+
+    test_client.post("/dataset/file/delete", json={"file": "model.uvl"})
+    logout(test_client)
+
+
+def test_chunked_upload_resumes_and_assembles_the_file(test_client, tmp_path, monkeypatch):
+    from app.modules.conftest import login, logout
+
+    monkeypatch.chdir(tmp_path)
+    login(test_client, "test@example.com", "test1234")
+    content = b"features\n    Root\n        optional\n" + b"".join(
+        f"            Feature{i}\n".encode() for i in range(200)
+    )
+    chunks = [content[start : start + 1000] for start in range(0, len(content), 1000)]
+    session = "0f8c9a52-3b1e-4c55-9d6a-2b7f1c0e4a10"
+
+    def send(index, offset=None):
+        return test_client.post(
+            "/dataset/file/upload",
+            data={
+                "file": (io.BytesIO(chunks[index]), "model.uvl"),
+                "dzuuid": session,
+                "dzchunkbyteoffset": str(index * 1000 if offset is None else offset),
+                "dztotalfilesize": str(len(content)),
+            },
+            content_type="multipart/form-data",
+        )
+
+    assert send(0).get_json()["offset"] == 1000
+    # Un trozo que se salta parte del fichero se rechaza con el offset por el que sigue
+    response = send(2)
+    assert response.status_code == 409
+    assert response.get_json()["offset"] == 1000
+    assert test_client.get(f"/dataset/file/upload/{session}").get_json() == {"offset": 1000}
+
+    # Reenviar un trozo ya recibido (su respuesta se perdió) no lo duplica
+    send(1)
+    send(1)
+    for index in range(2, len(chunks)):
+        response = send(index)
+    assert response.get_json()["filename"] == "model.uvl"
+
+    uploaded = next(tmp_path.glob("uploads/temp/*/model.uvl"))
+    assert uploaded.read_bytes() == content
+    assert read_sidecar(str(uploaded)).md5 == hashlib.md5(content).hexdigest()
+    assert list(tmp_path.glob("uploads/temp/*/.chunks/*")) == []
+
+    # Un nombre repetido recibe un sufijo único sin buscar uno libre
+    response = test_client.post(
+        "/dataset/file/upload",
+        data={"file": (io.BytesIO(content), "model.uvl")},
+        content_type="multipart/form-data",
+    )
+    duplicate = response.get_json()["filename"]
+    assert duplicate != "model.uvl" and duplicate.startswith("model (") and duplicate.endswith(").uvl")
+
+    for name in ("model.uvl", duplicate):
+        test_client.post("/dataset/file/delete", json={"file": name})
+    logout(test_client)
+
+
+# --- TESTS DEL ALMACÉN DE BLOBS ---
+
+
+def _files_under(path):
+    return sorted(str(file.relative_to(path)) for file in path.rglob("*") if file.is_file())
+
+
+def test_combined_dataset_shares_blobs_instead_of_copying(test_client, uvl_datasets, tmp_path):
+    from types import SimpleNamespace
+
+    from app.modules.dataset.services import UVLDataSetService
+    from app.modules.hubfile.models import Blob
+
+    content = b"features\n    Shared\n"
+    source = uvl_datasets({"shared.uvl": content}, in_blob_store=True)
+    files_before = _files_under(tmp_path / "uploads")
+
+    user = User.query.filter_by(email="test@example.com").first()
+    author = SimpleNamespace(id=user.id, profile=SimpleNamespace(surname="Doe", name="Jane", affiliation="", orcid=""))
+    combined = UVLDataSetService().create_combined_dataset(author, "Combined", "", "any", "", [source.id])
+
+    source_file = source.feature_models[0].files[0]
+    combined_file = combined.feature_models[0].files[0]
+    assert combined_file.blob_id == source_file.blob_id
+    assert combined_file.checksum == hashlib.md5(content).hexdigest()
+    assert db.session.get(Blob, source_file.blob_id).ref_count == 2
+    # Solo cambian los metadatos: no se escribe ningún fichero
+    assert _files_under(tmp_path / "uploads") == files_before
+    with open(combined_file.get_path(), "rb") as stored:
+        assert stored.read() == content
+
+    # Borrar uno de los dos datasets libera su referencia
+    db.session.delete(combined)
+    db.session.commit()
+    assert db.session.get(Blob, source_file.blob_id).ref_count == 1
+
+
+def test_storage_migrate_deduplicates_legacy_files(test_client, uvl_datasets, tmp_path):
+    from app.modules.hubfile.models import Blob
+    from app.modules.hubfile.services import BlobService
+
+    first = uvl_datasets({"a.uvl": b"features\n    Same\n", "b.uvl": b"features\n    Other\n"})
+    second = uvl_datasets({"copy.uvl": b"features\n    Same\n"})
+
+    assert BlobService().migrate_legacy_files(batch_size=2, dry_run=True)["duplicates"] == 1
+    assert not (tmp_path / "uploads" / "blobs").exists()
+
+    stats = BlobService().migrate_legacy_files(batch_size=2)
+
+    assert stats == {"files": 3, "blobs": 2, "duplicates": 1, "missing": 0, "bytes_saved": 18}
+    # Las carpetas antiguas desaparecen y cada contenido queda una sola vez
+    assert [path.split("/")[0] for path in _files_under(tmp_path / "uploads")] == ["blobs", "blobs"]
+    same = db.session.get(Blob, second.feature_models[0].files[0].blob_id)
+    assert same.ref_count == 2
+    assert first.feature_models[0].files[0].blob_id == same.id
+    with open(first.feature_models[1].files[0].get_path(), "rb") as stored:
+        assert stored.read() == b"features\n    Other\n"
+
+    # Una segunda ejecución no tiene nada que hacer
+    assert BlobService().migrate_legacy_files()["files"] == 0
+
+
+def test_storage_gc_removes_unreferenced_blobs(test_client, uvl_datasets, tmp_path):
+    import os
+
+    from app.modules.hubfile.models import Blob
+    from app.modules.hubfile.services import BlobService
+    from core.storage.resolver import blob_path, verdict_path
+
+    dataset = uvl_datasets({"gone.uvl": b"features\n    Gone\n"}, in_blob_store=True)
+    checksum = dataset.feature_models[0].files[0].blob.checksum
+    db.session.delete(dataset)
+    db.session.commit()
+
+    # Un fichero y el veredicto de una subida que nunca llegó a guardarse, con más de una hora
+    orphan = blob_path("f" * 32)
+    verdict = verdict_path("f" * 32)
+    for path in (orphan, verdict):
+        os.makedirs(os.path.dirname(path))
+        open(path, "wb").close()
+        os.utime(path, (0, 0))
+
+    stats = BlobService().collect_garbage()
+    assert stats["orphan_files"] == 2
+    assert Blob.query.filter(Blob.ref_count <= 0).count() == 0
+    assert Blob.query.filter_by(checksum=checksum).first() is None
+    assert not os.path.exists(blob_path(checksum))
+    assert not os.path.exists(orphan) and not os.path.exists(verdict)
+
+
+def test_blob_download_without_working_dir(test_client, uvl_datasets, tmp_path, monkeypatch):
+    """Con WORKING_DIR vacío (desarrollo local) las rutas se resuelven en el directorio actual, no en app/."""
+    content = b"features\n    Local\n"
+    dataset = uvl_datasets({"local.uvl": content}, in_blob_store=True)
+    monkeypatch.setenv("WORKING_DIR", "")
+    monkeypatch.chdir(tmp_path)
+
+    file = dataset.feature_models[0].files[0]
+    assert file.get_path().startswith(str(tmp_path))
+    response = test_client.get(f"/file/download/{file.id}")
+    assert response.status_code == 200
+    assert response.get_data() == content
+
+
+def count_queries(test_client, url):
+    """Número de sentencias SQL que ejecuta una petición, con todo lo cargado en la sesión caducado."""
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    db.session.expire_all()
+    event.listen(db.engine, "before_cursor_execute", count_statement)
+    try:
+        response = test_client.get(url)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count_statement)
+    assert response.status_code == 200
+    return len(statements)
+
+
+def test_dataset_pages_run_a_constant_number_of_queries(test_client, uvl_datasets):
+    """Los listados y la vista de un dataset cargan sus relaciones con perfiles de carga: sin consultas N+1."""
+    from app.modules.conftest import login, logout
+
+    login(test_client, "test@example.com", "test1234")
+    try:
+        first = uvl_datasets({"a.uvl": b"features\n    A\n"})
+        first.ds_meta_data.tags = "profiles"
+        db.session.commit()
+        queries = {
+            "list": count_queries(test_client, "/dataset/list"),
+            "summary": count_queries(test_client, "/profile/summary"),
+            "view": count_queries(test_client, f"/dataset/view/{first.id}"),
+        }
+
+        for _ in range(3):
+            uvl_datasets({f"{name}.uvl": f"features\n    {name}\n".encode() for name in "bcde"})
+        bigger = uvl_datasets({f"{name}.uvl": f"features\n    {name}\n".encode() for name in "fghijk"})
+        bigger.ds_meta_data.tags = "profiles"
+        db.session.commit()
+
+        assert count_queries(test_client, "/dataset/list") == queries["list"]
+        assert count_queries(test_client, "/profile/summary") == queries["summary"]
+        assert count_queries(test_client, f"/dataset/view/{bigger.id}") == queries["view"]
+    finally:
+        logout(test_client)
+
+
+def test_file_totals_are_kept_on_write_and_fixed_when_drifted(test_client, uvl_datasets):
+    from types import SimpleNamespace
+
+    from app.modules.dataset.services import DataSetService, UVLDataSetService
+    from app.modules.explore.services import ExploreService
+
+    small = uvl_datasets({"a.uvl": b"features\n    A\n"})
+    big = uvl_datasets({"b.uvl": b"features\n    B\n", "c.uvl": b"features\n    C\n" * 10})
+    db.session.expire_all()
+    assert (small.files_count, small.total_size_in_bytes) == (1, 15)
+    assert (big.files_count, big.total_size_in_bytes) == (2, 15 + 150)
+
+    user = User.query.filter_by(email="test@example.com").first()
+    author = SimpleNamespace(id=user.id, profile=SimpleNamespace(surname="Doe", name="Jane", affiliation="", orcid=""))
+    combined = UVLDataSetService().create_combined_dataset(author, "Combined", "", "any", "", [small.id, big.id])
+    db.session.expire_all()
+    assert (combined.files_count, combined.total_size_in_bytes) == (3, 15 + 15 + 150)
+
+    # Ordenar por tamaño se resuelve en SQL con la columna almacenada
+    with test_client.application.test_request_context():
+        largest = ExploreService().filter_page(sorting="largest")["items"]
+    assert [item["id"] for item in largest[:2]] == [combined.id, big.id]
+    assert largest[0]["total_size_in_bytes"] == 180
+
+    # Quitar un fichero descuenta su tamaño
+    db.session.delete(big.feature_models[1])
+    db.session.commit()
+    db.session.expire_all()
+    assert (big.files_count, big.total_size_in_bytes) == (1, 15)
+
+    service = DataSetService()
+    assert service.sync_file_totals(fix=False) == []
+    small.files_count, small.total_size_in_bytes = 5, 0
+    db.session.commit()
+    assert [tuple(row) for row in service.sync_file_totals(fix=False)] == [(small.id, 5, 0, 1, 15)]
+    assert len(service.sync_file_totals()) == 1
+    assert service.sync_file_totals(fix=False) == []
+
+    db.session.delete(combined)
+    db.session.commit()
+
+
+@pytest.fixture
+def lru_page_cache(test_client, monkeypatch):
+    monkeypatch.setitem(test_client.application.config, "PAGE_CACHE_TYPE", "lru")
+    test_client.application.extensions.pop("page_cache", None)
+    yield
+    test_client.application.extensions.pop("page_cache", None)
+
+
+def test_dataset_page_is_served_from_the_page_cache(test_client, published_dataset, lru_page_cache):
+    """La página de un dataset publicado sale de la caché mientras no cambie nada de lo que muestra."""
+    from app.modules.dataset.models import DOIMapping, DSViewRecord
+    from app.modules.public.tracking import record_tracker
+
+    dataset = db.session.get(DataSet, published_dataset)
+    dataset.ds_meta_data.tags = "cache"
+    db.session.commit()
+
+    url = "/doi/10.1234/published.1/"
+    first = count_queries(test_client, url)
+    assert count_queries(test_client, url) < first
+    assert b"Published dataset" in test_client.get(url).data
+
+    # Las visitas se registran aunque la página salga de la caché
+    record_tracker.flush()
+    assert DSViewRecord.query.filter_by(dataset_id=published_dataset).count() == 1
+
+    # Cambiar los metadatos cambia la clave de la página
+    dataset.ds_meta_data.title = "Renamed dataset"
+    db.session.commit()
+    renamed = count_queries(test_client, url)
+    page = test_client.get(url).data
+    assert b"Renamed dataset" in page and b"0 downloads" in page
+    # Las descargas no: el contador se rellena sobre la página cacheada
+    test_client.get(f"/dataset/download/{published_dataset}")
+    record_tracker.flush()
+    assert count_queries(test_client, url) < renamed
+    page = test_client.get(url).data
+    assert b'id="download_count_text">1<' in page and b"1 downloads" in page
+
+    # Los DOI antiguos redirigen, también desde la caché
+    db.session.add(DOIMapping(dataset_doi_old="10.1234/old.1", dataset_doi_new="10.1234/published.1"))
+    db.session.commit()
+    for _ in range(2):
+        assert test_client.get("/doi/10.1234/old.1/").headers["Location"].endswith(url)
+
+    # Un DOI cacheado que deja de ser del dataset ya no lo muestra
+    dataset.ds_meta_data.dataset_doi = "10.1234/published.2"
+    db.session.commit()
+    assert test_client.get(url).status_code == 404
+    assert b"Renamed dataset" in test_client.get("/doi/10.1234/published.2/").data
+
+    record_tracker.flush()
+    # Borrados uno a uno para que los contadores de la portada los descuenten
+    for record in DSViewRecord.query.filter_by(dataset_id=published_dataset):
+        db.session.delete(record)
+    DOIMapping.query.filter_by(dataset_doi_old="10.1234/old.1").delete()
+    db.session.commit()
+
+
+def test_bulk_import_writes_datasets_in_batches(test_client, uvl_datasets, tmp_path, monkeypatch):
+    import json
+
+    from app.modules.conftest import login, logout
+    from app.modules.dataset.ingestion import DataSetImportJobService
+    from app.modules.dataset.models import UVLDataSet
+    from app.modules.explore.models import SearchTerm
+    from app.modules.hubfile.models import Blob
+
+    shared = b"features\n    Shared\n"
+    existing = uvl_datasets({"shared.uvl": shared}, in_blob_store=True)
+    blob = Blob.query.filter_by(checksum=hashlib.md5(shared).hexdigest()).first()
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zip_file:
+        zip_file.writestr("cars/engine.uvl", b"features\n    Engine\n        optional\n            Turbo\n")
+        zip_file.writestr("cars/shared.uvl", shared)
+        zip_file.writestr("phones/broken.uvl", b"features\n\tRoot {\n")
+        zip_file.writestr("phones/screen.uvl", b"features\n    Screen\n")
+    manifest = [
+        {
+            "title": "Bulk cars",
+            "description": "Imported cars",
+            "publication_type": "article",
+            "tags": ["cars", "engines"],
+            "authors": [{"name": "Roe, Richard", "affiliation": "Motors"}],
+            "models": [{"file": "cars/engine.uvl", "title": "Engine"}, {"file": "cars/shared.uvl"}],
+        },
+        {
+            "title": "Bulk phones",
+            "description": "Imported phones",
+            "models": [{"file": "phones/broken.uvl"}, {"file": "phones/screen.uvl"}, {"file": "phones/missing.uvl"}],
+        },
+        {"title": "Bulk nothing", "description": "Only broken files", "models": [{"file": "phones/broken.uvl"}]},
+    ]
+
+    def send(manifest=manifest):
+        return test_client.post(
+            "/dataset/import",
+            data={
+                "manifest": (io.BytesIO(json.dumps(manifest).encode()), "manifest.json"),
+                "files": (io.BytesIO(archive.getvalue()), "files.zip"),
+            },
+            content_type="multipart/form-data",
+        )
+
+    # Varios lotes, con los ficheros validados en procesos aparte
+    monkeypatch.setitem(test_client.application.config, "DATASET_IMPORT_WORKERS", 2)
+    monkeypatch.setitem(test_client.application.config, "DATASET_IMPORT_BATCH_SIZE", 2)
+    login(test_client, "test@example.com", "test1234")
+
+    # Los ZIP que superan los límites se rechazan antes de extraer nada, y solo se admiten ficheros .uvl
+    monkeypatch.setitem(test_client.application.config, "DATASET_IMPORT_MAX_FILES", 3)
+    assert "4 entries" in send().get_json()["message"]
+    monkeypatch.setitem(test_client.application.config, "DATASET_IMPORT_MAX_FILES", 10)
+    monkeypatch.setitem(test_client.application.config, "DATASET_IMPORT_MAX_BYTES", 10)
+    assert send().status_code == 400
+    monkeypatch.setitem(test_client.application.config, "DATASET_IMPORT_MAX_BYTES", 1024)
+    response = send([{"title": "Text", "description": "", "models": [{"file": "cars/notes.txt"}]}])
+    assert "not a .uvl file" in response.get_json()["message"]
+    assert not (tmp_path / "uploads" / "imports").exists() or not any((tmp_path / "uploads" / "imports").iterdir())
+
+    # La petición solo encola la importación; el worker la hace y su estado se consulta en status_url
+    response = send()
+    assert response.status_code == 202
+    assert response.get_json()["status"] == "queued"
+    status_url = response.headers["Location"]
+    with test_client.application.app_context():
+        assert DataSetImportJobService().work(once=True) == 1
+    job = test_client.get(status_url).get_json()
+    logout(test_client)
+    assert job["status"] == "succeeded"
+    assert list((tmp_path / "uploads" / "imports").iterdir()) == []
+    report = job["report"]
+    try:
+        assert (report["datasets"], report["models"]) == (2, 3)
+        assert [rejected["item"] for rejected in report["rejected"]] == [
+            "phones/broken.uvl",
+            "phones/missing.uvl",
+            "phones/broken.uvl",
+            "Bulk nothing",
+        ]
+        assert "Line 3:0" in report["rejected"][0]["reason"]
+
+        cars, phones = [db.session.get(UVLDataSet, dataset_id) for dataset_id in report["dataset_ids"]]
+        assert cars.ds_meta_data.publication_type == PublicationType.JOURNAL_ARTICLE
+        assert cars.ds_meta_data.tags == "cars,engines"
+        assert [author.name for author in cars.ds_meta_data.authors] == ["Roe, Richard"]
+        # Sin autores en el manifiesto, el autor sería el propietario, que aquí no tiene perfil
+        assert phones.ds_meta_data.authors == []
+        assert [fm.fm_meta_data.title for fm in cars.feature_models] == ["Engine", "shared"]
+        assert (cars.files_count, cars.total_size_in_bytes) == (2, sum(file.size for file in cars.files()))
+        assert [file.name for file in phones.files()] == ["screen.uvl"]
+
+        # El contenido repetido comparte el blob existente y el nuevo queda en el almacén
+        db.session.refresh(blob)
+        assert blob.ref_count == 2
+        for file in cars.files() + phones.files():
+            with open(file.get_path(), "rb") as stored:
+                assert hashlib.md5(stored.read()).hexdigest() == file.checksum
+
+        assert SearchTerm.query.filter_by(dataset_id=cars.id, term="turbo").count() == 0
+        assert SearchTerm.query.filter_by(dataset_id=cars.id, term="engines").count() == 1
+        assert SearchTerm.query.filter_by(dataset_id=phones.id, term="screen").count() == 1
+    finally:
+        for dataset_id in report["dataset_ids"]:
+            db.session.delete(db.session.get(UVLDataSet, dataset_id))
+        db.session.commit()
+    db.session.refresh(blob)
+    assert blob.ref_count == 1
+    assert existing.files_count == 1
+
+
+def test_scaled_seeder_bulk_inserts_consistent_datasets(test_client, tmp_path, monkeypatch):
+    import os
+
+    from app.modules.dataset.models import UVLDataSet
+    from app.modules.dataset.seeders import DataSetSeeder
+    from app.modules.explore.models import SearchTerm
+    from app.modules.featuremodel.models import FMMetrics
+    from app.modules.hubfile.models import Blob
+
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    templates = [os.path.join("app", "modules", "dataset", "uvl_examples", f"file{i}.uvl") for i in (1, 2)]
+    template_metrics = [FMMetrics(number_of_features=10), FMMetrics(number_of_features=None)]
+    datasets_before = UVLDataSet.query.count()
+
+    DataSetSeeder(scale=25).seed_synthetic_datasets(25, templates, template_metrics)
+
+    seeded = UVLDataSet.query.order_by(UVLDataSet.id).all()[datasets_before:]
+    try:
+        assert len(seeded) == 25
+        for dataset in seeded:
+            files = dataset.files()
+            # Los totales que mantendrían los listeners de Hubfile
+            assert (dataset.files_count, dataset.total_size_in_bytes) == (len(files), sum(f.size for f in files))
+            assert dataset.ds_meta_data.ds_metrics.number_of_models == len(files)
+            assert SearchTerm.query.filter_by(dataset_id=dataset.id).count() > 0
+            for file in files:
+                assert db.session.get(Blob, file.blob_id).ref_count == 1
+                with open(file.get_path(), "rb") as stored:
+                    assert hashlib.md5(stored.read()).hexdigest() == file.checksum
+        assert len({file.checksum for dataset in seeded for file in dataset.files()}) == sum(
+            dataset.files_count for dataset in seeded
+        )
+    finally:
+        for dataset in seeded:
+            db.session.delete(dataset)
+        db.session.commit()
+
+
+def test_uploaded_models_are_analysed_in_the_background(test_client, uvl_datasets):
+    from app.modules.featuremodel.analysis import analysis_queue
+
+    with open("app/modules/dataset/uvl_examples/file1.uvl", "rb") as example:
+        dataset = uvl_datasets({"file1.uvl": example.read()}, in_blob_store=True)
+    dataset_id, version = dataset.id, dataset.version
+    assert dataset.feature_models[0].fm_meta_data.fm_metrics is None
+
+    # La subida solo encola el dataset; el hilo del worker lo analiza (flush espera a que termine)
+    with test_client.application.app_context():
+        analysis_queue.schedule(dataset_id)
+        analysis_queue.flush()
+
+    db.session.expire_all()
+    dataset = db.session.get(DataSet, dataset_id)
+    assert dataset.feature_models[0].fm_meta_data.fm_metrics.number_of_features == 10
+    assert dataset.ds_meta_data.ds_metrics.number_of_models == 1
+    assert dataset.ds_meta_data.ds_metrics.number_of_features == 10
+    # La página cacheada del dataset deja de valer
+    assert dataset.version > version
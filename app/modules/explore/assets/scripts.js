@@ -2,6 +2,20 @@ document.addEventListener('DOMContentLoaded', () => {
     send_query();
 });
 
+// Cursor of the next page of the current search, null when there are no more results
+let nextCursor = null;
+
+function currentSearchCriteria() {
+    return {
+        csrf_token: document.getElementById('csrf_token').value,
+        query: document.querySelector('#query').value,
+        publication_type: document.querySelector('#publication_type').value,
+        sorting: document.querySelector('[name="sorting"]:checked').value,
+        min_features: document.querySelector('#min_features').value,
+        max_features: document.querySelector('#max_features').value,
+    };
+}
+
 function send_query() {
 
     console.log("send query...")
@@ -14,139 +28,165 @@ function send_query() {
 
     filters.forEach(filter => {
         filter.addEventListener('input', () => {
-            const csrfToken = document.getElementById('csrf_token').value;
-
-            const searchCriteria = {
-                csrf_token: csrfToken,
-                query: document.querySelector('#query').value,
-                publication_type: document.querySelector('#publication_type').value,
-                sorting: document.querySelector('[name="sorting"]:checked').value,
-            };
-
-            console.log(document.querySelector('#publication_type').value);
-
-            fetch('/explore', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify(searchCriteria),
-            })
-                .then(response => response.json())
-                .then(data => {
-
-                    console.log(data);
-                    document.getElementById('results').innerHTML = '';
-
-                    // results counter
-                    const resultCount = data.length;
-                    const resultText = resultCount === 1 ? 'dataset' : 'datasets';
-                    document.getElementById('results_number').textContent = `${resultCount} ${resultText} found`;
-
-                    if (resultCount === 0) {
-                        console.log("show not found icon");
-                        document.getElementById("results_not_found").style.display = "block";
-                    } else {
-                        document.getElementById("results_not_found").style.display = "none";
-                    }
-
-
-                    data.forEach(dataset => {
-                        let card = document.createElement('div');
-                        card.className = 'col-12';
-                        card.innerHTML = `
-                            <div class="card">
-                                <div class="card-body">
-                                    <div class="d-flex align-items-center justify-content-between">
-                                        <h3><a href="${dataset.dataset_doi ? dataset.url : '/dataset/view/' + dataset.id}">${dataset.title}</a></h3>
-                                        <div>
-                                            <span class="badge bg-primary" style="cursor: pointer;" onclick="set_publication_type_as_query('${dataset.publication_type}')">${dataset.publication_type}</span>
-                                        </div>
-                                    </div>
-                                    <p class="text-secondary">${formatDate(dataset.created_at)}</p>
-
-                                    <div class="row mb-2">
-
-                                        <div class="col-md-4 col-12">
-                                            <span class=" text-secondary">
-                                                Description
-                                            </span>
-                                        </div>
-                                        <div class="col-md-8 col-12">
-                                            <p class="card-text">${dataset.description}</p>
-                                        </div>
-
-                                    </div>
-
-                                    <div class="row mb-2">
-
-                                        <div class="col-md-4 col-12">
-                                            <span class=" text-secondary">
-                                                Authors
-                                            </span>
-                                        </div>
-                                        <div class="col-md-8 col-12">
-                                            ${dataset.authors.map(author => `
-                                                <p class="p-0 m-0">${author.name}${author.affiliation ? ` (${author.affiliation})` : ''}${author.orcid ? ` (${author.orcid})` : ''}</p>
-                                            `).join('')}
-                                        </div>
-
-                                    </div>
-
-                                    <div class="row mb-2">
-
-                                        <div class="col-md-4 col-12">
-                                            <span class=" text-secondary">
-                                                Tags
-                                            </span>
-                                        </div>
-                                        <div class="col-md-8 col-12">
-                                            ${dataset.tags.map(tag => `<span class="badge bg-primary me-1" style="cursor: pointer;" onclick="set_tag_as_query('${tag}')">${tag}</span>`).join('')}
-                                        </div>
-
-                                    </div>
-
-                                    <div class="row">
-
-                                        <div class="col-md-4 col-12">
-
-                                        </div>
-                                        <div class="col-md-8 col-12">
-                                            <a href="${dataset.url}" class="btn btn-outline-primary btn-sm" id="search" style="border-radius: 5px;">
-                                                View dataset
-                                            </a>
-                                            <a href="/dataset/download/${dataset.id}" class="btn btn-outline-primary btn-sm" id="search" style="border-radius: 5px;">
-                                                Download (${dataset.total_size_in_human_format})
-                                            </a>
-                                            <button
-                                                class="btn btn-primary btn-sm btn-add-to-cart"
-                                                data-dataset-id="${dataset.id}"
-                                                data-dataset-title="${dataset.title}"
-                                                id="add-btn-${dataset.id}"
-                                                style="border-radius: 5px;"
-                                            >
-                                                <i data-feather="plus-circle" class="center-button-icon"></i>
-                                                Add to my dataset
-                                            </button>
-                                        </div>
-                                    </div>
-                                </div>
-                            </div>
-                        `;
-
-                        document.getElementById('results').appendChild(card);
-
-                        // Conecta el Add to my datasets con el carrito
-                        const addBtn = document.getElementById(`add-btn-${dataset.id}`);
-                        if (addBtn) {
-                            addBtn.addEventListener('click', () => {
-                                addDatasetToSelection(dataset.id, dataset.title);
-                            });
-                        }
-                    });
-                });
+            fetch_results(null);
         });
     });
+
+    const loadMoreBtn = document.getElementById('load_more');
+    if (loadMoreBtn) {
+        loadMoreBtn.addEventListener('click', () => {
+            if (nextCursor) fetch_results(nextCursor);
+        });
+    }
+}
+
+function fetch_results(cursor) {
+    const searchCriteria = currentSearchCriteria();
+    if (cursor) searchCriteria.cursor = cursor;
+
+    fetch('/explore', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(searchCriteria),
+    })
+        .then(response => response.json())
+        .then(data => {
+
+            console.log(data);
+
+            // A new search starts from scratch, the next pages are appended
+            if (!cursor) {
+                document.getElementById('results').innerHTML = '';
+
+                // results counter
+                const resultCount = data.total;
+                const resultText = resultCount === 1 ? 'dataset' : 'datasets';
+                document.getElementById('results_number').textContent = `${resultCount} ${resultText} found`;
+
+                if (resultCount === 0) {
+                    console.log("show not found icon");
+                    document.getElementById("results_not_found").style.display = "block";
+                } else {
+                    document.getElementById("results_not_found").style.display = "none";
+                }
+            }
+
+            nextCursor = data.next_cursor;
+            const loadMoreBtn = document.getElementById('load_more');
+            if (loadMoreBtn) loadMoreBtn.style.display = nextCursor ? 'inline-block' : 'none';
+
+            data.items.forEach(dataset => render_dataset_card(dataset));
+        });
+}
+
+function render_dataset_card(dataset) {
+    let card = document.createElement('div');
+    card.className = 'col-12';
+    card.innerHTML = `
+        <div class="card">
+            <div class="card-body">
+                <div class="d-flex align-items-center justify-content-between">
+                    <h3><a href="${dataset.dataset_doi ? dataset.url : '/dataset/view/' + dataset.id}">${dataset.title}</a></h3>
+                    <div>
+                        <span class="badge bg-primary" style="cursor: pointer;" onclick="set_publication_type_as_query('${dataset.publication_type}')">${dataset.publication_type}</span>
+                    </div>
+                </div>
+                <p class="text-secondary">${formatDate(dataset.created_at)}</p>
+
+                <div class="row mb-2">
+
+                    <div class="col-md-4 col-12">
+                        <span class=" text-secondary">
+                            Description
+                        </span>
+                    </div>
+                    <div class="col-md-8 col-12">
+                        <p class="card-text">${dataset.description}</p>
+                    </div>
+
+                </div>
+
+                <div class="row mb-2">
+
+                    <div class="col-md-4 col-12">
+                        <span class=" text-secondary">
+                            Authors
+                        </span>
+                    </div>
+                    <div class="col-md-8 col-12">
+                        ${dataset.authors.map(author => `
+                            <p class="p-0 m-0">${author.name}${author.affiliation ? ` (${author.affiliation})` : ''}${author.orcid ? ` (${author.orcid})` : ''}</p>
+                        `).join('')}
+                    </div>
+
+                </div>
+
+                <div class="row mb-2">
+
+                    <div class="col-md-4 col-12">
+                        <span class=" text-secondary">
+                            Tags
+                        </span>
+                    </div>
+                    <div class="col-md-8 col-12">
+                        ${dataset.tags.map(tag => `<span class="badge bg-primary me-1" style="cursor: pointer;" onclick="set_tag_as_query('${tag}')">${tag}</span>`).join('')}
+                    </div>
+
+                </div>
+
+                ${dataset.number_of_features !== null ? `
+                <div class="row mb-2">
+
+                    <div class="col-md-4 col-12">
+                        <span class=" text-secondary">
+                            Features
+                        </span>
+                    </div>
+                    <div class="col-md-8 col-12">
+                        <p class="card-text">${dataset.number_of_features} in ${dataset.number_of_models} models</p>
+                    </div>
+
+                </div>` : ''}
+
+                <div class="row">
+
+                    <div class="col-md-4 col-12">
+
+                    </div>
+                    <div class="col-md-8 col-12">
+                        <a href="${dataset.url}" class="btn btn-outline-primary btn-sm" id="search" style="border-radius: 5px;">
+                            View dataset
+                        </a>
+                        <a href="/dataset/download/${dataset.id}" class="btn btn-outline-primary btn-sm" id="search" style="border-radius: 5px;">
+                            Download (${dataset.total_size_in_human_format})
+                        </a>
+                        <button
+                            class="btn btn-primary btn-sm btn-add-to-cart"
+                            data-dataset-id="${dataset.id}"
+                            data-dataset-title="${dataset.title}"
+                            id="add-btn-${dataset.id}"
+                            style="border-radius: 5px;"
+                        >
+                            <i data-feather="plus-circle" class="center-button-icon"></i>
+                            Add to my dataset
+                        </button>
+                    </div>
+                </div>
+            </div>
+        </div>
+    `;
+
+    document.getElementById('results').appendChild(card);
+
+    // Conecta el Add to my datasets con el carrito
+    const addBtn = document.getElementById(`add-btn-${dataset.id}`);
+    if (addBtn) {
+        addBtn.addEventListener('click', () => {
+            addDatasetToSelection(dataset.id, dataset.title);
+        });
+    }
 }
 
 function formatDate(dateString) {
@@ -279,6 +319,10 @@ function clearFilters() {
     publicationTypeSelect.value = "any"; // replace "any" with whatever your default value is
     // publicationTypeSelect.dispatchEvent(new Event('input', {bubbles: true}));
 
+    // Reset the bounds on the number of features
+    document.querySelector('#min_features').value = "";
+    document.querySelector('#max_features').value = "";
+
     // Reset the sorting option
     let sortingOptions = document.querySelectorAll('[name="sorting"]');
     sortingOptions.forEach(option => {
@@ -405,25 +449,16 @@ document.addEventListener('DOMContentLoaded', () => {
             let filename = document.getElementById('zip-filename').value || "models";
             dModal.style.display = 'none';
 
-            const csrfToken = document.getElementById('csrf_token').value;
-            const datasetIds = Array.from(selectedDatasets.keys()).map(id => parseInt(id));
-
-            fetch('/explore/download_cart', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json', 'X-CSRFToken': csrfToken },
-                body: JSON.stringify({ dataset_ids: datasetIds, filename: filename })
-            })
-            .then(res => res.ok ? res.blob() : res.text().then(t => { throw new Error(t) }))
-            .then(blob => {
-                const url = window.URL.createObjectURL(blob);
-                const a = document.createElement('a');
-                a.href = url;
-                a.download = filename.endsWith('.zip') ? filename : filename + '.zip';
-                document.body.appendChild(a);
-                a.click();
-                a.remove();
-            })
-            .catch(err => alert('Error downloading.'));
+            const datasetIds = Array.from(selectedDatasets.keys()).join(',');
+
+            // El navegador descarga el ZIP directamente (en streaming y reanudable) en vez de cargarlo en memoria
+            const params = new URLSearchParams({ dataset_ids: datasetIds, filename: filename });
+            const a = document.createElement('a');
+            a.href = `/explore/download_cart?${params.toString()}`;
+            a.download = filename.endsWith('.zip') ? filename : filename + '.zip';
+            document.body.appendChild(a);
+            a.click();
+            a.remove();
         };
     }
 });
@@ -1,45 +1,114 @@
 import re
+from collections import Counter
 
 import unidecode
-from sqlalchemy import any_, or_
+from sqlalchemy import Integer, and_, cast, delete, func, insert, or_, select, union_all
 
-from app.modules.dataset.models import Author, DataSet, DSMetaData, PublicationType
-from app.modules.featuremodel.models import FeatureModel, FMMetaData
+from app.modules.dataset.models import Author, DataSet, DSMetaData, DSMetrics, PublicationType
+from app.modules.explore.models import SearchTerm
+from app.modules.featuremodel.models import FeatureModel
+from app.modules.hubfile.models import Blob, Hubfile
 from core.repositories.BaseRepository import BaseRepository
 
+MAX_TERM_LENGTH = 64
+
+
+def tokenize(text):
+    """Normalizes a text the same way for indexing and querying and splits it into terms."""
+    normalized = unidecode.unidecode(text or "").lower()
+    cleaned = re.sub(r'[,.":\'()\[\]^;!¡¿?]', " ", normalized)
+    return [word[:MAX_TERM_LENGTH] for word in cleaned.split()]
+
+
+def collect_terms(weighted_texts):
+    """
+    Builds the postings of one dataset.
+
+    :param weighted_texts: Iterable of (text, weight) pairs.
+    :return: Counter mapping each term to the sum of the weights of the fields it appears in.
+    """
+    terms = Counter()
+    for text, weight in weighted_texts:
+        for term in set(tokenize(text)):
+            terms[term] += weight
+    return terms
+
+
+def prefix_upper_bound(word):
+    """Smallest string greater than every string starting with `word` (terms are lowercase ASCII)."""
+    return word[:-1] + chr(ord(word[-1]) + 1)
+
+
+def keyset_after(keys, values):
+    """
+    Condition selecting the rows that come strictly after `values` in the order given by `keys`, expanded as
+    (a > x) OR (a = x AND b > y) OR ... so that every backend can walk the index instead of offsetting.
+    """
+    clauses = []
+    for position, (name, column, descending) in enumerate(keys):
+        previous_equal = [keys[i][1] == values[keys[i][0]] for i in range(position)]
+        beyond = column < values[name] if descending else column > values[name]
+        clauses.append(and_(*previous_equal, beyond))
+    return or_(*clauses)
+
+
+class SearchTermRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(SearchTerm)
+
+    def replace_terms(self, dataset_id: int, terms: Counter):
+        self.session.execute(delete(self.model).where(self.model.dataset_id == dataset_id))
+        if terms:
+            self.session.execute(
+                insert(self.model),
+                [{"term": term, "dataset_id": dataset_id, "weight": weight} for term, weight in terms.items()],
+            )
+
+    def delete_all(self):
+        self.session.execute(delete(self.model))
+
 
 class ExploreRepository(BaseRepository):
     def __init__(self):
         super().__init__(DataSet)
 
-    def filter(self, query="", sorting="newest", publication_type="any", tags=[], **kwargs):
-        # Normalize and remove unwanted characters
-        normalized_query = unidecode.unidecode(query).lower()
-        cleaned_query = re.sub(r'[,.":\'()\[\]^;!¡¿?]', "", normalized_query)
-
-        filters = []
-        for word in cleaned_query.split():
-            filters.append(DSMetaData.title.ilike(f"%{word}%"))
-            filters.append(DSMetaData.description.ilike(f"%{word}%"))
-            filters.append(Author.name.ilike(f"%{word}%"))
-            filters.append(Author.affiliation.ilike(f"%{word}%"))
-            filters.append(Author.orcid.ilike(f"%{word}%"))
-            filters.append(FMMetaData.uvl_filename.ilike(f"%{word}%"))
-            filters.append(FMMetaData.title.ilike(f"%{word}%"))
-            filters.append(FMMetaData.description.ilike(f"%{word}%"))
-            filters.append(FMMetaData.publication_doi.ilike(f"%{word}%"))
-            filters.append(FMMetaData.tags.ilike(f"%{word}%"))
-            filters.append(DSMetaData.tags.ilike(f"%{word}%"))
-
-        datasets = (
-            self.model.query.join(DataSet.ds_meta_data)
-            .join(DSMetaData.authors)
-            # .join(DataSet.feature_models)
-            .join(FeatureModel.fm_meta_data)
-            .filter(or_(*filters))
-            # .filter(DSMetaData.dataset_doi.isnot(None))
+    def scores_for(self, words):
+        """
+        Ranks datasets by the summed weight of the indexed terms starting with each query word. Every word is
+        looked up on its own so that datasets matching more words rank higher, and prefixes are matched as a range
+        so the lookup is an index scan on every backend.
+
+        Only the start of terms is matched: unlike the ILIKE '%word%' search this replaced, "model" does not find
+        "featuremodel". Matching inside words would need a scan of every text or an n-gram index.
+        """
+        per_word = [
+            select(SearchTerm.dataset_id, SearchTerm.weight).where(
+                SearchTerm.term >= word, SearchTerm.term < prefix_upper_bound(word)
+            )
+            for word in words
+        ]
+        matches = (per_word[0] if len(per_word) == 1 else union_all(*per_word)).subquery()
+        return (
+            # SUM over an integer column is DECIMAL on MariaDB, which the page cursor could not encode
+            select(matches.c.dataset_id, cast(func.sum(matches.c.weight), Integer).label("score"))
+            .group_by(matches.c.dataset_id)
+            .subquery()
         )
 
+    def _apply_criteria(self, statement, query, publication_type, tags, min_features=None, max_features=None):
+        """
+        Narrows a statement over DataSet joined to DSMetaData to the explore criteria.
+
+        :return: The filtered statement and the relevance score column, or None when there is no query to rank.
+        """
+        words = tokenize(query)
+
+        score = None
+        if words:
+            scores = self.scores_for(words)
+            statement = statement.join(scores, scores.c.dataset_id == DataSet.id)
+            score = scores.c.score
+
         if publication_type != "any":
             matching_type = None
             for member in PublicationType:
@@ -48,15 +117,156 @@ class ExploreRepository(BaseRepository):
                     break
 
             if matching_type is not None:
-                datasets = datasets.filter(DSMetaData.publication_type == matching_type.name)
+                statement = statement.filter(DSMetaData.publication_type == matching_type.name)
 
         if tags:
-            datasets = datasets.filter(DSMetaData.tags.ilike(any_(f"%{tag}%" for tag in tags)))
+            statement = statement.filter(or_(*[DSMetaData.tags.ilike(f"%{tag}%") for tag in tags]))
+
+        # Bounds on the features of all the models of the dataset, as stored when they were analysed
+        if min_features is not None or max_features is not None:
+            metrics = select(DSMetrics.id)
+            if min_features is not None:
+                metrics = metrics.where(DSMetrics.number_of_features >= min_features)
+            if max_features is not None:
+                metrics = metrics.where(DSMetrics.number_of_features <= max_features)
+            statement = statement.filter(DSMetaData.ds_metrics_id.in_(metrics))
 
-        # Order by created_at
+        return statement, score
+
+    def sort_keys(self, sorting, score=None):
+        """
+        Total order of the results as (name, column, descending) triples. The id always breaks ties so that a keyset
+        cursor points to exactly one position.
+        """
+        # Order by relevance (only when there is something to rank), by size or by created_at
+        if sorting == "relevance" and score is not None:
+            return [("score", score, True), ("created_at", DataSet.created_at, True), ("id", DataSet.id, True)]
         if sorting == "oldest":
-            datasets = datasets.order_by(self.model.created_at.asc())
-        else:
-            datasets = datasets.order_by(self.model.created_at.desc())
+            return [("created_at", DataSet.created_at, False), ("id", DataSet.id, False)]
+        if sorting == "largest":
+            return [("total_size_in_bytes", DataSet.total_size_in_bytes, True), ("id", DataSet.id, True)]
+        if sorting == "smallest":
+            return [("total_size_in_bytes", DataSet.total_size_in_bytes, False), ("id", DataSet.id, False)]
+        return [("created_at", DataSet.created_at, True), ("id", DataSet.id, True)]
+
+    def filter(
+        self,
+        query="",
+        sorting="newest",
+        publication_type="any",
+        tags=[],
+        min_features=None,
+        max_features=None,
+        **kwargs,
+    ):
+        datasets, score = self._apply_criteria(
+            self.model.query.join(DataSet.ds_meta_data), query, publication_type, tags, min_features, max_features
+        )
+        keys = self.sort_keys(sorting, score)
+        return datasets.order_by(
+            *[column.desc() if descending else column.asc() for _, column, descending in keys]
+        ).all()
+
+    def count_matching(self, query="", publication_type="any", tags=[], min_features=None, max_features=None) -> int:
+        statement, _ = self._apply_criteria(
+            select(func.count(DataSet.id))
+            .select_from(DataSet)
+            .join(DSMetaData, DataSet.ds_meta_data_id == DSMetaData.id),
+            query,
+            publication_type,
+            tags,
+            min_features,
+            max_features,
+        )
+        return self.session.execute(statement).scalar_one()
+
+    def list_page(
+        self,
+        query="",
+        sorting="newest",
+        publication_type="any",
+        tags=[],
+        min_features=None,
+        max_features=None,
+        after=None,
+        limit=20,
+    ):
+        """
+        One page of results projected to the columns that the explore cards show.
+
+        :param after: Sort key values (keyed by name, as given by sort_keys) of the last row of the previous page.
+        :param limit: Maximum number of rows to return.
+        :return: The rows and the sort keys used to order them.
+        """
+        statement, score = self._apply_criteria(
+            self._cards(), query, publication_type, tags, min_features, max_features
+        )
+        keys = self.sort_keys(sorting, score)
+        if score is not None:
+            statement = statement.add_columns(score.label("score"))
+
+        if after is not None:
+            statement = statement.where(keyset_after(keys, after))
+
+        statement = statement.order_by(
+            *[column.desc() if descending else column.asc() for _, column, descending in keys]
+        ).limit(limit)
+        return self.session.execute(statement).all(), keys
+
+    def latest_synchronized(self, limit=5):
+        """The most recent datasets with a DOI, projected like list_page."""
+        statement = self._cards().where(DSMetaData.dataset_doi.isnot(None)).order_by(DataSet.id.desc()).limit(limit)
+        return self.session.execute(statement).all()
+
+    def _cards(self):
+        return (
+            select(
+                DataSet.id,
+                DataSet.created_at,
+                DataSet.dataset_type,
+                DataSet.download_count,
+                DataSet.files_count,
+                DataSet.total_size_in_bytes,
+                DataSet.ds_meta_data_id,
+                DSMetaData.title,
+                DSMetaData.description,
+                DSMetaData.publication_type,
+                DSMetaData.publication_doi,
+                DSMetaData.dataset_doi,
+                DSMetaData.deposition_id,
+                DSMetaData.tags,
+                DSMetrics.number_of_models,
+                DSMetrics.number_of_features,
+            )
+            .select_from(DataSet)
+            .join(DSMetaData, DataSet.ds_meta_data_id == DSMetaData.id)
+            .outerjoin(DSMetrics, DSMetaData.ds_metrics_id == DSMetrics.id)
+        )
+
+    def authors_for(self, ds_meta_data_ids):
+        if not ds_meta_data_ids:
+            return []
+        return self.session.execute(
+            select(Author.ds_meta_data_id, Author.name, Author.affiliation, Author.orcid)
+            .where(Author.ds_meta_data_id.in_(ds_meta_data_ids))
+            .order_by(Author.id)
+        ).all()
 
-        return datasets.all()
+    def cart_files(self, dataset_ids):
+        """
+        (dataset id, owner id, file name, blob checksum, CRC-32, size and creation time, all None for files without
+        a blob) of every file of the given datasets in one query, keeping the order in which the datasets were
+        selected.
+        """
+        if not dataset_ids:
+            return []
+        rows = self.session.execute(
+            select(DataSet.id, DataSet.user_id, Hubfile.name, Blob.checksum, Blob.crc32, Blob.size, Blob.created_at)
+            .join(FeatureModel, FeatureModel.data_set_id == DataSet.id)
+            .join(Hubfile, Hubfile.feature_model_id == FeatureModel.id)
+            .outerjoin(Blob, Hubfile.blob_id == Blob.id)
+            .where(DataSet.id.in_(dataset_ids))
+            .order_by(Hubfile.id)
+        ).all()
+        position = {dataset_id: index for index, dataset_id in reversed(list(enumerate(dataset_ids)))}
+        return sorted(rows, key=lambda row: position[row.id])
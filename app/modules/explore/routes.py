@@ -1,12 +1,13 @@
 import logging
 
-from flask import jsonify, render_template, request, send_file
+from flask import Response, jsonify, render_template, request
 from flask_login import current_user, login_required
+from werkzeug.utils import secure_filename
 
 from app.modules.dataset.services import DataSetService
 from app.modules.explore import explore_bp
 from app.modules.explore.forms import ExploreForm
-from app.modules.explore.services import ExploreService
+from app.modules.explore.services import PAGE_SIZE, ExploreService
 
 logger = logging.getLogger(__name__)
 
@@ -25,14 +26,20 @@ def index():
         explore_service = ExploreService()
 
         # Incluir datasets no sincronizados
-        datasets = explore_service.filter(
-            query=criteria.get("query", ""),
-            sorting=criteria.get("sorting", "newest"),
-            publication_type=criteria.get("publication_type", "any"),
-            tags=criteria.get("tags", []),
-            include_unsynchronized=True,
-        )
-        return jsonify([dataset.to_dict() for dataset in datasets])
+        try:
+            page = explore_service.filter_page(
+                query=criteria.get("query", ""),
+                sorting=criteria.get("sorting", "newest"),
+                publication_type=criteria.get("publication_type", "any"),
+                tags=criteria.get("tags", []),
+                min_features=criteria.get("min_features"),
+                max_features=criteria.get("max_features"),
+                cursor=criteria.get("cursor"),
+                limit=criteria.get("limit", PAGE_SIZE),
+            )
+        except ValueError as e:
+            return jsonify({"success": False, "message": str(e)}), 400
+        return jsonify(page)
 
 
 @explore_bp.route("/explore/create-dataset-from-cart", methods=["POST"])
@@ -69,12 +76,17 @@ def create_dataset_from_cart():
         return jsonify({"success": False, "message": f"Error creating dataset: {str(e)}"}), 500
 
 
-@explore_bp.route("/explore/download_cart", methods=["POST"])
+@explore_bp.route("/explore/download_cart", methods=["GET", "POST"])
 def download_cart():
+    # GET permite que el navegador descargue directamente y reanude con Range
     try:
-        data = request.get_json()
-        dataset_ids = data.get("dataset_ids", [])
-        filename = data.get("filename", "my_uvlhub_models")
+        if request.method == "POST":
+            data = request.get_json()
+            dataset_ids = data.get("dataset_ids", [])
+            filename = data.get("filename", "my_uvlhub_models")
+        else:
+            dataset_ids = [int(id.strip()) for id in request.args.get("dataset_ids", "").split(",") if id.strip()]
+            filename = request.args.get("filename", "my_uvlhub_models")
 
         if not filename.endswith(".zip"):
             filename += ".zip"
@@ -83,13 +95,25 @@ def download_cart():
             return jsonify({"success": False, "message": "No datasets selected"}), 400
 
         explore_service = ExploreService()
-        zip_buffer = explore_service.generate_zip_from_cart(dataset_ids)
+        zip_stream = explore_service.generate_zip_from_cart(dataset_ids)
+
+        # Se comprueba antes de enviar las cabeceras: a mitad de descarga solo se podría cortar
+        missing = zip_stream.missing_files()
+        if missing:
+            logger.error(f"Cart download refused, files missing from storage: {missing}")
+            return jsonify({"success": False, "message": f"{len(missing)} files are missing from storage"}), 500
 
-        return send_file(
-            zip_buffer,
+        # Se puede posicionar, así que una petición Range empieza a leer en el fichero que contiene el offset
+        response = Response(
+            zip_stream.reader(),
             mimetype="application/zip",
-            as_attachment=True,
-            download_name=filename,
+            headers={"Content-Disposition": f"attachment; filename={secure_filename(filename) or 'models.zip'}"},
         )
+        response.content_length = zip_stream.size()
+        response.accept_ranges = "bytes"
+        response.set_etag(zip_stream.etag())
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
+
+    # Responde 206 a las peticiones Range (y 416 si no se pueden satisfacer)
+    return response.make_conditional(request, accept_ranges=True, complete_length=response.content_length)
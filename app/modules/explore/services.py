@@ -1,11 +1,121 @@
-import io
+import base64
+import binascii
+import json
 import os
-import zipfile
+from collections import defaultdict
+from datetime import datetime, timezone
+from decimal import Decimal
 
-from flask import current_app
+from flask import request
 
-from app.modules.explore.repositories import ExploreRepository
+from app.modules.explore.repositories import ExploreRepository, SearchTermRepository, collect_terms
+from core.archives.zip_stream import ZIP_STORED, ZipStream
 from core.services.BaseService import BaseService
+from core.storage.resolver import stored_file_path
+
+# Relative importance of every searchable field when ranking explore results
+FIELD_WEIGHTS = {
+    "title": 5,
+    "tags": 4,
+    "author_name": 3,
+    "author_orcid": 3,
+    "uvl_filename": 3,
+    "fm_title": 3,
+    "fm_tags": 3,
+    "author_affiliation": 2,
+    "description": 1,
+    "fm_description": 1,
+    "fm_publication_doi": 1,
+}
+
+# DSMetaData columns whose changes require the dataset to be reindexed
+INDEXED_DSMETADATA_FIELDS = {"title", "description", "tags"}
+
+# Explore results per page, by default and at most
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(sorting, row, keys):
+    """Opaque, URL-safe token with the sort key values of the last row of a page."""
+    values = {}
+    for name, _, _ in keys:
+        value = getattr(row, name)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif isinstance(value, Decimal):
+            # Scores are sums of integer weights
+            value = int(value)
+        values[name] = value
+    payload = json.dumps({"sorting": sorting, "after": values}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor, sorting):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        after = payload["after"]
+        if payload["sorting"] != sorting:
+            raise ValueError("The cursor was issued for another sorting")
+        if "created_at" in after:
+            after["created_at"] = datetime.fromisoformat(after["created_at"])
+        return after
+    except (binascii.Error, UnicodeError, TypeError, KeyError, json.JSONDecodeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def searchable_texts(dataset):
+    ds_meta_data = dataset.ds_meta_data
+    # Only UVL datasets have feature models
+    fm_meta_datas = [fm.fm_meta_data for fm in getattr(dataset, "feature_models", []) if fm.fm_meta_data]
+    return metadata_texts(ds_meta_data, ds_meta_data.authors, fm_meta_datas)
+
+
+def metadata_texts(ds_meta_data, authors, fm_meta_datas):
+    """
+    The weighted texts of a dataset, from anything with the attributes of DSMetaData, Author and FMMetaData (the bulk
+    import indexes its datasets before loading them).
+    """
+    yield ds_meta_data.title, FIELD_WEIGHTS["title"]
+    yield ds_meta_data.description, FIELD_WEIGHTS["description"]
+    yield ds_meta_data.tags, FIELD_WEIGHTS["tags"]
+
+    for author in authors:
+        yield author.name, FIELD_WEIGHTS["author_name"]
+        yield author.affiliation, FIELD_WEIGHTS["author_affiliation"]
+        yield author.orcid, FIELD_WEIGHTS["author_orcid"]
+
+    for fm_meta_data in fm_meta_datas:
+        yield fm_meta_data.uvl_filename, FIELD_WEIGHTS["uvl_filename"]
+        yield fm_meta_data.title, FIELD_WEIGHTS["fm_title"]
+        yield fm_meta_data.description, FIELD_WEIGHTS["fm_description"]
+        yield fm_meta_data.publication_doi, FIELD_WEIGHTS["fm_publication_doi"]
+        yield fm_meta_data.tags, FIELD_WEIGHTS["fm_tags"]
+
+
+class SearchIndexService(BaseService):
+    def __init__(self):
+        super().__init__(SearchTermRepository())
+
+    def index_dataset(self, dataset, commit: bool = False):
+        """
+        Rebuilds the postings of a single dataset. By default it joins the caller's transaction, so the index is
+        committed together with the dataset changes that triggered it.
+        """
+        self.repository.replace_terms(dataset.id, collect_terms(searchable_texts(dataset)))
+        if commit:
+            self.repository.session.commit()
+
+    def reindex_all(self) -> int:
+        from app.modules.dataset.models import DataSet
+
+        self.repository.delete_all()
+        indexed = 0
+        for dataset in DataSet.query.yield_per(500):
+            self.index_dataset(dataset)
+            indexed += 1
+        self.repository.session.commit()
+        return indexed
 
 
 class ExploreService(BaseService):
@@ -15,46 +125,109 @@ class ExploreService(BaseService):
     def filter(self, query="", sorting="newest", publication_type="any", tags=[], **kwargs):
         return self.repository.filter(query, sorting, publication_type, tags, **kwargs)
 
-    def generate_zip_from_cart(self, dataset_ids):
-        from app.modules.dataset.services import DataSetService
-
-        dataset_service = DataSetService()
-
-        memory_file = io.BytesIO()
-
-        possible_roots = [
-            current_app.config.get("UPLOAD_FOLDER"),
-            os.path.join(os.getcwd(), "uploads"),
-            os.path.join(current_app.root_path, "uploads"),
-        ]
+    def filter_page(
+        self,
+        query="",
+        sorting="newest",
+        publication_type="any",
+        tags=[],
+        min_features=None,
+        max_features=None,
+        cursor=None,
+        limit=PAGE_SIZE,
+    ):
+        """
+        Keyset-paginated explore results as lightweight dictionaries for the result cards.
+
+        A page always costs the same queries (rows and authors, plus the match count on the first page)
+        no matter how many datasets match, and nothing is lazy loaded.
+
+        :param min_features: Least total number of features of the models of a dataset, None for no bound.
+        :param max_features: Greatest total number of features, None for no bound.
+        :param cursor: The next_cursor of the previous page, or None for the first page.
+        :raises ValueError: If the cursor is malformed or was issued for another sorting, or a bound is not a number.
+        """
+        limit = max(1, min(int(limit or PAGE_SIZE), MAX_PAGE_SIZE))
+        after = decode_cursor(cursor, sorting) if cursor else None
+        bounds = {
+            "min_features": int(min_features) if min_features not in (None, "") else None,
+            "max_features": int(max_features) if max_features not in (None, "") else None,
+        }
+
+        # One extra row tells whether there is a next page
+        rows, keys = self.repository.list_page(
+            query, sorting, publication_type, tags, **bounds, after=after, limit=limit + 1
+        )
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        return {
+            "items": self._list_items(rows),
+            "next_cursor": encode_cursor(sorting, rows[-1], keys) if has_more else None,
+            "total": None if cursor else self.repository.count_matching(query, publication_type, tags, **bounds),
+        }
+
+    def latest_synchronized(self, limit=5):
+        """The most recent datasets with a DOI, as the same dictionaries as filter_page, in two queries."""
+        return self._list_items(self.repository.latest_synchronized(limit))
+
+    def _list_items(self, rows):
+        authors = defaultdict(list)
+        for author in self.repository.authors_for([row.ds_meta_data_id for row in rows]):
+            authors[author.ds_meta_data_id].append(
+                {"name": author.name, "affiliation": author.affiliation, "orcid": author.orcid}
+            )
+        return [self._list_item(row, authors[row.ds_meta_data_id]) for row in rows]
+
+    def _list_item(self, row, authors):
+        from app.modules.dataset.services import SizeService
+
+        domain = os.getenv("DOMAIN", "localhost")
+        return {
+            "id": row.id,
+            "title": row.title,
+            "description": row.description,
+            "created_at": row.created_at,
+            "created_at_timestamp": int(row.created_at.timestamp()),
+            "authors": authors,
+            "publication_type": row.publication_type.name.replace("_", " ").title(),
+            "publication_doi": row.publication_doi,
+            "dataset_doi": row.dataset_doi,
+            "tags": row.tags.split(",") if row.tags else [],
+            "url": f"http://{domain}/doi/{row.dataset_doi}" if row.dataset_doi else f"/dataset/view/{row.id}",
+            "download": f'{request.host_url.rstrip("/")}/dataset/download/{row.id}',
+            "zenodo": f"https://zenodo.org/record/{row.deposition_id}" if row.dataset_doi else None,
+            "download_count": row.download_count,
+            "dataset_type": row.dataset_type,
+            "files_count": row.files_count,
+            "number_of_models": row.number_of_models,
+            "number_of_features": row.number_of_features,
+            "total_size_in_bytes": row.total_size_in_bytes,
+            "total_size_in_human_format": SizeService().get_human_readable_size(row.total_size_in_bytes),
+        }
 
-        with zipfile.ZipFile(memory_file, "w", zipfile.ZIP_DEFLATED) as zf:
-            for dataset_id in dataset_ids:
-                try:
-                    dataset = dataset_service.get_or_404(dataset_id)
-
-                    user_folder = f"user_{dataset.user_id}"
-                    dataset_folder = f"dataset_{dataset.id}"
-
-                    for file in dataset.files():
-                        file_name = file.name
-
-                        for root in possible_roots:
-                            if not root or not os.path.exists(root):
-                                continue
-
-                            path_struct = os.path.join(root, user_folder, dataset_folder, file_name)
-                            if os.path.exists(path_struct):
-                                zf.write(path_struct, f"{dataset.id}_{file_name}")
-                                break
-
-                            path_flat = os.path.join(root, file_name)
-                            if os.path.exists(path_flat):
-                                zf.write(path_flat, f"{dataset.id}_{file_name}")
-                                break
-
-                except Exception:
-                    continue
-
-        memory_file.seek(0)
-        return memory_file
+    def generate_zip_from_cart(self, dataset_ids):
+        """
+        Plans the archive of a cart. All the files of the selected datasets are loaded in a single query and their
+        paths resolved once; nothing is read until the returned ZipStream is iterated.
+
+        Entries are stored rather than deflated so the archive has a known length and can be served in ranges,
+        which lets big carts be resumed. The size and CRC of files kept as blobs come from the database, so those
+        files are not stat'ed up front and their entries go without a data descriptor.
+        """
+        zip_stream = ZipStream(compression=ZIP_STORED)
+        for dataset_id, user_id, file_name, blob_checksum, crc32, size, created_at in self.repository.cart_files(
+            dataset_ids
+        ):
+            path = stored_file_path(user_id, dataset_id, file_name, blob_checksum)
+            if blob_checksum is None:
+                zip_stream.add_file(path, f"{dataset_id}_{file_name}")
+                continue
+            zip_stream.add_file(
+                path,
+                f"{dataset_id}_{file_name}",
+                size=size,
+                crc32=int(crc32, 16),
+                mtime=created_at.replace(tzinfo=timezone.utc).timestamp(),
+            )
+        return zip_stream
@@ -0,0 +1,192 @@
+"""
+Search latency benchmark for explore.
+
+Seeds synthetic datasets (with one author and one feature model each) into the TESTING database and compares the
+legacy per-word ILIKE fan-out with the inverted index behind ExploreRepository.filter at growing catalogue sizes.
+
+WARNING: the testing database is dropped and recreated, exactly as the pytest fixtures do.
+
+Usage:
+    python -m app.modules.explore.tests.benchmark_search --sizes 10000,100000,1000000 --runs 20
+"""
+
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+from faker import Faker
+from sqlalchemy import insert, or_
+
+from app import create_app, db
+from app.modules.auth.models import User
+from app.modules.dataset.models import Author, DataSet, DSMetaData, PublicationType
+from app.modules.explore.models import SearchTerm
+from app.modules.explore.repositories import ExploreRepository, collect_terms, tokenize
+from app.modules.explore.services import FIELD_WEIGHTS
+from app.modules.featuremodel.models import FeatureModel, FMMetaData
+
+BATCH_SIZE = 5000
+
+
+def legacy_filter(query):
+    """The ILIKE fan-out that ExploreRepository.filter used before the search index."""
+    filters = []
+    for word in tokenize(query):
+        for column in (
+            DSMetaData.title,
+            DSMetaData.description,
+            Author.name,
+            Author.affiliation,
+            Author.orcid,
+            FMMetaData.uvl_filename,
+            FMMetaData.title,
+            FMMetaData.description,
+            FMMetaData.publication_doi,
+            FMMetaData.tags,
+            DSMetaData.tags,
+        ):
+            filters.append(column.ilike(f"%{word}%"))
+
+    return (
+        DataSet.query.join(DataSet.ds_meta_data)
+        .join(DSMetaData.authors)
+        .join(FeatureModel, FeatureModel.data_set_id == DataSet.id)
+        .join(FeatureModel.fm_meta_data)
+        .filter(or_(*filters))
+        .order_by(DataSet.created_at.desc())
+        .all()
+    )
+
+
+def seed(start, end, user_id, vocabulary, rng):
+    created_at = datetime.now(timezone.utc)
+    for batch_start in range(start, end, BATCH_SIZE):
+        ids = range(batch_start + 1, min(batch_start + BATCH_SIZE, end) + 1)
+        ds_meta_data, datasets, authors, fm_meta_data, feature_models, terms = [], [], [], [], [], []
+        for i in ids:
+            title = " ".join(rng.sample(vocabulary, 4))
+            description = " ".join(rng.sample(vocabulary, 25))
+            tags = ",".join(rng.sample(vocabulary, 3))
+            author_name = " ".join(rng.sample(vocabulary, 2)).title()
+            affiliation = f"University of {rng.choice(vocabulary).title()}"
+            uvl_filename = f"{rng.choice(vocabulary)}_{i}.uvl"
+
+            ds_meta_data.append(
+                {
+                    "id": i,
+                    "title": title,
+                    "description": description,
+                    "publication_type": PublicationType.JOURNAL_ARTICLE.name,
+                    "tags": tags,
+                }
+            )
+            datasets.append(
+                {
+                    "id": i,
+                    "user_id": user_id,
+                    "ds_meta_data_id": i,
+                    "created_at": created_at - timedelta(minutes=i),
+                    "dataset_type": "generic_dataset",
+                }
+            )
+            authors.append({"id": i, "name": author_name, "affiliation": affiliation, "ds_meta_data_id": i})
+            fm_meta_data.append(
+                {
+                    "id": i,
+                    "uvl_filename": uvl_filename,
+                    "title": title,
+                    "description": description,
+                    "publication_type": PublicationType.NONE.name,
+                    "tags": tags,
+                }
+            )
+            feature_models.append({"id": i, "data_set_id": i, "fm_meta_data_id": i})
+
+            postings = collect_terms(
+                [
+                    (title, FIELD_WEIGHTS["title"]),
+                    (description, FIELD_WEIGHTS["description"]),
+                    (tags, FIELD_WEIGHTS["tags"]),
+                    (author_name, FIELD_WEIGHTS["author_name"]),
+                    (affiliation, FIELD_WEIGHTS["author_affiliation"]),
+                    (uvl_filename, FIELD_WEIGHTS["uvl_filename"]),
+                    (title, FIELD_WEIGHTS["fm_title"]),
+                    (description, FIELD_WEIGHTS["fm_description"]),
+                    (tags, FIELD_WEIGHTS["fm_tags"]),
+                ]
+            )
+            terms.extend({"term": term, "dataset_id": i, "weight": weight} for term, weight in postings.items())
+
+        for model, rows in (
+            (DSMetaData, ds_meta_data),
+            (DataSet, datasets),
+            (Author, authors),
+            (FMMetaData, fm_meta_data),
+            (FeatureModel, feature_models),
+            (SearchTerm, terms),
+        ):
+            db.session.execute(insert(model.__table__), rows)
+        db.session.commit()
+
+
+def measure(function, queries, runs):
+    timings = []
+    for run in range(runs):
+        query = queries[run % len(queries)]
+        started = time.perf_counter()
+        function(query)
+        timings.append((time.perf_counter() - started) * 1000)
+        db.session.expunge_all()
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Comma separated catalogue sizes.")
+    parser.add_argument("--runs", type=int, default=20, help="Queries measured per size and strategy.")
+    parser.add_argument("--skip-legacy", action="store_true", help="Do not measure the ILIKE fan-out.")
+    args = parser.parse_args()
+
+    sizes = sorted(int(size) for size in args.sizes.split(","))
+    rng = random.Random(42)
+    fake = Faker()
+    fake.seed_instance(42)
+    vocabulary = sorted(set(fake.get_words_list()) | {fake.last_name().lower() for _ in range(5000)})
+    queries = [" ".join(rng.sample(vocabulary, rng.randint(1, 3))) for _ in range(args.runs)]
+    repository = ExploreRepository()
+
+    app = create_app("testing")
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        user = User(email="benchmark@example.com", password="benchmark")
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+
+        print(f"{'datasets':>10} | {'legacy p50':>11} | {'legacy p95':>11} | {'index p50':>10} | {'index p95':>10}")
+        seeded = 0
+        for size in sizes:
+            seed(seeded, size, user_id, vocabulary, rng)
+            seeded = size
+
+            index_p50, index_p95 = measure(
+                lambda q: repository.filter(query=q, sorting="relevance"), queries, args.runs
+            )
+            legacy_p50 = legacy_p95 = float("nan")
+            if not args.skip_legacy:
+                legacy_p50, legacy_p95 = measure(legacy_filter, queries, args.runs)
+
+            print(
+                f"{size:>10} | {legacy_p50:>9.1f}ms | {legacy_p95:>9.1f}ms | {index_p50:>8.1f}ms | {index_p95:>8.1f}ms"
+            )
+
+        db.session.remove()
+        db.drop_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import os
 from unittest.mock import MagicMock, patch
 
 import pytest
@@ -184,3 +185,333 @@ def test_session_cart_logic(test_client):
         assert 1 not in sess["cart"]
         assert 2 in sess["cart"]
         assert len(sess["cart"]) == 1
+
+
+# --- TESTS DEL ÍNDICE DE BÚSQUEDA ---
+
+
+@pytest.fixture
+def indexed_datasets(test_client):
+    """
+    Crea dos datasets indexados: uno con 'automotive' en el título y otro que solo lo menciona en la descripción.
+    """
+    from app.modules.dataset.models import Author
+    from app.modules.explore.services import SearchIndexService
+
+    user = User.query.filter_by(email="search_tester@example.com").first()
+    if not user:
+        user = User(email="search_tester@example.com", password="password123")
+        db.session.add(user)
+        db.session.commit()
+
+    meta1 = DSMetaData(
+        title="Automotive product lines",
+        description="Variability of cars",
+        publication_type=PublicationType.JOURNAL_ARTICLE,
+        tags="cars,industry",
+    )
+    meta2 = DSMetaData(
+        title="Mobile phones",
+        description="Some automotive examples too",
+        publication_type=PublicationType.REPORT,
+        tags="phones",
+    )
+    db.session.add_all([meta1, meta2])
+    db.session.commit()
+    db.session.add(Author(name="Ada Lovelace", affiliation="University of Seville", ds_meta_data_id=meta2.id))
+
+    ds1 = DataSet(user_id=user.id, ds_meta_data_id=meta1.id)
+    ds2 = DataSet(user_id=user.id, ds_meta_data_id=meta2.id)
+    db.session.add_all([ds1, ds2])
+    db.session.commit()
+
+    search_index_service = SearchIndexService()
+    search_index_service.index_dataset(ds1)
+    search_index_service.index_dataset(ds2, commit=True)
+
+    yield {"ds1_id": ds1.id, "ds2_id": ds2.id, "meta1_id": meta1.id}
+
+    db.session.rollback()
+    from app.modules.explore.models import SearchTerm
+
+    SearchTerm.query.filter(SearchTerm.dataset_id.in_([ds1.id, ds2.id])).delete()
+    DataSet.query.filter(DataSet.id.in_([ds1.id, ds2.id])).delete()
+    Author.query.filter_by(ds_meta_data_id=meta2.id).delete()
+    DSMetaData.query.filter(DSMetaData.id.in_([meta1.id, meta2.id])).delete()
+    User.query.filter_by(id=user.id).delete()
+    db.session.commit()
+
+
+def test_search_index_ranks_title_matches_first(test_client, indexed_datasets):
+    from app.modules.explore.services import ExploreService
+
+    results = ExploreService().filter(query="automotive", sorting="relevance")
+
+    assert [dataset.id for dataset in results] == [indexed_datasets["ds1_id"], indexed_datasets["ds2_id"]]
+
+
+def test_search_index_prefix_match_and_publication_type(test_client, indexed_datasets):
+    from app.modules.explore.services import ExploreService
+
+    explore_service = ExploreService()
+
+    # "lovel" es prefijo del nombre del autor, "sevil" de su afiliación
+    assert [d.id for d in explore_service.filter(query="lovel")] == [indexed_datasets["ds2_id"]]
+    assert [d.id for d in explore_service.filter(query="Sevil")] == [indexed_datasets["ds2_id"]]
+    assert explore_service.filter(query="automotive", publication_type="report")[0].id == indexed_datasets["ds2_id"]
+    assert explore_service.filter(query="nonexistentword") == []
+
+
+def test_search_matches_only_the_start_of_words(test_client, indexed_datasets):
+    from app.modules.explore.services import ExploreService
+
+    explore_service = ExploreService()
+
+    # Las palabras se buscan como prefijo de cualquier palabra indexada, sin distinguir mayúsculas
+    assert [d.id for d in explore_service.filter(query="AUTO", sorting="relevance")] == [
+        indexed_datasets["ds1_id"],
+        indexed_datasets["ds2_id"],
+    ]
+    # Un texto en mitad de una palabra no coincide, ni siquiera en el título ("motive" de "Automotive")
+    assert explore_service.filter(query="motive") == []
+    assert explore_service.filter(query="obile") == []
+
+
+def test_update_dsmetadata_reindexes_dataset(test_client, indexed_datasets):
+    from app.modules.dataset.services import DataSetService
+    from app.modules.explore.services import ExploreService
+
+    DataSetService().update_dsmetadata(indexed_datasets["meta1_id"], title="Renamed trains dataset")
+
+    results = ExploreService().filter(query="trains")
+    assert [dataset.id for dataset in results] == [indexed_datasets["ds1_id"]]
+
+
+# --- TESTS DE LA PAGINACIÓN DE EXPLORE ---
+
+
+def test_explore_pages_with_keyset_cursor(test_client, indexed_datasets):
+    criteria = {"query": "automotive", "sorting": "relevance", "publication_type": "any", "limit": 1}
+
+    first = test_client.post("/explore", json=criteria).get_json()
+    assert first["total"] == 2
+    assert [item["id"] for item in first["items"]] == [indexed_datasets["ds1_id"]]
+    assert first["items"][0]["files_count"] == 0
+    assert first["items"][0]["tags"] == ["cars", "industry"]
+    assert first["next_cursor"]
+
+    second = test_client.post("/explore", json={**criteria, "cursor": first["next_cursor"]}).get_json()
+    assert [item["id"] for item in second["items"]] == [indexed_datasets["ds2_id"]]
+    assert second["items"][0]["authors"][0]["name"] == "Ada Lovelace"
+    assert second["next_cursor"] is None
+
+
+def test_explore_pages_through_relevance_sorted_results(test_client, indexed_datasets):
+    from datetime import datetime
+    from decimal import Decimal
+    from types import SimpleNamespace
+
+    from app.modules.explore.repositories import ExploreRepository
+    from app.modules.explore.services import decode_cursor, encode_cursor
+
+    # Recorre página a página todos los resultados ordenados por relevancia
+    criteria = {"query": "automotive cars", "sorting": "relevance", "publication_type": "any", "limit": 1}
+    seen, cursor = [], None
+    while True:
+        page = test_client.post("/explore", json={**criteria, "cursor": cursor}).get_json()
+        seen += [item["id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert seen == [indexed_datasets["ds1_id"], indexed_datasets["ds2_id"]]
+
+    # MariaDB devuelve la suma de pesos como DECIMAL: el cursor se sigue pudiendo construir
+    keys = ExploreRepository().sort_keys("relevance", score=object())
+    row = SimpleNamespace(score=Decimal("9"), created_at=datetime(2026, 1, 1), id=7)
+    assert decode_cursor(encode_cursor("relevance", row, keys), "relevance")["score"] == 9
+
+
+def test_explore_rejects_invalid_cursor(test_client, indexed_datasets):
+    first = test_client.post("/explore", json={"sorting": "newest", "limit": 1}).get_json()
+
+    response = test_client.post("/explore", json={"sorting": "newest", "cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+    # Un cursor solo vale para la ordenación con la que se emitió
+    response = test_client.post("/explore", json={"sorting": "oldest", "cursor": first["next_cursor"]})
+    assert response.status_code == 400
+
+
+def test_explore_filters_by_number_of_features(test_client, indexed_datasets):
+    from app.modules.dataset.models import DSMetrics
+
+    metrics = DSMetrics(number_of_models=3, number_of_features=30)
+    db.session.add(metrics)
+    db.session.commit()
+    db.session.get(DSMetaData, indexed_datasets["meta1_id"]).ds_metrics_id = metrics.id
+    db.session.commit()
+
+    try:
+        criteria = {"query": "automotive", "min_features": 20, "max_features": "40"}
+        page = test_client.post("/explore", json=criteria).get_json()
+        assert page["total"] == 1
+        assert page["items"][0]["id"] == indexed_datasets["ds1_id"]
+        assert page["items"][0]["number_of_features"] == 30
+        assert page["items"][0]["number_of_models"] == 3
+
+        # Los datasets sin analizar no cumplen ninguna cota, pero sí aparecen sin ellas
+        assert test_client.post("/explore", json={**criteria, "min_features": 31}).get_json()["total"] == 0
+        assert test_client.post("/explore", json={"query": "automotive", "min_features": ""}).get_json()["total"] == 2
+        assert test_client.post("/explore", json={**criteria, "max_features": "many"}).status_code == 400
+    finally:
+        db.session.get(DSMetaData, indexed_datasets["meta1_id"]).ds_metrics_id = None
+        db.session.delete(metrics)
+        db.session.commit()
+
+
+# --- TESTS DE LA DESCARGA DEL CARRITO ---
+
+
+@pytest.fixture
+def cart_datasets(test_client, tmp_path, monkeypatch):
+    """
+    Dos datasets UVL con sus ficheros en disco bajo un WORKING_DIR temporal.
+    """
+    from app.modules.dataset.models import UVLDataSet
+    from app.modules.featuremodel.models import FeatureModel
+    from app.modules.hubfile.models import Hubfile
+
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+
+    user = User.query.filter_by(email="cart_download@example.com").first()
+    if not user:
+        user = User(email="cart_download@example.com", password="password123")
+        db.session.add(user)
+        db.session.commit()
+
+    dataset_ids = []
+    for index in range(2):
+        meta = DSMetaData(
+            title=f"Cart dataset {index}", description="Cart download", publication_type=PublicationType.NONE
+        )
+        db.session.add(meta)
+        db.session.commit()
+        dataset = UVLDataSet(user_id=user.id, ds_meta_data_id=meta.id)
+        db.session.add(dataset)
+        db.session.commit()
+        feature_model = FeatureModel(data_set_id=dataset.id)
+        db.session.add(feature_model)
+        db.session.commit()
+
+        folder = tmp_path / "uploads" / f"user_{user.id}" / f"dataset_{dataset.id}"
+        folder.mkdir(parents=True)
+        for name in ("model_a.uvl", "model_b.uvl"):
+            content = f"features\n    Root{index}\n" * 500
+            (folder / name).write_text(content)
+            db.session.add(Hubfile(name=name, checksum="-", size=len(content), feature_model_id=feature_model.id))
+        db.session.commit()
+        dataset_ids.append(dataset.id)
+
+    yield dataset_ids
+
+    db.session.rollback()
+    for dataset_id in dataset_ids:
+        db.session.delete(db.session.get(UVLDataSet, dataset_id))
+    db.session.commit()
+
+
+def test_download_cart_streams_resumable_zip(test_client, cart_datasets):
+    import io
+    import zipfile
+
+    ids = ",".join(str(dataset_id) for dataset_id in reversed(cart_datasets))
+    response = test_client.get(f"/explore/download_cart?dataset_ids={ids}&filename=cart")
+
+    assert response.status_code == 200
+    assert response.headers["Accept-Ranges"] == "bytes"
+    body = response.get_data()
+    assert int(response.headers["Content-Length"]) == len(body)
+
+    with zipfile.ZipFile(io.BytesIO(body)) as archive:
+        assert archive.testzip() is None
+        # Se respeta el orden en que se seleccionaron los datasets
+        assert archive.namelist()[0] == f"{cart_datasets[1]}_model_a.uvl"
+        assert len(archive.namelist()) == 4
+
+    # Reanudación: el resto del archivo a partir de un byte, validado con el ETag
+    resumed = test_client.get(
+        f"/explore/download_cart?dataset_ids={ids}&filename=cart",
+        headers={"Range": "bytes=1000-", "If-Range": response.headers["ETag"]},
+    )
+    assert resumed.status_code == 206
+    assert resumed.headers["Content-Range"] == f"bytes 1000-{len(body) - 1}/{len(body)}"
+    assert resumed.get_data() == body[1000:]
+
+
+def test_download_cart_resumes_from_the_entry_holding_the_offset(test_client, cart_datasets, tmp_path):
+    import io
+    import struct
+    import zipfile
+
+    from app.modules.hubfile.models import Hubfile
+    from app.modules.hubfile.services import BlobService
+    from core.archives.zip_stream import FileChanged
+    from core.storage.hashing import hash_file
+
+    # Los ficheros del primer dataset del carrito pasan al almacén de blobs
+    first = cart_datasets[1]
+    folder = next((tmp_path / "uploads").glob(f"user_*/dataset_{first}"))
+    blob_paths = set()
+    for hubfile in Hubfile.query.filter(Hubfile.name.like("model_%")).all():
+        if hubfile.feature_model.data_set_id != first:
+            continue
+        digest = hash_file(str(folder / hubfile.name))
+        hubfile.blob_id = BlobService().acquire(digest).id
+        blob_paths.add(BlobService().store(str(folder / hubfile.name), digest.md5))
+        (folder / hubfile.name).unlink()
+    db.session.commit()
+
+    url = f"/explore/download_cart?dataset_ids={first},{cart_datasets[0]}"
+    response = test_client.get(url)
+    body = response.get_data()
+    assert int(response.headers["Content-Length"]) == len(body)
+
+    with zipfile.ZipFile(io.BytesIO(body)) as archive:
+        assert archive.testzip() is None
+        entries = archive.infolist()
+    # Las entradas con blob llevan CRC y tamaños en la cabecera local, sin data descriptor
+    flags, crc = struct.unpack("<H6xI", body[6:18])
+    assert not flags & 0x08 and crc == entries[0].CRC
+    assert entries[2].flag_bits & 0x08
+
+    # Al reanudar en el segundo dataset no se vuelven a leer los ficheros anteriores: si se leyeran, su contenido
+    # (del mismo tamaño pero otro CRC) cortaría la descarga
+    originals = {}
+    for path in blob_paths:
+        with open(path, "rb") as blob:
+            originals[path] = blob.read()
+        with open(path, "wb") as blob:
+            blob.write(b"x" * len(originals[path]))
+    start = entries[2].header_offset + 10
+    resumed = test_client.get(url, headers={"Range": f"bytes={start}-", "If-Range": response.headers["ETag"]})
+    assert resumed.status_code == 206
+    assert resumed.get_data() == body[start:]
+
+    # Si un fichero ya no coincide con lo planificado, la descarga se corta en vez de servir un ZIP incorrecto
+    with pytest.raises(FileChanged):
+        test_client.get(url).get_data()
+
+    # Si falta un fichero se responde con un error antes de empezar a enviar el ZIP
+    for path, content in originals.items():
+        with open(path, "wb") as blob:
+            blob.write(content)
+    os.remove(next(iter(blob_paths)))
+    missing = test_client.get(url)
+    assert missing.status_code == 500
+    # Los dos modelos del dataset comparten ese blob
+    assert missing.get_json()["message"] == "2 files are missing from storage"
+
+
+def test_download_cart_without_datasets(test_client):
+    response = test_client.get("/explore/download_cart?dataset_ids=")
+    assert response.status_code == 400
@@ -0,0 +1,42 @@
+import threading
+
+from flask import current_app
+
+from app.modules.featuremodel.services import FMMetricsService
+from core.events.buffer import EventBuffer
+
+
+class AnalysisQueue:
+    """
+    Analyses the feature models of new datasets off the request path.
+
+    Uploads only queue the id of the dataset, and its models are analysed (see FMMetricsService.backfill) by the
+    event buffer thread of the worker right after. Like every event buffer it is best effort: the models of a
+    dataset still queued when a process is killed keep no metrics until `rosemary featuremodel:analyze` runs.
+    """
+
+    def __init__(self):
+        self._app = None
+        self._buffer = None
+        self._lock = threading.Lock()
+
+    def schedule(self, dataset_id: int):
+        """Queues the analysis of the models of a dataset. Must run in an app context, after the dataset is saved."""
+        if self._buffer is None:
+            with self._lock:
+                if self._buffer is None:
+                    self._app = current_app._get_current_object()
+                    # Every dataset is handed to the thread at once: there is nothing to gain from waiting for more
+                    self._buffer = EventBuffer(self._analyze, max_events=1)
+        self._buffer.push("dataset", dataset_id)
+
+    def flush(self) -> int:
+        """Analyses the queued datasets now. Returns how many were queued."""
+        return self._buffer.flush() if self._buffer is not None else 0
+
+    def _analyze(self, queued):
+        with self._app.app_context():
+            FMMetricsService().backfill(dataset_ids=sorted(set(queued["dataset"])))
+
+
+analysis_queue = AnalysisQueue()
@@ -35,9 +35,30 @@ class FMMetaData(db.Model):
 
 
 class FMMetrics(db.Model):
+    """Analysis of a UVL model, computed once in the background after it is uploaded (see core.flamapy.analysis)."""
+
     id = db.Column(db.Integer, primary_key=True)
-    solver = db.Column(db.Text)
-    not_solver = db.Column(db.Text)
+    number_of_features = db.Column(db.Integer)
+    number_of_constraints = db.Column(db.Integer)
+    max_depth = db.Column(db.Integer)
+    # A double: counts easily exceed 64 bits. None when no count finished within the time budget
+    number_of_configurations = db.Column(db.Double)
+
+    def to_dict(self):
+        return {
+            "number_of_features": self.number_of_features,
+            "number_of_constraints": self.number_of_constraints,
+            "max_depth": self.max_depth,
+            "number_of_configurations": self.number_of_configurations,
+        }
+
+    def get_formatted_configurations(self):
+        if self.number_of_configurations is None:
+            return None
+        # Exact up to the largest integer a double holds without gaps, in scientific notation beyond it
+        if self.number_of_configurations < 2**53:
+            return f"{self.number_of_configurations:,.0f}"
+        return f"{self.number_of_configurations:.3e}"
 
     def __repr__(self):
-        return f"FMMetrics<solver={self.solver}, not_solver={self.not_solver}>"
+        return f"FMMetrics<features={self.number_of_features}, configurations={self.number_of_configurations}>"
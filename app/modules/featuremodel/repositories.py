@@ -1,6 +1,8 @@
-from sqlalchemy import func
+from sqlalchemy import func, select
 
-from app.modules.featuremodel.models import FeatureModel, FMMetaData
+from app.modules.dataset.models import DataSet
+from app.modules.featuremodel.models import FeatureModel, FMMetaData, FMMetrics
+from app.modules.hubfile.models import Blob, Hubfile
 from core.repositories.BaseRepository import BaseRepository
 
 
@@ -16,3 +18,42 @@ class FeatureModelRepository(BaseRepository):
 class FMMetaDataRepository(BaseRepository):
     def __init__(self):
         super().__init__(FMMetaData)
+
+
+class FMMetricsRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(FMMetrics)
+
+    def unanalyzed(self, after_id: int, batch_size: int, everything: bool = False, dataset_ids=None):
+        """
+        Feature models without metrics (or all of them), as (FMMetaData, dataset id, owner id, file name, blob
+        checksum or None) rows, the last three locating the UVL file on disk. Only those of the given datasets, if
+        any are given.
+        """
+        statement = (
+            select(FMMetaData, DataSet.id, DataSet.user_id, Hubfile.name, Blob.checksum)
+            .join(FeatureModel, FeatureModel.fm_meta_data_id == FMMetaData.id)
+            .join(DataSet, FeatureModel.data_set_id == DataSet.id)
+            .join(Hubfile, Hubfile.feature_model_id == FeatureModel.id)
+            .outerjoin(Blob, Hubfile.blob_id == Blob.id)
+            .where(FMMetaData.id > after_id)
+            .order_by(FMMetaData.id)
+            .limit(batch_size)
+        )
+        if not everything:
+            statement = statement.where(FMMetaData.fm_metrics_id.is_(None))
+        if dataset_ids is not None:
+            statement = statement.where(DataSet.id.in_(dataset_ids))
+        return self.session.execute(statement).all()
+
+    def of_dataset(self, dataset_id: int):
+        return (
+            self.session.execute(
+                select(FMMetrics)
+                .join(FMMetaData, FMMetaData.fm_metrics_id == FMMetrics.id)
+                .join(FeatureModel, FeatureModel.fm_meta_data_id == FMMetaData.id)
+                .where(FeatureModel.data_set_id == dataset_id)
+            )
+            .scalars()
+            .all()
+        )
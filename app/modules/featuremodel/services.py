@@ -1,6 +1,12 @@
-from app.modules.featuremodel.repositories import FeatureModelRepository, FMMetaDataRepository
+from flask import current_app
+
+from app.modules.dataset.models import DataSet, DSMetaData, DSMetrics
+from app.modules.featuremodel.models import FMMetrics
+from app.modules.featuremodel.repositories import FeatureModelRepository, FMMetaDataRepository, FMMetricsRepository
 from app.modules.hubfile.services import HubfileService
+from core.flamapy.analysis import analyze_uvl_files
 from core.services.BaseService import BaseService
+from core.storage.resolver import stored_file_path
 
 
 class FeatureModelService(BaseService):
@@ -20,3 +26,63 @@ class FeatureModelService(BaseService):
     class FMMetaDataService(BaseService):
         def __init__(self):
             super().__init__(FMMetaDataRepository())
+
+
+class FMMetricsService(BaseService):
+    """Persists the flamapy analysis of UVL models, so that pages and filters read numbers instead of parsing."""
+
+    def __init__(self):
+        super().__init__(FMMetricsRepository())
+
+    def analyze(self, paths) -> list:
+        """
+        Unsaved FMMetrics of the given UVL files, in the same order. Each model gets UVL_ANALYSIS_TIME_BUDGET seconds
+        to be parsed and as many to count its configurations.
+        """
+        analyses = analyze_uvl_files(list(paths), current_app.config["UVL_ANALYSIS_TIME_BUDGET"])
+        return [FMMetrics(**analysis._asdict()) for analysis in analyses]
+
+    def set_dataset_metrics(self, ds_meta_data: DSMetaData, fm_metrics):
+        """Stores the totals of the given metrics, those of every model of the dataset, in its DSMetrics."""
+        totals = DSMetrics.from_fm_metrics(fm_metrics)
+        shared = ds_meta_data.ds_metrics is not None and (
+            DSMetaData.query.filter_by(ds_metrics_id=ds_meta_data.ds_metrics_id).count() > 1
+        )
+        if ds_meta_data.ds_metrics is None or shared:
+            ds_meta_data.ds_metrics = totals
+        else:
+            ds_meta_data.ds_metrics.number_of_models = totals.number_of_models
+            ds_meta_data.ds_metrics.number_of_features = totals.number_of_features
+
+    def backfill(self, everything: bool = False, batch_size: int = 50, dataset_ids=None) -> int:
+        """
+        Analyses the stored feature models that have no metrics yet (every one with everything), only those of the
+        given datasets if any are given, and refreshes the totals of their datasets. Commits after every batch.
+
+        :return: The number of feature models analysed.
+        """
+        analyzed = 0
+        after_id = 0
+        while rows := self.repository.unanalyzed(after_id, batch_size, everything, dataset_ids):
+            paths = [
+                stored_file_path(user_id, dataset_id, name, blob_checksum)
+                for _, dataset_id, user_id, name, blob_checksum in rows
+            ]
+            for (fm_meta_data, *_), fm_metrics in zip(rows, self.analyze(paths)):
+                if fm_meta_data.fm_metrics is None:
+                    fm_meta_data.fm_metrics = fm_metrics
+                else:
+                    for key, value in fm_metrics.to_dict().items():
+                        setattr(fm_meta_data.fm_metrics, key, value)
+            self.repository.session.flush()
+
+            for dataset_id in {row[1] for row in rows}:
+                dataset = self.repository.session.get(DataSet, dataset_id)
+                self.set_dataset_metrics(dataset.ds_meta_data, self.repository.of_dataset(dataset_id))
+                # The dataset page shows the metrics: its cached copy is no longer valid
+                dataset.version = DataSet.version + 1
+            self.repository.session.commit()
+
+            analyzed += len(rows)
+            after_id = rows[-1][0].id
+        return analyzed
@@ -0,0 +1,210 @@
+"""
+Bounded pool of processes that export UVL models with flamapy, away from the request workers.
+
+Exports are CPU bound and a pathological model can keep one busy for a very long time. flamapy operations cannot be
+interrupted, so every job runs in one of a fixed number of long-lived child processes, which is killed and replaced
+when the job runs out of time or is cancelled. Children keep the models they parsed for the next exports.
+
+Jobs are identified by the key of their result in the export cache: a worker never runs the same export twice at
+once, and a finished export is served from the cache by every worker. So is the error of a model that cannot be
+exported, but not that of a job that ran out of time or whose process did not start or died, which the next request
+for the export tries again.
+"""
+
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait as wait_for
+
+from flask import current_app
+
+from app.modules.flamapy.transformations import failure_key
+from core.flamapy.exports import serve
+
+logger = logging.getLogger(__name__)
+
+# As in core.flamapy.analysis, children start in a clean interpreter rather than a fork of a threaded worker
+_context = multiprocessing.get_context("spawn")
+
+# Seconds allowed for a child to start and import flamapy, on top of the time budget of its first job
+STARTUP_TIMEOUT = 30
+
+# Seconds between checks for cancellation while a job runs
+POLL_INTERVAL = 0.1
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class ExportFailed(RuntimeError):
+    """The model cannot be parsed or converted: every attempt to export it would fail the same way."""
+
+
+class ExportProcess:
+    """One child process of the pool, started on its first job and again after being killed."""
+
+    def __init__(self, model_cache_size):
+        self.model_cache_size = model_cache_size
+        self._process = None
+        self._connection = None
+
+    def run(self, task, time_budget, cancelled: threading.Event):
+        """
+        Runs an export task (UVL path, checksum, format, destination path) in the child.
+
+        :raises TimeoutError: If the export does not finish within the time budget.
+        :raises JobCancelled: If the cancelled event is set before the export finishes.
+        :raises ExportFailed: If the model cannot be exported.
+        :raises RuntimeError: If the export fails for a reason that may go away (the child does not start or dies, a
+            file cannot be read or written).
+        """
+        if self._process is None or not self._process.is_alive():
+            self._start(cancelled)
+        self._connection.send(task)
+        outcome = self._receive(time.monotonic() + time_budget, cancelled)
+        if outcome is None:
+            self.kill()
+            raise TimeoutError(f"The export did not finish within {time_budget:g} seconds")
+        succeeded, message, retryable = outcome
+        if not succeeded:
+            raise RuntimeError(message) if retryable else ExportFailed(message)
+
+    def kill(self):
+        if self._process is None:
+            return
+        self._connection.close()
+        self._process.kill()
+        self._process.join()
+        self._process = self._connection = None
+
+    def _start(self, cancelled):
+        self.kill()
+        self._connection, child_connection = _context.Pipe()
+        self._process = _context.Process(target=serve, args=(child_connection, self.model_cache_size), daemon=True)
+        self._process.start()
+        child_connection.close()
+        if self._receive(time.monotonic() + STARTUP_TIMEOUT, cancelled) != "ready":
+            self.kill()
+            raise RuntimeError("The export process did not start")
+
+    def _receive(self, deadline, cancelled):
+        """The next message of the child, or None if it did not come before the deadline."""
+        while True:
+            if cancelled.is_set():
+                self.kill()
+                raise JobCancelled()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            try:
+                if self._connection.poll(min(remaining, POLL_INTERVAL)):
+                    return self._connection.recv()
+            except EOFError:
+                self.kill()
+                raise RuntimeError("The export process died")
+
+
+class ExportJob:
+    def __init__(self, key):
+        self.key = key
+        self.cancelled = threading.Event()
+        self.future = None
+
+    def wait(self, timeout) -> bool:
+        """Whether the job finished (or failed, or was cancelled) within timeout seconds."""
+        return bool(wait_for([self.future], timeout=timeout).done)
+
+    def retryable_error(self):
+        """The error of a finished job that failed without caching it (see ExportProcess.run), or None."""
+        if not self.future.done() or self.future.cancelled():
+            return None
+        error = self.future.exception()
+        return None if isinstance(error, ExportFailed) else error
+
+
+class ExportJobs:
+    """Runs exports in pool_size processes, as many at once as there are processes; the rest wait in order."""
+
+    def __init__(self, pool_size, time_budget, model_cache_size):
+        self.time_budget = time_budget
+        self._processes = queue.SimpleQueue()
+        for _ in range(pool_size):
+            self._processes.put(ExportProcess(model_cache_size))
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="flamapy-export")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, cache, key, uvl_path, checksum, export_format) -> ExportJob:
+        """
+        Queues the export of a model to the given key of the export cache, unless it is already queued or running,
+        in which case that job is returned.
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None:
+                job = self._jobs[key] = ExportJob(key)
+                job.future = self._executor.submit(self._run, job, cache, (uvl_path, checksum, export_format))
+            return job
+
+    def cancel(self, key) -> bool:
+        """Cancels the job of the given key, killing its process if it is running. False if there is no such job."""
+        with self._lock:
+            job = self._jobs.pop(key, None)
+        if job is None:
+            return False
+        job.cancelled.set()
+        job.future.cancel()
+        return True
+
+    def shutdown(self):
+        with self._lock:
+            jobs, self._jobs = list(self._jobs.values()), {}
+        for job in jobs:
+            job.cancelled.set()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        while not self._processes.empty():
+            self._processes.get().kill()
+
+    def _run(self, job, cache, task):
+        process = self._processes.get()
+        try:
+            cache.put_file(job.key, lambda path: process.run((*task, path), self.time_budget, job.cancelled))
+        except JobCancelled:
+            logger.info(f"Export {job.key} cancelled")
+        except ExportFailed as exc:
+            message = str(exc)
+            logger.warning(f"Export {job.key} failed: {message}")
+            cache.put_file(failure_key(job.key), lambda path: _write_text(path, message))
+            raise
+        except Exception as exc:
+            # Nothing is cached, so that the next request tries again
+            logger.warning(f"Export {job.key} failed, it will be retried: {exc}")
+            raise
+        finally:
+            self._processes.put(process)
+            with self._lock:
+                if self._jobs.get(job.key) is job:
+                    del self._jobs[job.key]
+
+
+def _write_text(path, text):
+    with open(path, "w") as file:
+        file.write(text)
+
+
+def export_jobs() -> ExportJobs:
+    """Export pool of the current app, created from its configuration on first use."""
+    jobs = current_app.extensions.get("flamapy_exports")
+    if jobs is None:
+        config = current_app.config
+        jobs = current_app.extensions.setdefault(
+            "flamapy_exports",
+            ExportJobs(
+                config["FLAMAPY_POOL_SIZE"], config["FLAMAPY_EXPORT_TIME_BUDGET"], config["FLAMAPY_MODEL_CACHE_SIZE"]
+            ),
+        )
+    return jobs
@@ -1,63 +1,28 @@
 import logging
-import os
-import tempfile
+import time
 
-from antlr4 import CommonTokenStream, FileStream
-from antlr4.error.ErrorListener import ErrorListener
-from flamapy.metamodels.fm_metamodel.transformations import GlencoeWriter, SPLOTWriter, UVLReader
-from flamapy.metamodels.pysat_metamodel.transformations import DimacsWriter, FmToPysat
-from flask import jsonify, send_file
-from uvl.UVLCustomLexer import UVLCustomLexer
-from uvl.UVLPythonParser import UVLPythonParser
+from flask import Response, abort, current_app, jsonify, request, send_file, url_for
 
+from app.modules.dataset.services import DataSetService
 from app.modules.flamapy import flamapy_bp
+from app.modules.flamapy.jobs import export_jobs
+from app.modules.flamapy.transformations import export_cache, export_key, failure_key
+from app.modules.flamapy.validation import uvl_verdict
 from app.modules.hubfile.services import HubfileService
+from core.archives.zip_stream import ZipStream
+from core.flamapy.exports import EXPORT_FORMATS
 
 logger = logging.getLogger(__name__)
 
 
 @flamapy_bp.route("/flamapy/check_uvl/<int:file_id>", methods=["GET"])
 def check_uvl(file_id):
-    class CustomErrorListener(ErrorListener):
-        def __init__(self):
-            self.errors = []
-
-        def syntaxError(self, recognizer, offendingSymbol, line, column, msg, e):
-            if "\\t" in msg:
-                warning_message = (
-                    f"The UVL has the following warning that prevents reading it: " f"Line {line}:{column} - {msg}"
-                )
-                print(warning_message)
-                self.errors.append(warning_message)
-            else:
-                error_message = (
-                    f"The UVL has the following error that prevents reading it: " f"Line {line}:{column} - {msg}"
-                )
-                self.errors.append(error_message)
-
     try:
         hubfile = HubfileService().get_by_id(file_id)
-        input_stream = FileStream(hubfile.get_path())
-        lexer = UVLCustomLexer(input_stream)
-
-        error_listener = CustomErrorListener()
-
-        lexer.removeErrorListeners()
-        lexer.addErrorListener(error_listener)
-
-        stream = CommonTokenStream(lexer)
-        parser = UVLPythonParser(stream)
-
-        parser.removeErrorListeners()
-        parser.addErrorListener(error_listener)
-
-        # tree = parser.featureModel()
-
-        if error_listener.errors:
-            return jsonify({"errors": error_listener.errors}), 400
-
-        # Optional: Print the parse tree
-        # print(tree.toStringTree(recog=parser))
+        # El veredicto se calculó al subir el fichero, normalmente no hace falta volver a leerlo
+        verdict = uvl_verdict(hubfile.get_path(), hubfile.checksum)
+        if not verdict.valid:
+            return jsonify({"errors": verdict.errors()}), 400
 
         return jsonify({"message": "Valid Model"}), 200
 
@@ -72,45 +37,128 @@ def valid(file_id):
 
 @flamapy_bp.route("/flamapy/to_glencoe/<int:file_id>", methods=["GET"])
 def to_glencoe(file_id):
-    temp_file = tempfile.NamedTemporaryFile(suffix=".json", delete=False)
-    try:
-        hubfile = HubfileService().get_or_404(file_id)
-        fm = UVLReader(hubfile.get_path()).transform()
-        GlencoeWriter(temp_file.name, fm).transform()
-
-        # Return the file in the response
-        return send_file(temp_file.name, as_attachment=True, download_name=f"{hubfile.name}_glencoe.txt")
-    finally:
-        # Clean up the temporary file
-        os.remove(temp_file.name)
+    hubfile = HubfileService().get_or_404(file_id)
+    return _export_response(hubfile, "glencoe")
 
 
 @flamapy_bp.route("/flamapy/to_splot/<int:file_id>", methods=["GET"])
 def to_splot(file_id):
-    temp_file = tempfile.NamedTemporaryFile(suffix=".splx", delete=False)
-    try:
-        hubfile = HubfileService().get_by_id(file_id)
-        fm = UVLReader(hubfile.get_path()).transform()
-        SPLOTWriter(temp_file.name, fm).transform()
-
-        # Return the file in the response
-        return send_file(temp_file.name, as_attachment=True, download_name=f"{hubfile.name}_splot.txt")
-    finally:
-        # Clean up the temporary file
-        os.remove(temp_file.name)
+    hubfile = HubfileService().get_by_id(file_id)
+    return _export_response(hubfile, "splot")
 
 
 @flamapy_bp.route("/flamapy/to_cnf/<int:file_id>", methods=["GET"])
 def to_cnf(file_id):
-    temp_file = tempfile.NamedTemporaryFile(suffix=".cnf", delete=False)
-    try:
-        hubfile = HubfileService().get_by_id(file_id)
-        fm = UVLReader(hubfile.get_path()).transform()
-        sat = FmToPysat(fm).transform()
-        DimacsWriter(temp_file.name, sat).transform()
-
-        # Return the file in the response
-        return send_file(temp_file.name, as_attachment=True, download_name=f"{hubfile.name}_cnf.txt")
-    finally:
-        # Clean up the temporary file
-        os.remove(temp_file.name)
+    hubfile = HubfileService().get_by_id(file_id)
+    return _export_response(hubfile, "cnf")
+
+
+@flamapy_bp.route("/flamapy/exports/<int:file_id>/<export_format>", methods=["GET"])
+def export(file_id, export_format):
+    if export_format not in EXPORT_FORMATS:
+        abort(404)
+    hubfile = HubfileService().get_or_404(file_id)
+    return _export_response(hubfile, export_format)
+
+
+@flamapy_bp.route("/flamapy/exports/<int:file_id>/<export_format>", methods=["DELETE"])
+def cancel_export(file_id, export_format):
+    if export_format not in EXPORT_FORMATS:
+        abort(404)
+    hubfile = HubfileService().get_or_404(file_id)
+    if not export_jobs().cancel(export_key(hubfile.checksum, export_format)):
+        return jsonify({"message": "The export is not running"}), 404
+    return "", 204
+
+
+@flamapy_bp.route("/flamapy/dataset/<int:dataset_id>/export", methods=["GET"])
+def export_dataset(dataset_id):
+    export_format = request.args.get("format", "cnf")
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"message": f"Unknown format, use one of: {', '.join(EXPORT_FORMATS)}"}), 400
+    dataset = DataSetService().get_or_404(dataset_id)
+    models = HubfileService().stored_models(dataset.id)
+    if not models:
+        return jsonify({"message": "The dataset has no UVL models"}), 404
+
+    # Los modelos sin exportar se reparten entre los procesos del pool; los ya exportados salen de la caché
+    cache = export_cache()
+    jobs = []
+    for _, checksum, path in models:
+        key = export_key(checksum, export_format)
+        if cache.get(key) is None and cache.get(failure_key(key)) is None:
+            jobs.append(export_jobs().submit(cache, key, path, checksum, export_format))
+
+    deadline = time.monotonic() + current_app.config["FLAMAPY_EXPORT_WAIT"]
+    if not all(job.wait(max(deadline - time.monotonic(), 0)) for job in jobs):
+        url = url_for("flamapy.export_dataset", dataset_id=dataset.id, format=export_format)
+        response = jsonify({"status": "running", "url": url, "pending": sum(not job.future.done() for job in jobs)})
+        response.status_code = 202
+        response.headers["Location"] = url
+        response.headers["Retry-After"] = "1"
+        return response
+
+    # Un fallo pasajero (sin tiempo, el proceso murió) no se guarda: el ZIP se pide de nuevo más tarde
+    errors = [str(error) for job in jobs if (error := job.retryable_error())]
+    if errors:
+        return _retry_later(f"{len(errors)} models could not be exported now: {errors[0]}")
+
+    # Los modelos que no se pudieron exportar van con el motivo en lugar del fichero
+    folder = f"dataset_{dataset.id}_{export_format}"
+    suffix = EXPORT_FORMATS[export_format].download_suffix
+    zip_stream = ZipStream()
+    for name, checksum, _ in models:
+        key = export_key(checksum, export_format)
+        exported = cache.get(key)
+        if exported:
+            zip_stream.add_file(exported, f"{folder}/{name}{suffix}")
+        elif failure := cache.get(failure_key(key)):
+            zip_stream.add_file(failure, f"{folder}/{name}{suffix}.failed")
+
+    return Response(
+        zip_stream,
+        mimetype="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={folder}.zip"},
+    )
+
+
+def _export_response(hubfile, export_format):
+    cache = export_cache()
+    key = export_key(hubfile.checksum, export_format)
+
+    # Las exportaciones ya hechas (o fallidas) se sirven directamente desde la caché
+    path = cache.get(key)
+    failure = None if path else cache.get(failure_key(key))
+    if path is None and failure is None:
+        job = export_jobs().submit(cache, key, hubfile.get_path(), hubfile.checksum, export_format)
+
+        # Si no termina en unos segundos, el cliente consulta el estado en la URL de la exportación
+        if not job.wait(current_app.config["FLAMAPY_EXPORT_WAIT"]):
+            url = url_for("flamapy.export", file_id=hubfile.id, export_format=export_format)
+            response = jsonify({"status": "running", "url": url})
+            response.status_code = 202
+            response.headers["Location"] = url
+            response.headers["Retry-After"] = "1"
+            return response
+
+        path = cache.get(key)
+        failure = None if path else cache.get(failure_key(key))
+        if path is None and failure is None and (error := job.retryable_error()):
+            return _retry_later(str(error))
+
+    if path is None and failure is None:
+        return jsonify({"status": "cancelled", "message": "The export was cancelled"}), 409
+    if path is None:
+        with open(failure) as file:
+            return jsonify({"status": "failed", "message": file.read()}), 422
+
+    download_name = f"{hubfile.name}{EXPORT_FORMATS[export_format].download_suffix}"
+    return send_file(path, as_attachment=True, download_name=download_name)
+
+
+def _retry_later(message):
+    """Export that failed for a reason that may go away: nothing was cached and the next request tries again."""
+    response = jsonify({"status": "failed", "message": message})
+    response.status_code = 503
+    response.headers["Retry-After"] = "5"
+    return response
@@ -1,5 +1,13 @@
+import hashlib
+import shutil
+import time
+
 import pytest
 
+from app import db
+from app.modules.auth.models import User
+from app.modules.dataset.models import DSMetaData, PublicationType
+
 
 @pytest.fixture(scope="module")
 def test_client(test_client):
@@ -22,3 +30,214 @@ def test_sample_assertion(test_client):
     """
     greeting = "Hello, World!"
     assert greeting == "Hello, World!", "The greeting does not coincide with 'Hello, World!'"
+
+
+def test_analyze_uvl_file_reads_structure_and_counts_configurations():
+    from core.flamapy.analysis import UVLAnalysis, analyze_uvl_file
+
+    analysis = analyze_uvl_file("app/modules/dataset/uvl_examples/file1.uvl", time_budget=30)
+
+    assert analysis == UVLAnalysis(
+        number_of_features=10, number_of_constraints=2, max_depth=2, number_of_configurations=24.0
+    )
+
+
+def test_analyze_uvl_files_gives_up_counting_out_of_time_and_goes_on(tmp_path):
+    from core.flamapy.analysis import UVLAnalysis, analyze_uvl_files
+
+    # 2^40 configuraciones: demasiadas para enumerarlas en un segundo
+    features = "\n".join(f"\t\t\tF{i}" for i in range(40))
+    big = tmp_path / "big.uvl"
+    big.write_text(f"features\n\tRoot\n\t\toptional\n{features}\n")
+    broken = tmp_path / "broken.uvl"
+    broken.write_text("this is not uvl {")
+
+    analyses = analyze_uvl_files([str(big), str(broken), "app/modules/dataset/uvl_examples/file1.uvl"], 1)
+
+    assert analyses[0].number_of_features == 41
+    assert analyses[0].max_depth == 1
+    assert analyses[0].number_of_configurations in (None, 2.0**40)
+    assert analyses[1] == UVLAnalysis()
+    assert analyses[2].number_of_configurations == 24.0
+
+
+@pytest.fixture
+def uvl_hubfile(test_client, tmp_path, monkeypatch):
+    """
+    Un dataset con tres ficheros UVL (file1.uvl, el mismo contenido como copy.uvl y uno erróneo) en disco bajo un
+    WORKING_DIR temporal, y cachés de exportación vacías.
+    """
+    from app.modules.dataset.models import UVLDataSet
+    from app.modules.featuremodel.models import FeatureModel
+    from app.modules.hubfile.models import Hubfile
+
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    monkeypatch.setitem(test_client.application.config, "FLAMAPY_CACHE_DIR", str(tmp_path / "flamapy_cache"))
+    # Un solo proceso de exportación, que se crea para cada test con esta configuración
+    monkeypatch.setitem(test_client.application.config, "FLAMAPY_POOL_SIZE", 1)
+    monkeypatch.setitem(test_client.application.config, "FLAMAPY_EXPORT_WAIT", 30)
+    test_client.application.extensions.pop("flamapy_exports", None)
+
+    user = User.query.filter_by(email="flamapy_export@example.com").first()
+    if not user:
+        user = User(email="flamapy_export@example.com", password="password123")
+        db.session.add(user)
+        db.session.commit()
+
+    meta = DSMetaData(title="Flamapy export", description="Exports", publication_type=PublicationType.NONE)
+    db.session.add(meta)
+    db.session.commit()
+    dataset = UVLDataSet(user_id=user.id, ds_meta_data_id=meta.id)
+    db.session.add(dataset)
+    db.session.commit()
+    feature_model = FeatureModel(data_set_id=dataset.id)
+    db.session.add(feature_model)
+    db.session.commit()
+
+    folder = tmp_path / "uploads" / f"user_{user.id}" / f"dataset_{dataset.id}"
+    folder.mkdir(parents=True)
+    path = folder / "file1.uvl"
+    shutil.copy("app/modules/dataset/uvl_examples/file1.uvl", path)
+    checksum = hashlib.md5(path.read_bytes()).hexdigest()
+    hubfile = Hubfile(name="file1.uvl", checksum=checksum, size=path.stat().st_size, feature_model_id=feature_model.id)
+    db.session.add(hubfile)
+    db.session.commit()
+
+    for name, content in (("copy.uvl", path.read_text()), ("broken.uvl", "features\n\tRoot {\n")):
+        (folder / name).write_text(content)
+        db.session.add(
+            Hubfile(
+                name=name,
+                checksum=hashlib.md5(content.encode()).hexdigest(),
+                size=len(content),
+                feature_model_id=feature_model.id,
+            )
+        )
+    db.session.commit()
+
+    yield {
+        "id": hubfile.id,
+        "dataset_id": dataset.id,
+        "path": path,
+        "checksum": checksum,
+        "cache_dir": tmp_path / "flamapy_cache",
+    }
+
+    export_jobs = test_client.application.extensions.pop("flamapy_exports", None)
+    if export_jobs:
+        export_jobs.shutdown()
+    db.session.rollback()
+    db.session.delete(db.session.get(UVLDataSet, dataset.id))
+    db.session.delete(db.session.get(DSMetaData, meta.id))
+    db.session.commit()
+
+
+def test_exports_are_served_from_the_cache(test_client, uvl_hubfile):
+    first = test_client.get(f"/flamapy/to_cnf/{uvl_hubfile['id']}")
+    assert first.status_code == 200
+    assert "file1.uvl_cnf.txt" in first.headers["Content-Disposition"]
+    assert first.data.startswith(b"p cnf 10 ")
+    assert [entry.name for entry in uvl_hubfile["cache_dir"].iterdir()] == [f"{uvl_hubfile['checksum']}.cnf"]
+
+    # Sin el fichero original, la exportación sale de la caché en disco y las demás del modelo que ya leyó el proceso
+    uvl_hubfile["path"].unlink()
+    again = test_client.get(f"/flamapy/to_cnf/{uvl_hubfile['id']}")
+    assert again.status_code == 200
+    assert again.data == first.data
+
+    splot = test_client.get(f"/flamapy/to_splot/{uvl_hubfile['id']}")
+    assert splot.status_code == 200
+    assert b"<feature" in splot.data
+    assert test_client.get(f"/flamapy/to_glencoe/{uvl_hubfile['id']}").status_code == 200
+
+
+def test_slow_exports_answer_202_with_a_polling_url(test_client, uvl_hubfile):
+    test_client.application.config["FLAMAPY_EXPORT_WAIT"] = 0
+
+    response = test_client.get(f"/flamapy/to_glencoe/{uvl_hubfile['id']}")
+    assert response.status_code == 202
+    url = response.get_json()["url"]
+    assert response.headers["Location"] == url == f"/flamapy/exports/{uvl_hubfile['id']}/glencoe"
+
+    deadline = time.monotonic() + 60
+    while response.status_code == 202 and time.monotonic() < deadline:
+        time.sleep(0.2)
+        response = test_client.get(url)
+    assert response.status_code == 200
+    assert "file1.uvl_glencoe.txt" in response.headers["Content-Disposition"]
+
+
+def test_exports_out_of_time_can_be_retried_and_cancelled(test_client, uvl_hubfile):
+    from app.modules.flamapy.jobs import export_jobs
+
+    test_client.application.config["FLAMAPY_EXPORT_WAIT"] = 0
+    response = test_client.get(f"/flamapy/exports/{uvl_hubfile['id']}/cnf")
+    assert response.status_code == 202
+
+    # Cancelar mata el proceso y no deja nada en la caché
+    assert test_client.delete(f"/flamapy/exports/{uvl_hubfile['id']}/cnf").status_code == 204
+    assert test_client.delete(f"/flamapy/exports/{uvl_hubfile['id']}/cnf").status_code == 404
+    assert test_client.get(f"/flamapy/exports/{uvl_hubfile['id']}/nonexistent").status_code == 404
+
+    # Quedarse sin tiempo es un fallo pasajero: no se guarda en la caché
+    with test_client.application.app_context():
+        export_jobs().time_budget = 0
+    test_client.application.config["FLAMAPY_EXPORT_WAIT"] = 30
+    response = test_client.get(f"/flamapy/exports/{uvl_hubfile['id']}/cnf")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"]
+    assert "did not finish" in response.get_json()["message"]
+    assert not uvl_hubfile["cache_dir"].exists() or list(uvl_hubfile["cache_dir"].iterdir()) == []
+
+    # y la siguiente petición lo vuelve a intentar
+    with test_client.application.app_context():
+        export_jobs().time_budget = 120
+    response = test_client.get(f"/flamapy/to_cnf/{uvl_hubfile['id']}")
+    assert response.status_code == 200
+    assert response.data.startswith(b"p cnf 10 ")
+
+
+def test_dataset_export_streams_a_zip_of_all_its_models(test_client, uvl_hubfile):
+    import io
+    import zipfile
+
+    test_client.application.config["FLAMAPY_POOL_SIZE"] = 2
+    url = f"/flamapy/dataset/{uvl_hubfile['dataset_id']}/export?format=splot"
+
+    response = test_client.get(url)
+    assert response.status_code == 200
+    assert "dataset_" in response.headers["Content-Disposition"]
+    archive = zipfile.ZipFile(io.BytesIO(response.data))
+    folder = f"dataset_{uvl_hubfile['dataset_id']}_splot"
+    assert sorted(archive.namelist()) == [
+        f"{folder}/broken.uvl_splot.txt.failed",
+        f"{folder}/copy.uvl_splot.txt",
+        f"{folder}/file1.uvl_splot.txt",
+    ]
+    assert archive.read(f"{folder}/copy.uvl_splot.txt") == archive.read(f"{folder}/file1.uvl_splot.txt")
+    assert archive.read(f"{folder}/broken.uvl_splot.txt.failed")
+
+    # Los ficheros con el mismo contenido comparten exportación, y la segunda vez todo sale de la caché
+    assert len(list(uvl_hubfile["cache_dir"].iterdir())) == 2
+    uvl_hubfile["path"].unlink()
+    again = zipfile.ZipFile(io.BytesIO(test_client.get(url).data))
+    assert [(info.filename, info.CRC) for info in again.infolist()] == [
+        (info.filename, info.CRC) for info in archive.infolist()
+    ]
+
+    assert test_client.get(f"/flamapy/dataset/{uvl_hubfile['dataset_id']}/export?format=pdf").status_code == 400
+
+
+def test_check_uvl_reports_syntax_errors(test_client, uvl_hubfile):
+    from app.modules.hubfile.models import Hubfile
+
+    assert test_client.get(f"/flamapy/check_uvl/{uvl_hubfile['id']}").get_json() == {"message": "Valid Model"}
+
+    broken = Hubfile.query.filter_by(feature_model_id=db.session.get(Hubfile, uvl_hubfile["id"]).feature_model_id)
+    broken = broken.filter_by(name="broken.uvl").one()
+    response = test_client.get(f"/flamapy/check_uvl/{broken.id}")
+    assert response.status_code == 400
+    assert response.get_json()["errors"] == [
+        "The UVL has the following error that prevents reading it: Line 3:0 - mismatched input '\\n' expecting "
+        "{'constraint', 'constraints', '}', ID_NOT_STRICT, ID_STRICT}"
+    ]
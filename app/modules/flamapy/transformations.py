@@ -0,0 +1,28 @@
+"""
+Exported UVL models (see core.flamapy.exports), kept in a size-bounded LRU on local disk shared by every worker of
+the host. Entries are keyed by the checksum of the UVL file, so files with the same content share them and an entry
+never goes stale.
+"""
+
+from flask import current_app
+
+from core.cache.disk_lru import DiskLRUCache
+from core.flamapy.exports import EXPORT_FORMATS
+
+
+def export_cache() -> DiskLRUCache:
+    return DiskLRUCache(current_app.config["FLAMAPY_CACHE_DIR"], current_app.config["FLAMAPY_CACHE_MAX_BYTES"])
+
+
+def export_key(checksum: str, export_format: str) -> str:
+    """
+    Key of a model exported to one of EXPORT_FORMATS in the export cache.
+
+    :raises KeyError: If the format is unknown.
+    """
+    return f"{checksum}.{EXPORT_FORMATS[export_format].extension}"
+
+
+def failure_key(key: str) -> str:
+    """Key of the error message of an export that failed, so that it is not attempted again by every request."""
+    return f"{key}.failed"
@@ -0,0 +1,50 @@
+"""
+Verdicts of the syntax validation of UVL files (see core.flamapy.validation).
+
+Files are validated once, when they are uploaded, and the verdict is kept on disk by the checksum of the file (see
+verdict_path), so that check_uvl and the creation of the dataset read it instead of parsing the file again, whichever
+worker or container handles them. The verdict of some content never changes; storage:gc drops those of contents
+that never became a blob.
+"""
+
+import json
+import os
+import uuid
+from typing import Optional
+
+from core.flamapy.validation import UVLDiagnostic, UVLVerdict, validate_uvl
+from core.storage.resolver import verdict_path
+
+
+def _stored_verdict(checksum: str) -> Optional[UVLVerdict]:
+    try:
+        with open(verdict_path(checksum)) as stored:
+            diagnostics = json.load(stored)
+    except (OSError, ValueError):
+        return None
+    return UVLVerdict(tuple(UVLDiagnostic(*diagnostic) for diagnostic in diagnostics))
+
+
+def _store_verdict(checksum: str, verdict: UVLVerdict):
+    path = verdict_path(checksum)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Written aside and renamed, so that other workers never read half a verdict
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(temp_path, "w") as stored:
+        json.dump([list(diagnostic) for diagnostic in verdict.diagnostics], stored)
+    os.replace(temp_path, path)
+
+
+def uvl_verdict(path, checksum: str) -> UVLVerdict:
+    """The verdict of the file with the given checksum, validating it only when it is not known yet."""
+    verdict = _stored_verdict(checksum)
+    if verdict is None:
+        verdict = validate_uvl(path)
+        remember_verdicts({checksum: verdict})
+    return verdict
+
+
+def remember_verdicts(verdicts):
+    """Keeps verdicts computed elsewhere, e.g. by the workers of a bulk import, given by checksum."""
+    for checksum, verdict in verdicts.items():
+        _store_verdict(checksum, verdict)
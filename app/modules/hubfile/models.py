@@ -1,10 +1,30 @@
 from datetime import datetime, timezone
 
 from flask import request
+from sqlalchemy import event, select, update
 
 from app import db
 from app.modules.auth.models import User
 from app.modules.dataset.models import DataSet
+from app.modules.featuremodel.models import FeatureModel
+
+
+class Blob(db.Model):
+    """
+    Content of one or more Hubfiles, stored once under uploads/blobs/ and addressed by its MD5.
+    ref_count is the number of Hubfiles pointing at it; blobs left without references are removed by storage:gc.
+    """
+
+    __tablename__ = "blob"
+    id = db.Column(db.Integer, primary_key=True)
+    checksum = db.Column(db.String(32), nullable=False, unique=True)
+    crc32 = db.Column(db.String(8), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f"Blob<{self.checksum} refs={self.ref_count}>"
 
 
 class Hubfile(db.Model):
@@ -14,6 +34,9 @@ class Hubfile(db.Model):
     checksum = db.Column(db.String(120), nullable=False)
     size = db.Column(db.Integer, nullable=False)
     feature_model_id = db.Column(db.Integer, db.ForeignKey("feature_model.id"), nullable=False)
+    # Empty for files still stored in the legacy user_X/dataset_Y layout (see storage:migrate)
+    blob_id = db.Column(db.Integer, db.ForeignKey("blob.id"), nullable=True, index=True)
+    blob = db.relationship("Blob")
 
     def get_formatted_size(self):
         from app.modules.dataset.services import SizeService
@@ -49,8 +72,44 @@ class Hubfile(db.Model):
         return f"File<{self.id}>"
 
 
+@event.listens_for(Hubfile, "after_delete")
+def release_blob(mapper, connection, hubfile):
+    # Runs in the same transaction as the delete, so the count cannot drift if it is rolled back
+    if hubfile.blob_id is not None:
+        connection.execute(
+            update(Blob.__table__).where(Blob.id == hubfile.blob_id).values(ref_count=Blob.ref_count - 1)
+        )
+
+
+def _add_to_dataset_totals(connection, hubfile, sign):
+    dataset_id = select(FeatureModel.data_set_id).where(FeatureModel.id == hubfile.feature_model_id).scalar_subquery()
+    connection.execute(
+        update(DataSet.__table__)
+        .where(DataSet.id == dataset_id)
+        .values(
+            files_count=DataSet.files_count + sign,
+            total_size_in_bytes=DataSet.total_size_in_bytes + sign * hubfile.size,
+            version=DataSet.version + 1,
+        )
+    )
+
+
+@event.listens_for(Hubfile, "after_insert")
+def add_to_dataset_totals(mapper, connection, hubfile):
+    _add_to_dataset_totals(connection, hubfile, 1)
+
+
+@event.listens_for(Hubfile, "after_delete")
+def remove_from_dataset_totals(mapper, connection, hubfile):
+    # When the whole dataset is being deleted its row may already be gone, and nothing is updated
+    _add_to_dataset_totals(connection, hubfile, -1)
+
+
 class HubfileViewRecord(db.Model):
     __tablename__ = "file_view_record"
+    # One record per browser and file: duplicates are dropped by the database when the events are written
+    __table_args__ = (db.UniqueConstraint("view_cookie", "file_id", name="uq_file_view_record_cookie"),)
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=True)
     file_id = db.Column(db.Integer, db.ForeignKey("file.id"), nullable=False)
@@ -63,6 +122,8 @@ class HubfileViewRecord(db.Model):
 
 class HubfileDownloadRecord(db.Model):
     __tablename__ = "file_download_record"
+    __table_args__ = (db.UniqueConstraint("download_cookie", "file_id", name="uq_file_download_record_cookie"),)
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=True)
     file_id = db.Column(db.Integer, db.ForeignKey("file.id"))
@@ -1,10 +1,11 @@
-from sqlalchemy import func
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
 
 from app import db
 from app.modules.auth.models import User
 from app.modules.dataset.models import DataSet
 from app.modules.featuremodel.models import FeatureModel
-from app.modules.hubfile.models import Hubfile, HubfileDownloadRecord, HubfileViewRecord
+from app.modules.hubfile.models import Blob, Hubfile, HubfileDownloadRecord, HubfileViewRecord
 from core.repositories.BaseRepository import BaseRepository
 
 
@@ -25,6 +26,92 @@ class HubfileRepository(BaseRepository):
     def get_dataset_by_hubfile(self, hubfile: Hubfile) -> DataSet:
         return db.session.query(DataSet).join(FeatureModel).join(Hubfile).filter(Hubfile.id == hubfile.id).first()
 
+    def stored_files(self, dataset_ids):
+        """
+        (dataset id, owner id, file name, blob checksum or None) of every file of the given datasets, in one query.
+        """
+        if not dataset_ids:
+            return []
+        return self.session.execute(
+            select(DataSet.id, DataSet.user_id, Hubfile.name, Blob.checksum)
+            .join(FeatureModel, FeatureModel.data_set_id == DataSet.id)
+            .join(Hubfile, Hubfile.feature_model_id == FeatureModel.id)
+            .outerjoin(Blob, Hubfile.blob_id == Blob.id)
+            .where(DataSet.id.in_(dataset_ids))
+            .order_by(Hubfile.id)
+        ).all()
+
+    def stored_models(self, dataset_id):
+        """(file name, file checksum, owner id, blob checksum or None) of every file of a dataset, in one query."""
+        return self.session.execute(
+            select(Hubfile.name, Hubfile.checksum, DataSet.user_id, Blob.checksum)
+            .select_from(DataSet)
+            .join(FeatureModel, FeatureModel.data_set_id == DataSet.id)
+            .join(Hubfile, Hubfile.feature_model_id == FeatureModel.id)
+            .outerjoin(Blob, Hubfile.blob_id == Blob.id)
+            .where(DataSet.id == dataset_id)
+            .order_by(Hubfile.id)
+        ).all()
+
+    def legacy_files(self, after_id: int, batch_size: int):
+        """Files not moved to the blob store yet, with the owner and dataset that locate them on disk."""
+        return (
+            self.session.query(Hubfile, DataSet.user_id, DataSet.id)
+            .join(FeatureModel, Hubfile.feature_model_id == FeatureModel.id)
+            .join(DataSet, FeatureModel.data_set_id == DataSet.id)
+            .filter(Hubfile.blob_id.is_(None), Hubfile.id > after_id)
+            .order_by(Hubfile.id)
+            .limit(batch_size)
+            .all()
+        )
+
+
+class BlobRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(Blob)
+
+    def get_by_checksum(self, checksum: str):
+        return self.model.query.filter_by(checksum=checksum).first()
+
+    def acquire(self, md5: str, crc32: str, size: int) -> Blob:
+        """
+        Adds a reference to the blob with this content, creating it if it is new. Nothing is committed; the
+        reference is kept only if the caller commits the Hubfile that points at it.
+        """
+        blob = self.get_by_checksum(md5)
+        if blob is None:
+            try:
+                # A concurrent upload of the same content may win the insert
+                with self.session.begin_nested():
+                    blob = self.create(commit=False, checksum=md5, crc32=crc32, size=size, ref_count=1)
+                return blob
+            except IntegrityError:
+                blob = self.get_by_checksum(md5)
+        self.add_reference(blob)
+        return blob
+
+    def add_reference(self, blob: Blob):
+        self.session.execute(
+            update(self.model).where(self.model.id == blob.id).values(ref_count=self.model.ref_count + 1)
+        )
+        self.session.expire(blob, ["ref_count"])
+
+    def recount_references(self):
+        """Resets every ref_count to the number of Hubfiles actually pointing at the blob."""
+        references = (
+            select(func.count(Hubfile.id))
+            .where(Hubfile.blob_id == self.model.id)
+            .correlate(self.model)
+            .scalar_subquery()
+        )
+        self.session.execute(update(self.model).values(ref_count=references))
+
+    def unreferenced(self):
+        return self.model.query.filter(self.model.ref_count <= 0).all()
+
+    def all_checksums(self):
+        return set(self.session.scalars(select(self.model.checksum)))
+
 
 class HubfileViewRecordRepository(BaseRepository):
     def __init__(self):
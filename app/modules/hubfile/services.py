@@ -1,14 +1,22 @@
+import logging
 import os
+import time
+import uuid
 
 from app.modules.auth.models import User
 from app.modules.dataset.models import DataSet
-from app.modules.hubfile.models import Hubfile
+from app.modules.hubfile.models import Blob, Hubfile
 from app.modules.hubfile.repositories import (
+    BlobRepository,
     HubfileDownloadRecordRepository,
     HubfileRepository,
     HubfileViewRecordRepository,
 )
 from core.services.BaseService import BaseService
+from core.storage.hashing import FileDigest, copy_file, file_digest
+from core.storage.resolver import blob_path, dataset_file_path, stored_file_path, uploads_root
+
+logger = logging.getLogger(__name__)
 
 
 class HubfileService(BaseService):
@@ -27,14 +35,25 @@ class HubfileService(BaseService):
 
         hubfile_user = self.get_owner_user_by_hubfile(hubfile)
         hubfile_dataset = self.get_dataset_by_hubfile(hubfile)
-        working_dir = os.getenv("WORKING_DIR")
-
-        path = os.path.join(
-            working_dir, "uploads", f"user_{hubfile_user.id}", f"dataset_{hubfile_dataset.id}", hubfile.name
-        )
+        blob_checksum = hubfile.blob.checksum if hubfile.blob else None
+        path = stored_file_path(hubfile_user.id, hubfile_dataset.id, hubfile.name, blob_checksum)
 
         return path
 
+    def stored_files(self, dataset_ids):
+        """(dataset id, file name, path on disk) of every file of the given datasets, resolved in one query."""
+        return [
+            (dataset_id, name, stored_file_path(user_id, dataset_id, name, blob_checksum))
+            for dataset_id, user_id, name, blob_checksum in self.repository.stored_files(dataset_ids)
+        ]
+
+    def stored_models(self, dataset_id):
+        """(file name, file checksum, path on disk) of every file of a dataset, resolved in one query."""
+        return [
+            (name, checksum, stored_file_path(user_id, dataset_id, name, blob_checksum))
+            for name, checksum, user_id, blob_checksum in self.repository.stored_models(dataset_id)
+        ]
+
     def total_hubfile_views(self) -> int:
         return self.hubfile_view_record_repository.total_hubfile_views()
 
@@ -46,3 +65,134 @@ class HubfileService(BaseService):
 class HubfileDownloadRecordService(BaseService):
     def __init__(self):
         super().__init__(HubfileDownloadRecordRepository())
+
+
+class BlobService(BaseService):
+    """
+    Content-addressed store of file contents. Each distinct content is kept once under uploads/blobs/ and shared by
+    every Hubfile with that checksum, so copying files between datasets only adds references.
+    """
+
+    def __init__(self):
+        super().__init__(BlobRepository())
+
+    def acquire(self, digest: FileDigest) -> Blob:
+        return self.repository.acquire(digest.md5, digest.crc32, digest.size)
+
+    def add_reference(self, blob: Blob):
+        self.repository.add_reference(blob)
+
+    def store(self, source_path: str, checksum: str) -> str:
+        """
+        Makes the content of source_path available as a blob, leaving the source untouched. It is hard linked when
+        possible, which costs no I/O, and copied otherwise. Blobs appear atomically.
+        """
+        destination = blob_path(checksum)
+        if os.path.exists(destination):
+            return destination
+
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        temp_path = f"{destination}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.link(source_path, temp_path)
+        except OSError:
+            copy_file(source_path, temp_path)
+        os.replace(temp_path, destination)
+        return destination
+
+    def migrate_legacy_files(self, batch_size: int = 200, dry_run: bool = False) -> dict:
+        """
+        Converts files stored in the legacy uploads/user_X/dataset_Y layout to blobs, in place. Every batch is
+        committed before its legacy copies are removed, so an interrupted run leaves every file readable and can
+        simply be started again.
+        """
+        stats = {"files": 0, "blobs": 0, "duplicates": 0, "missing": 0, "bytes_saved": 0}
+        seen = self.repository.all_checksums()
+        after_id = 0
+
+        while True:
+            rows = self.hubfile_repository.legacy_files(after_id, batch_size)
+            if not rows:
+                break
+
+            migrated_paths = []
+            for hubfile, user_id, dataset_id in rows:
+                after_id = hubfile.id
+                path = dataset_file_path(user_id, dataset_id, hubfile.name)
+                if not os.path.exists(path):
+                    logger.warning(f"Missing file for Hubfile {hubfile.id}: {path}")
+                    stats["missing"] += 1
+                    continue
+
+                digest = file_digest(path)
+                stats["files"] += 1
+                if digest.md5 in seen:
+                    stats["duplicates"] += 1
+                    stats["bytes_saved"] += digest.size
+                else:
+                    stats["blobs"] += 1
+                    seen.add(digest.md5)
+
+                if dry_run:
+                    continue
+                blob = self.acquire(digest)
+                self.store(path, digest.md5)
+                hubfile.blob_id = blob.id
+                hubfile.checksum = digest.md5
+                hubfile.size = digest.size
+                migrated_paths.append(path)
+
+            if dry_run:
+                continue
+            self.repository.session.commit()
+            for path in migrated_paths:
+                self._remove_legacy_file(path)
+
+        return stats
+
+    def collect_garbage(self, grace_seconds: int = 3600) -> dict:
+        """
+        Recounts the references of every blob and deletes the blobs nothing points at, as well as blob files without
+        a row (left by uploads that were never committed) and UVL verdicts of contents that are not blobs once they
+        are older than grace_seconds.
+        """
+        self.repository.recount_references()
+        removed_blobs = 0
+        for blob in self.repository.unreferenced():
+            self._remove(blob_path(blob.checksum))
+            self.repository.session.delete(blob)
+            removed_blobs += 1
+        self.repository.session.commit()
+
+        known = self.repository.all_checksums()
+        removed_files = 0
+        now = time.time()
+        for folder in ("blobs", "verdicts"):
+            for directory, _, files in os.walk(os.path.join(uploads_root(), folder)):
+                for name in files:
+                    path = os.path.join(directory, name)
+                    # Verdicts are named after the checksum of their content (see verdict_path)
+                    if name.split(".")[0] not in known and now - os.path.getmtime(path) > grace_seconds:
+                        self._remove(path)
+                        removed_files += 1
+
+        return {"blobs": removed_blobs, "orphan_files": removed_files}
+
+    @property
+    def hubfile_repository(self) -> HubfileRepository:
+        return HubfileRepository()
+
+    def _remove_legacy_file(self, path):
+        self._remove(path)
+        # Drop the dataset and user folders once they are empty
+        for folder in (os.path.dirname(path), os.path.dirname(os.path.dirname(path))):
+            try:
+                os.rmdir(folder)
+            except OSError:
+                break
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
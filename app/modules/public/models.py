@@ -0,0 +1,96 @@
+from sqlalchemy import event, func, inspect, select, update
+
+from app import db
+from app.modules.dataset.models import DataSet, DSDownloadRecord, DSMetaData, DSViewRecord
+from app.modules.featuremodel.models import FeatureModel
+from app.modules.hubfile.models import HubfileDownloadRecord, HubfileViewRecord
+
+DATASETS = "datasets"
+FEATURE_MODELS = "feature_models"
+DATASET_VIEWS = "dataset_views"
+DATASET_DOWNLOADS = "dataset_downloads"
+FEATURE_MODEL_VIEWS = "feature_model_views"
+FEATURE_MODEL_DOWNLOADS = "feature_model_downloads"
+
+COUNTERS = (DATASETS, FEATURE_MODELS, DATASET_VIEWS, DATASET_DOWNLOADS, FEATURE_MODEL_VIEWS, FEATURE_MODEL_DOWNLOADS)
+
+
+class HubCounter(db.Model):
+    """Running totals shown on the homepage, kept up to date as records are created and deleted."""
+
+    __tablename__ = "hub_counter"
+
+    name = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0, server_default="0")
+
+    def __repr__(self):
+        return f"HubCounter<{self.name}={self.value}>"
+
+
+def increment_counter(connection, name, amount=1):
+    # A relative update in the same transaction as the change it counts: concurrent writers never lose an increment
+    # and a rollback undoes both
+    connection.execute(
+        update(HubCounter.__table__).where(HubCounter.name == name).values(value=HubCounter.value + amount)
+    )
+
+
+# Every row of these tables counts once. Rows written with Core statements bypass the mapper events below, so
+# whoever writes them must increment the counter itself
+RECORD_COUNTERS = {
+    FeatureModel: FEATURE_MODELS,
+    DSViewRecord: DATASET_VIEWS,
+    DSDownloadRecord: DATASET_DOWNLOADS,
+    HubfileViewRecord: FEATURE_MODEL_VIEWS,
+    HubfileDownloadRecord: FEATURE_MODEL_DOWNLOADS,
+}
+
+
+def _count_records(model, name):
+    @event.listens_for(model, "after_insert")
+    def record_created(mapper, connection, target):
+        increment_counter(connection, name)
+
+    @event.listens_for(model, "after_delete")
+    def record_deleted(mapper, connection, target):
+        increment_counter(connection, name, -1)
+
+
+for _model, _name in RECORD_COUNTERS.items():
+    _count_records(_model, _name)
+
+
+# Only synchronized datasets (those with a DOI) are counted, and a dataset usually gets its DOI after being created
+
+
+def _is_synchronized(connection, ds_meta_data_id):
+    return (
+        connection.execute(select(DSMetaData.dataset_doi).where(DSMetaData.id == ds_meta_data_id)).scalar() is not None
+    )
+
+
+@event.listens_for(DataSet, "after_insert", propagate=True)
+def dataset_created(mapper, connection, dataset):
+    if _is_synchronized(connection, dataset.ds_meta_data_id):
+        increment_counter(connection, DATASETS)
+
+
+@event.listens_for(DataSet, "after_delete", propagate=True)
+def dataset_deleted(mapper, connection, dataset):
+    if _is_synchronized(connection, dataset.ds_meta_data_id):
+        increment_counter(connection, DATASETS, -1)
+
+
+@event.listens_for(DSMetaData, "after_update")
+def dataset_doi_changed(mapper, connection, ds_meta_data):
+    history = inspect(ds_meta_data).attrs.dataset_doi.history
+    if not history.has_changes():
+        return
+    was_synchronized = any(value is not None for value in history.deleted)
+    is_synchronized = ds_meta_data.dataset_doi is not None
+    if was_synchronized == is_synchronized:
+        return
+    datasets = connection.execute(
+        select(func.count(DataSet.id)).where(DataSet.ds_meta_data_id == ds_meta_data.id)
+    ).scalar()
+    increment_counter(connection, DATASETS, datasets if is_synchronized else -datasets)
@@ -0,0 +1,45 @@
+from sqlalchemy import delete, func, insert, select
+
+from app.modules.dataset.models import DataSet, DSDownloadRecord, DSMetaData, DSViewRecord
+from app.modules.featuremodel.models import FeatureModel
+from app.modules.hubfile.models import HubfileDownloadRecord, HubfileViewRecord
+from app.modules.public.models import (
+    DATASET_DOWNLOADS,
+    DATASET_VIEWS,
+    DATASETS,
+    FEATURE_MODEL_DOWNLOADS,
+    FEATURE_MODEL_VIEWS,
+    FEATURE_MODELS,
+    HubCounter,
+)
+from core.repositories.BaseRepository import BaseRepository
+
+
+class HubCounterRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(HubCounter)
+
+    def values(self) -> dict:
+        return dict(self.session.execute(select(HubCounter.name, HubCounter.value)).all())
+
+    def reset(self, values: dict):
+        """Replaces every counter with the given values."""
+        self.session.execute(delete(HubCounter))
+        self.session.execute(insert(HubCounter), [{"name": name, "value": value} for name, value in values.items()])
+
+    def actual_values(self) -> dict:
+        """The counters computed from the tables they summarize, one COUNT each."""
+
+        def count(model):
+            return self.session.execute(select(func.count()).select_from(model)).scalar_one()
+
+        return {
+            DATASETS: self.session.execute(
+                select(func.count(DataSet.id)).join(DSMetaData).where(DSMetaData.dataset_doi.isnot(None))
+            ).scalar_one(),
+            FEATURE_MODELS: count(FeatureModel),
+            DATASET_VIEWS: count(DSViewRecord),
+            DATASET_DOWNLOADS: count(DSDownloadRecord),
+            FEATURE_MODEL_VIEWS: count(HubfileViewRecord),
+            FEATURE_MODEL_DOWNLOADS: count(HubfileDownloadRecord),
+        }
@@ -0,0 +1,52 @@
+import logging
+
+from flask import current_app
+
+from app.modules.explore.services import ExploreService
+from app.modules.public.models import COUNTERS
+from app.modules.public.repositories import HubCounterRepository
+from core.cache.ttl import TTLCache
+from core.services.BaseService import BaseService
+
+logger = logging.getLogger(__name__)
+
+LATEST_DATASETS = 5
+
+# One snapshot per worker process
+_snapshots = TTLCache()
+
+
+class StatisticsService(BaseService):
+    def __init__(self):
+        super().__init__(HubCounterRepository())
+
+    def counters(self) -> dict:
+        """
+        Current value of every homepage counter, read from the hub_counter table in a single query. The counters are
+        rebuilt from the tables they summarize if any is missing, e.g. on a freshly created database.
+        """
+        values = self.repository.values()
+        if any(name not in values for name in COUNTERS):
+            values = self.recount()
+        return values
+
+    def recount(self) -> dict:
+        """Recomputes every counter from scratch, fixing any drift. Returns the new values."""
+        values = self.repository.actual_values()
+        self.repository.reset(values)
+        self.repository.session.commit()
+        logger.info("Homepage counters recounted: %s", values)
+        return values
+
+    def homepage_snapshot(self) -> dict:
+        """
+        Everything the homepage shows: the counters and the latest synchronized datasets. The snapshot is cached in
+        the worker for STATISTICS_CACHE_TTL seconds, so most hits run no query at all.
+        """
+        return _snapshots.get("homepage", self._build_snapshot, current_app.config["STATISTICS_CACHE_TTL"])
+
+    def _build_snapshot(self):
+        return {
+            "counters": self.counters(),
+            "datasets": ExploreService().latest_synchronized(LATEST_DATASETS),
+        }
@@ -0,0 +1,163 @@
+import re
+import threading
+
+import pytest
+from sqlalchemy import event
+
+from app import db
+from app.modules.auth.models import User
+from app.modules.dataset.models import DataSet, DSMetaData, DSViewRecord, PublicationType
+from app.modules.public import services as public_services
+from app.modules.public.models import DATASET_VIEWS, DATASETS
+from app.modules.public.services import StatisticsService
+from app.modules.public.tracking import record_tracker
+from core.events.buffer import EventBuffer
+from core.instrumentation.metrics import endpoint_summary, parse_metrics
+from core.managers.instrumentation_manager import metrics_registry
+
+
+@pytest.fixture
+def statistics_dataset(test_client):
+    """Un dataset sin DOI (aún no sincronizado) y el servicio con los contadores recién recalculados."""
+    user = User.query.filter_by(email="stats_tester@example.com").first()
+    if not user:
+        user = User(email="stats_tester@example.com", password="password123")
+        db.session.add(user)
+        db.session.commit()
+
+    meta = DSMetaData(
+        title="Statistics dataset",
+        description="Dataset used by the homepage statistics tests",
+        publication_type=PublicationType.JOURNAL_ARTICLE,
+        tags="stats",
+    )
+    db.session.add(meta)
+    db.session.commit()
+    dataset = DataSet(user_id=user.id, ds_meta_data_id=meta.id)
+    db.session.add(dataset)
+    db.session.commit()
+
+    service = StatisticsService()
+    service.recount()
+
+    dataset_id, meta_id = dataset.id, meta.id
+    yield service, dataset
+
+    db.session.rollback()
+    DSViewRecord.query.filter_by(dataset_id=dataset_id).delete()
+    DataSet.query.filter_by(id=dataset_id).delete()
+    DSMetaData.query.filter_by(id=meta_id).delete()
+    db.session.commit()
+
+
+def test_counters_follow_records_as_they_change(statistics_dataset):
+    service, dataset = statistics_dataset
+    before = service.counters()
+
+    # Recibir el DOI lo cuenta como dataset sincronizado
+    dataset.ds_meta_data.dataset_doi = "10.1234/stats.1"
+    db.session.add(DSViewRecord(dataset_id=dataset.id, view_cookie="stats-cookie"))
+    db.session.commit()
+
+    after = service.counters()
+    assert after[DATASETS] == before[DATASETS] + 1
+    assert after[DATASET_VIEWS] == before[DATASET_VIEWS] + 1
+    # Los contadores incrementales coinciden con un recuento completo
+    assert after == service.repository.actual_values()
+
+    for view in DSViewRecord.query.filter_by(dataset_id=dataset.id):
+        db.session.delete(view)
+    db.session.delete(dataset)
+    db.session.commit()
+    assert service.counters()[DATASETS] == before[DATASETS]
+    assert service.counters() == service.repository.actual_values()
+
+
+def test_homepage_is_served_from_the_cached_snapshot(test_client, statistics_dataset, monkeypatch):
+    _, dataset = statistics_dataset
+    dataset.ds_meta_data.dataset_doi = "10.1234/stats.2"
+    db.session.commit()
+
+    monkeypatch.setitem(test_client.application.config, "STATISTICS_CACHE_TTL", 60)
+    monkeypatch.setattr(public_services, "_snapshots", public_services.TTLCache())
+
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    first = test_client.get("/")
+    assert first.status_code == 200
+    assert b"Statistics dataset" in first.data
+
+    event.listen(db.engine, "before_cursor_execute", count_statement)
+    try:
+        second = test_client.get("/")
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count_statement)
+
+    assert second.status_code == 200
+    assert second.data == first.data
+    assert statements == []
+
+
+def test_views_are_buffered_and_written_once_per_cookie(test_client, statistics_dataset):
+    service, dataset = statistics_dataset
+    dataset.ds_meta_data.dataset_doi = "10.1234/stats.3"
+    db.session.commit()
+    record_tracker.flush()
+    views_before = service.counters()[DATASET_VIEWS]
+
+    test_client.set_cookie("view_cookie", "buffered-cookie")
+    for _ in range(3):
+        assert test_client.get("/doi/10.1234/stats.3/").status_code == 200
+    test_client.delete_cookie("view_cookie")
+
+    # Nada se escribe en la petición
+    assert DSViewRecord.query.filter_by(dataset_id=dataset.id).count() == 0
+
+    assert record_tracker.flush() == 3
+    records = DSViewRecord.query.filter_by(dataset_id=dataset.id).all()
+    assert [record.view_cookie for record in records] == ["buffered-cookie"]
+    assert service.counters()[DATASET_VIEWS] == views_before + 1
+
+
+def test_event_buffer_flushes_when_full():
+    written = []
+    flushed = threading.Event()
+
+    def write(events):
+        written.append(events)
+        flushed.set()
+
+    buffer = EventBuffer(write, max_events=3, flush_interval=60)
+    buffer.push("views", 1)
+    buffer.push("downloads", 2)
+    assert written == []
+
+    buffer.push("views", 3)
+    assert flushed.wait(5)
+    assert written == [{"views": [1, 3], "downloads": [2]}]
+    assert len(buffer) == 0
+
+
+def test_requests_are_measured_and_exposed_as_metrics(test_client, monkeypatch):
+    metrics_registry.reset()
+    monkeypatch.setitem(test_client.application.config, "SERVER_TIMING", True)
+
+    response = test_client.get("/")
+    assert response.status_code == 200
+    assert re.fullmatch(r'sql;dur=[\d.]+;desc="\d+ queries", app;dur=[\d.]+', response.headers["Server-Timing"])
+    test_client.get("/")
+
+    metrics = test_client.get("/metrics")
+    assert metrics.status_code == 200
+    assert metrics.mimetype == "text/plain"
+    assert 'uvlhub_http_requests_total{endpoint="public.index"} 2' in metrics.text
+    # /metrics no se mide a sí mismo
+    assert 'endpoint="metrics"' not in metrics.text
+
+    summary = endpoint_summary(parse_metrics(metrics.text))
+    assert summary["public.index"]["requests"] == 2
+    assert summary["public.index"]["max_statements"] > 0
+    assert summary["public.index"]["mean_ms"] > 0
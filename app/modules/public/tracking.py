@@ -0,0 +1,77 @@
+import threading
+from collections import Counter
+
+from flask import current_app
+from sqlalchemy import insert, update
+
+from app import db
+from app.modules.public.models import RECORD_COUNTERS, increment_counter
+from core.events.buffer import EventBuffer
+
+
+def insert_ignoring_duplicates(model):
+    """INSERT that silently skips rows clashing with a unique key, instead of checking for them first."""
+    return (
+        insert(model.__table__)
+        .prefix_with("IGNORE", dialect="mysql")
+        .prefix_with("IGNORE", dialect="mariadb")
+        .prefix_with("OR IGNORE", dialect="sqlite")
+    )
+
+
+class RecordTracker:
+    """
+    Records views and downloads without writing on the request path.
+
+    Records are buffered in the worker and written in bulk, one executemany per table, by the event buffer thread.
+    The unique (cookie, target) key of every record table drops repeated views and downloads of the same browser, so
+    nothing is read before writing. Counter columns such as DataSet.download_count are buffered the same way and
+    written in the same transaction, one UPDATE per row whatever the number of increments.
+    """
+
+    def __init__(self):
+        self._app = None
+        self._buffer = None
+        self._lock = threading.Lock()
+
+    def track(self, model, **record):
+        """Buffers a record of model (one of the view or download record models). Must run in an app context."""
+        self._started().push(model, record)
+
+    def increment(self, column, row_id):
+        """Buffers an increment by one of a counter column (e.g. DataSet.download_count) of the row with that id."""
+        self._started().push(column, row_id)
+
+    def _started(self) -> EventBuffer:
+        if self._buffer is None:
+            with self._lock:
+                if self._buffer is None:
+                    self._app = current_app._get_current_object()
+                    self._buffer = EventBuffer(
+                        self._write,
+                        max_events=self._app.config["EVENT_BUFFER_MAX_EVENTS"],
+                        flush_interval=self._app.config["EVENT_BUFFER_FLUSH_INTERVAL"],
+                    )
+        return self._buffer
+
+    def flush(self) -> int:
+        """Writes the buffered records now. Returns how many were buffered."""
+        return self._buffer.flush() if self._buffer is not None else 0
+
+    def _write(self, events):
+        with self._app.app_context(), db.engine.begin() as connection:
+            for key, values in events.items():
+                if not isinstance(key, type):
+                    entity = key.class_
+                    for row_id, increments in Counter(values).items():
+                        connection.execute(
+                            update(entity).where(entity.id == row_id).values({key.key: key + increments})
+                        )
+                    continue
+                inserted = connection.execute(insert_ignoring_duplicates(key), values).rowcount
+                if inserted > 0:
+                    # Core inserts bypass the mapper events that keep the homepage counters
+                    increment_counter(connection, RECORD_COUNTERS[key], inserted)
+
+
+record_tracker = RecordTracker()
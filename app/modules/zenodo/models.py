@@ -1,5 +1,77 @@
+from datetime import datetime, timezone
+from enum import Enum
+
+from sqlalchemy import Enum as SQLAlchemyEnum
+
 from app import db
 
 
 class Zenodo(db.Model):
     id = db.Column(db.Integer, primary_key=True)
+
+
+class ZenodoJobStatus(Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class ZenodoJobStep(Enum):
+    """Steps of a publication, in order. A retried job resumes at the step that failed."""
+
+    CREATE_DEPOSITION = "create_deposition"
+    UPLOAD_FILES = "upload_files"
+    PUBLISH = "publish"
+    UPDATE_DOI = "update_doi"
+    DONE = "done"
+
+
+class ZenodoJob(db.Model):
+    """
+    Publication of a dataset in Zenodo, run in the background by `flask zenodo worker`. There is a single job per
+    dataset, identified by its idempotency key, so enqueuing it twice never creates two depositions.
+    """
+
+    __tablename__ = "zenodo_job"
+    # The worker polls for due jobs
+    __table_args__ = (db.Index("ix_zenodo_job_status_next_run_at", "status", "next_run_at"),)
+    id = db.Column(db.Integer, primary_key=True)
+    dataset_id = db.Column(db.Integer, db.ForeignKey("data_set.id", ondelete="CASCADE"), nullable=False, index=True)
+    idempotency_key = db.Column(db.String(64), nullable=False, unique=True)
+    status = db.Column(SQLAlchemyEnum(ZenodoJobStatus), nullable=False, default=ZenodoJobStatus.QUEUED)
+    step = db.Column(SQLAlchemyEnum(ZenodoJobStep), nullable=False, default=ZenodoJobStep.CREATE_DEPOSITION)
+    # Feature models already uploaded, so that a retry does not send them again
+    files_uploaded = db.Column(db.Integer, nullable=False, default=0)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    next_run_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    locked_by = db.Column(db.String(64))
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    updated_at = db.Column(
+        db.DateTime,
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc),
+    )
+
+    dataset = db.relationship("DataSet", backref=db.backref("zenodo_jobs", lazy=True, cascade="all, delete-orphan"))
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "dataset_id": self.dataset_id,
+            "status": self.status.value,
+            "step": self.step.value,
+            "files_uploaded": self.files_uploaded,
+            "attempts": self.attempts,
+            "max_attempts": self.max_attempts,
+            "next_run_at": self.next_run_at.isoformat() if self.status == ZenodoJobStatus.QUEUED else None,
+            "last_error": self.last_error,
+            "dataset_doi": self.dataset.ds_meta_data.dataset_doi,
+        }
+
+    def __repr__(self):
+        return f"ZenodoJob<{self.id} dataset={self.dataset_id} {self.status.value}:{self.step.value}>"
@@ -1,7 +1,59 @@
-from app.modules.zenodo.models import Zenodo
+from sqlalchemy import and_, or_, select, update
+
+from app.modules.zenodo.models import Zenodo, ZenodoJob, ZenodoJobStatus
 from core.repositories.BaseRepository import BaseRepository
 
 
 class ZenodoRepository(BaseRepository):
     def __init__(self):
         super().__init__(Zenodo)
+
+
+class ZenodoJobRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(ZenodoJob)
+
+    def get_by_idempotency_key(self, idempotency_key: str):
+        return self.model.query.filter_by(idempotency_key=idempotency_key).first()
+
+    def latest_for_dataset(self, dataset_id: int):
+        return self.model.query.filter_by(dataset_id=dataset_id).order_by(self.model.id.desc()).first()
+
+    def _runnable(self, now, stale_before):
+        # Jobs whose worker died keep RUNNING forever unless their lease can expire
+        return or_(
+            and_(self.model.status == ZenodoJobStatus.QUEUED, self.model.next_run_at <= now),
+            and_(self.model.status == ZenodoJobStatus.RUNNING, self.model.locked_at < stale_before),
+        )
+
+    def claim_next(self, worker_id: str, now, stale_before):
+        """
+        Locks the next runnable job for worker_id and counts the attempt. The claim is a conditional UPDATE, so when
+        several workers race for the same job only one of them gets it.
+
+        :return: The claimed job, or None if there is nothing to run.
+        """
+        while True:
+            job_id = self.session.scalar(
+                select(self.model.id)
+                .where(self._runnable(now, stale_before))
+                .order_by(self.model.next_run_at, self.model.id)
+                .limit(1)
+            )
+            if job_id is None:
+                return None
+
+            claimed = self.session.execute(
+                update(self.model)
+                .where(self.model.id == job_id, self._runnable(now, stale_before))
+                .values(
+                    status=ZenodoJobStatus.RUNNING,
+                    locked_by=worker_id,
+                    locked_at=now,
+                    attempts=self.model.attempts + 1,
+                )
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            self.session.commit()
+            if claimed:
+                return self.get_by_id(job_id)
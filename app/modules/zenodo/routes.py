@@ -1,7 +1,10 @@
-from flask import render_template
+import click
+from flask import abort, jsonify, render_template
+from flask_login import current_user, login_required
 
+from app.modules.dataset.models import DataSet
 from app.modules.zenodo import zenodo_bp
-from app.modules.zenodo.services import ZenodoService
+from app.modules.zenodo.services import ZenodoJobService, ZenodoService
 
 
 @zenodo_bp.route("/zenodo", methods=["GET"])
@@ -13,3 +16,25 @@ def index():
 def zenodo_test() -> dict:
     service = ZenodoService()
     return service.test_full_connection()
+
+
+@zenodo_bp.route("/zenodo/jobs/dataset/<int:dataset_id>", methods=["GET"])
+@login_required
+def publication_status(dataset_id):
+    dataset = DataSet.query.get_or_404(dataset_id)
+    if dataset.user_id != current_user.id:
+        abort(404)
+
+    status = ZenodoJobService().status_for_dataset(dataset_id)
+    if status is None:
+        return jsonify({"message": "This dataset has no publication in Zenodo"}), 404
+    return jsonify(status)
+
+
+@zenodo_bp.cli.command("worker", help="Publishes queued datasets in Zenodo.")
+@click.option("--poll-interval", default=5.0, show_default=True, help="Seconds to wait when the queue is empty.")
+@click.option("--once", is_flag=True, help="Exit when the queue is empty instead of waiting for new jobs.")
+def zenodo_worker(poll_interval, once):
+    click.echo(click.style("Zenodo worker started", fg="yellow"))
+    processed = ZenodoJobService().work(poll_interval=poll_interval, once=once)
+    click.echo(click.style(f"Zenodo worker finished after {processed} jobs", fg="green"))
@@ -1,21 +1,50 @@
 import logging
 import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from urllib.parse import quote
 
 import requests
 from dotenv import load_dotenv
 from flask import Response, jsonify
 from flask_login import current_user
+from requests.adapters import HTTPAdapter
+from sqlalchemy.exc import IntegrityError
 
 from app.modules.dataset.models import DataSet
 from app.modules.featuremodel.models import FeatureModel
-from app.modules.zenodo.repositories import ZenodoRepository
-from core.configuration.configuration import uploads_folder_name
+from app.modules.zenodo.models import ZenodoJob, ZenodoJobStatus, ZenodoJobStep
+from app.modules.zenodo.repositories import ZenodoJobRepository, ZenodoRepository
 from core.services.BaseService import BaseService
+from core.storage.resolver import stored_file_path
 
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+_session = None
+_session_lock = threading.Lock()
+
+
+def pooled_session(pool_size: int) -> requests.Session:
+    """
+    HTTP session shared by every ZenodoService of the process. Connections to Zenodo are kept alive and reused,
+    so only the first request pays for the TLS handshake; the pool holds one connection per concurrent upload.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(pool_size, 1))
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
 
 class ZenodoService(BaseService):
     def get_zenodo_url(self):
@@ -34,12 +63,17 @@ class ZenodoService(BaseService):
     def get_zenodo_access_token(self):
         return os.getenv("ZENODO_ACCESS_TOKEN")
 
-    def __init__(self):
+    # Connect and read timeouts; sending the file itself is not bounded
+    UPLOAD_TIMEOUT = (5, 60)
+
+    def __init__(self, session: Optional[requests.Session] = None, max_concurrent_uploads: Optional[int] = None):
         super().__init__(ZenodoRepository())
         self.ZENODO_ACCESS_TOKEN = self.get_zenodo_access_token()
         self.ZENODO_API_URL = self.get_zenodo_url()
         self.headers = {"Content-Type": "application/json"}
         self.params = {"access_token": self.ZENODO_ACCESS_TOKEN}
+        self.max_concurrent_uploads = max_concurrent_uploads or int(os.getenv("ZENODO_MAX_CONCURRENT_UPLOADS", "4"))
+        self.session = session or pooled_session(self.max_concurrent_uploads)
 
     def test_connection(self) -> bool:
         """
@@ -48,7 +82,7 @@ class ZenodoService(BaseService):
         Returns:
             bool: True if the connection is successful, False otherwise.
         """
-        response = requests.get(
+        response = self.session.get(
             self.ZENODO_API_URL,
             params=self.params,
             headers=self.headers,
@@ -85,7 +119,7 @@ class ZenodoService(BaseService):
             }
         }
 
-        response = requests.post(
+        response = self.session.post(
             self.ZENODO_API_URL,
             json=data,
             params=self.params,
@@ -105,10 +139,10 @@ class ZenodoService(BaseService):
 
         # Step 2: Upload an empty file to the deposition
         data = {"name": "test_file.txt"}
-        files = {"file": open(file_path, "rb")}
         publish_url = f"{self.ZENODO_API_URL}/{deposition_id}/files"
-        response = requests.post(publish_url, params=self.params, data=data, files=files, timeout=5)
-        files["file"].close()  # Close the file after uploading
+        with open(file_path, "rb") as test_file:
+            files = {"file": test_file}
+            response = self.session.post(publish_url, params=self.params, data=data, files=files, timeout=5)
 
         logger.info(f"Publish URL: {publish_url}")
         logger.info(f"Params: {self.params}")
@@ -122,7 +156,7 @@ class ZenodoService(BaseService):
             success = False
 
         # Step 3: Delete the deposition
-        response = requests.delete(
+        response = self.session.delete(
             f"{self.ZENODO_API_URL}/{deposition_id}",
             params=self.params,
             timeout=5,
@@ -140,7 +174,7 @@ class ZenodoService(BaseService):
         Returns:
             dict: The response in JSON format with the depositions.
         """
-        response = requests.get(
+        response = self.session.get(
             self.ZENODO_API_URL,
             params=self.params,
             headers=self.headers,
@@ -190,7 +224,7 @@ class ZenodoService(BaseService):
 
         data = {"metadata": metadata}
 
-        response = requests.post(
+        response = self.session.post(
             self.ZENODO_API_URL,
             params=self.params,
             json=data,
@@ -202,6 +236,20 @@ class ZenodoService(BaseService):
             raise Exception(error_message)
         return response.json()
 
+    def file_to_upload(self, dataset: DataSet, feature_model: FeatureModel, user=None) -> tuple:
+        """
+        Name and path on disk of the file of a feature model. Paths are resolved here, in the calling thread, so
+        that the uploads themselves never touch the database.
+        """
+        uvl_filename = feature_model.fm_meta_data.uvl_filename
+        user_id = current_user.id if user is None else user.id
+        hubfile = next((file for file in feature_model.files if file.name == uvl_filename), None)
+        blob_checksum = hubfile.blob.checksum if hubfile is not None and hubfile.blob else None
+        return uvl_filename, stored_file_path(user_id, dataset.id, uvl_filename, blob_checksum)
+
+    def get_bucket_url(self, deposition_id: int) -> str:
+        return self.get_deposition(deposition_id)["links"]["bucket"]
+
     def upload_file(
         self,
         dataset: DataSet,
@@ -220,20 +268,36 @@ class ZenodoService(BaseService):
         Returns:
             dict: The response in JSON format with the details of the uploaded file.
         """
-        uvl_filename = feature_model.fm_meta_data.uvl_filename
-        data = {"name": uvl_filename}
-        user_id = current_user.id if user is None else user.id
-        file_path = os.path.join(
-            uploads_folder_name(),
-            f"user_{str(user_id)}",
-            f"dataset_{dataset.id}/",
-            uvl_filename,
-        )
-        files = {"file": open(file_path, "rb")}
+        name, file_path = self.file_to_upload(dataset, feature_model, user)
+        return self._put_file(self.get_bucket_url(deposition_id), name, file_path)
 
-        publish_url = f"{self.ZENODO_API_URL}/{deposition_id}/files"
-        response = requests.post(publish_url, params=self.params, data=data, files=files, timeout=5)
-        if response.status_code != 201:
+    def upload_files(self, deposition_id: int, files: list) -> list:
+        """
+        Upload several files to a deposition at once, at most max_concurrent_uploads at a time.
+
+        Args:
+            deposition_id (int): The ID of the deposition in Zenodo.
+            files (list): (name, path) pairs, as given by file_to_upload.
+
+        Returns:
+            list: For every file, in order, None if it was uploaded or the exception that made it fail. Every
+            upload is attempted even if some fail.
+        """
+        if not files:
+            return []
+        bucket_url = self.get_bucket_url(deposition_id)
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrent_uploads, len(files))) as executor:
+            futures = [executor.submit(self._put_file, bucket_url, name, path) for name, path in files]
+        return [future.exception() for future in futures]
+
+    def _put_file(self, bucket_url: str, name: str, file_path: str) -> dict:
+        # The bucket API takes the raw content, so the file is streamed from disk instead of being encoded as a
+        # multipart body in memory. PUT replaces the file, so an upload can be retried safely.
+        with open(file_path, "rb") as file:
+            response = self.session.put(
+                f"{bucket_url}/{quote(name)}", params=self.params, data=file, timeout=self.UPLOAD_TIMEOUT
+            )
+        if response.status_code not in (200, 201):
             error_message = f"Failed to upload files. Error details: {response.json()}"
             raise Exception(error_message)
         return response.json()
@@ -249,7 +313,7 @@ class ZenodoService(BaseService):
             dict: The response in JSON format with the details of the published deposition.
         """
         publish_url = f"{self.ZENODO_API_URL}/{deposition_id}/actions/publish"
-        response = requests.post(publish_url, params=self.params, headers=self.headers, timeout=5)
+        response = self.session.post(publish_url, params=self.params, headers=self.headers, timeout=5)
         if response.status_code != 202:
             raise Exception("Failed to publish deposition")
         return response.json()
@@ -265,7 +329,7 @@ class ZenodoService(BaseService):
             dict: The response in JSON format with the details of the deposition.
         """
         deposition_url = f"{self.ZENODO_API_URL}/{deposition_id}"
-        response = requests.get(deposition_url, params=self.params, headers=self.headers, timeout=5)
+        response = self.session.get(deposition_url, params=self.params, headers=self.headers, timeout=5)
         if response.status_code != 200:
             raise Exception("Failed to get deposition")
         return response.json()
@@ -281,3 +345,137 @@ class ZenodoService(BaseService):
             str: The DOI of the deposition.
         """
         return self.get_deposition(deposition_id).get("doi")
+
+
+class ZenodoJobService(BaseService):
+    """
+    Queue of dataset publications in Zenodo. Uploads only enqueue a job; a worker process (`flask zenodo worker`)
+    creates the deposition, uploads the files, publishes it and stores the DOI, committing after every step so that
+    a failed job is retried with exponential backoff from the step where it stopped.
+    """
+
+    BACKOFF_BASE_SECONDS = 30
+    BACKOFF_MAX_SECONDS = 3600
+    # A RUNNING job not finished after this long is considered abandoned by its worker
+    LEASE_SECONDS = 15 * 60
+
+    def __init__(self, zenodo_service: Optional[ZenodoService] = None):
+        super().__init__(ZenodoJobRepository())
+        self.zenodo_service = zenodo_service or ZenodoService()
+
+    @staticmethod
+    def idempotency_key(dataset_id: int) -> str:
+        return f"dataset-{dataset_id}-publish"
+
+    def backoff_delay(self, attempts: int) -> timedelta:
+        return timedelta(seconds=min(self.BACKOFF_BASE_SECONDS * 2 ** max(attempts - 1, 0), self.BACKOFF_MAX_SECONDS))
+
+    def enqueue_publication(self, dataset: DataSet) -> ZenodoJob:
+        """Queues the publication of a dataset, or returns the job already queued for it."""
+        key = self.idempotency_key(dataset.id)
+        job = self.repository.get_by_idempotency_key(key)
+        if job is not None:
+            return job
+        try:
+            return self.repository.create(dataset_id=dataset.id, idempotency_key=key)
+        except IntegrityError:
+            # Enqueued by a concurrent request
+            self.repository.session.rollback()
+            return self.repository.get_by_idempotency_key(key)
+
+    def status_for_dataset(self, dataset_id: int) -> Optional[dict]:
+        job = self.repository.latest_for_dataset(dataset_id)
+        return job.to_dict() if job else None
+
+    def run_next(self, worker_id: str) -> Optional[ZenodoJob]:
+        """Claims and runs the next due job. Returns it, or None when the queue is empty."""
+        now = datetime.now(timezone.utc)
+        job = self.repository.claim_next(worker_id, now, now - timedelta(seconds=self.LEASE_SECONDS))
+        if job is None:
+            return None
+
+        logger.info(f"Running {job} (attempt {job.attempts}/{job.max_attempts})")
+        try:
+            self._advance(job)
+        except Exception as exc:
+            logger.exception(f"{job} failed at step {job.step.value}: {exc}")
+            self._retry_or_fail(job, exc)
+        return job
+
+    def work(self, worker_id: Optional[str] = None, poll_interval: float = 5.0, once: bool = False) -> int:
+        """
+        Runs jobs until interrupted, sleeping poll_interval seconds whenever the queue is empty.
+
+        :param once: Stop as soon as the queue is empty instead of waiting for new jobs.
+        :return: Number of jobs run.
+        """
+        worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        processed = 0
+        while True:
+            job = self.run_next(worker_id)
+            if job is not None:
+                processed += 1
+                continue
+            if once:
+                return processed
+            time.sleep(poll_interval)
+
+    def _advance(self, job: ZenodoJob):
+        dataset = job.dataset
+        ds_meta_data = dataset.ds_meta_data
+        session = self.repository.session
+
+        if job.step == ZenodoJobStep.CREATE_DEPOSITION:
+            # A previous attempt may have created the deposition and failed right after
+            if not ds_meta_data.deposition_id:
+                deposition = self.zenodo_service.create_new_deposition(dataset)
+                ds_meta_data.deposition_id = deposition["id"]
+            job.step = ZenodoJobStep.UPLOAD_FILES
+            session.commit()
+
+        if job.step == ZenodoJobStep.UPLOAD_FILES:
+            # Los RawDataSet aún no tienen ficheros: se publican solo los metadatos
+            feature_models = sorted(getattr(dataset, "feature_models", []), key=lambda feature_model: feature_model.id)
+            pending = feature_models[job.files_uploaded :]
+            files = [self.zenodo_service.file_to_upload(dataset, fm, user=dataset.user) for fm in pending]
+            errors = self.zenodo_service.upload_files(ds_meta_data.deposition_id, files)
+
+            # Uploads finish in any order; progress only counts the files before the first failure
+            failed = [error for error in errors if error is not None]
+            job.files_uploaded += errors.index(failed[0]) if failed else len(errors)
+            session.commit()
+            if failed:
+                raise failed[0]
+            job.step = ZenodoJobStep.PUBLISH
+            session.commit()
+
+        if job.step == ZenodoJobStep.PUBLISH:
+            # Publishing twice fails, and a previous attempt may have published it before failing
+            retried = job.attempts > 1
+            if not retried or not self.zenodo_service.get_deposition(ds_meta_data.deposition_id).get("submitted"):
+                self.zenodo_service.publish_deposition(ds_meta_data.deposition_id)
+            job.step = ZenodoJobStep.UPDATE_DOI
+            session.commit()
+
+        if job.step == ZenodoJobStep.UPDATE_DOI:
+            ds_meta_data.dataset_doi = self.zenodo_service.get_doi(ds_meta_data.deposition_id)
+            job.step = ZenodoJobStep.DONE
+
+        job.status = ZenodoJobStatus.SUCCEEDED
+        job.locked_by = None
+        job.locked_at = None
+        job.last_error = None
+        session.commit()
+
+    def _retry_or_fail(self, job: ZenodoJob, exc: Exception):
+        session = self.repository.session
+        session.rollback()
+        job.last_error = str(exc)
+        job.locked_by = None
+        job.locked_at = None
+        if job.attempts >= job.max_attempts:
+            job.status = ZenodoJobStatus.FAILED
+        else:
+            job.status = ZenodoJobStatus.QUEUED
+            job.next_run_at = datetime.now(timezone.utc) + self.backoff_delay(job.attempts)
+        session.commit()
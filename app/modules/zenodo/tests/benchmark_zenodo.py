@@ -0,0 +1,95 @@
+"""
+Deposition wall time benchmark for ZenodoService.
+
+Publishes a dataset with 1, 10 and 100 feature model files against the local fake Zenodo server (which adds the
+given network latency to every request and to every new connection) and compares:
+
+    legacy      one connection per request and one upload after another, as before the pooled session
+    pooled      keep-alive connections from a pooled session, uploads one after another
+    concurrent  keep-alive connections and --concurrency uploads at a time
+
+Usage:
+    python -m app.modules.zenodo.tests.benchmark_zenodo --files 1,10,100 --latency 20 --handshake-latency 60
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.modules.dataset.models import DataSet, DSMetaData, PublicationType
+from app.modules.zenodo.services import ZenodoService
+from app.modules.zenodo.tests.fake_zenodo import FakeZenodo
+
+
+def make_session(pool_size, keep_alive=True):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    if not keep_alive:
+        session.headers["Connection"] = "close"
+    return session
+
+
+def publish(service, dataset, files):
+    deposition_id = service.create_new_deposition(dataset)["id"]
+    errors = service.upload_files(deposition_id, files)
+    if any(errors):
+        raise next(error for error in errors if error)
+    service.publish_deposition(deposition_id)
+    return service.get_doi(deposition_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", default="1,10,100", help="Comma separated numbers of files per deposition.")
+    parser.add_argument("--file-size", type=int, default=64, help="Size of every file in KiB.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent uploads of the concurrent strategy.")
+    parser.add_argument("--latency", type=float, default=20, help="Milliseconds added to every request.")
+    parser.add_argument("--handshake-latency", type=float, default=60, help="Milliseconds added to new connections.")
+    args = parser.parse_args()
+    logging.getLogger("app.modules.zenodo.services").setLevel(logging.WARNING)
+
+    dataset = DataSet(
+        ds_meta_data=DSMetaData(title="Benchmark", description="", publication_type=PublicationType.NONE, tags="")
+    )
+    strategies = {
+        "legacy": lambda: (make_session(1, keep_alive=False), 1),
+        "pooled": lambda: (make_session(1), 1),
+        "concurrent": lambda: (make_session(args.concurrency), args.concurrency),
+    }
+
+    with (
+        tempfile.TemporaryDirectory() as directory,
+        FakeZenodo(latency=args.latency / 1000, handshake_latency=args.handshake_latency / 1000) as fake,
+    ):
+        os.environ["ZENODO_API_URL"] = fake.url
+        content = os.urandom(args.file_size * 1024)
+        all_files = []
+        for index in range(max(int(count) for count in args.files.split(","))):
+            path = os.path.join(directory, f"model_{index}.uvl")
+            with open(path, "wb") as file:
+                file.write(content)
+            all_files.append((f"model_{index}.uvl", path))
+
+        print(f"{'files':>6} | " + " | ".join(f"{name:>20}" for name in strategies))
+        for count in sorted(int(count) for count in args.files.split(",")):
+            cells = []
+            for make in strategies.values():
+                session, concurrency = make()
+                service = ZenodoService(session=session, max_concurrent_uploads=concurrency)
+                fake.reset_counters()
+                started = time.perf_counter()
+                publish(service, dataset, all_files[:count])
+                elapsed = (time.perf_counter() - started) * 1000
+                cells.append(f"{elapsed:>9.0f}ms {fake.connections:>4} conn")
+                session.close()
+            print(f"{count:>6} | " + " | ".join(f"{cell:>20}" for cell in cells))
+
+
+if __name__ == "__main__":
+    main()
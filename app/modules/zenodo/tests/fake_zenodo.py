@@ -0,0 +1,250 @@
+"""
+Local stand-in for the parts of the Zenodo deposition API that ZenodoService uses, for tests and benchmarks.
+
+It keeps depositions in memory, reads uploads as a stream and can add latency to every request and to every new
+connection (the TCP and TLS handshakes of the real service), so that the effect of reusing connections and of
+concurrent uploads shows up on a single machine.
+
+Usage:
+    python -m app.modules.zenodo.tests.fake_zenodo --port 8081 --latency 50 --handshake-latency 100
+
+and then run the app with ZENODO_API_URL=http://127.0.0.1:8081/api/deposit/depositions.
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import socket
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Without keep-alive every request is a new connection, more than the default backlog of 5 absorbs
+    request_queue_size = 128
+
+
+class FakeZenodo:
+    def __init__(self, port=0, latency=0.0, handshake_latency=0.0):
+        """
+        :param latency: Seconds added to every request.
+        :param handshake_latency: Seconds added once to every new connection.
+        """
+        self.latency = latency
+        self.handshake_latency = handshake_latency
+        self.depositions = {}
+        self.buckets = {}
+        self.connections = 0
+        self.requests = 0
+        self.max_concurrent_uploads = 0
+        self._uploading = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self.server = _Server(("127.0.0.1", port), self._handler_class())
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def url(self):
+        """Value for ZENODO_API_URL."""
+        return f"{self.base_url}/api/deposit/depositions"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def reset_counters(self):
+        with self._lock:
+            self.connections = self.requests = self.max_concurrent_uploads = 0
+
+    # --- API ---
+
+    def create_deposition(self, body):
+        with self._lock:
+            deposition_id = len(self.depositions) + 1
+            bucket = uuid.uuid4().hex
+            self.buckets[bucket] = {}
+            self.depositions[deposition_id] = {
+                "id": deposition_id,
+                "doi": "",
+                "submitted": False,
+                "metadata": body.get("metadata", {}),
+                "links": {"bucket": f"{self.base_url}/api/files/{bucket}"},
+                "files": self.buckets[bucket],
+            }
+        return 201, self._public(self.depositions[deposition_id])
+
+    def get_deposition(self, deposition_id):
+        deposition = self.depositions.get(deposition_id)
+        return (200, self._public(deposition)) if deposition else (404, {"message": "Deposition not found"})
+
+    def delete_deposition(self, deposition_id):
+        return (204, None) if self.depositions.pop(deposition_id, None) else (404, {"message": "Deposition not found"})
+
+    def publish(self, deposition_id):
+        deposition = self.depositions.get(deposition_id)
+        if deposition is None:
+            return 404, {"message": "Deposition not found"}
+        if deposition["submitted"]:
+            return 400, {"message": "Deposition already published"}
+        deposition["submitted"] = True
+        deposition["doi"] = f"10.5072/zenodo.{deposition_id}"
+        return 202, self._public(deposition)
+
+    def _public(self, deposition):
+        return {key: value for key, value in deposition.items() if key != "files"}
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive needs HTTP/1.1 and a Content-Length on every response
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                # Headers and body go in separate writes, which Nagle's algorithm would hold back
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                with fake._lock:
+                    fake.connections += 1
+                time.sleep(fake.handshake_latency)
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def do_PUT(self):
+                self._dispatch("PUT")
+
+            def do_DELETE(self):
+                self._dispatch("DELETE")
+
+            def _dispatch(self, method):
+                with fake._lock:
+                    fake.requests += 1
+                path = urlsplit(self.path).path
+
+                if method == "PUT" and (match := re.fullmatch(r"/api/files/(\w+)/(.+)", path)):
+                    return self._respond(*self._upload(match.group(1), unquote(match.group(2))))
+
+                time.sleep(fake.latency)
+
+                body = self._read_body()
+                match = re.fullmatch(r"/api/deposit/depositions(?:/(\d+))?(/files|/actions/publish)?", path)
+                if not match:
+                    return self._respond(404, {"message": "Not found"})
+                deposition_id = int(match.group(1)) if match.group(1) else None
+                action = match.group(2)
+
+                if deposition_id is None and method == "GET":
+                    return self._respond(200, [fake._public(d) for d in fake.depositions.values()])
+                if deposition_id is None and method == "POST":
+                    return self._respond(*fake.create_deposition(json.loads(body or b"{}")))
+                if action == "/actions/publish" and method == "POST":
+                    return self._respond(*fake.publish(deposition_id))
+                if action == "/files" and method == "POST":
+                    # Legacy multipart upload, only used by the connection test
+                    return self._respond(201, {"filename": "test_file.txt", "filesize": len(body)})
+                if action is None and method == "GET":
+                    return self._respond(*fake.get_deposition(deposition_id))
+                if action is None and method == "DELETE":
+                    return self._respond(*fake.delete_deposition(deposition_id))
+                return self._respond(405, {"message": "Method not allowed"})
+
+            def _upload(self, bucket, name):
+                if bucket not in fake.buckets:
+                    time.sleep(fake.latency)
+                    self._read_body()
+                    return 404, {"message": "Bucket not found"}
+                # The latency counts as part of the upload, so that overlapping uploads are seen even when their
+                # bodies are small enough to be read at once
+                with fake._lock:
+                    fake._uploading += 1
+                    fake.max_concurrent_uploads = max(fake.max_concurrent_uploads, fake._uploading)
+                try:
+                    time.sleep(fake.latency)
+                    digest = hashlib.md5()
+                    size = 0
+                    for chunk in self._body_chunks():
+                        digest.update(chunk)
+                        size += len(chunk)
+                finally:
+                    with fake._lock:
+                        fake._uploading -= 1
+                fake.buckets[bucket][name] = {"size": size, "checksum": f"md5:{digest.hexdigest()}"}
+                return 201, {"key": name, **fake.buckets[bucket][name]}
+
+            def _body_chunks(self):
+                if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+                    while True:
+                        length = int(self.rfile.readline().strip(), 16)
+                        if length == 0:
+                            self.rfile.readline()
+                            return
+                        yield self.rfile.read(length)
+                        self.rfile.readline()
+                remaining = int(self.headers.get("Content-Length") or 0)
+                while remaining:
+                    chunk = self.rfile.read(min(remaining, READ_CHUNK_SIZE))
+                    if not chunk:
+                        return
+                    remaining -= len(chunk)
+                    yield chunk
+
+            def _read_body(self):
+                return b"".join(self._body_chunks())
+
+            def _respond(self, status, payload):
+                content = b"" if payload is None else json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0, help="Milliseconds added to every request.")
+    parser.add_argument("--handshake-latency", type=float, default=0, help="Milliseconds added to new connections.")
+    args = parser.parse_args()
+
+    fake = FakeZenodo(args.port, args.latency / 1000, args.handshake_latency / 1000)
+    print(f"Fake Zenodo listening, use ZENODO_API_URL={fake.url}")
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        fake.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
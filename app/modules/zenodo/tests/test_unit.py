@@ -0,0 +1,205 @@
+import hashlib
+from datetime import datetime
+
+import pytest
+
+from app import db
+from app.modules.auth.models import User
+from app.modules.conftest import login, logout
+from app.modules.dataset.models import DSMetaData, PublicationType, UVLDataSet
+from app.modules.featuremodel.models import FeatureModel
+from app.modules.zenodo.models import ZenodoJob, ZenodoJobStatus, ZenodoJobStep
+from app.modules.zenodo.services import ZenodoJobService, ZenodoService
+from app.modules.zenodo.tests.fake_zenodo import FakeZenodo
+
+
+class FakeZenodoService:
+    """Records the calls of the publication and fails the uploads listed in fail_uploads, once each."""
+
+    def __init__(self, fail_uploads=(), always_fail=False):
+        self.calls = []
+        self.fail_uploads = set(fail_uploads)
+        self.always_fail = always_fail
+        self.published = False
+
+    def create_new_deposition(self, dataset):
+        self.calls.append("create")
+        return {"id": 1234}
+
+    def file_to_upload(self, dataset, feature_model, user=None):
+        assert user.id == dataset.user_id
+        return f"upload:{feature_model.id}", None
+
+    def upload_files(self, deposition_id, files):
+        errors = []
+        for name, _ in files:
+            self.calls.append(name)
+            if self.always_fail:
+                errors.append(Exception("Zenodo is down"))
+            elif len(self.calls) - 1 in self.fail_uploads:
+                self.fail_uploads.discard(len(self.calls) - 1)
+                errors.append(Exception("Failed to upload files"))
+            else:
+                errors.append(None)
+        return errors
+
+    def publish_deposition(self, deposition_id):
+        self.calls.append("publish")
+        self.published = True
+
+    def get_deposition(self, deposition_id):
+        return {"submitted": self.published}
+
+    def get_doi(self, deposition_id):
+        return f"10.5072/zenodo.{deposition_id}"
+
+
+@pytest.fixture
+def dataset(test_client):
+    user = User.query.filter_by(email="test@example.com").first()
+    meta = DSMetaData(title="Queued", description="", publication_type=PublicationType.NONE)
+    dataset = UVLDataSet(user_id=user.id, ds_meta_data=meta)
+    db.session.add(dataset)
+    db.session.commit()
+    for _ in range(2):
+        db.session.add(FeatureModel(data_set_id=dataset.id))
+    db.session.commit()
+
+    yield dataset
+
+    db.session.rollback()
+    db.session.delete(db.session.get(UVLDataSet, dataset.id))
+    # Los DOI son únicos: los metadatos no se borran con el dataset
+    db.session.delete(db.session.get(DSMetaData, meta.id))
+    db.session.commit()
+
+
+def test_enqueue_publication_is_idempotent(dataset):
+    service = ZenodoJobService(FakeZenodoService())
+
+    job = service.enqueue_publication(dataset)
+
+    assert service.enqueue_publication(dataset).id == job.id
+    assert ZenodoJob.query.filter_by(dataset_id=dataset.id).count() == 1
+    assert job.status == ZenodoJobStatus.QUEUED
+    assert job.step == ZenodoJobStep.CREATE_DEPOSITION
+
+
+def test_worker_publishes_dataset(dataset):
+    zenodo = FakeZenodoService()
+    service = ZenodoJobService(zenodo)
+    job = service.enqueue_publication(dataset)
+
+    assert service.work(worker_id="test", once=True) == 1
+
+    db.session.refresh(job)
+    assert job.status == ZenodoJobStatus.SUCCEEDED
+    assert job.step == ZenodoJobStep.DONE
+    assert job.files_uploaded == 2
+    assert dataset.ds_meta_data.deposition_id == 1234
+    assert dataset.ds_meta_data.dataset_doi == "10.5072/zenodo.1234"
+    assert zenodo.calls == ["create"] + [f"upload:{fm.id}" for fm in dataset.feature_models] + ["publish"]
+    # Los trabajos terminados no se vuelven a ejecutar
+    assert service.run_next("test") is None
+
+
+def test_failed_job_is_retried_with_backoff_from_the_failed_step(dataset):
+    # Falla la subida del segundo fichero
+    zenodo = FakeZenodoService(fail_uploads={2})
+    service = ZenodoJobService(zenodo)
+    job = service.enqueue_publication(dataset)
+
+    service.run_next("test")
+    db.session.refresh(job)
+    assert job.status == ZenodoJobStatus.QUEUED
+    assert job.step == ZenodoJobStep.UPLOAD_FILES
+    assert job.files_uploaded == 1
+    assert job.attempts == 1
+    assert job.last_error == "Failed to upload files"
+    # Hasta que pasa el tiempo de espera no se reintenta
+    assert service.run_next("test") is None
+
+    job.next_run_at = datetime(2000, 1, 1)
+    db.session.commit()
+    service.run_next("test")
+
+    db.session.refresh(job)
+    assert job.status == ZenodoJobStatus.SUCCEEDED
+    first, second = [f"upload:{fm.id}" for fm in dataset.feature_models]
+    # Ni se crea otra deposición ni se vuelve a subir el primer fichero
+    assert zenodo.calls == ["create", first, second, second, "publish"]
+
+
+def test_job_fails_after_max_attempts(dataset):
+    service = ZenodoJobService(FakeZenodoService(always_fail=True))
+    job = service.enqueue_publication(dataset)
+    job.max_attempts = 2
+    db.session.commit()
+
+    delays = []
+    for _ in range(2):
+        service.run_next("test")
+        db.session.refresh(job)
+        delays.append(job.next_run_at)
+        job.next_run_at = datetime(2000, 1, 1)
+        db.session.commit()
+
+    assert job.status == ZenodoJobStatus.FAILED
+    assert job.attempts == 2
+    assert service.run_next("test") is None
+    assert service.backoff_delay(1).total_seconds() == 30
+    assert service.backoff_delay(4).total_seconds() == 240
+    assert service.backoff_delay(20).total_seconds() == ZenodoJobService.BACKOFF_MAX_SECONDS
+
+
+def test_publication_status_endpoint(test_client, dataset):
+    ZenodoJobService(FakeZenodoService()).enqueue_publication(dataset)
+    other = User(email="zenodo_other@example.com", password="password123")
+    db.session.add(other)
+    db.session.commit()
+
+    login(test_client, "test@example.com", "test1234")
+    response = test_client.get(f"/zenodo/jobs/dataset/{dataset.id}")
+    assert response.status_code == 200
+    assert response.json["status"] == "queued"
+    assert response.json["step"] == "create_deposition"
+    logout(test_client)
+
+    login(test_client, "zenodo_other@example.com", "password123")
+    assert test_client.get(f"/zenodo/jobs/dataset/{dataset.id}").status_code == 404
+    logout(test_client)
+
+
+def test_upload_files_streams_concurrently_over_pooled_connections(test_client, tmp_path, monkeypatch):
+    files = []
+    for index in range(12):
+        path = tmp_path / f"model_{index}.uvl"
+        path.write_bytes(f"features\n    Root{index}\n".encode() * 1000)
+        files.append((path.name, str(path)))
+    # Un fichero que ya no existe falla sin impedir el resto de subidas
+    files.append(("missing.uvl", str(tmp_path / "missing.uvl")))
+
+    with FakeZenodo(latency=0.02) as fake:
+        monkeypatch.setenv("ZENODO_API_URL", fake.url)
+        service = ZenodoService(max_concurrent_uploads=4)
+        dataset = UVLDataSet(
+            ds_meta_data=DSMetaData(title="Fake", description="", publication_type=PublicationType.NONE, tags="")
+        )
+        deposition_id = service.create_new_deposition(dataset)["id"]
+        fake.reset_counters()
+
+        errors = service.upload_files(deposition_id, files)
+
+        assert errors[:-1] == [None] * 12
+        assert isinstance(errors[-1], FileNotFoundError)
+        uploaded = next(iter(fake.buckets.values()))
+        for name, path in files[:-1]:
+            with open(path, "rb") as file:
+                assert uploaded[name]["checksum"] == f"md5:{hashlib.md5(file.read()).hexdigest()}"
+        assert 1 < fake.max_concurrent_uploads <= 4
+        # Las conexiones se reutilizan: como mucho una por subida simultánea
+        assert fake.connections <= 4
+        assert fake.requests == 13
+
+        service.publish_deposition(deposition_id)
+        assert service.get_doi(deposition_id) == f"10.5072/zenodo.{deposition_id}"
@@ -0,0 +1,486 @@
+import hashlib
+import logging
+import os
+import struct
+import time
+import zlib
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+
+# Files that are already compressed gain nothing from deflate, so they are stored as they are
+STORED_EXTENSIONS = {
+    ".zip",
+    ".gz",
+    ".tgz",
+    ".bz2",
+    ".xz",
+    ".7z",
+    ".rar",
+    ".jar",
+    ".png",
+    ".jpg",
+    ".jpeg",
+    ".gif",
+    ".webp",
+    ".pdf",
+    ".mp3",
+    ".mp4",
+}
+
+CHUNK_SIZE = 64 * 1024
+
+ZIP32_LIMIT = 0xFFFFFFFF
+ZIP16_LIMIT = 0xFFFF
+
+# Deflate can grow incompressible data slightly, so files close to 4 GiB are written as zip64 too
+ZIP64_MARGIN = 1024 * 1024
+
+UTF8 = 0x0800
+DATA_DESCRIPTOR = 0x0008
+
+
+def compression_for(filename):
+    return ZIP_STORED if os.path.splitext(filename)[1].lower() in STORED_EXTENSIONS else ZIP_DEFLATED
+
+
+def dos_datetime(timestamp):
+    year, month, day, hour, minute, second = time.localtime(timestamp)[:6]
+    year = max(year, 1980)
+    return (hour << 11) | (minute << 5) | (second // 2), ((year - 1980) << 9) | (month << 5) | day
+
+
+class FileChanged(RuntimeError):
+    """A file no longer matches the size or CRC the archive was planned with, so the archive is cut short."""
+
+
+class _Source(NamedTuple):
+    path: str
+    arcname: str
+    method: int
+    size: Optional[int]
+    crc: Optional[int]
+    mtime: Optional[float]
+
+
+class ZipStream:
+    """
+    Writes a ZIP archive as an iterable of byte chunks, reading every file only when its turn comes.
+
+    Entries carry their CRC and sizes in a data descriptor after the data, so nothing has to be buffered or
+    written to disk first: memory stays constant whatever the number or size of the files, and the first bytes
+    can be sent as soon as the response starts. Stored entries whose size and CRC are given to add_file carry
+    them in the local header instead, since streaming readers such as Java's ZipInputStream reject stored entries
+    with a data descriptor. Zip64 records are used when sizes, offsets or the number of entries do not fit the
+    classic format.
+
+    When every entry is stored the layout of the archive is planned in advance (see size()), so it can be read
+    from any offset (see reader()) and every file is checked against the plan as it is read.
+    """
+
+    def __init__(self, chunk_size=CHUNK_SIZE, compresslevel=6, compression=None):
+        """
+        :param compression: Method for every entry (ZIP_STORED or ZIP_DEFLATED). By default it is chosen per file
+            from its extension.
+        """
+        self.chunk_size = chunk_size
+        self.compresslevel = compresslevel
+        self.compression = compression
+        self._files = []
+        self._layout = None
+
+    def add_file(self, path, arcname, compression=None, size=None, crc32=None, mtime=None):
+        """
+        Queues a file on disk. It is opened when the archive reaches it; files that are gone by then are skipped,
+        unless the layout was already planned (see size()), in which case the archive is cut short with FileChanged.
+
+        :param compression: ZIP_STORED or ZIP_DEFLATED, overriding the method of the stream for this file.
+        :param size: Size in bytes of the file when already known (e.g. from the database), so it is not stat'ed.
+        :param crc32: CRC-32 of the file as an int, when already known. Together with size it lets a stored entry
+            go without a data descriptor.
+        :param mtime: Modification timestamp for the entry, when already known.
+        """
+        if compression is None:
+            compression = self.compression if self.compression is not None else compression_for(arcname)
+        self._files.append(_Source(path, arcname, compression, size, crc32, mtime))
+        self._layout = None
+
+    def __len__(self):
+        return len(self._files)
+
+    def missing_files(self):
+        """
+        Paths of the queued files that are not on disk, so that an incomplete archive can be refused before its
+        response starts rather than cut short (or silently left without them) once it is being sent.
+        """
+        return [source.path for source in self._files if not os.path.isfile(source.path)]
+
+    def _described_files(self):
+        """(source, size, mtime) of every queued file, stat'ing only the ones whose size or mtime were not given."""
+        for source in self._files:
+            if source.size is not None and source.mtime is not None:
+                yield source, source.size, source.mtime
+                continue
+            try:
+                stat = os.stat(source.path)
+            except OSError:
+                continue
+            yield source, stat.st_size, stat.st_mtime
+
+    def _planned_layout(self):
+        """
+        (path, entry) of every file with the offset and size it will have, and the offset of the central directory.
+        It is planned once, the first time it is needed.
+
+        :raises ValueError: If some entry is deflated.
+        """
+        if self._layout is None:
+            layout = []
+            offset = 0
+            for source, size, mtime in self._described_files():
+                if source.method != ZIP_STORED:
+                    raise ValueError("The size of an archive with deflated entries is only known once written")
+                entry = _Entry(source.arcname, ZIP_STORED, mtime, offset, size >= ZIP32_LIMIT - ZIP64_MARGIN)
+                entry.file_size = entry.compress_size = size
+                if source.crc is not None:
+                    entry.crc, entry.known = source.crc, True
+                offset += len(entry.local_header()) + size + len(entry.data_descriptor())
+                layout.append((source.path, entry))
+            self._layout = layout, offset
+        return self._layout
+
+    def size(self):
+        """
+        Exact length in bytes of the archive. It is only known in advance when every entry is stored, which is what
+        allows serving the archive in HTTP ranges.
+
+        :raises ValueError: If some entry is deflated.
+        """
+        layout, offset = self._planned_layout()
+        entries = [entry for _, entry in layout]
+        return offset + sum(len(record) for record in self._central_directory(entries, offset))
+
+    def etag(self):
+        """Validator that changes whenever a file is added, removed, renamed or modified."""
+        digest = hashlib.sha1()
+        for source, size, mtime in self._described_files():
+            digest.update(f"{source.arcname}\0{source.method}\0{size}\0{mtime}\0{source.crc}\n".encode())
+        return digest.hexdigest()
+
+    def reader(self):
+        """
+        The archive as an iterator of chunks that can be seeked before it starts, which is how werkzeug serves
+        HTTP ranges from it: a resume starts at the entry holding the offset instead of writing and dropping every
+        byte before it. Files wholly before the offset are not read, unless their CRC was not given to add_file
+        and is needed for the central directory.
+
+        :raises ValueError: If some entry is deflated.
+        """
+        self._planned_layout()
+        return _ArchiveReader(self)
+
+    def __iter__(self):
+        return self._buffered(self._generate())
+
+    def _buffered(self, chunks):
+        buffer = bytearray()
+        for chunk in chunks:
+            buffer += chunk
+            # Many small files would otherwise turn into many tiny writes to the client
+            if len(buffer) >= self.chunk_size:
+                yield bytes(buffer)
+                buffer.clear()
+        if buffer:
+            yield bytes(buffer)
+
+    def _generate(self):
+        central_directory = []
+        offset = 0
+
+        for path, arcname, method, size, crc, mtime in self._files:
+            try:
+                source = open(path, "rb")
+            except OSError:
+                logger.warning("Skipping %s from the archive, it can no longer be read", path)
+                continue
+
+            with source:
+                stat = os.fstat(source.fileno())
+                entry = _Entry(
+                    arcname,
+                    method,
+                    stat.st_mtime if mtime is None else mtime,
+                    offset,
+                    stat.st_size >= ZIP32_LIMIT - ZIP64_MARGIN,
+                )
+                known = method == ZIP_STORED and crc is not None and size == stat.st_size
+                if known:
+                    entry.crc, entry.file_size, entry.compress_size, entry.known = crc, size, size, True
+
+                header = entry.local_header()
+                offset += len(header)
+                yield header
+
+                # The CRC and size are worked out again from the data, to check them against the header
+                entry.crc = entry.file_size = entry.compress_size = 0
+                for chunk in self._file_data(source, entry):
+                    offset += len(chunk)
+                    yield chunk
+                if known and (entry.crc, entry.file_size) != (crc, size):
+                    raise FileChanged(f"{path} does not match the size and CRC in its header")
+
+                descriptor = entry.data_descriptor()
+                offset += len(descriptor)
+                yield descriptor
+
+            central_directory.append(entry)
+
+        yield from self._central_directory(central_directory, offset)
+
+    def _generate_from(self, start):
+        """Chunks of the planned (stored) archive from byte start on."""
+        layout, directory_offset = self._planned_layout()
+
+        for path, entry in layout:
+            header = entry.local_header()
+            data_offset = entry.offset + len(header)
+            descriptor_offset = data_offset + entry.file_size
+            if descriptor_offset + len(entry.data_descriptor()) <= start and entry.known:
+                continue
+
+            try:
+                source = open(path, "rb")
+            except OSError as exc:
+                raise FileChanged(f"{path} can no longer be read") from exc
+
+            with source:
+                if os.fstat(source.fileno()).st_size != entry.file_size:
+                    raise FileChanged(f"{path} changed size since the archive was planned")
+                if start < data_offset:
+                    yield header[max(start - entry.offset, 0) :]
+
+                skip = max(start - data_offset, 0)
+                position, crc = 0, 0
+                if entry.known and skip:
+                    # The CRC is already in the header, so only the data that is sent has to be read
+                    source.seek(min(skip, entry.file_size))
+                    position, crc = min(skip, entry.file_size), None
+                while position < entry.file_size:
+                    data = source.read(min(self.chunk_size, entry.file_size - position))
+                    if not data:
+                        raise FileChanged(f"{path} changed size since the archive was planned")
+                    if crc is not None:
+                        crc = zlib.crc32(data, crc)
+                    if position + len(data) > skip:
+                        yield data[max(skip - position, 0) :]
+                    position += len(data)
+
+                if not entry.known:
+                    entry.crc = crc
+                elif crc is not None and crc != entry.crc:
+                    raise FileChanged(f"{path} does not match the CRC in its header")
+
+                descriptor = entry.data_descriptor()
+                if start < descriptor_offset + len(descriptor):
+                    yield descriptor[max(start - descriptor_offset, 0) :]
+
+        position = directory_offset
+        for record in self._central_directory([entry for _, entry in layout], directory_offset):
+            if position + len(record) > start:
+                yield record[max(start - position, 0) :]
+            position += len(record)
+
+    def _file_data(self, source, entry):
+        compressor = (
+            zlib.compressobj(self.compresslevel, zlib.DEFLATED, -zlib.MAX_WBITS)
+            if entry.method == ZIP_DEFLATED
+            else None
+        )
+        while True:
+            data = source.read(self.chunk_size)
+            if not data:
+                break
+            entry.crc = zlib.crc32(data, entry.crc)
+            entry.file_size += len(data)
+            if compressor:
+                data = compressor.compress(data)
+            if data:
+                entry.compress_size += len(data)
+                yield data
+
+        if compressor:
+            data = compressor.flush()
+            entry.compress_size += len(data)
+            yield data
+
+    def _central_directory(self, entries, offset):
+        start = offset
+        size = 0
+        for entry in entries:
+            record = entry.central_directory_record()
+            size += len(record)
+            yield record
+
+        if len(entries) >= ZIP16_LIMIT or start >= ZIP32_LIMIT or size >= ZIP32_LIMIT:
+            zip64_end = offset + size
+            yield struct.pack("<IQHHIIQQQQ", 0x06064B50, 44, 45, 45, 0, 0, len(entries), len(entries), size, start)
+            yield struct.pack("<IIQI", 0x07064B50, 0, zip64_end, 1)
+
+        count = min(len(entries), ZIP16_LIMIT)
+        yield struct.pack(
+            "<IHHHHIIH", 0x06054B50, 0, 0, count, count, min(size, ZIP32_LIMIT), min(start, ZIP32_LIMIT), 0
+        )
+
+
+class _ArchiveReader:
+    """Iterator over the chunks of a planned archive that can be seeked to any offset before it starts."""
+
+    def __init__(self, zip_stream):
+        self._zip_stream = zip_stream
+        self._position = 0
+        self._chunks = None
+
+    def seekable(self):
+        return self._chunks is None
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if self._chunks is not None:
+            raise OSError("The archive can only be seeked before it starts")
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += self._zip_stream.size()
+        self._position = max(offset, 0)
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._chunks is None:
+            self._chunks = self._zip_stream._buffered(self._zip_stream._generate_from(self._position))
+        chunk = next(self._chunks)
+        self._position += len(chunk)
+        return chunk
+
+    def close(self):
+        if self._chunks is not None:
+            self._chunks.close()
+
+
+class _Entry:
+    # Entries are kept until the central directory is written, one per file, so they are kept small
+    __slots__ = (
+        "name",
+        "method",
+        "dos_time",
+        "dos_date",
+        "offset",
+        "zip64",
+        "crc",
+        "file_size",
+        "compress_size",
+        "known",
+    )
+
+    def __init__(self, arcname, method, mtime, offset, zip64):
+        self.name = arcname.replace(os.sep, "/").encode("utf-8")
+        self.method = method
+        self.dos_time, self.dos_date = dos_datetime(mtime)
+        self.offset = offset
+        self.zip64 = zip64
+        self.crc = 0
+        self.file_size = 0
+        self.compress_size = 0
+        # Whether the CRC and sizes are known before the data is written, and so go in the local header
+        self.known = False
+
+    @property
+    def version(self):
+        return 45 if self.zip64 or self.offset >= ZIP32_LIMIT else 20
+
+    @property
+    def flags(self):
+        return UTF8 if self.known else UTF8 | DATA_DESCRIPTOR
+
+    def local_header(self):
+        extra = b""
+        crc, file_size, compress_size = (self.crc, self.file_size, self.compress_size) if self.known else (0, 0, 0)
+        if self.zip64:
+            # Unless known in advance, the real sizes go in the data descriptor and the extra field only announces them
+            extra = struct.pack("<HHQQ", 0x0001, 16, file_size, compress_size)
+            file_size = compress_size = ZIP32_LIMIT
+        return (
+            struct.pack(
+                "<IHHHHHIIIHH",
+                0x04034B50,
+                self.version,
+                self.flags,
+                self.method,
+                self.dos_time,
+                self.dos_date,
+                crc,
+                compress_size,
+                file_size,
+                len(self.name),
+                len(extra),
+            )
+            + self.name
+            + extra
+        )
+
+    def data_descriptor(self):
+        if self.known:
+            return b""
+        if self.zip64:
+            return struct.pack("<IIQQ", 0x08074B50, self.crc, self.compress_size, self.file_size)
+        return struct.pack("<IIII", 0x08074B50, self.crc, self.compress_size, self.file_size)
+
+    def central_directory_record(self):
+        zip64_fields = []
+        file_size, compress_size, offset = self.file_size, self.compress_size, self.offset
+        if file_size >= ZIP32_LIMIT or self.zip64:
+            zip64_fields.append(file_size)
+            file_size = ZIP32_LIMIT
+        if compress_size >= ZIP32_LIMIT or self.zip64:
+            zip64_fields.append(compress_size)
+            compress_size = ZIP32_LIMIT
+        if offset >= ZIP32_LIMIT:
+            zip64_fields.append(offset)
+            offset = ZIP32_LIMIT
+
+        extra = b""
+        if zip64_fields:
+            extra = struct.pack(f"<HH{len(zip64_fields)}Q", 0x0001, 8 * len(zip64_fields), *zip64_fields)
+
+        version = 45 if zip64_fields else self.version
+        return (
+            struct.pack(
+                "<IHHHHHHIIIHHHHHII",
+                0x02014B50,
+                (3 << 8) | version,
+                version,
+                self.flags,
+                self.method,
+                self.dos_time,
+                self.dos_date,
+                self.crc,
+                compress_size,
+                file_size,
+                len(self.name),
+                len(extra),
+                0,
+                0,
+                0,
+                0o100644 << 16,
+                offset,
+            )
+            + self.name
+            + extra
+        )
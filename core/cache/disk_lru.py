@@ -0,0 +1,118 @@
+import logging
+import os
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
+
+TEMP_PREFIX = ".tmp-"
+
+# Partial files older than this are leftovers of interrupted writes
+STALE_TEMP_SECONDS = 3600
+
+
+class DiskLRUCache:
+    """
+    Size-bounded store of files on local disk, shared by every worker of the host.
+
+    The modification time of an entry is its last use: reads touch it and, whenever the store grows past
+    max_bytes, the least recently used entries are removed. Entries are written to a temporary file and renamed
+    into place, so readers never see a partial entry.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def path_for(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        """Path of the entry, or None on a miss. A hit counts as a use for the eviction order."""
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def put_stream(self, key, chunks):
+        """
+        Yields the chunks unchanged while writing them to the entry, so it can be filled while a response is being
+        sent. The entry only becomes visible once every chunk was written; if the consumer stops early nothing is
+        stored.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix=TEMP_PREFIX)
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                for chunk in chunks:
+                    temp_file.write(chunk)
+                    yield chunk
+            os.replace(temp_path, self.path_for(key))
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        self.evict()
+
+    def put_file(self, key, write):
+        """
+        Stores the file that write(path) creates at the given path and returns the path of the entry. As with
+        put_stream, the entry only becomes visible once write returns.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix=TEMP_PREFIX)
+        os.close(fd)
+        try:
+            write(temp_path)
+            os.replace(temp_path, self.path_for(key))
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        self.evict()
+        return self.path_for(key)
+
+    def invalidate(self, prefix):
+        """Removes every entry whose key starts with prefix."""
+        for entry in self._entries():
+            if entry.name.startswith(prefix):
+                self._remove(entry.path)
+
+    def evict(self):
+        entries = []
+        total = 0
+        now = time.time()
+        for entry in self._entries(include_temp=True):
+            stat = entry.stat()
+            if entry.name.startswith(TEMP_PREFIX):
+                if now - stat.st_mtime > STALE_TEMP_SECONDS:
+                    self._remove(entry.path)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def _entries(self, include_temp=False):
+        try:
+            with os.scandir(self.directory) as entries:
+                return [
+                    entry
+                    for entry in entries
+                    if entry.is_file() and (include_temp or not entry.name.startswith(TEMP_PREFIX))
+                ]
+        except FileNotFoundError:
+            return []
+
+    def _remove(self, path):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            # Another worker got there first
+            pass
+        except OSError:
+            logger.warning("Could not remove %s from the disk cache", path)
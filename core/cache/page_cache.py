@@ -0,0 +1,86 @@
+import threading
+import time
+from collections import OrderedDict
+
+from cachelib import BaseCache, FileSystemCache, NullCache
+from flask import current_app
+
+
+class LRUCache(BaseCache):
+    """
+    In-process cachelib backend that keeps at most threshold entries, dropping the least recently used first.
+
+    Unlike cachelib's SimpleCache it is thread safe and evicts by use rather than by expiry time. Values are stored
+    as they are, without serializing them.
+    """
+
+    def __init__(self, threshold=500, default_timeout=300):
+        super().__init__(default_timeout)
+        self._threshold = threshold
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expires(self, timeout):
+        timeout = self._normalize_timeout(timeout)
+        # As in every cachelib backend, a timeout of 0 never expires
+        return time.monotonic() + timeout if timeout > 0 else None
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires is not None and expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        with self._lock:
+            self._entries[key] = (self._expires(timeout), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._threshold:
+                self._entries.popitem(last=False)
+        return True
+
+    def add(self, key, value, timeout=None):
+        if self.has(key):
+            return False
+        return self.set(key, value, timeout)
+
+    def has(self, key):
+        return self.get(key) is not None
+
+    def delete(self, key):
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        return True
+
+
+def create_page_cache(config) -> BaseCache:
+    """The backend chosen by PAGE_CACHE_TYPE: "lru", "filesystem" or "null"."""
+    backend = config["PAGE_CACHE_TYPE"]
+    timeout = config["PAGE_CACHE_TIMEOUT"]
+    if backend == "lru":
+        return LRUCache(threshold=config["PAGE_CACHE_THRESHOLD"], default_timeout=timeout)
+    if backend == "filesystem":
+        return FileSystemCache(
+            config["PAGE_CACHE_DIR"], threshold=config["PAGE_CACHE_THRESHOLD"], default_timeout=timeout
+        )
+    if backend == "null":
+        return NullCache()
+    raise ValueError(f"Unknown PAGE_CACHE_TYPE: {backend}")
+
+
+def page_cache() -> BaseCache:
+    """Page and fragment cache of the current app, created from its configuration on first use."""
+    cache = current_app.extensions.get("page_cache")
+    if cache is None:
+        cache = current_app.extensions.setdefault("page_cache", create_page_cache(current_app.config))
+    return cache
@@ -0,0 +1,34 @@
+import threading
+import time
+
+
+class TTLCache:
+    """
+    Small in-process cache whose entries expire ttl seconds after being computed.
+
+    Every worker process keeps its own copy, so it suits values that are cheap to recompute and may be a few
+    seconds stale. Concurrent misses on the same key compute the value only once.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, compute, ttl):
+        """The cached value of key, or the result of compute() (stored for ttl seconds) when missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1]
+            value = compute()
+            if ttl > 0:
+                self._entries[key] = (time.monotonic() + ttl, value)
+            return value
+
+    def invalidate(self, key=None):
+        """Drops key, or every entry when no key is given."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
@@ -0,0 +1,75 @@
+import atexit
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class EventBuffer:
+    """
+    In-process, append-only buffer of events that are written in bulk off the request path.
+
+    push() only appends to a list. A daemon thread hands everything buffered to write() every flush_interval
+    seconds, or as soon as max_events are waiting, and once more when the process exits. Events are grouped by the
+    key they were pushed with, so write() receives {key: [event, ...]}.
+
+    Delivery is best effort: events still in memory when a process is killed are lost, and so are those of a batch
+    whose write() fails. That suits analytics, not data that must survive.
+    """
+
+    def __init__(self, write, max_events=500, flush_interval=2.0):
+        self.write = write
+        self.max_events = max_events
+        self.flush_interval = flush_interval
+        self._events = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid = None
+        atexit.register(self.flush)
+
+    def __len__(self):
+        return self._size
+
+    def push(self, key, event):
+        with self._lock:
+            self._ensure_worker()
+            self._events.setdefault(key, []).append(event)
+            self._size += 1
+            full = self._size >= self.max_events
+        if full:
+            self._wake.set()
+
+    def flush(self) -> int:
+        """Writes everything buffered so far in the calling thread. Returns the number of events handed to write()."""
+        # One flush at a time, so a batch is never written twice nor overtaken by a later one
+        with self._flush_lock:
+            with self._lock:
+                events, self._events = self._events, {}
+                size, self._size = self._size, 0
+            if not size:
+                return 0
+            try:
+                self.write(events)
+            except Exception:
+                logger.exception("Could not write %s buffered events, they are lost", size)
+            return size
+
+    def _ensure_worker(self):
+        # Started on first use, and again in every forked worker: threads do not survive a fork
+        if self._pid == os.getpid():
+            return
+        if self._pid is not None:
+            # Events inherited from the parent are the parent's to write
+            self._events, self._size = {}, 0
+        self._pid = os.getpid()
+        threading.Thread(target=self._run, name="event-buffer", daemon=True).start()
+
+    def _run(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
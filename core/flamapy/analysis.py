@@ -0,0 +1,144 @@
+"""
+Analysis of UVL models with flamapy, run once when they are uploaded.
+
+Every model is parsed a single time and its structure (features, constraints, depth of the tree) read from the
+parsed model. The number of configurations is counted with a BDD and, when that is not possible, by enumerating
+them with a SAT solver; either can take exponential time, so the count is given up when it does not finish within
+the time budget.
+
+Models are analysed in a child process that is killed when the budget runs out: flamapy operations cannot be
+interrupted from the outside. The module is outside the app package so that children do not import (and create) the
+app.
+"""
+
+import logging
+import math
+import multiprocessing
+import time
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+# Models are parsed in a clean interpreter: forking a process that serves requests could copy locks held by
+# other threads
+_context = multiprocessing.get_context("spawn")
+
+# Seconds allowed for a child to start and import flamapy, on top of the time budget
+STARTUP_TIMEOUT = 30
+
+
+class UVLAnalysis(NamedTuple):
+    number_of_features: Optional[int] = None
+    number_of_constraints: Optional[int] = None
+    max_depth: Optional[int] = None
+    # A float: counts easily exceed 64 bits. None when no count finished within the time budget
+    number_of_configurations: Optional[float] = None
+
+
+def count_configurations(feature_model) -> int:
+    try:
+        from flamapy.metamodels.bdd_metamodel.operations import BDDConfigurationsNumber
+        from flamapy.metamodels.bdd_metamodel.transformations import FmToBDD
+    except ImportError:
+        # The dd package behind the BDD metamodel is optional
+        logger.debug("BDD metamodel unavailable, counting configurations with SAT")
+    else:
+        try:
+            return BDDConfigurationsNumber().execute(FmToBDD(feature_model).transform()).get_result()
+        except Exception as exc:
+            logger.debug(f"BDD count failed, counting configurations with SAT: {exc}")
+
+    from flamapy.metamodels.pysat_metamodel.operations import PySATConfigurationsNumber
+    from flamapy.metamodels.pysat_metamodel.transformations import FmToPysat
+
+    return PySATConfigurationsNumber().execute(FmToPysat(feature_model).transform()).get_result()
+
+
+def _analyze_files(paths, connection):
+    """Child process: sends the structure and then the configuration count of every model, in order."""
+    from flamapy.metamodels.fm_metamodel.operations import FMMaxDepthTree
+    from flamapy.metamodels.fm_metamodel.transformations import UVLReader
+
+    connection.send("ready")
+    for path in paths:
+        try:
+            feature_model = UVLReader(path).transform()
+            connection.send(
+                (
+                    len(feature_model.get_features()),
+                    len(feature_model.get_constraints()),
+                    FMMaxDepthTree().execute(feature_model).get_result(),
+                )
+            )
+        except Exception as exc:
+            connection.send(exc)
+            continue
+        try:
+            connection.send(count_configurations(feature_model))
+        except Exception as exc:
+            connection.send(exc)
+    connection.close()
+
+
+def _receive(connection, deadline):
+    """The next message of the child, or None if it did not come before the deadline or the child is gone."""
+    try:
+        if connection.poll(max(deadline - time.monotonic(), 0)):
+            return connection.recv()
+    except EOFError:
+        pass
+    return None
+
+
+def analyze_uvl_files(paths, time_budget: float) -> list:
+    """
+    Analyses the given UVL files, in one child process shared by all of them.
+
+    :param time_budget: Seconds allowed for parsing each model, and again for counting its configurations.
+    :return: One UVLAnalysis per path, in the same order. Models that cannot be parsed get an empty analysis.
+    """
+    analyses = []
+    while len(analyses) < len(paths):
+        pending = paths[len(analyses) :]
+        receiver, sender = _context.Pipe(duplex=False)
+        process = _context.Process(target=_analyze_files, args=(pending, sender), daemon=True)
+        process.start()
+        sender.close()
+        try:
+            if _receive(receiver, time.monotonic() + STARTUP_TIMEOUT) != "ready":
+                raise RuntimeError("The UVL analysis process did not start")
+            for path in pending:
+                structure = _receive(receiver, time.monotonic() + time_budget)
+                if not isinstance(structure, tuple):
+                    logger.warning(f"Could not analyse {path}: {structure or 'out of time'}")
+                    analyses.append(UVLAnalysis())
+                    if structure is None:
+                        break
+                    continue
+
+                configurations = _receive(receiver, time.monotonic() + time_budget)
+                if isinstance(configurations, int):
+                    analyses.append(UVLAnalysis(*structure, _as_float(configurations)))
+                    continue
+                logger.info(f"Configurations of {path} not counted: {configurations or 'out of time'}")
+                analyses.append(UVLAnalysis(*structure))
+                if configurations is None:
+                    # The child is still counting, the remaining models go to a new one
+                    break
+        finally:
+            receiver.close()
+            process.kill()
+            process.join()
+    return analyses
+
+
+def analyze_uvl_file(path, time_budget: float) -> UVLAnalysis:
+    return analyze_uvl_files([path], time_budget)[0]
+
+
+def _as_float(count: int) -> Optional[float]:
+    try:
+        value = float(count)
+    except OverflowError:
+        return None
+    return value if math.isfinite(value) else None
@@ -0,0 +1,78 @@
+"""
+Exports of UVL models to other formats (Glencoe, SPLOT, DIMACS).
+
+They run in the export processes of app.modules.flamapy.jobs, which call serve; like core.flamapy.analysis the module
+is outside the app package so that those processes do not import the app.
+"""
+
+from typing import Callable, NamedTuple
+
+from flamapy.metamodels.fm_metamodel.transformations import GlencoeWriter, SPLOTWriter, UVLReader
+from flamapy.metamodels.pysat_metamodel.transformations import DimacsWriter, FmToPysat
+
+from core.cache.page_cache import LRUCache
+
+
+class ExportFormat(NamedTuple):
+    extension: str
+    # Suffix of the name of the downloaded file
+    download_suffix: str
+    # write(feature_model, path)
+    write: Callable
+
+
+def _write_glencoe(feature_model, path):
+    GlencoeWriter(path, feature_model).transform()
+
+
+def _write_splot(feature_model, path):
+    SPLOTWriter(path, feature_model).transform()
+
+
+def _write_cnf(feature_model, path):
+    DimacsWriter(path, FmToPysat(feature_model).transform()).transform()
+
+
+EXPORT_FORMATS = {
+    "glencoe": ExportFormat("json", "_glencoe.txt", _write_glencoe),
+    "splot": ExportFormat("splx", "_splot.txt", _write_splot),
+    "cnf": ExportFormat("cnf", "_cnf.txt", _write_cnf),
+}
+
+
+def export_file(uvl_path, checksum, export_format, path, models):
+    """
+    Writes the model exported to one of EXPORT_FORMATS at path.
+
+    :param models: Cache of parsed FeatureModels by checksum: the file is only read when no file with the same
+        content was parsed before.
+    """
+    feature_model = models.get(checksum)
+    if feature_model is None:
+        feature_model = UVLReader(uvl_path).transform()
+        models.set(checksum, feature_model)
+    EXPORT_FORMATS[export_format].write(feature_model, path)
+
+
+def serve(connection, model_cache_size):
+    """
+    Export process: runs the tasks (UVL path, checksum, format, destination path) it receives, one at a time, and
+    answers each with (succeeded, error message, whether the error may go away on a retry). Reading or writing a file
+    may fail for a while; a model that cannot be parsed or converted fails every time. Parsed models are kept for the
+    next tasks.
+    """
+    models = LRUCache(threshold=model_cache_size, default_timeout=0)
+    connection.send("ready")
+    while True:
+        try:
+            task = connection.recv()
+        except EOFError:
+            return
+        try:
+            export_file(*task, models)
+        except OSError as exc:
+            connection.send((False, f"{type(exc).__name__}: {exc}", True))
+        except Exception as exc:
+            connection.send((False, f"{type(exc).__name__}: {exc}", False))
+        else:
+            connection.send((True, None, False))
@@ -0,0 +1,79 @@
+"""
+Syntax validation of UVL files with the ANTLR grammar of the uvl package.
+
+As core.flamapy.analysis, the module is outside the app package so that it can run in child processes that validate
+many files at once (see the bulk import of datasets) without importing the app.
+"""
+
+from typing import NamedTuple, Optional
+
+from antlr4 import CommonTokenStream, FileStream
+from antlr4.error.ErrorListener import ErrorListener
+from uvl.UVLCustomLexer import UVLCustomLexer
+from uvl.UVLPythonParser import UVLPythonParser
+
+from core.storage.hashing import FileDigest, hash_file
+
+
+class UVLDiagnostic(NamedTuple):
+    line: int
+    column: int
+    message: str
+
+    def __str__(self):
+        # Tabs in the wrong place are reported as warnings, but they prevent reading the model all the same
+        kind = "warning" if "\\t" in self.message else "error"
+        return (
+            f"The UVL has the following {kind} that prevents reading it: "
+            f"Line {self.line}:{self.column} - {self.message}"
+        )
+
+
+class UVLVerdict(NamedTuple):
+    diagnostics: tuple = ()
+
+    @property
+    def valid(self) -> bool:
+        return not self.diagnostics
+
+    def errors(self):
+        return [str(diagnostic) for diagnostic in self.diagnostics]
+
+
+class _DiagnosticCollector(ErrorListener):
+    def __init__(self):
+        self.diagnostics = []
+
+    def syntaxError(self, recognizer, offendingSymbol, line, column, msg, e):
+        self.diagnostics.append(UVLDiagnostic(line, column, msg))
+
+
+def validate_uvl(path) -> UVLVerdict:
+    """Lexes and parses a whole UVL file, collecting every syntax error instead of stopping at the first one."""
+    collector = _DiagnosticCollector()
+
+    lexer = UVLCustomLexer(FileStream(path, encoding="utf-8"))
+    lexer.removeErrorListeners()
+    lexer.addErrorListener(collector)
+
+    parser = UVLPythonParser(CommonTokenStream(lexer))
+    parser.removeErrorListeners()
+    parser.addErrorListener(collector)
+    parser.featureModel()
+
+    return UVLVerdict(tuple(collector.diagnostics))
+
+
+class InspectedFile(NamedTuple):
+    digest: Optional[FileDigest] = None
+    verdict: Optional[UVLVerdict] = None
+    # Why the file could not be read, when it could not
+    error: Optional[str] = None
+
+
+def inspect_uvl_file(path) -> InspectedFile:
+    """Digest and verdict of a UVL file, computed in the calling process."""
+    try:
+        return InspectedFile(hash_file(path), validate_uvl(path))
+    except (OSError, UnicodeDecodeError) as exc:
+        return InspectedFile(error=str(exc))
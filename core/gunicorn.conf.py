@@ -0,0 +1,64 @@
+"""
+Gunicorn settings of the production entrypoints: `gunicorn -c core/gunicorn.conf.py app:app`.
+
+GUNICORN_WORKER_CLASS chooses how each worker process serves requests:
+  sync     one request at a time; a slow request (a Zenodo call, a large ZIP) holds a whole process
+  gthread  GUNICORN_THREADS requests at a time, one per thread (the default)
+  gevent   up to GUNICORN_WORKER_CONNECTIONS requests at a time, in greenlets that yield on every socket wait
+           (PyMySQL is pure Python, so database calls yield too)
+
+The number of workers is derived from the CPUs unless GUNICORN_WORKERS is given. Each worker keeps its own
+SQLAlchemy pool, sized here after its concurrency unless SQLALCHEMY_POOL_SIZE is given, so that the connections of
+the whole server stay bounded: requests beyond the pool wait for a connection (see SQLALCHEMY_ENGINE_OPTIONS in
+ConfigManager). `rosemary locust:compare` benchmarks the worker classes against each other.
+"""
+
+import multiprocessing
+import os
+
+WORKER_CLASSES = ("sync", "gthread", "gevent")
+
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+if worker_class not in WORKER_CLASSES:
+    raise RuntimeError(f"GUNICORN_WORKER_CLASS must be one of {', '.join(WORKER_CLASSES)}, not {worker_class}")
+
+cpus = multiprocessing.cpu_count()
+# Sync workers only overlap requests across processes. Threads and greenlets overlap I/O within one, so a process
+# per CPU (plus one to cover the gaps) is enough
+workers = int(os.getenv("GUNICORN_WORKERS", 2 * cpus + 1 if worker_class == "sync" else cpus + 1))
+threads = int(os.getenv("GUNICORN_THREADS", 8)) if worker_class == "gthread" else 1
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 200))
+
+# Every thread may hold a connection, plus one for the background flushes of the view and download records, and no
+# more can be needed. Greenlets share a smaller pool, as most of their time is not spent in the database, and wait
+# for a connection when it runs out
+if worker_class == "gevent":
+    pool_size, max_overflow = 20, 10
+else:
+    pool_size, max_overflow = threads + 1, 0
+os.environ.setdefault("SQLALCHEMY_POOL_SIZE", str(pool_size))
+os.environ.setdefault("SQLALCHEMY_MAX_OVERFLOW", str(max_overflow))
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+# A sync worker only tells the arbiter it is alive between requests, so it is killed when a single request runs
+# longer than timeout: streaming a large dataset or cart ZIP to a slow client can take far more than two minutes, so
+# sync workers keep the long timeout. Threads and greenlets are supervised apart from the requests they serve, so
+# there timeout only catches a stuck worker (imports, exports and model analysis run in the background)
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 3600 if worker_class == "sync" else 120))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+# Workers are replaced after this many requests (give or take the jitter, so they do not restart together)
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 5000))
+max_requests_jitter = max_requests // 10
+
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+accesslog = os.getenv("GUNICORN_ACCESS_LOG") or None
+
+
+def when_ready(server):
+    connections = int(os.environ["SQLALCHEMY_POOL_SIZE"]) + int(os.environ["SQLALCHEMY_MAX_OVERFLOW"])
+    concurrency = {"sync": 1, "gthread": threads, "gevent": worker_connections}[worker_class]
+    server.log.info(
+        f"{workers} {worker_class} workers, {workers * concurrency} concurrent requests, "
+        f"up to {workers * connections} database connections"
+    )
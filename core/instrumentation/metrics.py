@@ -0,0 +1,188 @@
+import re
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+PREFIX = "uvlhub"
+
+# Upper bounds, in seconds, of the request duration histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_SAMPLE = re.compile(r"^(?P<name>[a-zA-Z_:][\w:]*)(?:\{(?P<labels>.*)\})?\s+(?P<value>\S+)$")
+_LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+@dataclass
+class RequestStats:
+    """What one request did, filled in while it runs."""
+
+    started: float = field(default_factory=time.perf_counter)
+    sql_statements: int = 0
+    sql_seconds: float = 0.0
+
+
+# Stats of the request being handled in the current thread or task, None outside requests
+current_request = ContextVar("current_request", default=None)
+
+
+def record_statement(seconds):
+    stats = current_request.get()
+    if stats is not None:
+        stats.sql_statements += 1
+        stats.sql_seconds += seconds
+
+
+@dataclass
+class EndpointMetrics:
+    requests: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+    sql_statements: int = 0
+    sql_statements_max: int = 0
+    sql_seconds: float = 0.0
+    response_bytes: int = 0
+    buckets: list = field(default_factory=lambda: [0] * len(DURATION_BUCKETS))
+
+
+class MetricsRegistry:
+    """Per-endpoint request metrics of this process, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint, seconds, sql_statements, sql_seconds, response_bytes, error=False):
+        with self._lock:
+            metrics = self._endpoints.setdefault(endpoint, EndpointMetrics())
+            metrics.requests += 1
+            metrics.errors += int(error)
+            metrics.seconds += seconds
+            metrics.sql_statements += sql_statements
+            metrics.sql_statements_max = max(metrics.sql_statements_max, sql_statements)
+            metrics.sql_seconds += sql_seconds
+            metrics.response_bytes += response_bytes
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    metrics.buckets[index] += 1
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+    def render(self) -> str:
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            lines = []
+
+            def family(name, kind, help_text, samples):
+                lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+                lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+                for suffix, labels, value in samples:
+                    label_text = ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+                    lines.append(f"{PREFIX}_{name}{suffix}{{{label_text}}} {value}")
+
+            family(
+                "http_requests_total",
+                "counter",
+                "Requests handled, by endpoint.",
+                [("", {"endpoint": endpoint}, m.requests) for endpoint, m in endpoints],
+            )
+            family(
+                "http_errors_total",
+                "counter",
+                "Requests answered with a 5xx status, by endpoint.",
+                [("", {"endpoint": endpoint}, m.errors) for endpoint, m in endpoints],
+            )
+            duration_samples = []
+            for endpoint, m in endpoints:
+                for bound, count in zip(DURATION_BUCKETS, m.buckets):
+                    duration_samples.append(("_bucket", {"endpoint": endpoint, "le": repr(bound)}, count))
+                duration_samples.append(("_bucket", {"endpoint": endpoint, "le": "+Inf"}, m.requests))
+                duration_samples.append(("_sum", {"endpoint": endpoint}, f"{m.seconds:.6f}"))
+                duration_samples.append(("_count", {"endpoint": endpoint}, m.requests))
+            family(
+                "http_request_duration_seconds",
+                "histogram",
+                "Time spent in the handler, by endpoint.",
+                duration_samples,
+            )
+            family(
+                "sql_statements_total",
+                "counter",
+                "SQL statements executed while handling requests, by endpoint.",
+                [("", {"endpoint": endpoint}, m.sql_statements) for endpoint, m in endpoints],
+            )
+            family(
+                "sql_statements_per_request_max",
+                "gauge",
+                "Most SQL statements executed by a single request, by endpoint.",
+                [("", {"endpoint": endpoint}, m.sql_statements_max) for endpoint, m in endpoints],
+            )
+            family(
+                "sql_duration_seconds_total",
+                "counter",
+                "Time spent executing SQL statements, by endpoint.",
+                [("", {"endpoint": endpoint}, f"{m.sql_seconds:.6f}") for endpoint, m in endpoints],
+            )
+            family(
+                "http_response_bytes_total",
+                "counter",
+                "Bytes of response bodies with a known length, by endpoint.",
+                [("", {"endpoint": endpoint}, m.response_bytes) for endpoint, m in endpoints],
+            )
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def parse_metrics(text):
+    """
+    Reads back what MetricsRegistry.render() produced (or any Prometheus text exposition) as
+    {sample name: [(labels, value), ...]}.
+    """
+    samples = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        match = _SAMPLE.match(line)
+        if not match:
+            continue
+        labels = {
+            key: value.replace('\\"', '"').replace("\\\\", "\\") for key, value in _LABEL.findall(match["labels"] or "")
+        }
+        samples.setdefault(match["name"], []).append((labels, float(match["value"])))
+    return samples
+
+
+def endpoint_summary(samples):
+    """
+    Per-endpoint figures of a parsed metrics page: requests, mean and total handler milliseconds, mean and max SQL
+    statements per request, and mean SQL milliseconds.
+    """
+
+    def by_endpoint(name):
+        return {labels["endpoint"]: value for labels, value in samples.get(f"{PREFIX}_{name}", [])}
+
+    requests = by_endpoint("http_requests_total")
+    seconds = by_endpoint("http_request_duration_seconds_sum")
+    statements = by_endpoint("sql_statements_total")
+    statements_max = by_endpoint("sql_statements_per_request_max")
+    sql_seconds = by_endpoint("sql_duration_seconds_total")
+
+    summary = {}
+    for endpoint, count in requests.items():
+        if not count:
+            continue
+        summary[endpoint] = {
+            "requests": int(count),
+            "mean_ms": seconds.get(endpoint, 0) * 1000 / count,
+            "total_ms": seconds.get(endpoint, 0) * 1000,
+            "mean_statements": statements.get(endpoint, 0) / count,
+            "max_statements": int(statements_max.get(endpoint, 0)),
+            "mean_sql_ms": sql_seconds.get(endpoint, 0) * 1000 / count,
+        }
+    return summary
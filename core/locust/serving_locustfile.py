@@ -0,0 +1,36 @@
+"""
+Workload of `rosemary locust:compare`: anonymous visitors browsing the hub. Most requests are short (homepage,
+explore, dataset pages) and some download a whole dataset, which holds the request for as long as the ZIP streams.
+"""
+
+import random
+
+from locust import HttpUser, between, task
+
+SEARCH_WORDS = ("model", "feature", "car", "system", "phone", "linux", "network", "data")
+
+
+class VisitorUser(HttpUser):
+    wait_time = between(0.5, 2)
+
+    def on_start(self):
+        response = self.client.post("/explore", json={"query": "", "limit": 100}, name="/explore [search]")
+        self.dataset_ids = [item["id"] for item in response.json().get("items", [])] if response.ok else []
+
+    @task(5)
+    def homepage(self):
+        self.client.get("/")
+
+    @task(4)
+    def search(self):
+        self.client.post("/explore", json={"query": random.choice(SEARCH_WORDS)}, name="/explore [search]")
+
+    @task(3)
+    def dataset_page(self):
+        if self.dataset_ids:
+            self.client.get(f"/dataset/view/{random.choice(self.dataset_ids)}", name="/dataset/view/[id]")
+
+    @task(1)
+    def download_dataset(self):
+        if self.dataset_ids:
+            self.client.get(f"/dataset/download/{random.choice(self.dataset_ids)}", name="/dataset/download/[id]")
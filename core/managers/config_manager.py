@@ -30,9 +30,64 @@ class Config:
         f"{os.getenv('MARIADB_DATABASE', 'default_db')}"
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # A pool per process. Requests beyond pool_size + max_overflow connections wait up to pool_timeout seconds for
+    # one, which bounds the connections of the whole server (core/gunicorn.conf.py sizes the pool after the worker
+    # class). Connections are checked before use and replaced well before MariaDB's wait_timeout drops them
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        "pool_size": int(os.getenv("SQLALCHEMY_POOL_SIZE", 5)),
+        "max_overflow": int(os.getenv("SQLALCHEMY_MAX_OVERFLOW", 5)),
+        "pool_timeout": float(os.getenv("SQLALCHEMY_POOL_TIMEOUT", 10)),
+        "pool_pre_ping": True,
+        "pool_recycle": int(os.getenv("SQLALCHEMY_POOL_RECYCLE", 1800)),
+    }
     TIMEZONE = "Europe/Madrid"
     TEMPLATES_AUTO_RELOAD = True
     UPLOAD_FOLDER = "uploads"
+    # Archives of published datasets, kept in a size-bounded LRU on local disk
+    # (absolute, as send_file would resolve a relative path against the app package)
+    ARCHIVE_CACHE_DIR = os.path.abspath(
+        os.getenv("ARCHIVE_CACHE_DIR", os.path.join(os.getenv("WORKING_DIR", ""), "archive_cache"))
+    )
+    ARCHIVE_CACHE_MAX_BYTES = int(os.getenv("ARCHIVE_CACHE_MAX_BYTES", 2 * 1024**3))
+    # Internal nginx location aliasing ARCHIVE_CACHE_DIR. When unset, Flask sends cached archives itself
+    ARCHIVE_CACHE_ACCEL_REDIRECT = os.getenv("ARCHIVE_CACHE_ACCEL_REDIRECT")
+    # Rendered dataset pages and DOI lookups: "lru" keeps them in every worker, "filesystem" in PAGE_CACHE_DIR for
+    # all the workers of a host, "null" disables the cache
+    PAGE_CACHE_TYPE = os.getenv("PAGE_CACHE_TYPE", "lru")
+    PAGE_CACHE_DIR = os.getenv("PAGE_CACHE_DIR", os.path.join(os.getenv("WORKING_DIR", ""), "page_cache"))
+    PAGE_CACHE_THRESHOLD = int(os.getenv("PAGE_CACHE_THRESHOLD", 500))
+    PAGE_CACHE_TIMEOUT = int(os.getenv("PAGE_CACHE_TIMEOUT", 3600))
+    # UVL models exported to other formats, kept in a size-bounded LRU on local disk (absolute, like
+    # ARCHIVE_CACHE_DIR, as exports are sent with send_file)
+    FLAMAPY_CACHE_DIR = os.path.abspath(
+        os.getenv("FLAMAPY_CACHE_DIR", os.path.join(os.getenv("WORKING_DIR", ""), "flamapy_cache"))
+    )
+    FLAMAPY_CACHE_MAX_BYTES = int(os.getenv("FLAMAPY_CACHE_MAX_BYTES", 512 * 1024**2))
+    # Exports run in FLAMAPY_POOL_SIZE processes per worker, each keeping up to FLAMAPY_MODEL_CACHE_SIZE parsed models
+    # and killed when an export takes longer than FLAMAPY_EXPORT_TIME_BUDGET seconds. Requests wait
+    # FLAMAPY_EXPORT_WAIT seconds for the export, and answer 202 with a URL to poll if it is not done by then
+    FLAMAPY_POOL_SIZE = int(os.getenv("FLAMAPY_POOL_SIZE", 2))
+    FLAMAPY_MODEL_CACHE_SIZE = int(os.getenv("FLAMAPY_MODEL_CACHE_SIZE", 64))
+    FLAMAPY_EXPORT_TIME_BUDGET = float(os.getenv("FLAMAPY_EXPORT_TIME_BUDGET", 120))
+    FLAMAPY_EXPORT_WAIT = float(os.getenv("FLAMAPY_EXPORT_WAIT", 5))
+    # Seconds that each uploaded UVL model gets to be parsed, and again to count its configurations
+    UVL_ANALYSIS_TIME_BUDGET = float(os.getenv("UVL_ANALYSIS_TIME_BUDGET", 10))
+    # Bulk imports hash and validate files in DATASET_IMPORT_WORKERS processes and commit the datasets of about
+    # DATASET_IMPORT_BATCH_SIZE feature models at a time
+    DATASET_IMPORT_WORKERS = int(os.getenv("DATASET_IMPORT_WORKERS", os.cpu_count() or 1))
+    DATASET_IMPORT_BATCH_SIZE = int(os.getenv("DATASET_IMPORT_BATCH_SIZE", 1000))
+    # ZIP archives of an import are rejected before extracting anything when they have more entries, or their files
+    # take more bytes once extracted, than these
+    DATASET_IMPORT_MAX_FILES = int(os.getenv("DATASET_IMPORT_MAX_FILES", 100_000))
+    DATASET_IMPORT_MAX_BYTES = int(os.getenv("DATASET_IMPORT_MAX_BYTES", 2 * 1024**3))
+    # Seconds that every worker serves the same homepage statistics before reading them again
+    STATISTICS_CACHE_TTL = float(os.getenv("STATISTICS_CACHE_TTL", 30))
+    # View and download records are buffered in every worker and written in bulk when this many are waiting, or
+    # after this many seconds
+    EVENT_BUFFER_MAX_EVENTS = int(os.getenv("EVENT_BUFFER_MAX_EVENTS", 500))
+    EVENT_BUFFER_FLUSH_INTERVAL = float(os.getenv("EVENT_BUFFER_FLUSH_INTERVAL", 2))
+    # Send SQL and handler times of every response in a Server-Timing header (shown by the browser dev tools)
+    SERVER_TIMING = os.getenv("SERVER_TIMING", "False").lower() in ("true", "1", "yes")
 
 
 class DevelopmentConfig(Config):
@@ -49,6 +104,10 @@ class TestingConfig(Config):
         f"{os.getenv('MARIADB_TEST_DATABASE', 'default_db')}"
     )
     WTF_CSRF_ENABLED = False
+    STATISTICS_CACHE_TTL = 0
+    PAGE_CACHE_TYPE = "null"
+    # Tests write the buffered records explicitly with record_tracker.flush()
+    EVENT_BUFFER_FLUSH_INTERVAL = 3600
 
 
 class ProductionConfig(Config):
@@ -0,0 +1,74 @@
+import time
+
+from flask import Response, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from core.instrumentation.metrics import MetricsRegistry, RequestStats, current_request, record_statement
+
+metrics_registry = MetricsRegistry()
+
+# Requests that are not worth measuring, and would only add noise
+IGNORED_ENDPOINTS = {"static", "metrics"}
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("statement_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    record_statement(time.perf_counter() - conn.info["statement_started"].pop())
+
+
+class InstrumentationManager:
+    """
+    Measures every request: handler time, SQL statements executed and their time (through engine events), and
+    response size, aggregated by endpoint in this process. The figures are exposed at /metrics in the Prometheus
+    text format and, when SERVER_TIMING is enabled, sent to the browser in a Server-Timing header.
+
+    Only the handler is measured: the body of a streamed response is produced after the figures are recorded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def register_instrumentation(self):
+        if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+            event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+        @self.app.before_request
+        def start_measuring():
+            current_request.set(RequestStats())
+
+        @self.app.after_request
+        def record_measures(response):
+            stats = current_request.get()
+            endpoint = request.url_rule.endpoint if request.url_rule else "unmatched"
+            if stats is None or endpoint in IGNORED_ENDPOINTS:
+                return response
+
+            seconds = time.perf_counter() - stats.started
+            metrics_registry.observe(
+                endpoint,
+                seconds,
+                stats.sql_statements,
+                stats.sql_seconds,
+                response.content_length or 0,
+                error=response.status_code >= 500,
+            )
+            if self.app.config.get("SERVER_TIMING"):
+                response.headers["Server-Timing"] = (
+                    f'sql;dur={stats.sql_seconds * 1000:.1f};desc="{stats.sql_statements} queries", '
+                    f"app;dur={seconds * 1000:.1f}"
+                )
+            return response
+
+        @self.app.teardown_request
+        def stop_measuring(exc):
+            # Statements of threads reused for later requests must not count for this one
+            current_request.set(None)
+
+        @self.app.route("/metrics")
+        def metrics():
+            return Response(metrics_registry.render(), mimetype="text/plain; version=0.0.4")
@@ -1,13 +1,22 @@
+from itertools import islice
+
+from sqlalchemy import insert
 from sqlalchemy.exc import IntegrityError
 
 from app import db
 
+# Rows per INSERT statement, and per transaction, of bulk_seed
+BULK_BATCH_SIZE = 5000
+
 
 class BaseSeeder:
     priority = 10  # Default priority
 
-    def __init__(self):
+    def __init__(self, scale=None):
         self.db = db
+        # Number of synthetic datasets requested with `rosemary db:seed --scale N`, for the seeders that generate
+        # data at scale. None seeds the fixed sample data only
+        self.scale = scale
 
     def run(self):
         raise NotImplementedError("The 'run' method must be implemented by the child class.")
@@ -36,3 +45,29 @@ class BaseSeeder:
 
         # After committing, the `data` objects should have their IDs assigned.
         return data
+
+    def bulk_seed(self, model, rows, return_ids=False):
+        """
+        Inserts rows given as dicts with multi-row INSERTs, committing every BULK_BATCH_SIZE rows, for the volumes
+        of the scaled seeders: no object is built nor tracked by the session. Mapper events do not run either, so
+        aggregates kept by listeners (file totals, blob references, homepage counters) are up to the caller.
+
+        :param rows: Iterable of dicts, consumed one batch at a time.
+        :return: The IDs of the rows, in order, if return_ids.
+        """
+        statement = insert(model)
+        if return_ids:
+            statement = statement.returning(model.id, sort_by_parameter_order=True)
+
+        ids = []
+        rows = iter(rows)
+        while batch := list(islice(rows, BULK_BATCH_SIZE)):
+            try:
+                result = self.db.session.execute(statement, batch)
+                if return_ids:
+                    ids.extend(result.scalars().all())
+                self.db.session.commit()
+            except IntegrityError as e:
+                self.db.session.rollback()
+                raise Exception(f"Failed to insert data into `{model.__tablename__}` table. Error: {e}")
+        return ids
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import shutil
+import zlib
+from typing import NamedTuple, Optional
+
+CHUNK_SIZE = 1024 * 1024
+
+SIDECAR_SUFFIX = ".checksum"
+
+
+class FileDigest(NamedTuple):
+    md5: str
+    # CRC-32 is much cheaper than MD5: together with the size it discards most dedup candidates before comparing MD5s
+    crc32: str
+    size: int
+
+
+class StreamingDigest:
+    """Hashes data as it arrives in chunks, so the whole content never has to be in memory."""
+
+    def __init__(self):
+        self._md5 = hashlib.md5()
+        self._crc32 = 0
+        self._size = 0
+
+    def update(self, chunk: bytes):
+        self._md5.update(chunk)
+        self._crc32 = zlib.crc32(chunk, self._crc32)
+        self._size += len(chunk)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def digest(self) -> FileDigest:
+        return FileDigest(self._md5.hexdigest(), f"{self._crc32:08x}", self._size)
+
+
+def _copy(source, destination=None) -> FileDigest:
+    digest = StreamingDigest()
+    while True:
+        chunk = source.read(CHUNK_SIZE)
+        if not chunk:
+            return digest.digest()
+        digest.update(chunk)
+        if destination is not None:
+            destination.write(chunk)
+
+
+def hash_file(path) -> FileDigest:
+    with open(path, "rb") as source:
+        return _copy(source)
+
+
+def save_stream(stream, path) -> FileDigest:
+    """
+    Writes a stream (e.g. an uploaded file) to path, hashing the bytes on the way, and leaves the digest in a sidecar
+    file so that it does not have to be read again later.
+    """
+    with open(path, "wb") as destination:
+        digest = _copy(stream, destination)
+    write_sidecar(path, digest)
+    return digest
+
+
+def copy_file(source_path, destination_path) -> FileDigest:
+    """Like shutil.copy2, but the copy is hashed in the same pass instead of being read again afterwards."""
+    with open(source_path, "rb") as source, open(destination_path, "wb") as destination:
+        digest = _copy(source, destination)
+    shutil.copystat(source_path, destination_path)
+    return digest
+
+
+def sidecar_path(path):
+    return path + SIDECAR_SUFFIX
+
+
+def write_sidecar(path, digest: FileDigest):
+    stat = os.stat(path)
+    with open(sidecar_path(path), "w") as sidecar:
+        json.dump({**digest._asdict(), "mtime_ns": stat.st_mtime_ns}, sidecar)
+
+
+def read_sidecar(path) -> Optional[FileDigest]:
+    """The cached digest of a file, or None if there is none or the file changed since it was computed."""
+    try:
+        with open(sidecar_path(path)) as sidecar:
+            cached = json.load(sidecar)
+        stat = os.stat(path)
+    except (OSError, ValueError):
+        return None
+    if cached.get("size") != stat.st_size or cached.get("mtime_ns") != stat.st_mtime_ns:
+        return None
+    return FileDigest(cached["md5"], cached["crc32"], cached["size"])
+
+
+def remove_sidecar(path):
+    try:
+        os.remove(sidecar_path(path))
+    except FileNotFoundError:
+        pass
+
+
+def file_digest(path) -> FileDigest:
+    """Digest of a file, taken from its sidecar when it is still valid and computed in chunks otherwise."""
+    return read_sidecar(path) or hash_file(path)
@@ -0,0 +1,40 @@
+import os
+
+from core.configuration.configuration import uploads_folder_name
+
+
+def uploads_root():
+    """
+    Absolute folder where every uploaded file lives. An empty WORKING_DIR (local development) resolves against the
+    current directory, never against the app package as send_file would do with a relative path.
+    """
+    return os.path.abspath(os.path.join(os.getenv("WORKING_DIR", ""), uploads_folder_name()))
+
+
+def dataset_folder(user_id, dataset_id):
+    return os.path.join(uploads_root(), f"user_{user_id}", f"dataset_{dataset_id}")
+
+
+def dataset_file_path(user_id, dataset_id, filename):
+    """Where a file of a dataset lives in the legacy layout, before being moved to the blob store."""
+    return os.path.join(dataset_folder(user_id, dataset_id), filename)
+
+
+def blob_path(checksum):
+    """Content-addressed location of a blob, fanned out by the first two characters of its checksum."""
+    return os.path.join(uploads_root(), "blobs", checksum[:2], checksum)
+
+
+def verdict_path(checksum):
+    """Where the UVL validation verdict of some content is kept, fanned out like the blobs."""
+    return os.path.join(uploads_root(), "verdicts", checksum[:2], f"{checksum}.json")
+
+
+def stored_file_path(user_id, dataset_id, filename, blob_checksum=None):
+    """
+    Where a file of a dataset is stored: its blob if it has one, the legacy dataset folder otherwise. Every reader
+    should resolve paths here rather than probing folders.
+    """
+    if blob_checksum:
+        return blob_path(blob_checksum)
+    return dataset_file_path(user_id, dataset_id, filename)
@@ -0,0 +1,151 @@
+"""
+Uploads to the temporary folder of a user, whole or in chunks.
+
+A chunked upload is a session (an id chosen by the client) whose chunks are appended in order to a partial file,
+hashed on the way, and renamed into place when the last one arrives. The size of the partial file is the offset the
+next chunk must start at, so a client that lost its connection asks for it and carries on from there.
+"""
+
+import os
+import re
+import uuid
+
+from core.cache.page_cache import LRUCache
+from core.storage.hashing import CHUNK_SIZE, StreamingDigest, hash_file, write_sidecar
+
+CHUNKS_FOLDER = ".chunks"
+
+SESSION_ID = re.compile(r"[A-Za-z0-9-]{8,64}")
+
+# Digests of the chunks received so far by this worker, per session. A session whose chunks reach another worker
+# (or that outlives this one) hashes its partial file again once and carries on from there
+_digests = LRUCache(threshold=1000, default_timeout=0)
+
+
+class OffsetMismatch(Exception):
+    """A chunk does not start where the partial file ends."""
+
+    def __init__(self, offset):
+        super().__init__(f"The upload continues at byte {offset}")
+        self.offset = offset
+
+
+def unique_name(folder, filename, create):
+    """
+    Calls create(path) with the path of filename in folder and, if a file with that name exists, once more with a
+    name made unique by a random suffix, "name (1a2b3c4d).uvl". Two filesystem calls at most, however many
+    duplicates there are.
+
+    :param create: Creates the file at the given path, raising FileExistsError if it already exists.
+    :return: The name the file was created with.
+    """
+    try:
+        create(os.path.join(folder, filename))
+        return filename
+    except FileExistsError:
+        base_name, extension = os.path.splitext(filename)
+        unique = f"{base_name} ({uuid.uuid4().hex[:8]}){extension}"
+        create(os.path.join(folder, unique))
+        return unique
+
+
+def save_new_file(stream, folder, filename):
+    """
+    Writes a whole stream to a new file of folder, under a unique name, hashing it on the way. The digest is left in
+    a sidecar as save_stream does.
+
+    :return: The name of the file and its digest.
+    """
+    digest = StreamingDigest()
+    paths = []
+
+    def create(path):
+        with open(path, "xb") as destination:
+            paths.append(path)
+            while chunk := stream.read(CHUNK_SIZE):
+                digest.update(chunk)
+                destination.write(chunk)
+
+    name = unique_name(folder, filename, create)
+    write_sidecar(paths[-1], digest.digest())
+    return name, digest.digest()
+
+
+class ChunkedUpload:
+    def __init__(self, folder, session_id):
+        """
+        :raises ValueError: If the session id is not a short string of letters, digits and dashes (a UUID).
+        """
+        if not SESSION_ID.fullmatch(session_id or ""):
+            raise ValueError("Invalid upload session")
+        self.folder = folder
+        self.session_id = session_id
+        self.part_path = os.path.join(folder, CHUNKS_FOLDER, f"{session_id}.part")
+
+    def offset(self) -> int:
+        """Bytes received so far, where the next chunk must start."""
+        try:
+            return os.path.getsize(self.part_path)
+        except FileNotFoundError:
+            return 0
+
+    def append(self, stream, offset: int) -> int:
+        """
+        Appends a chunk to the partial file, hashing it on the way. A chunk sent again (because its response was
+        lost) replaces what had arrived from its offset on.
+
+        :return: The new offset.
+        :raises OffsetMismatch: If the chunk starts beyond the end of the partial file.
+        """
+        os.makedirs(os.path.dirname(self.part_path), exist_ok=True)
+        received = self.offset()
+        if offset > received:
+            raise OffsetMismatch(received)
+
+        digest = _digests.get(self.part_path)
+        if digest is None or digest.size != offset:
+            digest = self._digest_of_part(offset)
+
+        with open(self.part_path, "r+b" if received else "wb") as part:
+            part.truncate(offset)
+            part.seek(offset)
+            while chunk := stream.read(CHUNK_SIZE):
+                digest.update(chunk)
+                part.write(chunk)
+
+        _digests.set(self.part_path, digest)
+        return digest.size
+
+    def complete(self, filename):
+        """
+        Moves the assembled file into the folder under a unique name and leaves its digest in a sidecar.
+
+        :return: The name of the file and its digest.
+        """
+        digest = _digests.get(self.part_path)
+        _digests.delete(self.part_path)
+        size = self.offset()
+        file_digest = digest.digest() if digest is not None and digest.size == size else hash_file(self.part_path)
+
+        # A hard link never replaces an existing file, unlike a rename
+        name = unique_name(self.folder, filename, lambda path: os.link(self.part_path, path))
+        os.unlink(self.part_path)
+        write_sidecar(os.path.join(self.folder, name), file_digest)
+        return name, file_digest
+
+    def discard(self):
+        _digests.delete(self.part_path)
+        try:
+            os.unlink(self.part_path)
+        except FileNotFoundError:
+            pass
+
+    def _digest_of_part(self, length) -> StreamingDigest:
+        digest = StreamingDigest()
+        if length:
+            with open(self.part_path, "rb") as part:
+                while length:
+                    chunk = part.read(min(CHUNK_SIZE, length))
+                    digest.update(chunk)
+                    length -= len(chunk)
+        return digest
@@ -18,6 +18,20 @@ flask db upgrade
 echo "🌱 Ejecutando semillas..."
 rosemary db:seed
 
-# 4. Iniciar Gunicorn
+# 4. Workers de las colas, junto a gunicorn en el mismo contenedor (se relanzan si fallan)
+run_worker() {
+    while true; do
+        "$@" || echo "⚠️ '$*' terminó con error. Relanzando..."
+        sleep 5
+    done
+}
+
+echo "📤 Iniciando worker de Zenodo..."
+run_worker flask zenodo worker &
+
+echo "📦 Iniciando worker de importación de datasets..."
+run_worker flask dataset import-worker &
+
+# 5. Iniciar Gunicorn
 echo "🔥 Iniciando servidor..."
-exec gunicorn app:app --bind 0.0.0.0:80
+exec gunicorn -c core/gunicorn.conf.py --bind 0.0.0.0:80 app:app
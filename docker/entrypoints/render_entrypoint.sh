@@ -35,10 +35,30 @@ else
 fi
 
 # ---------------------------------------------------------------------------
-# 3. INICIO DEL SERVIDOR
+# 3. WORKERS EN SEGUNDO PLANO
+# ---------------------------------------------------------------------------
+# Render solo arranca este contenedor, así que los workers de las colas corren
+# junto a gunicorn (y comparten con él la carpeta de uploads). Si uno termina
+# con error se relanza a los 5 segundos.
+run_worker() {
+    while true; do
+        "$@" || echo "⚠️ '$*' terminó con error. Relanzando..."
+        sleep 5
+    done
+}
+
+echo "📤 Arrancando el worker de publicación en Zenodo..."
+run_worker flask zenodo worker &
+
+echo "📦 Arrancando el worker de importación de datasets..."
+run_worker flask dataset import-worker &
+
+# ---------------------------------------------------------------------------
+# 4. INICIO DEL SERVIDOR
 # ---------------------------------------------------------------------------
 echo "🔥 Arrancando Gunicorn..."
 
 # 'exec' reemplaza el proceso shell actual por gunicorn.
 # Esto asegura que gunicorn reciba las señales de parada de Render correctamente.
-exec gunicorn --bind 0.0.0.0:80 app:app --log-level info --timeout 3600
+# Workers, clase de worker (GUNICORN_WORKER_CLASS) y pool de la base de datos: core/gunicorn.conf.py
+exec gunicorn -c core/gunicorn.conf.py --bind 0.0.0.0:80 app:app
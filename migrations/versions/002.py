@@ -0,0 +1,36 @@
+"""explore search index
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-18 10:00:00.000000
+
+The index starts empty: run `rosemary search:reindex` once after upgrading to index existing datasets.
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "002"
+down_revision = "001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "search_term",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("term", sa.String(length=64), nullable=False),
+        sa.Column("dataset_id", sa.Integer(), nullable=False),
+        sa.Column("weight", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["dataset_id"], ["data_set.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("term", "dataset_id", name="uq_search_term_term_dataset"),
+    )
+    op.create_index("ix_search_term_dataset_id", "search_term", ["dataset_id"])
+
+
+def downgrade():
+    op.drop_index("ix_search_term_dataset_id", table_name="search_term")
+    op.drop_table("search_term")
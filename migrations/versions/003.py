@@ -0,0 +1,44 @@
+"""content-addressed blob store
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-18 12:00:00.000000
+
+Existing files keep their legacy uploads/user_X/dataset_Y location (blob_id empty) until `rosemary storage:migrate`
+moves them into the blob store.
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "003"
+down_revision = "002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "blob",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("checksum", sa.String(length=32), nullable=False),
+        sa.Column("crc32", sa.String(length=8), nullable=False),
+        sa.Column("size", sa.BigInteger(), nullable=False),
+        sa.Column("ref_count", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("checksum", name="uq_blob_checksum"),
+    )
+    with op.batch_alter_table("file", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("blob_id", sa.Integer(), nullable=True))
+        batch_op.create_index("ix_file_blob_id", ["blob_id"], unique=False)
+        batch_op.create_foreign_key("fk_file_blob_id", "blob", ["blob_id"], ["id"])
+
+
+def downgrade():
+    with op.batch_alter_table("file", schema=None) as batch_op:
+        batch_op.drop_constraint("fk_file_blob_id", type_="foreignkey")
+        batch_op.drop_index("ix_file_blob_id")
+        batch_op.drop_column("blob_id")
+    op.drop_table("blob")
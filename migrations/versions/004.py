@@ -0,0 +1,56 @@
+"""zenodo publication jobs
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "004"
+down_revision = "003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "zenodo_job",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("dataset_id", sa.Integer(), nullable=False),
+        sa.Column("idempotency_key", sa.String(length=64), nullable=False),
+        sa.Column(
+            "status",
+            sa.Enum("QUEUED", "RUNNING", "SUCCEEDED", "FAILED", name="zenodojobstatus"),
+            nullable=False,
+        ),
+        sa.Column(
+            "step",
+            sa.Enum("CREATE_DEPOSITION", "UPLOAD_FILES", "PUBLISH", "UPDATE_DOI", "DONE", name="zenodojobstep"),
+            nullable=False,
+        ),
+        sa.Column("files_uploaded", sa.Integer(), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("max_attempts", sa.Integer(), nullable=False),
+        sa.Column("next_run_at", sa.DateTime(), nullable=False),
+        sa.Column("locked_by", sa.String(length=64), nullable=True),
+        sa.Column("locked_at", sa.DateTime(), nullable=True),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["dataset_id"], ["data_set.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("idempotency_key", name="uq_zenodo_job_idempotency_key"),
+    )
+    op.create_index("ix_zenodo_job_dataset_id", "zenodo_job", ["dataset_id"])
+    # The worker polls for due jobs
+    op.create_index("ix_zenodo_job_status_next_run_at", "zenodo_job", ["status", "next_run_at"])
+
+
+def downgrade():
+    op.drop_index("ix_zenodo_job_status_next_run_at", table_name="zenodo_job")
+    op.drop_index("ix_zenodo_job_dataset_id", table_name="zenodo_job")
+    op.drop_table("zenodo_job")
@@ -0,0 +1,42 @@
+"""homepage counters
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "005"
+down_revision = "004"
+branch_labels = None
+depends_on = None
+
+COUNTS = {
+    "datasets": "SELECT COUNT(*) FROM data_set JOIN ds_meta_data ON ds_meta_data.id = data_set.ds_meta_data_id "
+    "WHERE ds_meta_data.dataset_doi IS NOT NULL",
+    "feature_models": "SELECT COUNT(*) FROM feature_model",
+    "dataset_views": "SELECT COUNT(*) FROM ds_view_record",
+    "dataset_downloads": "SELECT COUNT(*) FROM ds_download_record",
+    "feature_model_views": "SELECT COUNT(*) FROM file_view_record",
+    "feature_model_downloads": "SELECT COUNT(*) FROM file_download_record",
+}
+
+
+def upgrade():
+    op.create_table(
+        "hub_counter",
+        sa.Column("name", sa.String(length=64), nullable=False),
+        sa.Column("value", sa.BigInteger(), server_default="0", nullable=False),
+        sa.PrimaryKeyConstraint("name"),
+    )
+    # Start from the current totals, later changes are counted as they happen
+    for name, count in COUNTS.items():
+        op.execute(f"INSERT INTO hub_counter (name, value) SELECT '{name}', ({count})")
+
+
+def downgrade():
+    op.drop_table("hub_counter")
@@ -0,0 +1,39 @@
+"""unique view and download records per cookie
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "006"
+down_revision = "005"
+branch_labels = None
+depends_on = None
+
+# table: (constraint, cookie column, target column, homepage counter)
+RECORD_TABLES = {
+    "ds_view_record": ("uq_ds_view_record_cookie", "view_cookie", "dataset_id", "dataset_views"),
+    "ds_download_record": ("uq_ds_download_record_cookie", "download_cookie", "dataset_id", "dataset_downloads"),
+    "file_view_record": ("uq_file_view_record_cookie", "view_cookie", "file_id", "feature_model_views"),
+    "file_download_record": ("uq_file_download_record_cookie", "download_cookie", "file_id", "feature_model_downloads"),
+}
+
+
+def upgrade():
+    for table, (constraint, cookie, target, counter) in RECORD_TABLES.items():
+        # Keep the first record of every cookie and target, the ones the unique key would have let in
+        op.execute(
+            f"DELETE newer FROM {table} newer JOIN {table} older "
+            f"ON older.{cookie} = newer.{cookie} AND older.{target} = newer.{target} AND older.id < newer.id"
+        )
+        op.create_unique_constraint(constraint, table, [cookie, target])
+        op.execute(f"UPDATE hub_counter SET value = (SELECT COUNT(*) FROM {table}) WHERE name = '{counter}'")
+
+
+def downgrade():
+    for table, (constraint, *_) in RECORD_TABLES.items():
+        op.drop_constraint(constraint, table, type_="unique")
@@ -0,0 +1,38 @@
+"""dataset file totals
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "007"
+down_revision = "006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("data_set", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("files_count", sa.Integer(), server_default="0", nullable=False))
+        batch_op.add_column(sa.Column("total_size_in_bytes", sa.BigInteger(), server_default="0", nullable=False))
+
+    # Backfill from the files of every dataset; later changes are applied as files are added and removed
+    op.execute(
+        "UPDATE data_set JOIN ("
+        "SELECT feature_model.data_set_id, COUNT(file.id) AS files_count, SUM(file.size) AS total_size "
+        "FROM feature_model JOIN file ON file.feature_model_id = feature_model.id "
+        "GROUP BY feature_model.data_set_id"
+        ") totals ON totals.data_set_id = data_set.id "
+        "SET data_set.files_count = totals.files_count, data_set.total_size_in_bytes = totals.total_size"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table("data_set", schema=None) as batch_op:
+        batch_op.drop_column("total_size_in_bytes")
+        batch_op.drop_column("files_count")
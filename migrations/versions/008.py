@@ -0,0 +1,26 @@
+"""dataset page version
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-18 21:00:00.000000
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "008"
+down_revision = "007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("data_set", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("version", sa.Integer(), server_default="1", nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table("data_set", schema=None) as batch_op:
+        batch_op.drop_column("version")
@@ -0,0 +1,55 @@
+"""indexes for hot lookups
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "009"
+down_revision = "008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # DOIs are issued by Zenodo, so duplicates are mistakes. Each is a dataset, so rather than deleting any the upgrade
+    # stops, before changing anything (MySQL commits every DDL statement), until the operator fixes them
+    duplicates = op.get_bind().execute(
+        sa.text(
+            "SELECT dataset_doi, GROUP_CONCAT(id ORDER BY id) FROM ds_meta_data "
+            "WHERE dataset_doi IS NOT NULL AND dataset_doi != '' GROUP BY dataset_doi HAVING COUNT(*) > 1"
+        )
+    )
+    shared = "; ".join(f"{doi} (ds_meta_data ids {ids})" for doi, ids in duplicates)
+    if shared:
+        raise RuntimeError(
+            f"ds_meta_data.dataset_doi must be unique, but these DOIs are shared: {shared}. Keep each DOI on the "
+            "dataset it belongs to, set it to NULL on the others and run 'flask db upgrade' again."
+        )
+
+    # An old DOI maps to a single new one: keep the first mapping of every old DOI, the one that was being used
+    op.execute(
+        "DELETE newer FROM doi_mapping newer JOIN doi_mapping older "
+        "ON older.dataset_doi_old = newer.dataset_doi_old AND older.id < newer.id"
+    )
+    op.create_unique_constraint("uq_doi_mapping_dataset_doi_old", "doi_mapping", ["dataset_doi_old"])
+    # Empty DOIs saved by the forms mean no DOI at all
+    op.execute("UPDATE ds_meta_data SET dataset_doi = NULL WHERE dataset_doi = ''")
+    op.create_unique_constraint("uq_ds_meta_data_dataset_doi", "ds_meta_data", ["dataset_doi"])
+    op.create_index("ix_data_set_user_id_created_at", "data_set", ["user_id", "created_at"])
+    op.create_index("ix_user_session_user_id", "user_session", ["user_id"])
+
+
+def downgrade():
+    # MySQL dropped the implicit indexes of the user_id foreign keys once these could back them. They are put back,
+    # with their original name, before these go
+    op.create_index("user_id", "data_set", ["user_id"])
+    op.drop_index("ix_data_set_user_id_created_at", table_name="data_set")
+    op.execute("ALTER TABLE user_session RENAME INDEX ix_user_session_user_id TO user_id")
+    op.drop_constraint("uq_ds_meta_data_dataset_doi", "ds_meta_data", type_="unique")
+    op.drop_constraint("uq_doi_mapping_dataset_doi_old", "doi_mapping", type_="unique")
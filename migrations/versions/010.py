@@ -0,0 +1,48 @@
+"""typed feature model and dataset metrics
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-18 23:00:00.000000
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "010"
+down_revision = "009"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The solver columns were never filled by the app; models are analysed again with `rosemary featuremodel:analyze`
+    with op.batch_alter_table("fm_metrics", schema=None) as batch_op:
+        batch_op.drop_column("solver")
+        batch_op.drop_column("not_solver")
+        batch_op.add_column(sa.Column("number_of_features", sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column("number_of_constraints", sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column("max_depth", sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column("number_of_configurations", sa.Double(), nullable=True))
+
+    # Free text that is not a number cannot be converted
+    for column in ("number_of_models", "number_of_features"):
+        op.execute(f"UPDATE ds_metrics SET {column} = NULL WHERE {column} NOT REGEXP '^[0-9]+$'")
+    with op.batch_alter_table("ds_metrics", schema=None) as batch_op:
+        batch_op.alter_column("number_of_models", existing_type=sa.String(length=120), type_=sa.Integer())
+        batch_op.alter_column("number_of_features", existing_type=sa.String(length=120), type_=sa.Integer())
+
+
+def downgrade():
+    with op.batch_alter_table("ds_metrics", schema=None) as batch_op:
+        batch_op.alter_column("number_of_features", existing_type=sa.Integer(), type_=sa.String(length=120))
+        batch_op.alter_column("number_of_models", existing_type=sa.Integer(), type_=sa.String(length=120))
+
+    with op.batch_alter_table("fm_metrics", schema=None) as batch_op:
+        batch_op.drop_column("number_of_configurations")
+        batch_op.drop_column("max_depth")
+        batch_op.drop_column("number_of_constraints")
+        batch_op.drop_column("number_of_features")
+        batch_op.add_column(sa.Column("not_solver", sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column("solver", sa.Text(), nullable=True))
@@ -0,0 +1,48 @@
+"""dataset import jobs
+
+Revision ID: 011
+Revises: 010
+Create Date: 2026-10-18 23:30:00.000000
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "011"
+down_revision = "010"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "dataset_import_job",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column(
+            "status",
+            sa.Enum("QUEUED", "RUNNING", "SUCCEEDED", "FAILED", name="importjobstatus"),
+            nullable=False,
+        ),
+        sa.Column("folder", sa.String(length=255), nullable=False),
+        sa.Column("manifest_name", sa.String(length=255), nullable=False),
+        sa.Column("report", sa.Text(), nullable=True),
+        sa.Column("locked_by", sa.String(length=64), nullable=True),
+        sa.Column("locked_at", sa.DateTime(), nullable=True),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_dataset_import_job_user_id", "dataset_import_job", ["user_id"])
+    # The worker polls for queued jobs
+    op.create_index("ix_dataset_import_job_status_created_at", "dataset_import_job", ["status", "created_at"])
+
+
+def downgrade():
+    op.drop_index("ix_dataset_import_job_status_created_at", table_name="dataset_import_job")
+    op.drop_index("ix_dataset_import_job_user_id", table_name="dataset_import_job")
+    op.drop_table("dataset_import_job")
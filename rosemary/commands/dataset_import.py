@@ -0,0 +1,52 @@
+import os
+import sys
+
+import click
+from flask.cli import with_appcontext
+
+
+@click.command(
+    "dataset:import",
+    help="Creates the UVL datasets of a JSON or CSV manifest from a directory or a ZIP archive of UVL files.",
+)
+@click.argument("manifest", type=click.Path(exists=True, dir_okay=False))
+@click.argument("files", type=click.Path(exists=True))
+@click.option("--owner", required=True, help="Email of the user who will own the datasets.")
+@click.option("--workers", type=int, help="Processes hashing and validating files (DATASET_IMPORT_WORKERS).")
+@click.option("--batch-size", type=int, help="Feature models per transaction (DATASET_IMPORT_BATCH_SIZE).")
+@with_appcontext
+def dataset_import(manifest, files, owner, workers, batch_size):
+    from app.modules.auth.services import AuthenticationService
+    from app.modules.dataset.ingestion import DataSetImportService, ManifestError, files_root, read_manifest
+
+    user = AuthenticationService().get_user_by_email(owner)
+    if user is None:
+        click.echo(click.style(f"There is no user with email {owner}.", fg="red"))
+        sys.exit(1)
+
+    try:
+        with open(manifest, "rb") as file:
+            datasets = read_manifest(file.read(), os.path.basename(manifest))
+        models = sum(len(dataset.models) for dataset in datasets)
+        click.echo(click.style(f"Importing {len(datasets)} datasets with {models} feature models...", fg="yellow"))
+        with files_root(files, datasets) as root:
+            report = DataSetImportService().import_datasets(datasets, root, user, workers, batch_size)
+    except ManifestError as e:
+        click.echo(click.style(f"Invalid manifest: {e}", fg="red"))
+        sys.exit(1)
+    except Exception as e:
+        click.echo(click.style(f"Error importing datasets: {e}", fg="red"))
+        sys.exit(1)
+
+    for item, reason in report.rejected:
+        click.echo(click.style(f"Skipped {item}: {reason}", fg="yellow"))
+    click.echo(
+        click.style(
+            f"Imported {len(report.dataset_ids)} datasets, {report.models} feature models "
+            f"({report.bytes / 1024**2:.1f} MB) in {report.seconds:.1f} s: "
+            f"{report.models_per_second:.1f} models/s, {report.megabytes_per_second:.2f} MB/s.",
+            fg="green",
+        )
+    )
+    if report.models:
+        click.echo("Run rosemary featuremodel:analyze to compute the metrics of the new feature models.")
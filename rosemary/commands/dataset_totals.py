@@ -0,0 +1,33 @@
+import sys
+
+import click
+from flask.cli import with_appcontext
+
+
+@click.command(
+    "dataset:totals", help="Backfills the stored file count and size of every dataset, fixing any that drifted."
+)
+@click.option("--verify", is_flag=True, help="Only report drifted datasets (exit code 1 if any) without fixing them.")
+@with_appcontext
+def dataset_totals(verify):
+    from app.modules.dataset.services import DataSetService
+
+    click.echo(click.style("Checking dataset file totals...", fg="yellow"))
+    try:
+        drifted = DataSetService().sync_file_totals(fix=not verify)
+    except Exception as e:
+        click.echo(click.style(f"Error checking dataset file totals: {e}", fg="red"))
+        sys.exit(2)
+
+    for dataset_id, files_count, total_size, actual_count, actual_size in drifted:
+        click.echo(
+            f"  dataset {dataset_id}: {files_count} files / {total_size} bytes stored, "
+            f"{actual_count} files / {actual_size} bytes actual"
+        )
+    if not drifted:
+        click.echo(click.style("Every dataset file total is correct.", fg="green"))
+    elif verify:
+        click.echo(click.style(f"{len(drifted)} datasets have drifted file totals.", fg="red"))
+        sys.exit(1)
+    else:
+        click.echo(click.style(f"Fixed the file totals of {len(drifted)} datasets.", fg="green"))
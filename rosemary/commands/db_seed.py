@@ -1,6 +1,7 @@
 import importlib
 import inspect
 import os
+import time
 
 import click
 from flask.cli import with_appcontext
@@ -9,7 +10,7 @@ from core.seeders.BaseSeeder import BaseSeeder
 from rosemary.commands.db_reset import db_reset
 
 
-def get_module_seeders(module_path, specific_module=None):
+def get_module_seeders(module_path, specific_module=None, scale=None):
     seeders = []
     for root, dirs, files in os.walk(module_path):
         if "seeders.py" in files:
@@ -31,7 +32,7 @@ def get_module_seeders(module_path, specific_module=None):
                     and issubclass(potential_seeder_class, BaseSeeder)
                     and potential_seeder_class is not BaseSeeder
                 ):
-                    seeders.append(potential_seeder_class())
+                    seeders.append(potential_seeder_class(scale=scale))
 
     # Sort seeders by priority
     seeders.sort(key=lambda seeder: seeder.priority)
@@ -42,9 +43,14 @@ def get_module_seeders(module_path, specific_module=None):
 @click.command("db:seed", help="Populates the database with the seeders defined in each module.")
 @click.option("--reset", is_flag=True, help="Reset the database before seeding.")
 @click.option("-y", "--yes", is_flag=True, help="Confirm the operation without prompting.")
+@click.option(
+    "--scale",
+    type=click.IntRange(min=1),
+    help="Also generate this many synthetic datasets (with their users, feature models and files) for load testing.",
+)
 @click.argument("module", required=False)
 @with_appcontext
-def db_seed(reset, yes, module):
+def db_seed(reset, yes, scale, module):
     if reset:
         if yes or click.confirm(
             click.style("This will reset the database, do you want to continue?", fg="red"),
@@ -58,7 +64,7 @@ def db_seed(reset, yes, module):
             return
 
     blueprints_module_path = os.path.join(os.getenv("WORKING_DIR", ""), "app/modules")
-    seeders = get_module_seeders(blueprints_module_path, specific_module=module)
+    seeders = get_module_seeders(blueprints_module_path, specific_module=module, scale=scale)
     success = True  # Flag to control the successful flow of the operation
 
     if module:
@@ -68,8 +74,10 @@ def db_seed(reset, yes, module):
 
     for seeder in seeders:
         try:
+            started = time.monotonic()
             seeder.run()
-            click.echo(click.style(f"{seeder.__class__.__name__} performed.", fg="blue"))
+            elapsed = time.monotonic() - started
+            click.echo(click.style(f"{seeder.__class__.__name__} performed in {elapsed:.1f} s.", fg="blue"))
         except Exception as e:
             click.echo(click.style(f"Error running seeder {seeder.__class__.__name__}: {e}", fg="red"))
             click.echo(
@@ -0,0 +1,23 @@
+import sys
+
+import click
+from flask.cli import with_appcontext
+
+
+@click.command(
+    "featuremodel:analyze",
+    help="Analyses the stored UVL models that have no metrics yet (features, constraints, depth, configurations).",
+)
+@click.option("--all", "everything", is_flag=True, help="Analyse every model again, not only those without metrics.")
+@with_appcontext
+def featuremodel_analyze(everything):
+    from app.modules.featuremodel.services import FMMetricsService
+
+    click.echo(click.style("Analysing feature models...", fg="yellow"))
+    try:
+        analyzed = FMMetricsService().backfill(everything=everything)
+    except Exception as e:
+        click.echo(click.style(f"Error analysing feature models: {e}", fg="red"))
+        sys.exit(1)
+
+    click.echo(click.style(f"Analysed {analyzed} feature models.", fg="green"))
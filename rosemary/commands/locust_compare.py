@@ -0,0 +1,113 @@
+import csv
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+import click
+
+WORKER_CLASSES = ("sync", "gthread", "gevent")
+
+# Seconds for Gunicorn to start its workers and answer the first request
+STARTUP_TIMEOUT = 60
+
+
+def wait_until_serving(url, process):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise click.ClickException(f"Gunicorn exited with status {process.returncode}")
+        try:
+            with urllib.request.urlopen(url, timeout=5):
+                return
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.5)
+    raise click.ClickException(f"Gunicorn did not answer at {url} within {STARTUP_TIMEOUT} seconds")
+
+
+def read_stats(csv_prefix):
+    """Aggregated row and homepage row of the stats Locust wrote, by column name."""
+    with open(f"{csv_prefix}_stats.csv", newline="") as file:
+        rows = {row["Name"]: row for row in csv.DictReader(file)}
+    return rows.get("Aggregated", {}), rows.get("/", {})
+
+
+@click.command(
+    "locust:compare",
+    help="Benchmarks the Gunicorn worker classes against each other: serves the app with each one in turn and runs "
+    "the same headless Locust workload (core/locust/serving_locustfile.py) against it. Run it on a seeded database, "
+    "e.g. after rosemary db:seed --scale 10000.",
+)
+@click.option("--modes", default=",".join(WORKER_CLASSES), show_default=True, help="Worker classes to compare.")
+@click.option("--users", default=100, show_default=True, help="Concurrent Locust users.")
+@click.option("--spawn-rate", default=20, show_default=True, help="Users started per second.")
+@click.option("--duration", default="60s", show_default=True, help="Run time of every mode, e.g. 90s or 5m.")
+@click.option("--workers", type=int, help="Gunicorn workers of every mode (derived from the CPUs by default).")
+@click.option("--port", default=5050, show_default=True, help="Local port the app is served on while benchmarking.")
+def locust_compare(modes, users, spawn_rate, duration, workers, port):
+    working_dir = os.getenv("WORKING_DIR", "") or os.getcwd()
+    config_path = os.path.join(working_dir, "core", "gunicorn.conf.py")
+    locustfile_path = os.path.join(working_dir, "core", "locust", "serving_locustfile.py")
+    host = f"http://127.0.0.1:{port}"
+
+    modes = [mode.strip() for mode in modes.split(",") if mode.strip()]
+    unknown = set(modes) - set(WORKER_CLASSES)
+    if unknown:
+        raise click.UsageError(f"Unknown worker classes: {', '.join(sorted(unknown))}")
+
+    output_dir = tempfile.mkdtemp(prefix="locust-compare-")
+    results = []
+    for mode in modes:
+        env = dict(os.environ, GUNICORN_WORKER_CLASS=mode, GUNICORN_BIND=f"127.0.0.1:{port}")
+        if workers:
+            env["GUNICORN_WORKERS"] = str(workers)
+
+        click.echo(click.style(f"Serving with {mode} workers...", fg="yellow"))
+        server = subprocess.Popen(["gunicorn", "-c", config_path, "app:app"], cwd=working_dir, env=env)
+        try:
+            wait_until_serving(host, server)
+            csv_prefix = os.path.join(output_dir, mode)
+            subprocess.run(
+                [
+                    "locust",
+                    "-f",
+                    locustfile_path,
+                    "--headless",
+                    "--only-summary",
+                    "--users",
+                    str(users),
+                    "--spawn-rate",
+                    str(spawn_rate),
+                    "--run-time",
+                    duration,
+                    "--host",
+                    host,
+                    "--csv",
+                    csv_prefix,
+                ],
+                cwd=working_dir,
+                check=False,
+            )
+            results.append((mode, *read_stats(csv_prefix)))
+        except (click.ClickException, OSError) as e:
+            click.echo(click.style(f"Error benchmarking {mode} workers: {e}", fg="red"))
+            sys.exit(1)
+        finally:
+            server.terminate()
+            server.wait()
+
+    click.echo()
+    click.echo(
+        f"{'Mode':<10}{'Requests':>10}{'Failures':>10}{'Req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+        f"{'Home p95':>10}"
+    )
+    for mode, total, homepage in results:
+        click.echo(
+            f"{mode:<10}{total.get('Request Count', '-'):>10}{total.get('Failure Count', '-'):>10}"
+            f"{float(total.get('Requests/s') or 0):>10.1f}{total.get('50%', '-'):>10}{total.get('95%', '-'):>10}"
+            f"{total.get('99%', '-'):>10}{homepage.get('95%', '-'):>10}"
+        )
+    click.echo(click.style(f"Locust CSV reports written to {output_dir}", fg="green"))
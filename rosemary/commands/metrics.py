@@ -0,0 +1,56 @@
+import os
+
+import click
+import requests
+
+
+@click.command(
+    "metrics:report",
+    help="Summarizes the /metrics of a running app (e.g. after a Locust run): slowest endpoints and N+1 offenders.",
+)
+@click.option(
+    "--url",
+    default=lambda: f"http://localhost:{os.getenv('FLASK_RUN_PORT', '5000')}/metrics",
+    show_default="http://localhost:5000/metrics",
+    help="Metrics page of the app.",
+)
+@click.option("--file", "path", type=click.Path(exists=True), help="Read a saved metrics page instead of --url.")
+@click.option("--top", default=10, show_default=True, help="Endpoints listed in every ranking.")
+def metrics_report(url, path, top):
+    from core.instrumentation.metrics import endpoint_summary, parse_metrics
+
+    try:
+        if path:
+            with open(path) as metrics_file:
+                text = metrics_file.read()
+        else:
+            response = requests.get(url, timeout=10)
+            response.raise_for_status()
+            text = response.text
+    except (OSError, requests.RequestException) as e:
+        click.echo(click.style(f"Error reading metrics: {e}", fg="red"))
+        return
+
+    summary = endpoint_summary(parse_metrics(text))
+    if not summary:
+        click.echo(click.style("No requests recorded yet.", fg="yellow"))
+        return
+
+    def table(title, key, columns):
+        click.echo(click.style(title, fg="yellow"))
+        click.echo(f"  {'endpoint':<40} " + " ".join(f"{name:>16}" for name, _ in columns))
+        for endpoint, figures in sorted(summary.items(), key=lambda item: item[1][key], reverse=True)[:top]:
+            click.echo(f"  {endpoint:<40} " + " ".join(f"{fmt.format(figures[name]):>16}" for name, fmt in columns))
+        click.echo()
+
+    table(
+        "Slowest endpoints (mean handler time)",
+        "mean_ms",
+        [("requests", "{}"), ("mean_ms", "{:.1f}"), ("mean_sql_ms", "{:.1f}"), ("total_ms", "{:.0f}")],
+    )
+    # Many statements per request usually means relationships loaded one row at a time
+    table(
+        "Most queries per request (N+1 suspects)",
+        "mean_statements",
+        [("requests", "{}"), ("mean_statements", "{:.1f}"), ("max_statements", "{}"), ("mean_sql_ms", "{:.1f}")],
+    )
@@ -0,0 +1,18 @@
+import click
+from flask.cli import with_appcontext
+
+
+@click.command("stats:recount", help="Recomputes the homepage counters from the tables they summarize.")
+@with_appcontext
+def stats_recount():
+    from app.modules.public.services import StatisticsService
+
+    click.echo(click.style("Recounting homepage statistics...", fg="yellow"))
+    try:
+        values = StatisticsService().recount()
+    except Exception as e:
+        click.echo(click.style(f"Error recounting statistics: {e}", fg="red"))
+        return
+    for name, value in values.items():
+        click.echo(f"  {name}: {value}")
+    click.echo(click.style("Homepage statistics recounted.", fg="green"))
@@ -0,0 +1,49 @@
+import click
+from flask.cli import with_appcontext
+
+
+@click.command(
+    "storage:migrate", help="Moves files in the legacy uploads layout into the content-addressed blob store."
+)
+@click.option("--batch-size", default=200, show_default=True, help="Files converted per transaction.")
+@click.option("--dry-run", is_flag=True, help="Report what would be migrated without changing anything.")
+@with_appcontext
+def storage_migrate(batch_size, dry_run):
+    from app.modules.hubfile.services import BlobService
+
+    click.echo(click.style("Migrating files to the blob store...", fg="yellow"))
+    try:
+        stats = BlobService().migrate_legacy_files(batch_size=batch_size, dry_run=dry_run)
+    except Exception as e:
+        click.echo(click.style(f"Error migrating files: {e}", fg="red"))
+        return
+
+    prefix = "[dry run] " if dry_run else ""
+    click.echo(
+        click.style(
+            f"{prefix}{stats['files']} files migrated into {stats['blobs']} new blobs, "
+            f"{stats['duplicates']} duplicates ({stats['bytes_saved']} bytes saved).",
+            fg="green",
+        )
+    )
+    if stats["missing"]:
+        click.echo(click.style(f"{stats['missing']} files were missing on disk and were left as they are.", fg="red"))
+
+
+@click.command("storage:gc", help="Recounts blob references and deletes blobs no file points at.")
+@click.option("--grace", default=3600, show_default=True, help="Seconds an unknown blob file is kept before removal.")
+@with_appcontext
+def storage_gc(grace):
+    from app.modules.hubfile.services import BlobService
+
+    click.echo(click.style("Collecting unreferenced blobs...", fg="yellow"))
+    try:
+        stats = BlobService().collect_garbage(grace_seconds=grace)
+    except Exception as e:
+        click.echo(click.style(f"Error collecting blobs: {e}", fg="red"))
+        return
+    click.echo(
+        click.style(
+            f"Removed {stats['blobs']} unreferenced blobs and {stats['orphan_files']} orphan files.", fg="green"
+        )
+    )